@@ -152,6 +152,28 @@ def pair_correlation_disk(separation_values, radius):
     return rpd
 
 
+def pair_correlation_disk_radius_derivative(separation_values, radius):
+    """Derivative of pair_correlation_disk with respect to the radius of the
+    disk, for the Jacobians of the models. Since
+    arccos(s / 2R) - arctan(s / sqrt(4R^2 - s^2)) + pi / 2 = 2 arccos(s / 2R),
+    the other terms of the derivative cancel.
+
+    Args:
+        separation_values (float):
+            Separations between two points with the disk.
+        radius (float):
+            Radius of the disk.
+
+    Returns:
+        d_rpd (float):
+            The derivative of pair_correlation_disk with respect to the
+            radius, at the separation_values.
+    """
+    return (2 * np.pi * separation_values
+            * 4 * radius * np.arccos(separation_values / (2 * radius))
+            * 10 ** -7)
+
+
 def internalbg(separation_values, diameter, amp):
     """Background RPD term modeling isotripc localisations across a disk.
     See pair_correlation_disk().
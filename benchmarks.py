@@ -0,0 +1,890 @@
+"""
+benchmarks.py
+
+Benchmarks the neighbour search and file input and output of
+relative_positions.py (getdistances, getdistances_two_colours, get_vectors,
+save_relative_positions and read_data_in) on synthetic localisation data,
+so that changes to their performance can be measured and compared with an
+earlier run. No data files or network access are needed.
+
+The synthetic data are reproducible for a given seed: complete spatial
+randomness (CSR) background, with localisations around the 8 corners of
+rings like nuclear pore complexes (NPCs), in 2D or 3D (two rings, one above
+the other). The density of localisations is fixed, so the field of view
+grows with the number of localisations.
+
+For each benchmark, number of localisations, filter distance and 2D or 3D,
+the best wall time of several runs, the peak memory allocated (with
+tracemalloc, in a separate run, except for saving the relative positions as
+text, which tracemalloc slows down many times) and the throughput are saved
+as JSON, with the scaling exponent of the time with the number of
+localisations (time proportional to N ** exponent). Cases estimated to need
+more memory or time than the limits given (see relpos_estimate.py) are
+skipped.
+
+The fitting suite benchmarks the relative position distribution models
+(rotational symmetry, polyhedra, linear repeats and 9-fold centrioles) at
+fit lengths from 100 to 1000 nm: the time for one evaluation of each model,
+the number of evaluations and the time for a fit with
+modelling_general.fit_model_to_experiment to a synthetic distribution, and
+the time for the confidence band on the fitted model with
+modelling_general.stdev_of_model at all the distances (or estimated from
+fewer distances with --band-points).
+
+Usage:
+    python benchmarks.py -o benchmarks.json
+    python benchmarks.py --full -o benchmarks.json
+    python benchmarks.py --suite search --sizes 1e4,1e5 --filters 50,1000 --dims 2
+    python benchmarks.py --suite fitting --models cuboid --fit-lengths 200
+    python benchmarks.py -o new.json --compare benchmarks.json
+
+With --compare, the results are compared with a stored baseline, and the
+program exits with an error if any benchmark is slower than the baseline by
+more than --tolerance.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime
+import platform
+import tempfile
+import timeit
+import warnings
+import numpy as np
+import relative_positions as rp
+import relpos_estimate
+import instrumentation
+import modelling_general as models
+import rot_2d_symm_fit
+import dna_paint_data_fitting
+import zdisk_modelling
+import centriole_analysis
+import utils
+
+
+# Sizes (numbers of localisations) and filter distances (nm) benchmarked by
+# default, and with --full.
+QUICK_SIZES = (10 ** 3, 10 ** 4, 10 ** 5)
+QUICK_FILTERS = (50, 200)
+FULL_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+FULL_FILTERS = (50, 100, 200, 500, 1000)
+
+# Synthetic data: localisations per square micron (in X and Y), the
+# fraction of localisations in rings, and the rings (NPC-like).
+DEFAULT_DENSITY = 50.
+DEFAULT_RING_FRACTION = 0.5
+RING_DIAMETER = 107.
+RING_CORNERS = 8
+LOCALISATIONS_PER_RING = 32
+RING_SEPARATION_Z = 50.
+PRECISION = 5.
+DEPTH_3D = 600.
+
+# The search benchmarks, in the order they are run.
+SEARCH_BENCHMARKS = ('getdistances', 'getdistances_two_colours', 'get_vectors',
+                     'save_relative_positions', 'read_data_in')
+
+# Fit lengths (nm) benchmarked by the fitting suite, and the number of
+# distances at which the confidence band is timed by default (0 for all the
+# distances up to the fit length).
+FIT_LENGTHS = (100, 250, 500, 1000)
+DEFAULT_BAND_POINTS = 0
+
+# Initial parameters for the centriole models, as in centriole_analysis.main
+# (their defaults are all 1).
+CENTRIOLE_INITIAL_PARAMS = [300., 35., 100., 100., 100., 100., 10., 10., 10., 10.]
+
+def _set_up_rot_2d_symm_8fold():
+    """The rotational symmetry model fitted by rot_2d_symm_fit.py, for 8-fold
+    symmetry (see rot_2d_symm_fit.bind_symmetry_order)."""
+    model_with_info = (rot_2d_symm_fit
+                       .set_up_model_replocs_substruct_iso_bg_with_onset_with_fit_settings())
+    model_with_info.model_rpd = rot_2d_symm_fit.bind_symmetry_order(
+        model_with_info.model_rpd, 8)
+    model_with_info.vector_input_model = rot_2d_symm_fit.bind_symmetry_order(
+        model_with_info.vector_input_model, 8)
+    return model_with_info
+
+
+# The models benchmarked by the fitting suite: a name, the function setting
+# up the model with its fit settings (see modelling_general.ModelWithFitSettings),
+# and initial parameters to use instead of those set up (or None).
+FIT_BENCHMARK_MODELS = (
+    ('rot_2d_symm_8fold', _set_up_rot_2d_symm_8fold, None),
+    ('tri_prism',
+     dna_paint_data_fitting.set_up_tri_prism_on_grid_1_length_2disobg_substruct_with_fit_info,
+     None),
+    ('cuboid',
+     dna_paint_data_fitting.set_up_model_cuboid_on_grid_2disobg_substructure_with_fit_info,
+     None),
+    ('linear_repeat_5_peaks_fixed_ratio',
+     zdisk_modelling.set_up_model_5_peaks_fixed_ratio_with_fit_settings,
+     None),
+    ('linear_repeat_5_variable_peaks',
+     zdisk_modelling.set_up_model_5_variable_peaks_with_fit_settings,
+     None),
+    ('centriole_9fold',
+     centriole_analysis.set_up_variable_vertices_model_9fold_no_bg_with_fit_settings,
+     CENTRIOLE_INITIAL_PARAMS),
+    ('centriole_9fold_internal_bg',
+     centriole_analysis.set_up_variable_vertices_model_9fold_internal_bg_with_fit_settings,
+     CENTRIOLE_INITIAL_PARAMS + [300., 10.]),
+    )
+
+# Relative difference of the parameters of the synthetic 'experimental'
+# distributions from the initial parameters, and their noise relative to
+# their maximum.
+FIT_PARAMS_SPREAD = 0.1
+FIT_NOISE = 0.02
+
+# What identifies a case, to compare with a baseline.
+CASE_KEYS = ('benchmark', 'measure', 'dims', 'localisations', 'filter_distance',
+             'fit_length')
+
+# Baseline times shorter than this (s) are too noisy to compare.
+MIN_COMPARED_SECONDS = 0.01
+
+
+def synthetic_localisations(n_localisations, dims=2, density=DEFAULT_DENSITY,
+                            ring_fraction=DEFAULT_RING_FRACTION, seed=0):
+    """Make a reproducible set of localisations: CSR background with
+    NPC-like rings.
+
+    Args:
+        n_localisations (int): The number of localisations.
+        dims (int): 2 or 3.
+        density (float): Localisations per square micron, in X and Y.
+        ring_fraction (float): The fraction of localisations in rings.
+        seed (int): Seed for the random numbers.
+
+    Returns:
+        xyz_values (numpy array):
+            Localisations (nm), shape (n_localisations, dims), in random
+            order.
+    """
+    rng = np.random.default_rng(seed)
+    width = np.sqrt(n_localisations / density) * 1000.
+    n_rings = int(n_localisations * ring_fraction) // LOCALISATIONS_PER_RING
+    n_ring_localisations = n_rings * LOCALISATIONS_PER_RING
+    n_background = n_localisations - n_ring_localisations
+
+    background = rng.uniform(0., width, (n_background, dims))
+    if dims == 3:
+        background[:, 2] = rng.uniform(0., DEPTH_3D, n_background)
+
+    # Each ring localisation is at a corner of its ring, plus its
+    # localisation precision.
+    centres = rng.uniform(0., width, (n_rings, dims))
+    if dims == 3:
+        centres[:, 2] = rng.uniform(RING_SEPARATION_Z, DEPTH_3D - RING_SEPARATION_Z,
+                                    n_rings)
+    rotations = rng.uniform(0., 2. * np.pi / RING_CORNERS, n_rings)
+    ring = np.repeat(np.arange(n_rings), LOCALISATIONS_PER_RING)
+    angles = (rotations[ring]
+              + 2. * np.pi / RING_CORNERS
+              * rng.integers(0, RING_CORNERS, n_ring_localisations))
+    rings = centres[ring]
+    rings[:, 0] += RING_DIAMETER / 2. * np.cos(angles)
+    rings[:, 1] += RING_DIAMETER / 2. * np.sin(angles)
+    if dims == 3:
+        # Two rings, one above the other.
+        rings[:, 2] += RING_SEPARATION_Z * (
+            rng.integers(0, 2, n_ring_localisations) - 0.5)
+    rings += rng.normal(0., PRECISION, rings.shape)
+
+    xyz_values = np.concatenate((background, rings))
+    return xyz_values[rng.permutation(n_localisations)]
+
+
+def _benchmark_info(results_dir, in_file_and_path, dims, workers):
+    """The info dictionary used by read_data_in and save_relative_positions
+    in the benchmarks."""
+    return {'in_file_and_path': in_file_and_path,
+            'dims': dims,
+            'colours_analysed': None,
+            'workers': workers,
+            'results_dir': results_dir,
+            'in_file_no_extension': 'benchmark',
+            'short_names': False}
+
+
+def time_call(function, repeats=3, trace_memory=True):
+    """Time a function, as the best of several runs, after a run recording
+    the peak memory allocated.
+
+    Args:
+        function: The function to time, with no arguments.
+        repeats (int): The number of timed runs.
+        trace_memory (Boolean): Whether to record the peak memory allocated.
+            If False, the first run is not timed, as a warm-up.
+
+    Returns:
+        result: The return value of the function (from the last run).
+        seconds (list): The wall time of each timed run (s).
+        peak_traced_mb (float): The peak memory allocated (MB), or None.
+    """
+    recorder = instrumentation.StageRecorder(trace_memory=trace_memory)
+    with recorder.stage('memory'):
+        result = function()
+    del result
+    seconds = []
+    for _ in range(max(1, repeats)):
+        start_time = timeit.default_timer()
+        result = function()
+        seconds.append(timeit.default_timer() - start_time)
+    return result, seconds, recorder.stages[0]['peak_traced_mb']
+
+
+def _record(benchmark, dims, n_localisations, filterdist, pairs, seconds,
+            peak_traced_mb):
+    """One benchmark result."""
+    record = {'benchmark': benchmark,
+              'dims': dims,
+              'localisations': n_localisations,
+              'filter_distance': filterdist,
+              'pairs': pairs,
+              'seconds': min(seconds),
+              'all_seconds': seconds,
+              'peak_traced_mb': peak_traced_mb,
+              'throughput': {}}
+    if record['seconds'] > 0:
+        record['throughput']['localisations per second'] = (
+            n_localisations / record['seconds'])
+        if pairs is not None:
+            record['throughput']['pairs per second'] = pairs / record['seconds']
+    return record
+
+
+def _skipped(benchmark, dims, n_localisations, filterdist, reason):
+    """A benchmark that was not run."""
+    return {'benchmark': benchmark,
+            'dims': dims,
+            'localisations': n_localisations,
+            'filter_distance': filterdist,
+            'skipped': reason}
+
+
+def run_search_benchmarks(sizes=QUICK_SIZES, filter_distances=QUICK_FILTERS,
+                          dims_values=(2, 3), benchmarks=SEARCH_BENCHMARKS,
+                          repeats=3, workers=1, max_memory=4000.,
+                          max_seconds=600., seed=0, verbose=False):
+    """Run the neighbour search and input/output benchmarks.
+
+    Args:
+        sizes (iterable): Numbers of localisations.
+        filter_distances (iterable): Filter distances (nm).
+        dims_values (iterable): 2 and/or 3.
+        benchmarks (iterable): Names of the benchmarks to run, from
+            SEARCH_BENCHMARKS.
+        repeats (int): The number of timed runs of each benchmark.
+        workers (int): Number of processes for the search and reading.
+        max_memory (float): Cases estimated to need more memory than this
+            (MB) are skipped.
+        max_seconds (float): Cases estimated to take longer than this (s)
+            to search are skipped.
+        seed (int): Seed for the synthetic data.
+        verbose (Boolean): Whether to print each result.
+
+    Returns:
+        results (list of dicts):
+            One per case, with 'benchmark', 'dims', 'localisations',
+            'filter_distance', and 'seconds' (the best time),
+            'all_seconds', 'pairs', 'peak_traced_mb' and 'throughput',
+            or 'skipped' (the reason it was not run).
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as results_dir:
+        for dims in dims_values:
+            for n_localisations in sizes:
+                xyz_values = synthetic_localisations(n_localisations, dims,
+                                                     seed=seed)
+                in_file = os.path.join(results_dir, 'benchmark_locs.csv')
+                info = _benchmark_info(results_dir, in_file, dims, workers)
+
+                if 'read_data_in' in benchmarks:
+                    np.savetxt(in_file, xyz_values, delimiter=',',
+                               header=','.join('xyz'[:dims]), comments='')
+                    _, seconds, peak_mb = time_call(
+                        lambda: rp.read_data_in(info), repeats)
+                    results.append(_record('read_data_in', dims, n_localisations,
+                                           None, None, seconds, peak_mb))
+                    os.remove(in_file)
+                    if verbose:
+                        print(_result_line(results[-1]), flush=True)
+
+                for filterdist in filter_distances:
+                    results.extend(_search_benchmarks(
+                        xyz_values, filterdist, info, benchmarks, repeats,
+                        workers, max_memory, max_seconds, verbose))
+    return results
+
+
+def _search_benchmarks(xyz_values, filterdist, info, benchmarks, repeats, workers,
+                       max_memory, max_seconds, verbose):
+    """The benchmarks for one set of localisations and filter distance."""
+    n_localisations, dims = xyz_values.shape
+    results = []
+    names = [name for name in benchmarks if name != 'read_data_in']
+    if len(names) == 0:
+        return results
+
+    # Skip cases that would run for too long or run out of memory.
+    estimate = relpos_estimate.estimate_search(xyz_values, filterdist,
+                                               workers=workers)
+    if estimate['peak_memory_bytes'] > max_memory * 1024 ** 2:
+        reason = ('estimated peak memory '
+                  + str(round(estimate['peak_memory_bytes'] / 1024 ** 2))
+                  + ' MB is over ' + str(max_memory) + ' MB')
+    elif estimate['seconds'] * (repeats + 1) > max_seconds:
+        reason = ('estimated time ' + str(round(estimate['seconds'] * (repeats + 1)))
+                  + ' s is over ' + str(max_seconds) + ' s')
+    else:
+        reason = None
+    if reason is not None:
+        for name in names:
+            results.append(_skipped(name, dims, n_localisations, filterdist, reason))
+            if verbose:
+                print(_result_line(results[-1]), flush=True)
+        return results
+
+    d_values, seconds, peak_mb = time_call(
+        lambda: rp.getdistances(xyz_values, filterdist, workers=workers), repeats)
+    if 'getdistances' in names:
+        results.append(_record('getdistances', dims, n_localisations, filterdist,
+                               len(d_values), seconds, peak_mb))
+
+    if 'getdistances_two_colours' in names:
+        # Alternate localisations, as two colour channels.
+        xyz_values_start = xyz_values[0::2]
+        xyz_values_end = xyz_values[1::2]
+        d_between, seconds, peak_mb = time_call(
+            lambda: rp.getdistances_two_colours(xyz_values_start, filterdist,
+                                                xyz_values_end, workers=workers),
+            repeats)
+        results.append(_record('getdistances_two_colours', dims, n_localisations,
+                               filterdist, len(d_between), seconds, peak_mb))
+        del d_between
+
+    if 'get_vectors' in names or 'save_relative_positions' in names:
+        v_values, seconds, peak_mb = time_call(
+            lambda: rp.get_vectors(d_values, dims), repeats)
+        if 'get_vectors' in names:
+            results.append(_record('get_vectors', dims, n_localisations, filterdist,
+                                   len(d_values), seconds, peak_mb))
+
+    if 'save_relative_positions' in names:
+        # Tracing the memory allocated while writing text, line by line,
+        # would take many times longer than writing it.
+        out_file_name, seconds, peak_mb = time_call(
+            lambda: rp.save_relative_positions(v_values, filterdist, dims, info),
+            repeats, trace_memory=False)
+        os.remove(out_file_name)
+        results.append(_record('save_relative_positions', dims, n_localisations,
+                               filterdist, len(d_values), seconds, peak_mb))
+
+    if verbose:
+        for record in results:
+            print(_result_line(record), flush=True)
+    return results
+
+
+def fit_benchmark_model(name):
+    """Set up a model benchmarked by the fitting suite.
+
+    Args:
+        name (str): The name of the model in FIT_BENCHMARK_MODELS.
+
+    Returns:
+        model_with_info (ModelWithFitSettings):
+            The model, with its initial parameters and bounds for
+            curve_fit, and a vector-input version of it for stdev_of_model.
+    """
+    for model_name, set_up, initial_params in FIT_BENCHMARK_MODELS:
+        if model_name == name:
+            model_with_info = set_up()
+            if initial_params is not None:
+                model_with_info.initial_params = list(initial_params)
+            if model_with_info.vector_input_model is None:
+                model_with_info.vector_input_model = _vector_input_model(
+                    model_with_info.model_rpd)
+            return model_with_info
+    raise ValueError('Unknown model: ' + name)
+
+
+def _vector_input_model(model_rpd):
+    """A version of model_rpd taking one vector of the distance and the
+    parameters, as for stdev_of_model."""
+    def vector_input_model(input_vector):
+        return model_rpd(input_vector[0], *input_vector[1:])
+    return vector_input_model
+
+
+def synthetic_distribution(model_with_info, fit_length, seed=0):
+    """Make a reproducible 'experimental' relative position distribution
+    from a model, with parameters near the initial parameters, and noise.
+
+    Args:
+        model_with_info (ModelWithFitSettings): The model.
+        fit_length (int): The distribution is at fit_length distances,
+            0.5 nm to fit_length - 0.5 nm.
+        seed (int): Seed for the random numbers.
+
+    Returns:
+        expt (numpy array): The distribution.
+    """
+    rng = np.random.default_rng(seed)
+    initial_params = np.array(model_with_info.initial_params, dtype=float)
+    lower_bounds, upper_bounds = np.broadcast_arrays(
+        np.asarray(model_with_info.param_bounds[0], dtype=float),
+        np.asarray(model_with_info.param_bounds[1], dtype=float))
+    params = initial_params * (1. + FIT_PARAMS_SPREAD
+                               * rng.normal(size=len(initial_params)))
+    params = np.clip(params, lower_bounds, upper_bounds)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expt = model_with_info.model_rpd(np.arange(fit_length) + 0.5, *params)
+    expt = np.nan_to_num(expt)
+    return expt + rng.normal(0., FIT_NOISE * np.max(np.abs(expt)), fit_length)
+
+
+def run_fitting_benchmarks(fit_lengths=FIT_LENGTHS, model_names=None, repeats=3,
+                           band_points=DEFAULT_BAND_POINTS, seed=0, verbose=False):
+    """Run the model evaluation and fitting benchmarks.
+
+    For each model and fit length, this times one evaluation of the model
+    (the best of several), a fit of the model to a synthetic distribution
+    with fit_model_to_experiment (counting the model evaluations), and the
+    confidence band on the fitted model from stdev_of_model.
+
+    Args:
+        fit_lengths (iterable): Fit lengths (nm).
+        model_names (iterable): Names of the models to benchmark, from
+            FIT_BENCHMARK_MODELS. Defaults to all.
+        repeats (int): The number of timed runs of each evaluation.
+        band_points (int): The number of distances the confidence band is
+            timed at, to estimate the time for all the distances up to the
+            fit length. 0 for all the distances.
+        seed (int): Seed for the synthetic distributions.
+        verbose (Boolean): Whether to print each result.
+
+    Returns:
+        results (list of dicts):
+            Three per model and fit length, with 'benchmark' (the model),
+            'measure' ('evaluation', 'fit' or 'confidence band'),
+            'fit_length', 'parameters' and 'seconds', with 'evaluations'
+            per fit and the 'band_points' timed, or 'skipped' (the reason
+            there is no time).
+    """
+    if model_names is None:
+        model_names = [model[0] for model in FIT_BENCHMARK_MODELS]
+    results = []
+    for name in model_names:
+        for fit_length in fit_lengths:
+            case_results = _fitting_benchmarks(name, fit_length, repeats,
+                                               band_points, seed)
+            if verbose:
+                for record in case_results:
+                    print(_result_line(record), flush=True)
+            results.extend(case_results)
+    return results
+
+
+def _fit_record(name, measure, fit_length, n_params, seconds):
+    """One fitting benchmark result."""
+    return {'benchmark': name,
+            'measure': measure,
+            'fit_length': fit_length,
+            'parameters': n_params,
+            'seconds': seconds,
+            'throughput': {}}
+
+
+def _fitting_benchmarks(name, fit_length, repeats, band_points, seed):
+    """The benchmarks for one model and fit length."""
+    model_with_info = fit_benchmark_model(name)
+    model_rpd = model_with_info.model_rpd
+    initial_params = model_with_info.initial_params
+    n_params = len(initial_params)
+    x_values = np.arange(fit_length) + 0.5
+    expt = synthetic_distribution(model_with_info, fit_length, seed=seed)
+    results = []
+
+    with warnings.catch_warnings():
+        # The models warn outside their useful range of parameters.
+        warnings.simplefilter('ignore')
+
+        timer = timeit.Timer(lambda: model_rpd(x_values, *initial_params))
+        number = timer.autorange()[0]
+        seconds = min(timer.repeat(max(1, repeats), number)) / number
+        results.append(_fit_record(name, 'evaluation', fit_length, n_params,
+                                   seconds))
+        results[-1]['throughput']['evaluations per second'] = 1. / seconds
+
+        recorder = instrumentation.StageRecorder()
+        try:
+            with recorder.stage('fit') as stage:
+                (params_optimised,
+                 params_covar,
+                 _) = models.fit_model_to_experiment(expt,
+                                                     model_rpd,
+                                                     initial_params,
+                                                     model_with_info.param_bounds,
+                                                     fitlength=fit_length,
+                                                     stage=stage)
+        except (RuntimeError, ValueError) as exception:
+            reason = 'fit failed: ' + str(exception)
+            for measure in ('fit', 'confidence band'):
+                results.append(_fit_record(name, measure, fit_length, n_params,
+                                           None))
+                results[-1]['skipped'] = reason
+            return results
+        stage = recorder.stages[0]
+        results.append(_fit_record(name, 'fit', fit_length, n_params,
+                                   stage['wall_seconds']))
+        results[-1]['evaluations'] = stage['counts']['model evaluations']
+        results[-1]['throughput'] = stage['throughput']
+
+        if band_points and band_points < fit_length:
+            band_values = x_values[np.linspace(0, fit_length - 1,
+                                               band_points).astype(int)]
+        else:
+            band_values = x_values
+        start_time = timeit.default_timer()
+        models.stdev_of_model(band_values, params_optimised, params_covar,
+                              model_with_info.vector_input_model,
+                              jacobian=models.model_jacobian(model_rpd))
+        seconds = timeit.default_timer() - start_time
+        results.append(_fit_record(name, 'confidence band', fit_length, n_params,
+                                   seconds * fit_length / len(band_values)))
+        results[-1]['band_points'] = len(band_values)
+        results[-1]['throughput']['distances per second'] = (
+            len(band_values) / seconds)
+    return results
+
+
+def scaling_exponents(results):
+    """Fit the scaling of the time of each benchmark with the number of
+    localisations, as time proportional to N ** exponent.
+
+    Args:
+        results (list of dicts): As from run_search_benchmarks.
+
+    Returns:
+        scaling (list of dicts):
+            One for each benchmark, dims and filter distance run for at least
+            two numbers of localisations, with 'benchmark', 'dims',
+            'filter_distance', 'sizes' and 'exponent'.
+    """
+    groups = {}
+    for record in results:
+        if ('skipped' in record or record.get('localisations') is None
+                or record['seconds'] <= 0):
+            continue
+        key = (record['benchmark'], record['dims'], record['filter_distance'])
+        groups.setdefault(key, []).append(record)
+
+    scaling = []
+    for (benchmark, dims, filterdist), records in groups.items():
+        sizes = [record['localisations'] for record in records]
+        if len(set(sizes)) < 2:
+            continue
+        seconds = [record['seconds'] for record in records]
+        exponent = np.polyfit(np.log(sizes), np.log(seconds), 1)[0]
+        scaling.append({'benchmark': benchmark,
+                        'dims': dims,
+                        'filter_distance': filterdist,
+                        'sizes': sizes,
+                        'exponent': float(exponent)})
+    return scaling
+
+
+def _case_key(record):
+    """What identifies a case, to compare with a baseline."""
+    return tuple(record.get(key) for key in CASE_KEYS)
+
+
+def compare_with_baseline(results, baseline_results, tolerance=0.25):
+    """Compare benchmark results with a stored baseline.
+
+    Args:
+        results (list of dicts): As from run_search_benchmarks and
+            run_fitting_benchmarks.
+        baseline_results (list of dicts): The same, from the baseline.
+        tolerance (float): The fraction slower than the baseline that is
+            a regression.
+
+    Returns:
+        comparisons (list of dicts):
+            One for each case run in both, with the case, 'seconds',
+            'baseline_seconds', 'ratio' (seconds / baseline_seconds),
+            'memory_ratio' (None without both peak memories) and
+            'regression' (True if the ratio is over 1 + tolerance, for
+            baseline times long enough to compare).
+    """
+    baseline = {_case_key(record): record for record in baseline_results
+                if 'skipped' not in record}
+    comparisons = []
+    for record in results:
+        if 'skipped' in record or _case_key(record) not in baseline:
+            continue
+        base = baseline[_case_key(record)]
+        ratio = record['seconds'] / base['seconds'] if base['seconds'] > 0 else None
+        memory_ratio = None
+        if record.get('peak_traced_mb') and base.get('peak_traced_mb'):
+            memory_ratio = record['peak_traced_mb'] / base['peak_traced_mb']
+        comparison = {key: record.get(key) for key in CASE_KEYS}
+        comparison.update({
+            'seconds': record['seconds'],
+            'baseline_seconds': base['seconds'],
+            'ratio': ratio,
+            'memory_ratio': memory_ratio,
+            'regression': (ratio is not None
+                           and base['seconds'] >= MIN_COMPARED_SECONDS
+                           and ratio > 1. + tolerance)})
+        comparisons.append(comparison)
+    return comparisons
+
+
+def _case_text(record):
+    """Describe a case, e.g. 'getdistances, 2D, 1000 localisations, filter
+    50 nm' or 'cuboid, fit, fit length 200 nm'."""
+    if record.get('fit_length') is not None:
+        return (record['benchmark'] + ', ' + record['measure'] + ', fit length '
+                + str(record['fit_length']) + ' nm')
+    case = (record['benchmark'] + ', ' + str(record['dims']) + 'D, '
+            + str(record['localisations']) + ' localisations')
+    if record['filter_distance'] is not None:
+        case += ', filter ' + str(record['filter_distance']) + ' nm'
+    return case
+
+
+def _result_line(record):
+    """Describe one result, as a line of text."""
+    case = _case_text(record)
+    if 'skipped' in record:
+        return case + ': skipped (' + record['skipped'] + ')'
+    line = case + ': ' + str(round(record['seconds'], 4)) + ' s'
+    if record.get('peak_traced_mb') is not None:
+        line += ', ' + str(round(record['peak_traced_mb'], 1)) + ' MB'
+    if record.get('evaluations') is not None:
+        line += ', ' + str(record['evaluations']) + ' evaluations'
+    return line
+
+
+def _comparison_line(comparison):
+    """Describe one comparison with the baseline, as a line of text."""
+    line = (_case_text(comparison) + ': ' + str(round(comparison['seconds'], 4))
+            + ' s, baseline ' + str(round(comparison['baseline_seconds'], 4)) + ' s')
+    if comparison['ratio'] is not None:
+        line += ' (' + str(round(comparison['ratio'], 2)) + ' x)'
+    if comparison['regression']:
+        line += ' (SLOWER)'
+    return line
+
+
+def _parse_sizes(text):
+    """Reads numbers of localisations separated by commas, e.g. 1e3,1e4."""
+    try:
+        sizes = sorted(set(int(float(item)) for item in text.split(',')))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid sizes: %r" % text)
+    if min(sizes) < 2:
+        raise argparse.ArgumentTypeError("sizes must be at least 2: %r" % text)
+    return sizes
+
+
+def _parse_dims(text):
+    """Reads 2 and/or 3, separated by commas."""
+    try:
+        dims_values = sorted(set(int(item) for item in text.split(',')))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid dimensions: %r" % text)
+    if not set(dims_values) <= {2, 3}:
+        raise argparse.ArgumentTypeError("dimensions must be 2 or 3: %r" % text)
+    return dims_values
+
+
+def main():
+    """Run the benchmarks, save the results and compare them with a baseline
+    if one is given."""
+    parser = argparse.ArgumentParser(
+        prog='benchmarks',
+        description="Benchmarks the neighbour search and file input and output "
+        "of relative_positions.py on synthetic localisation data, and the "
+        "evaluation and fitting of the relative position distribution models.")
+
+    parser.add_argument('-o', '--output',
+                        help="JSON file for the results. Defaults to "
+                        "benchmarks.json.",
+                        default='benchmarks.json')
+    parser.add_argument('--suite', choices=['all', 'search', 'fitting'],
+                        default='all',
+                        help="The benchmarks to run: the neighbour search and "
+                        "input/output, the model fitting, or all (the default).")
+    parser.add_argument('--full',
+                        help="Benchmark 1000 to 10 million localisations and "
+                        "filter distances from 50 to 1000 nm (cases over "
+                        "--max-memory or --max-case-time are skipped).",
+                        action='store_true')
+    parser.add_argument('--sizes', type=_parse_sizes,
+                        help="Numbers of localisations, separated by commas, "
+                        "e.g. 1e3,1e4,1e5.")
+    parser.add_argument('--filters', type=rp.parse_filter_distances,
+                        help="Filter distances (nm), e.g. 50,200 or 50:1000:50.")
+    parser.add_argument('--dims', type=_parse_dims, default=[2, 3],
+                        help="2 and/or 3, e.g. 2,3 (the default).")
+    parser.add_argument('--benchmarks',
+                        help="Benchmarks to run, separated by commas, from: "
+                        + ', '.join(SEARCH_BENCHMARKS) + ". Defaults to all.")
+    parser.add_argument('--models',
+                        help="Models for the fitting benchmarks, separated by "
+                        "commas, from: "
+                        + ', '.join(model[0] for model in FIT_BENCHMARK_MODELS)
+                        + ". Defaults to all.")
+    parser.add_argument('--fit-lengths', dest='fit_lengths', type=_parse_sizes,
+                        default=list(FIT_LENGTHS),
+                        help="Fit lengths (nm) for the fitting benchmarks, "
+                        "separated by commas. Defaults to 100,250,500,1000.")
+    parser.add_argument('--band-points', dest='band_points', type=int,
+                        default=DEFAULT_BAND_POINTS,
+                        help="Number of distances at which the confidence "
+                        "band is timed, to estimate the time for the whole "
+                        "band. 0 for all the distances. Defaults to "
+                        + str(DEFAULT_BAND_POINTS) + ".")
+    parser.add_argument('--repeats', type=int, default=3,
+                        help="Number of timed runs of each benchmark; the "
+                        "best time is kept. Defaults to 3.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes for the search and reading.")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed for the synthetic data.")
+    parser.add_argument('--max-memory', dest='max_memory', type=float,
+                        default=4000.,
+                        help="Skip cases estimated to need more memory than "
+                        "this (MB). Defaults to 4000.")
+    parser.add_argument('--max-case-time', dest='max_case_time', type=float,
+                        default=600.,
+                        help="Skip cases estimated to take longer than this "
+                        "(s). Defaults to 600.")
+    parser.add_argument('--compare',
+                        help="JSON file of baseline results (from an earlier "
+                        "run) to compare with.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Fraction slower than the baseline counted as a "
+                        "regression. Defaults to 0.25.")
+    parser.add_argument('-v', '--verbose',
+                        help="Print each result.",
+                        action='store_true')
+
+    args = parser.parse_args()
+
+    if args.benchmarks is None:
+        benchmarks = SEARCH_BENCHMARKS
+    else:
+        benchmarks = args.benchmarks.split(',')
+        unknown = set(benchmarks) - set(SEARCH_BENCHMARKS)
+        if unknown:
+            sys.exit('Unknown benchmarks: ' + ', '.join(sorted(unknown)))
+    sizes = args.sizes or (FULL_SIZES if args.full else QUICK_SIZES)
+    filter_distances = args.filters or (FULL_FILTERS if args.full else QUICK_FILTERS)
+
+    if args.models is None:
+        model_names = [model[0] for model in FIT_BENCHMARK_MODELS]
+    else:
+        model_names = args.models.split(',')
+        unknown = set(model_names) - set(model[0] for model in FIT_BENCHMARK_MODELS)
+        if unknown:
+            sys.exit('Unknown models: ' + ', '.join(sorted(unknown)))
+    band_points = args.band_points
+
+    baseline = None
+    if args.compare is not None:
+        try:
+            with open(args.compare) as fin:
+                baseline = json.load(fin)
+        except (IOError, OSError, ValueError):
+            sys.exit('Could not read the baseline file ' + args.compare + '.')
+
+    start = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    results = []
+    if args.suite in ('all', 'search'):
+        results.extend(run_search_benchmarks(sizes=sizes,
+                                             filter_distances=filter_distances,
+                                             dims_values=args.dims,
+                                             benchmarks=benchmarks,
+                                             repeats=args.repeats,
+                                             workers=args.workers,
+                                             max_memory=args.max_memory,
+                                             max_seconds=args.max_case_time,
+                                             seed=args.seed,
+                                             verbose=args.verbose))
+    if args.suite in ('all', 'fitting'):
+        results.extend(run_fitting_benchmarks(fit_lengths=args.fit_lengths,
+                                              model_names=model_names,
+                                              repeats=args.repeats,
+                                              band_points=band_points,
+                                              seed=args.seed,
+                                              verbose=args.verbose))
+
+    run = {'program': 'benchmarks',
+           'start': start,
+           'host': utils.find_hostname_and_ip()[0],
+           'python': platform.python_version(),
+           'numpy': np.__version__,
+           'workers': args.workers,
+           'repeats': args.repeats,
+           'seed': args.seed,
+           'band_points': band_points,
+           'results': results,
+           'scaling': scaling_exponents(results)}
+    if baseline is not None:
+        run['baseline'] = args.compare
+        run['comparisons'] = compare_with_baseline(results, baseline['results'],
+                                                   tolerance=args.tolerance)
+
+    try:
+        with open(args.output, 'w') as fout:
+            json.dump(run, fout, indent=2)
+    except (EOFError, IOError, OSError):
+        print("Unexpected error:", sys.exc_info()[0])
+        sys.exit("Could not create and open the results file.")
+
+    if run['scaling']:
+        print('\nScaling (time proportional to localisations ** exponent):')
+    for scaling in run['scaling']:
+        filter_text = ''
+        if scaling['filter_distance'] is not None:
+            filter_text = ', filter ' + str(scaling['filter_distance']) + ' nm'
+        print('  ' + scaling['benchmark'] + ', ' + str(scaling['dims']) + 'D'
+              + filter_text + ': ' + str(round(scaling['exponent'], 2)))
+    print('\nResults saved in ' + args.output)
+
+    if baseline is not None:
+        print('\nCompared with ' + args.compare + ':')
+        for comparison in run['comparisons']:
+            print('  ' + _comparison_line(comparison))
+        regressions = [comparison for comparison in run['comparisons']
+                       if comparison['regression']]
+        if regressions:
+            sys.exit(str(len(regressions)) + ' benchmark(s) slower than the '
+                     'baseline by more than ' + str(round(100 * args.tolerance))
+                     + '%.')
+
+
+if __name__ == '__main__':
+    main()
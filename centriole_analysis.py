@@ -34,6 +34,8 @@ import modelling_general as models
 from modelling_general import ModelWithFitSettings
 from relative_positions import getdistances
 from background_models import pair_correlation_disk
+from background_models import pair_correlation_disk_radius_derivative
+import pair_correlation
 
 
 def get_input_data(infile='S:/Peckham/Bioimaging2/Alistair/Centriole-EPFL'
@@ -316,7 +318,7 @@ def plot_95_ci(axes,
         vector_input_model (function name):
             The version of the parametric model with input required to be a
             vector of the parameter values, for differentiation and error
-            propagation with numdifftools.
+            propagation.
 
     Returns:
         stdev (numpy array):
@@ -326,7 +328,8 @@ def plot_95_ci(axes,
     stdev = models.stdev_of_model(x_values,
                                   params_optimised,
                                   params_covar,
-                                  vector_input_model
+                                  vector_input_model,
+                                  jacobian=models.model_jacobian(model)
                                   )
 
     # Plot 95% CI
@@ -369,12 +372,12 @@ def plot_95_ci_internal_bg(axes,
             The version of the parametric model for separations less than
             the diameter of the background disk, with input required to be a
             vector of the parameter values, for differentiation and error
-            propagation with numdifftools.
+            propagation.
         vector_input_model_above_bg_dia (function name):
             The version of the parametric model for separations greater than
             the diameter of the background disk, with input required to be a
             vector of the parameter values, for differentiation and error
-            propagation with numdifftools.
+            propagation.
 
     Returns:
         stdev (numpy array):
@@ -384,7 +387,8 @@ def plot_95_ci_internal_bg(axes,
     stdev_lower = models.stdev_of_model(x_values[x_values < bg_dia],
                                         params_optimised,
                                         params_covar,
-                                        vector_input_model_below_bg_dia
+                                        vector_input_model_below_bg_dia,
+                                        jacobian=models.model_jacobian(model)
                                         )
 
     # Get SD of model at the x-values less than bg_dia
@@ -406,6 +410,53 @@ def plot_95_ci_internal_bg(axes,
     return stdev
 
 
+def unique_vertex_separations(diameter, sym_order=9):
+    """The different distances between the vertices of a polygon
+    (see modelling_general.polygon_chords).
+
+    Args:
+        diameter (float):
+            Diameter of the circle containing the vertices of the polygon.
+        sym_order (int):
+            The number of vertices, 9 (not fitted) for the centriole models.
+
+    Returns:
+        unique_xy_seps (numpy array):
+            The floor(sym_order / 2) different distances between vertices,
+            in increasing order.
+    """
+    return models.polygon_chords(sym_order, diameter)[0]
+
+
+def _variable_vertices_columns(separation_values,
+                               diameter,
+                               vertssd,
+                               vertamp1, vertamp2, vertamp3, vertamp4,
+                               replocssd, replocsamp,
+                               substructsd, substructamp):
+    """Derivatives of centriole_model_xy_distances_9fold_variable_vertices
+    with respect to its parameters, for the Jacobians of the models
+    (see modelling_general.model_jacobian). The distances between the
+    vertices are proportional to the diameter."""
+    unique_xy_seps = unique_vertex_separations(diameter)
+    vertices_contributions = [vertamp1, vertamp2, vertamp3, vertamp4]
+    (_, d_means,
+     d_vertssds,
+     d_contributions) = pair_correlation.sum_pair_correlations_derivatives(
+         separation_values,
+         unique_xy_seps,
+         vertssd,
+         vertices_contributions[0:len(unique_xy_seps)])
+    columns = [d_means.dot(unique_xy_seps / diameter),
+               d_vertssds.sum(axis=-1)]
+    columns += list(np.moveaxis(d_contributions, -1, 0))
+    columns += pair_correlation.zero_separation_derivatives(
+        separation_values, replocssd, replocsamp)
+    columns += pair_correlation.zero_separation_derivatives(
+        separation_values, substructsd, substructamp)
+    return columns
+
+
 def centriole_model_xy_distances_9fold_variable_vertices(
         separation_values,
         diameter,
@@ -448,27 +499,12 @@ def centriole_model_xy_distances_9fold_variable_vertices(
            The relative position density given by the model
            at distances r.
     """
-    # Set non-fittable symmetry order
-    sym_order = 9
-
     # Prepare amplitudes of the different inter-vertex distances
     # for easy use.
     vertices_contributions = [vertamp1, vertamp2, vertamp3, vertamp4]
 
     # Calculate the inter-vertex distances
-    vertices = models.generate_polygon_points(sym_order, diameter)
-
-    filter_distance = (2 * diameter)
-    # Need to get unsorted relative positions, to find unique distances
-    # at the start of the output list from getdistance(),
-    # so use sort_and_halve=False.
-    relative_positions = getdistances(vertices,
-                                      filter_distance,
-                                      verbose=False,
-                                      sort_and_halve=False)
-    xy_separations = np.sqrt(relative_positions[:, 0] ** 2
-                             + relative_positions[:, 1] ** 2)
-    unique_xy_seps = xy_separations[0:np.floor(sym_order / 2).astype(int)]
+    unique_xy_seps = unique_vertex_separations(diameter)
 
     # Include the contributions from the inter-vertex distance in the RPD.
     rpd = separation_values * 0.
@@ -501,12 +537,39 @@ def centriole_model_xy_distances_9fold_variable_vertices(
     return rpd
 
 
+def centriole_model_xy_distances_9fold_variable_vertices_jacobian(
+        separation_values,
+        diameter,
+        vertssd,
+        vertamp1, vertamp2, vertamp3, vertamp4,
+        replocssd, replocsamp,
+        substructsd, substructamp
+        ):
+    """Jacobian of centriole_model_xy_distances_9fold_variable_vertices
+    (see modelling_general.model_jacobian)."""
+    return np.stack(_variable_vertices_columns(separation_values,
+                                               diameter,
+                                               vertssd,
+                                               vertamp1, vertamp2,
+                                               vertamp3, vertamp4,
+                                               replocssd, replocsamp,
+                                               substructsd, substructamp),
+                    axis=-1)
+
+
+centriole_model_xy_distances_9fold_variable_vertices.jacobian = (
+    centriole_model_xy_distances_9fold_variable_vertices_jacobian)
+centriole_model_xy_distances_9fold_variable_vertices.linear_params = (
+    'vertamp1', 'vertamp2', 'vertamp3', 'vertamp4', 'replocsamp',
+    'substructamp')
+
+
 def centriole_model_xy_distances_9fold_variable_vertices_vectorargs(
         input_vector):
     """Function to calculate the values given by
     centriole_model_xy_distances_9fold_variable_vertices, but using a
-    vector input for the parameters, so that the numdifftools package can be
-    used to calculate partial derivatives for correct error propagation in the
+    vector input for the parameters, so that modelling_general.stdev_of_model
+    can calculate partial derivatives for correct error propagation in the
     model.
 
     Args:
@@ -591,27 +654,12 @@ def centriole_model_xy_distances_9fold_variable_vertices_internal_bg(
            The relative position density given by the model
            at distances r.
     """
-    # Set non-fittable symmetry order
-    sym_order = 9
-
     # Prepare amplitudes of the different inter-vertex distances
     # for easy use.
     vertices_contributions = [vertamp1, vertamp2, vertamp3, vertamp4]
 
     # Calculate the inter-vertex distances
-    vertices = models.generate_polygon_points(sym_order, diameter)
-
-    filter_distance = (2 * diameter)
-    # Need to get unsorted relative positions, to find unique distances
-    # at the start of the output list from getdistance(),
-    # so use sort_and_halve=False.
-    relative_positions = getdistances(vertices,
-                                      filter_distance,
-                                      verbose=False,
-                                      sort_and_halve=False)
-    xy_separations = np.sqrt(relative_positions[:, 0] ** 2
-                             + relative_positions[:, 1] ** 2)
-    unique_xy_seps = xy_separations[0:np.floor(sym_order / 2).astype(int)]
+    unique_xy_seps = unique_vertex_separations(diameter)
 
     # Include the contributions from the inter-vertex distance in the RPD.
     rpd = separation_values * 0.
@@ -653,12 +701,49 @@ def centriole_model_xy_distances_9fold_variable_vertices_internal_bg(
     return rpd
 
 
+def centriole_model_xy_distances_9fold_variable_vertices_internal_bg_jacobian(
+        separation_values,
+        diameter,
+        vertssd,
+        vertamp1, vertamp2, vertamp3, vertamp4,
+        replocssd, replocsamp,
+        substructsd, substructamp,
+        bg_dia, bg_amp
+        ):
+    """Jacobian of
+    centriole_model_xy_distances_9fold_variable_vertices_internal_bg
+    (see modelling_general.model_jacobian)."""
+    columns = _variable_vertices_columns(separation_values,
+                                         diameter,
+                                         vertssd,
+                                         vertamp1, vertamp2,
+                                         vertamp3, vertamp4,
+                                         replocssd, replocsamp,
+                                         substructsd, substructamp)
+    # Background within the disk, which is zero at the edge of the disk.
+    within_disk = separation_values < bg_dia
+    separations_within = np.where(within_disk, separation_values, 0.)
+    columns += [within_disk * bg_amp / 2.
+                * pair_correlation_disk_radius_derivative(separations_within,
+                                                          bg_dia / 2.),
+                within_disk * pair_correlation_disk(separations_within,
+                                                    radius=bg_dia / 2.)]
+    return np.stack(columns, axis=-1)
+
+
+centriole_model_xy_distances_9fold_variable_vertices_internal_bg.jacobian = (
+    centriole_model_xy_distances_9fold_variable_vertices_internal_bg_jacobian)
+centriole_model_xy_distances_9fold_variable_vertices_internal_bg.linear_params = (
+    'vertamp1', 'vertamp2', 'vertamp3', 'vertamp4', 'replocsamp',
+    'substructamp', 'bg_amp')
+
+
 def centriole_model_xy_distances_9fold_variable_vertices_internal_bg_vectorargs(
         input_vector):
     """Function to calculate the values given by
     centriole_model_xy_distances_9fold_variable_vertices, but using a
-    vector input for the parameters, so that the numdifftools package can be
-    used to calculate partial derivatives for correct error propagation in the
+    vector input for the parameters, so that modelling_general.stdev_of_model
+    can calculate partial derivatives for correct error propagation in the
     model.
 
     Args:
@@ -763,8 +848,8 @@ def create_default_fitting_params_dicts():
 
 def set_up_variable_vertices_model_9fold_no_bg_with_fit_settings():
     """Set up the RPD model with its fitting settings to pass to scipy's
-    curve_fit, and the vector-input version of it for differentiation with
-    numdifftools.
+    curve_fit, and the vector-input version of it for differentiation
+    and error propagation.
     """
     variable_vertices_model_9fold_no_bg_with_fit_settings = (
         ModelWithFitSettings(
@@ -830,8 +915,8 @@ def set_up_variable_vertices_model_9fold_no_bg_with_fit_settings():
 
 def set_up_variable_vertices_model_9fold_internal_bg_with_fit_settings():
     """Set up the RPD model with its fitting settings to pass to scipy's
-    curve_fit, and the vector-input version of it for differentiation with
-    numdifftools.
+    curve_fit, and the vector-input version of it for differentiation
+    and error propagation.
     """
     variable_vertices_model_9fold_internal_bg_with_fit_settings = (
         ModelWithFitSettings(
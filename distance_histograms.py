@@ -0,0 +1,279 @@
+"""
+distance_histograms.py
+
+Running histograms of the X, Y (and Z) separations and the XY (and XZ, YZ,
+XYZ) distances between localisations, accumulated block by block as pairs of
+localisations are found, so that the histograms can be produced without
+keeping a table of every relative position in memory.
+
+Counts are kept in 1-nm bins, together with the number of values falling
+exactly on each whole number of nm. From these, the counts in any histogram
+with bin edges at whole numbers of nm (as produced by plotting.plot_histogram
+and the 1-nm histograms used for model fitting) are the same as those given
+by numpy.histogram on the full set of values.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import numpy as np
+
+
+# Distances used for each dimensionality, in the order of the columns of
+# relative_positions.get_vectors output.
+DISTANCE_DESCRIPTIONS = {2: ('x', 'y', 'xy'),
+                         3: ('x', 'y', 'z', 'xy', 'xz', 'yz', 'xyz')}
+
+
+def separation_distances(separation_values, dims):
+    """Calculate the absolute separations and distances that are histogrammed,
+    in the same way as relative_positions.get_vectors and
+    plotting.plot_histograms.
+
+    Args:
+        separation_values (numpy array):
+            Relative position vectors, shape (P, 3). For 2D data, the third
+            column is zero.
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+
+    Returns:
+        distances (dict):
+            Numpy array of values for each description in
+            DISTANCE_DESCRIPTIONS[dims].
+    """
+    x_square_values = np.square(separation_values[:, 0])
+    y_square_values = np.square(separation_values[:, 1])
+
+    distances = {'x': np.absolute(separation_values[:, 0]),
+                 'y': np.absolute(separation_values[:, 1]),
+                 'xy': np.sqrt(x_square_values + y_square_values)}
+
+    if dims == 3:
+        z_square_values = np.square(separation_values[:, 2])
+        distances['z'] = np.absolute(separation_values[:, 2])
+        distances['xz'] = np.sqrt(x_square_values + z_square_values)
+        distances['yz'] = np.sqrt(y_square_values + z_square_values)
+        distances['xyz'] = np.sqrt(x_square_values + y_square_values
+                                   + z_square_values)
+
+    return distances
+
+
+class DistanceHistograms:
+    """Histograms of distances between localisations, with 1-nm bins.
+
+    Attributes
+    ----------
+    dims (int):
+        The dimensions of the data ie 2D or 3D.
+    filterdist (float):
+        The filter distance used to find the relative positions.
+    total (int):
+        Number of relative positions added.
+    counts (dict):
+        For each description in DISTANCE_DESCRIPTIONS[dims], a numpy array
+        of the number of values v with k <= v < k + 1, indexed by k.
+    exact_counts (dict):
+        For each description, a numpy array of the number of values
+        equal to k, indexed by k.
+    maxima (dict):
+        For each description, the largest value added.
+    """
+    def __init__(self, dims, filterdist):
+        self.dims = dims
+        self.filterdist = filterdist
+        self.total = 0
+        n_bins = int(np.ceil(filterdist * np.sqrt(dims))) + 2
+        self.counts = {}
+        self.exact_counts = {}
+        self.maxima = {}
+        for description in DISTANCE_DESCRIPTIONS[dims]:
+            self.counts[description] = np.zeros(n_bins, dtype=np.int64)
+            self.exact_counts[description] = np.zeros(n_bins, dtype=np.int64)
+            self.maxima[description] = 0.
+
+    @property
+    def descriptions(self):
+        """The distances histogrammed, for the dimensionality of the data."""
+        return DISTANCE_DESCRIPTIONS[self.dims]
+
+    def _add_to_bins(self, description, values, sign=1):
+        floor_values = np.floor(values)
+        bin_index = floor_values.astype(np.int64)
+        n_bins = max(len(self.counts[description]),
+                     int(bin_index.max()) + 1 if len(bin_index) > 0 else 0)
+        for counts_dict, selection in ((self.counts, None),
+                                       (self.exact_counts, values == floor_values)):
+            indices = bin_index if selection is None else bin_index[selection]
+            new_counts = np.bincount(indices, minlength=n_bins)
+            old_counts = counts_dict[description]
+            if len(old_counts) < n_bins:
+                old_counts = np.append(old_counts,
+                                       np.zeros(n_bins - len(old_counts),
+                                                dtype=np.int64))
+            counts_dict[description] = old_counts + sign * new_counts
+
+    def add_distances(self, distances):
+        """Add a block of distances, as given by separation_distances."""
+        n_values = len(distances[self.descriptions[0]])
+        if n_values == 0:
+            return
+        for description in self.descriptions:
+            values = distances[description]
+            self._add_to_bins(description, values)
+            self.maxima[description] = max(self.maxima[description],
+                                           float(np.max(values)))
+        self.total = self.total + n_values
+
+    def add_separations(self, separation_values):
+        """Add a block of relative position vectors, shape (P, 3)."""
+        self.add_distances(separation_distances(separation_values, self.dims))
+
+    def remove_separations(self, separation_values):
+        """Remove a block of relative position vectors that were previously
+        added. The maxima are not updated."""
+        if len(separation_values) == 0:
+            return
+        distances = separation_distances(separation_values, self.dims)
+        for description in self.descriptions:
+            self._add_to_bins(description, distances[description], sign=-1)
+        self.total = self.total - len(separation_values)
+
+    def merge(self, other):
+        """Add the counts from another DistanceHistograms object."""
+        for description in self.descriptions:
+            for counts_dict, other_dict in ((self.counts, other.counts),
+                                            (self.exact_counts, other.exact_counts)):
+                n_bins = max(len(counts_dict[description]),
+                             len(other_dict[description]))
+                counts_dict[description] = (
+                    _padded(counts_dict[description], n_bins)
+                    + _padded(other_dict[description], n_bins))
+            self.maxima[description] = max(self.maxima[description],
+                                           other.maxima[description])
+        self.total = self.total + other.total
+
+    def counts_in_bins(self, description, bin_edges, below=None):
+        """Counts of values in bins, as numpy.histogram(values, bin_edges)
+        or numpy.histogram(values[values < below], bin_edges) would give.
+
+        Args:
+            description (str):
+                The distance to use, e.g. 'xy'.
+            bin_edges (numpy array):
+                Increasing bin edges, at whole numbers of nm. As for
+                numpy.histogram, the last bin includes its upper edge.
+            below (float):
+                Optional, only count values less than this.
+
+        Returns:
+            bin_heights (numpy array):
+                Counts in each bin.
+        """
+        edges = np.asarray(bin_edges, dtype=float)
+        if np.any(edges != np.round(edges)) or np.any(edges < 0):
+            raise ValueError('Bin edges must be at whole numbers of nm.')
+        edges = edges.astype(np.int64)
+
+        last_included = None  # Highest whole nm counted in the last bin
+        if below is not None:
+            if below == np.floor(below):
+                last_included = int(below) - 1
+            elif edges[-1] > np.floor(below):
+                raise ValueError('Bins must end below a non-integer limit.')
+
+        n_bins = max(len(self.counts[description]), int(edges[-1]) + 2)
+        counts = _padded(self.counts[description], n_bins)
+        exact_counts = _padded(self.exact_counts[description], n_bins)
+        if last_included is not None:
+            counts[max(last_included + 1, 0):] = 0
+            exact_counts[max(last_included + 1, 0):] = 0
+
+        cumulative = np.append(0, np.cumsum(counts))
+        bin_heights = cumulative[edges[1:]] - cumulative[edges[:-1]]
+        if len(bin_heights) > 0:
+            bin_heights[-1] = bin_heights[-1] + exact_counts[edges[-1]]
+        return bin_heights
+
+    def normalised_1nm_histogram(self, description, fitlength):
+        """Histogram of distances with 1-nm bins up to fitlength, scaled so
+        that each relative position contributes fitlength / total, as in
+        modelling_general.make_xy_histogram_nm.
+
+        Returns:
+            histogram (numpy array):
+                Bin values.
+            bin_edges (numpy array):
+                Edges of the bins.
+        """
+        bin_edges = np.arange(float(fitlength) + 1)
+        bin_heights = self.counts_in_bins(description, bin_edges)
+        return bin_heights * (float(fitlength) / self.total), bin_edges
+
+    def arrays(self):
+        """The histograms as a dictionary of arrays, as saved by save."""
+        arrays = {'dims': self.dims,
+                  'filterdist': self.filterdist,
+                  'total': self.total}
+        for description in self.descriptions:
+            arrays['counts_' + description] = self.counts[description]
+            arrays['exact_counts_' + description] = self.exact_counts[description]
+            arrays['max_' + description] = self.maxima[description]
+        return arrays
+
+    def save(self, filename):
+        """Save the histograms to a numpy .npz file."""
+        np.savez(filename, **self.arrays())
+
+
+def load_histograms(filename):
+    """Load histograms saved by DistanceHistograms.save.
+
+    Args:
+        filename (str):
+            The .npz file.
+
+    Returns:
+        histograms (DistanceHistograms)
+
+    Raises:
+        KeyError if the file does not contain PERPL distance histograms.
+    """
+    with np.load(filename) as arrays:
+        return histograms_from_arrays(arrays)
+
+
+def histograms_from_arrays(arrays):
+    """Make histograms from arrays, as given by DistanceHistograms.arrays or
+    loaded from a .npz file.
+
+    Raises:
+        KeyError if the arrays are not PERPL distance histograms.
+    """
+    histograms = DistanceHistograms(int(arrays['dims']),
+                                    np.asarray(arrays['filterdist']).item())
+    histograms.total = int(arrays['total'])
+    for description in histograms.descriptions:
+        histograms.counts[description] = np.asarray(arrays['counts_' + description])
+        histograms.exact_counts[description] = np.asarray(
+            arrays['exact_counts_' + description])
+        histograms.maxima[description] = float(arrays['max_' + description])
+    return histograms
+
+
+def _padded(values, length):
+    """Copy of an array of counts, extended with zeros to a length."""
+    padded = np.zeros(length, dtype=np.int64)
+    padded[:len(values)] = values
+    return padded
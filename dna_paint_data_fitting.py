@@ -108,7 +108,7 @@ def set_up_tri_prism_on_grid_1_length_2disobg_substruct_with_fit_info():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -199,7 +199,7 @@ def set_up_tri_prism_on_grid_1_length_substruct_with_fit_info():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -287,7 +287,7 @@ def set_up_tri_prism_on_grid_1_length_3disobg_substruct_with_fit_info():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -379,7 +379,7 @@ def set_up_tri_prism_1_length_3disobg_substruct_with_fit_info():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -461,7 +461,7 @@ def set_up_model_tri_prism_on_grid_2disobg_substructure_with_fit_info():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -555,7 +555,7 @@ def set_up_model_cuboid_on_grid_2disobg_substructure_with_fit_info():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -652,7 +652,7 @@ def set_up_model_tri_pyramid_on_grid_2disobg_substructure_with_fit_info():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -782,7 +782,8 @@ def fitmodel_to_hist(
              100., 100.,  # structamp, spread
              100., 100.,  # substructamp, substructspread
              400., 1000., 100.,  # gridspace, gridamp, gridspread
-             0.1])  # bgslope
+             0.1]),  # bgslope
+        jac=models.model_jacobian(model)
         )
     # plt.plot(np.arange(fitlength) + 0.5,
     #          model(np.arange(fitlength) + 0.5, *params_optimised))
@@ -882,7 +883,9 @@ def plot_distance_hist_and_fit(distances,
         stdev = stdev_of_model(bin_centres,
                                params_optimised,
                                params_covar,
-                               model_with_info.vector_input_model
+                               model_with_info.vector_input_model,
+                               jacobian=models.model_jacobian(
+                                   model_with_info.model_rpd)
                                )
 
         axes.fill_between(bin_centres,
@@ -958,30 +961,19 @@ def plot_model_components_tri_prism(fitlength,
     plt.plot(distance_values, substructure_term)
 
     # Triangular prism peaks:
-    # Set up triangular prism
-    verts = poly.tri_prism_vertices(side_length, side_length)
-    relpos = poly.get_1d_relpos_no_filter(verts)
-    # Get unique distances
-    xyz_distances = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    xyz_distances = np.unique(xyz_distances)
-    # Two peaks:
-    # 3 x shorter distance x 6 vertices
-    tri_prism_peak_1 = (18 * structamp
-                        * models.pairwise_correlation_3d(distance_values,
-                                                         xyz_distances[0],
-                                                         spread
-                                                         )
-                        )
-    plt.plot(distance_values, tri_prism_peak_1)
-
-    # 2 x longer distance x 6 vertices
-    tri_prism_peak_2 = (12 * structamp
-                        * models.pairwise_correlation_3d(distance_values,
-                                                         xyz_distances[1],
-                                                         spread
-                                                         )
-                        )
-    plt.plot(distance_values, tri_prism_peak_2)
+    # One for each different distance between vertices, with the number of
+    # pairs of vertices at that distance (3 x shorter distance x 6 vertices
+    # and 2 x longer distance x 6 vertices).
+    xyz_distances, multiplicities = poly.vertex_distances(
+        poly.tri_prism_1_length_vertices, (side_length,))
+    for xyz_distance, multiplicity in zip(xyz_distances, multiplicities):
+        tri_prism_peak = (multiplicity * structamp
+                          * models.pairwise_correlation_3d(distance_values,
+                                                           xyz_distance,
+                                                           spread
+                                                           )
+                          )
+        plt.plot(distance_values, tri_prism_peak)
 
     # Plot square grid componenet
     square_grid_component = (
@@ -1086,7 +1078,9 @@ def dna_origami_fig_plot(
     stdev = stdev_of_model(bin_centres,
                            params_optimised,
                            params_covar,
-                           model_with_info.vector_input_model
+                           model_with_info.vector_input_model,
+                           jacobian=models.model_jacobian(
+                               model_with_info.model_rpd)
                            )
     axes.fill_between(bin_centres,
                       model_with_info.model_rpd(bin_centres, *params_optimised)
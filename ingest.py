@@ -0,0 +1,354 @@
+"""
+ingest.py
+
+Reads tables of localisations (or relative positions) from .csv, .txt and
+.npy files, keeping only the columns and rows that are needed.
+
+Only the chosen columns are converted to numbers, and rows can be filtered
+as the file is read (e.g. keeping localisations with a precision below
+20 nm, or in one colour channel), so that memory is not used for values that
+are not analysed. Columns can be chosen by index (negative indices count from
+the last column), or by the name in the header of the file. Names are matched
+ignoring case, quotes and units in brackets, so that the headers written by
+ThunderSTORM (e.g. "x [nm]", "uncertainty_xy [nm]") can be given as x,
+uncertainty_xy, or by the aliases in COLUMN_ALIASES (e.g. precision).
+
+Text files are divided into chunks of whole lines, which are parsed
+separately, on several processes if asked.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import io
+import re
+import csv
+import multiprocessing
+import numpy as np
+
+
+# Size of the chunks of a text file parsed at a time (bytes).
+DEFAULT_CHUNK_BYTES = 32 * 2 ** 20
+
+# Other names for columns, in the order they are looked for in a header.
+COLUMN_ALIASES = {'precision': ('precision', 'uncertainty_xy', 'uncertainty',
+                                'locprec'),
+                  'channel': ('channel', 'colour', 'color', 'probe')}
+
+# Comparisons allowed in row filters.
+FILTER_OPERATORS = {'<=': np.less_equal,
+                    '>=': np.greater_equal,
+                    '==': np.equal,
+                    '!=': np.not_equal,
+                    '<': np.less,
+                    '>': np.greater}
+
+
+def normalise_name(name):
+    """A column name without case, quotes, surrounding spaces or units in
+    brackets, e.g. '"x [nm]"' -> 'x'."""
+    name = name.strip().strip('"\'').strip()
+    name = re.sub(r'\s*[\[\(][^\]\)]*[\]\)]\s*$', '', name)
+    return name.lower()
+
+
+def _is_number(cell):
+    try:
+        float(cell)
+    except ValueError:
+        return False
+    return True
+
+
+def _first_line(source):
+    """The first line of a file, or of the bytes of a file."""
+    if isinstance(source, bytes):
+        return source.split(b'\n', 1)[0].decode('utf-8', 'replace')
+    with open(source) as fin:
+        return fin.readline()
+
+
+def read_header(source, delimiter=','):
+    """Read the layout of a table. The first line of a text file is a header
+    if any entry in it is not a number. A .npy file has no header.
+
+    Args:
+        source (str or bytes):
+            The filename, or the contents of a text file.
+        delimiter (str):
+            The column delimiter.
+
+    Returns:
+        names (list of str):
+            The column names, or None if there is no header.
+        n_columns (int):
+            Number of columns.
+    """
+    if isinstance(source, str) and source[-4:] == '.npy':
+        table = np.load(source, mmap_mode='r')
+        return None, 1 if table.ndim == 1 else table.shape[1]
+    cells = next(csv.reader([_first_line(source).rstrip('\r\n')],
+                            delimiter=delimiter), [])
+    if all(_is_number(cell) for cell in cells):
+        return None, len(cells)
+    return cells, len(cells)
+
+
+def column_index(column, names, n_columns):
+    """The index of a column given by index, or by name.
+
+    Args:
+        column (int or str):
+            The index (negative indices count from the end), or a name in
+            the header, or an alias of one (see COLUMN_ALIASES).
+        names (list of str):
+            The column names, or None if there is no header.
+        n_columns (int):
+            Number of columns.
+
+    Returns:
+        index (int):
+            Index of the column, from 0.
+    """
+    if isinstance(column, str) and re.match(r'^\s*-?\d+\s*$', column):
+        column = int(column)
+    if not isinstance(column, str):
+        index = int(column)
+        if index < 0:
+            index = index + n_columns
+        if index < 0 or index >= n_columns:
+            raise ValueError('There is no column %i in a table with %i columns.'
+                             % (int(column), n_columns))
+        return index
+
+    if names is None:
+        raise ValueError('The file has no header, so column %s must be given '
+                         'by index.' % column)
+    stripped = [name.strip() for name in names]
+    if column.strip() in stripped:
+        return stripped.index(column.strip())
+    normalised = [normalise_name(name) for name in names]
+    for candidate in COLUMN_ALIASES.get(normalise_name(column),
+                                        (normalise_name(column),)):
+        if candidate in normalised:
+            return normalised.index(candidate)
+    raise ValueError('There is no column %s in the header: %s'
+                     % (column, ','.join(names)))
+
+
+def parse_filter(text):
+    """Read a row filter written as e.g. 'precision<20' or '-1==0'.
+
+    Returns:
+        (column, operator, value) (tuple)
+    """
+    match = re.match(r'^\s*(.+?)\s*(<=|>=|==|!=|<|>)\s*([^<>=!]+?)\s*$', text)
+    if match is None:
+        raise ValueError('Could not read the filter %s. Filters are a column, '
+                         'a comparison (%s) and a number, e.g. precision<20.'
+                         % (text, ' '.join(FILTER_OPERATORS)))
+    try:
+        value = float(match.group(3))
+    except ValueError:
+        raise ValueError('Could not read the number in the filter %s.' % text)
+    return match.group(1), match.group(2), value
+
+
+def _header_bytes(source):
+    """Length of the header line of a file, in bytes."""
+    if isinstance(source, bytes):
+        end = source.find(b'\n')
+        return len(source) if end == -1 else end + 1
+    with open(source, 'rb') as fin:
+        fin.readline()
+        return fin.tell()
+
+
+def _chunk_ranges(source, begin, end, chunk_bytes):
+    """Divide bytes begin to end of a file into ranges of whole lines."""
+    ranges = []
+    if isinstance(source, bytes):
+        while begin < end:
+            stop = source.find(b'\n', min(begin + chunk_bytes, end) - 1)
+            stop = end if stop == -1 else min(stop + 1, end)
+            ranges.append((begin, stop))
+            begin = stop
+        return ranges
+    with open(source, 'rb') as fin:
+        while begin < end:
+            fin.seek(min(begin + chunk_bytes, end) - 1)
+            fin.readline()
+            stop = min(fin.tell(), end)
+            ranges.append((begin, stop))
+            begin = stop
+    return ranges
+
+
+def _select(values, filters, output_positions, dtype):
+    """Apply row filters to parsed columns, then keep the output columns."""
+    if len(filters) > 0:
+        keep = np.ones(len(values), dtype=bool)
+        for position, operator, value in filters:
+            keep = keep & FILTER_OPERATORS[operator](values[:, position], value)
+        values = values[keep]
+    return np.asarray(values[:, output_positions], dtype=dtype)
+
+
+def _parse_chunk(task):
+    """Parse a range of lines of a text file, and select from it."""
+    source, (begin, end), usecols, delimiter, filters, output_positions, dtype = task
+    if isinstance(source, bytes):
+        data = source[begin:end]
+    else:
+        with open(source, 'rb') as fin:
+            fin.seek(begin)
+            data = fin.read(end - begin)
+    if len(data.strip()) == 0:
+        values = np.zeros((0, len(usecols)))
+    else:
+        values = np.loadtxt(io.BytesIO(data), delimiter=delimiter,
+                            usecols=usecols, ndmin=2)
+    return _select(values, filters, output_positions, dtype)
+
+
+def read_table(source, columns=None, filters=None, dtype=np.float64,
+               workers=1, chunk_bytes=DEFAULT_CHUNK_BYTES, delimiter=','):
+    """Read chosen columns of a table from a .csv, .txt or .npy file.
+
+    Args:
+        source (str or bytes):
+            The filename, or the contents of a text file (e.g. uploaded).
+        columns (list):
+            The columns to keep, in order, by index or name (see
+            column_index). All columns if not given.
+        filters (list of tuples):
+            Optional, (column, operator, value) row filters, all of which a
+            row must pass to be kept, e.g. ('precision', '<', 20.). Strings
+            are read with parse_filter. The columns do not need to be kept.
+        dtype (numpy dtype):
+            Type to store the values, e.g. np.float32 to halve the memory.
+        workers (int):
+            Number of processes to parse a text file with.
+        chunk_bytes (int):
+            Approximate size of the chunks of a text file parsed at a time.
+        delimiter (str):
+            The column delimiter of a text file.
+
+    Returns:
+        values (numpy array):
+            The kept rows and columns, shape (N, number of columns).
+    """
+    if filters is None:
+        filters = []
+    filters = [parse_filter(item) if isinstance(item, str) else item
+               for item in filters]
+
+    names, n_columns = read_header(source, delimiter)
+    is_npy = isinstance(source, str) and source[-4:] == '.npy'
+
+    if columns is None:
+        columns = range(n_columns)
+    output_indices = [column_index(column, names, n_columns) for column in columns]
+    filter_indices = [column_index(column, names, n_columns)
+                      for column, _, _ in filters]
+    for _, operator, _ in filters:
+        if operator not in FILTER_OPERATORS:
+            raise ValueError('Unknown comparison %s in a filter.' % operator)
+
+    # Parse each needed column once, in file order.
+    usecols = sorted(set(output_indices + filter_indices))
+    output_positions = [usecols.index(index) for index in output_indices]
+    position_filters = [(usecols.index(index), operator, value)
+                        for index, (_, operator, value) in zip(filter_indices, filters)]
+
+    if is_npy:
+        table = np.load(source, mmap_mode='r').reshape(-1, n_columns)
+        rows = max(1, chunk_bytes // (8 * max(n_columns, 1)))
+        blocks = [_select(np.asarray(table[start:start + rows][:, usecols], dtype=float),
+                          position_filters, output_positions, dtype)
+                  for start in range(0, len(table), rows)]
+    else:
+        if isinstance(source, bytes):
+            size = len(source)
+        else:
+            size = os.path.getsize(source)
+        begin = 0
+        if names is not None:
+            begin = _header_bytes(source)
+        tasks = [(source, byte_range, usecols, delimiter, position_filters,
+                  output_positions, dtype)
+                 for byte_range in _chunk_ranges(source, begin, size, chunk_bytes)]
+        if workers > 1 and len(tasks) > 1 and not isinstance(source, bytes):
+            # numpy's parser holds the GIL, so chunks are parsed by processes.
+            with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+                blocks = pool.map(_parse_chunk, tasks)
+        else:
+            blocks = [_parse_chunk(task) for task in tasks]
+
+    if len(blocks) == 0:
+        return np.zeros((0, len(output_indices)), dtype=dtype)
+    return np.concatenate(blocks)
+
+
+def read_appended(filename, offset=0, columns=None, filters=None, dtype=np.float64,
+                  delimiter=','):
+    """Read the rows of a text file after a position in it, e.g. rows added
+    since it was last read while an acquisition is still writing it. Only
+    complete lines are read, so that a line being written is read next time.
+
+    Args:
+        filename (str):
+            The text file.
+        offset (int):
+            Position in the file (bytes) to read from. At 0, any header is
+            skipped.
+        columns, filters, dtype, delimiter:
+            As for read_table. Columns are found by name in the header at
+            the start of the file.
+
+    Returns:
+        values (numpy array):
+            The kept rows and columns of the complete lines read.
+        offset (int):
+            Position in the file after the last complete line read.
+    """
+    if filters is None:
+        filters = []
+    filters = [parse_filter(item) if isinstance(item, str) else item
+               for item in filters]
+
+    with open(filename, 'rb') as fin:
+        fin.seek(offset)
+        data = fin.read()
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        # Not even the header may be complete yet.
+        return np.zeros((0, len(columns or [])), dtype=dtype), offset
+
+    names, n_columns = read_header(filename, delimiter)
+    if columns is None:
+        columns = range(n_columns)
+    columns = [column_index(column, names, n_columns) for column in columns]
+    filters = [(column_index(column, names, n_columns), operator, value)
+               for column, operator, value in filters]
+    if offset == 0 and names is not None:
+        header_end = _header_bytes(filename)
+        data = data[header_end:end]
+        offset = header_end
+        end = len(data)
+        if end == 0:
+            return np.zeros((0, len(columns)), dtype=dtype), offset
+    values = read_table(data[:end], columns=columns, filters=filters, dtype=dtype,
+                        delimiter=delimiter)
+    return values, offset + end
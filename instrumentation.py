@@ -0,0 +1,232 @@
+"""
+instrumentation.py
+
+Records the wall time, CPU time, peak memory and throughput of each stage of
+a run of relative_positions.py, rot_2d_symm_fit.py or two_layer_fitting.py,
+so that performance can be compared between runs. The stages are saved in
+a JSON file in the results directory, and shown in the html report.
+
+For example:
+
+    recorder = StageRecorder()
+    with recorder.stage('search') as stage:
+        d_values = getdistances(xyz_values, filterdist)
+        stage['counts']['localisations'] = len(xyz_values)
+        stage['counts']['pairs'] = len(d_values)
+
+gives the time for the search, and the localisations and pairs per second.
+
+CPU time includes that of worker processes once they have finished. Peak
+RSS is the largest resident memory of this process up to the end of each
+stage (from the resource module, which is not available on Windows). The
+peak memory allocated by Python and numpy during each stage is also
+recorded, with tracemalloc, if StageRecorder(trace_memory=True), which
+slows the run down.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import functools
+import contextlib
+import tracemalloc
+import numpy as np
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+# Name of the file of stages saved in the results directory.
+STAGES_FILE_NAME = 'performance.json'
+
+
+def cpu_seconds():
+    """CPU time used by this process, and by its child processes that have
+    finished (e.g. worker processes)."""
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+def peak_rss_mb():
+    """Largest resident memory of this process so far (MB), or None where
+    it cannot be found."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+class StageRecorder:
+    """Records the performance of each stage of a run.
+
+    Args:
+        trace_memory (Boolean):
+            Whether to record the peak memory allocated in each stage, with
+            tracemalloc. Defaults to False.
+
+    Attributes
+    ----------
+    stages (list of dicts):
+        One dict per stage, in the order they finished, with:
+        'stage': The name of the stage,
+        'wall_seconds', 'cpu_seconds': The times taken,
+        'peak_rss_mb': Peak resident memory of the process so far,
+        'peak_traced_mb': Peak memory allocated in the stage (with
+        trace_memory, else None),
+        'counts': Numbers of items processed, e.g. {'pairs': 1000},
+        'throughput': The counts per second of wall time, e.g.
+        {'pairs per second': 2000.}.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager recording one stage. Stages should not be nested.
+
+        Yields:
+            record (dict):
+                The record of the stage. Counts of the items processed can
+                be added to record['counts'].
+        """
+        record = {'stage': name, 'counts': {}}
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            elif hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = cpu_seconds()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = cpu_seconds() - cpu_start
+            record['peak_rss_mb'] = peak_rss_mb()
+            record['peak_traced_mb'] = None
+            if self.trace_memory:
+                record['peak_traced_mb'] = (
+                    max(0, tracemalloc.get_traced_memory()[1] - traced_start)
+                    / 1024 ** 2)
+                if started_tracing:
+                    tracemalloc.stop()
+            record['throughput'] = {}
+            for item, count in record['counts'].items():
+                if record['wall_seconds'] > 0:
+                    record['throughput'][item + ' per second'] = (
+                        count / record['wall_seconds'])
+            self.stages.append(record)
+
+    def total_seconds(self):
+        """Wall time of all the stages (s)."""
+        return sum(record['wall_seconds'] for record in self.stages)
+
+    def save(self, file_name, info):
+        """Save the stages, with details of the run, in a JSON file.
+
+        Args:
+            file_name (str): The file to write.
+            info (dict): A python dictionary containing a collection of useful parameters
+                such as the filenames and paths.
+
+        Returns:
+            file_name (str): The file written.
+        """
+        run = {'program': info.get('prog'),
+               'start': info.get('start'),
+               'host': info.get('host'),
+               'input_file': info.get('in_file_and_path'),
+               'python': platform.python_version(),
+               'numpy': np.__version__,
+               'workers': info.get('workers', 1),
+               'trace_memory': self.trace_memory,
+               'total_wall_seconds': self.total_seconds(),
+               'stages': self.stages}
+        try:
+            with open(file_name, 'w') as fout:
+                json.dump(run, fout, indent=2, default=float)
+        except (EOFError, IOError, OSError):
+            print("Unexpected error:", sys.exc_info()[0])
+            sys.exit("Could not create and open the performance file.")
+        return file_name
+
+
+def stage(info, name):
+    """Record a stage of a run with info['stage_recorder'], if there is one
+    (see StageRecorder.stage), so that functions also called from scripts
+    without a recorder can mark their stages.
+
+    Returns:
+        A context manager, yielding the record of the stage.
+    """
+    recorder = info.get('stage_recorder')
+    if recorder is None:
+        return contextlib.nullcontext({'counts': {}})
+    return recorder.stage(name)
+
+
+def save_stages(info):
+    """Save the stages recorded in info['stage_recorder'] in the results
+    directory (see StageRecorder.save).
+
+    Returns:
+        file_name (str): The file written, or None with no recorder.
+    """
+    recorder = info.get('stage_recorder')
+    if recorder is None:
+        return None
+    if info.get('short_names') is True:
+        results_dir = info['short_results_dir']
+    else:
+        results_dir = info['results_dir']
+    return recorder.save(os.path.join(results_dir, STAGES_FILE_NAME), info)
+
+
+class CountCalls:
+    """Wraps a function, e.g. a model passed to scipy.optimize.curve_fit,
+    counting how many times it is called.
+
+    Attributes
+    ----------
+    calls (int):
+        The number of calls so far.
+    """
+    def __init__(self, function):
+        functools.update_wrapper(self, function)
+        self.function = function
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.function(*args, **kwargs)
+
+
+def add_count(record, item, count):
+    """Add to the count of an item processed in a stage, if there is a
+    record of the stage (see StageRecorder.stage)."""
+    if record is not None:
+        record['counts'][item] = record['counts'].get(item, 0) + count
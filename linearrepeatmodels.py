@@ -32,6 +32,39 @@ specific language governing permissions and limitations under the License.
 import numpy as np
 import modelling_general as model
 from modelling_general import pairwise_correlation_1d
+import pair_correlation
+
+
+def _repeat_peaks(x_values, rep, broadening, amps, first_multiple=1, offset=0.):
+    """Sum of 1D pair correlations with amplitudes amps at separations
+    offset + (first_multiple + i) * rep for peaks i = 0, 1, ..., with the
+    same broadening for all peaks or one for each peak."""
+    peak_means = offset + (first_multiple + np.arange(len(amps))) * rep
+    return pair_correlation.sum_pair_correlations(x_values, peak_means,
+                                                  broadening, amps, dims=1)
+
+
+def _repeat_peaks_derivatives(x_values, rep, broadening, amps,
+                              first_multiple=1, offset=0.):
+    """Derivatives of _repeat_peaks with respect to rep, the broadening of
+    each peak, the amplitude of each peak and the offset, for the Jacobians
+    of the models (see modelling_general.model_jacobian)."""
+    multiples = first_multiple + np.arange(len(amps))
+    (_, d_means,
+     d_broadenings,
+     d_amps) = pair_correlation.sum_pair_correlations_derivatives(
+         x_values, offset + multiples * rep, broadening, amps, dims=1)
+    return (d_means.dot(multiples), d_broadenings, d_amps,
+            d_means.sum(axis=-1))
+
+
+def _background_columns(x_values, slope=True):
+    """Derivatives of a background bgoffset + bgslope * x_values with
+    respect to bgslope (if slope) and bgoffset."""
+    ones = np.ones(np.shape(x_values))
+    if slope:
+        return [x_values * ones, ones]
+    return [ones]
 
 
 def noslope(x_values, mean):
@@ -52,6 +85,15 @@ def linear_fit(x_values, slope, offset):
     return rpd
 
 
+def linear_fit_jacobian(x_values, slope, offset):
+    """Jacobian of linear_fit (see modelling_general.model_jacobian)."""
+    return np.stack(_background_columns(x_values), axis=-1)
+
+
+linear_fit.jacobian = linear_fit_jacobian
+linear_fit.linear_params = ('slope', 'offset')
+
+
 def linear_fit_vector_args(vector_input):
     (x_values,
      bgslope, bgoffset) = vector_input
@@ -72,6 +114,21 @@ def justreplocs(x_values,
     return rpd
 
 
+def justreplocs_jacobian(x_values,
+                         locprec, ampreplocs,
+                         bgslope, bgoffset
+                         ):
+    """Jacobian of justreplocs (see modelling_general.model_jacobian)."""
+    columns = pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+justreplocs.jacobian = justreplocs_jacobian
+justreplocs.linear_params = ('ampreplocs', 'bgslope', 'bgoffset')
+
+
 def justreplocs_vectorinput(vector_input):
     (x_values,
      locprec, ampreplocs,
@@ -90,8 +147,7 @@ def onepeakplusreps(x_values, rep, broadening,
                     ):
     rpd = bgoffset + bgslope * x_values  # Linear background
     amps = [a]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
 
     reps = ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
     rpd = rpd + reps
@@ -99,6 +155,25 @@ def onepeakplusreps(x_values, rep, broadening,
     return rpd
 
 
+def onepeakplusreps_jacobian(x_values, rep, broadening,
+                             a,
+                             locprec, ampreplocs,
+                             bgslope, bgoffset
+                             ):
+    """Jacobian of onepeakplusreps (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening, [a])
+    columns = [d_rep, d_broadening[..., 0], d_amps[..., 0]]
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+onepeakplusreps.jacobian = onepeakplusreps_jacobian
+onepeakplusreps.linear_params = ('a', 'ampreplocs', 'bgslope', 'bgoffset')
+
+
 def onepeakplusreps_vectorinput(vector_input):
     (x_values, rep, broadening,
      a,
@@ -116,8 +191,7 @@ def onepeakplusreps_no_bg(x_values, rep, broadening,
                           locprec, ampreplocs):
     rpd = 0. * x_values
     amps = [a]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
 
     reps = ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
     rpd = rpd + reps
@@ -125,6 +199,23 @@ def onepeakplusreps_no_bg(x_values, rep, broadening,
     return rpd
 
 
+def onepeakplusreps_no_bg_jacobian(x_values, rep, broadening,
+                                   a,
+                                   locprec, ampreplocs):
+    """Jacobian of onepeakplusreps_no_bg
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening, [a])
+    columns = [d_rep, d_broadening[..., 0], d_amps[..., 0]]
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    return np.stack(columns, axis=-1)
+
+
+onepeakplusreps_no_bg.jacobian = onepeakplusreps_no_bg_jacobian
+onepeakplusreps_no_bg.linear_params = ('a', 'ampreplocs')
+
+
 def onepeakplusreps_no_bg_vectorinput(vector_input):
     (x_values, rep, broadening,
      a,
@@ -141,8 +232,7 @@ def onepeakplusreps_flat_bg(x_values, rep, broadening,
                           bgoffset):
     rpd = 0. * x_values + bgoffset
     amps = [a]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
 
     reps = ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
     rpd = rpd + reps
@@ -150,6 +240,25 @@ def onepeakplusreps_flat_bg(x_values, rep, broadening,
     return rpd
 
 
+def onepeakplusreps_flat_bg_jacobian(x_values, rep, broadening,
+                                     a,
+                                     locprec, ampreplocs,
+                                     bgoffset):
+    """Jacobian of onepeakplusreps_flat_bg
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening, [a])
+    columns = [d_rep, d_broadening[..., 0], d_amps[..., 0]]
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values, slope=False)
+    return np.stack(columns, axis=-1)
+
+
+onepeakplusreps_flat_bg.jacobian = onepeakplusreps_flat_bg_jacobian
+onepeakplusreps_flat_bg.linear_params = ('a', 'ampreplocs', 'bgoffset')
+
+
 def onepeakplusreps_flat_bg_vectorinput(vector_input):
     (x_values, rep, broadening,
      a,
@@ -168,12 +277,27 @@ def onepeaknoreps(x_values, rep, broadening,
                   ):
     rpd = bgoffset + bgslope * x_values  # Linear background
     amps = [a]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
 
     return rpd
 
 
+def onepeaknoreps_jacobian(x_values, rep, broadening,
+                           a,
+                           bgslope, bgoffset
+                           ):
+    """Jacobian of onepeaknoreps (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening, [a])
+    columns = [d_rep, d_broadening[..., 0], d_amps[..., 0]]
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+onepeaknoreps.jacobian = onepeaknoreps_jacobian
+onepeaknoreps.linear_params = ('a', 'bgslope', 'bgoffset')
+
+
 def onepeaknoreps_vectorinput(vector_input):
     (x_values, rep, broadening,
      a,
@@ -214,10 +338,7 @@ def linrepplusreps3(x_values, rep, broadening,
                     ):
     rpd = bgoffset + bgslope * x_values  # Linear background
     amps = [a, b, c]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values,
-                                                        (i + 1) * rep,
-                                                        broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     # Repeated localisations
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values,
                                                            0.,
@@ -234,12 +355,8 @@ def offsetlinrepplusreps3flatbg(x_values, rep, broadening,
                                 ):
     rpd = bgoffset + 0. * x_values  # Linear background
     amp = [a, b, c]
-    for i in range(3):
-        rpd = (rpd
-               + amp[i] * model.pairwise_correlation_1d(x_values,
-                                           peakoffset + (i + 1) * rep,
-                                           broadening)
-               )
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amp,
+                              offset=peakoffset)
 
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
 
@@ -251,8 +368,7 @@ def linrepplusreps3fixedpeaks(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(3):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 3)
     
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -268,8 +384,7 @@ def linrepplusreps3fixedpeaksflatbg(x_values, rep, broadening,
                    bgoffset
                    ):
     rpd = bgoffset + 0. * x_values # Linear background
-    for i in range(3):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 3)
     
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec) # rep locs
     return rpd
@@ -280,14 +395,37 @@ def linrepplusreps3fixedpeakratio(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(3):
-        rpd = rpd + (1. - i / 3.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(3) / 3.))
     
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec) # rep locs
 
     return rpd
 
 
+def linrepplusreps3fixedpeakratio_jacobian(x_values, rep, broadening,
+                                           amp,
+                                           locprec, ampreplocs,
+                                           bgslope, bgoffset
+                                           ):
+    """Jacobian of linrepplusreps3fixedpeakratio
+    (see modelling_general.model_jacobian)."""
+    ratios = 1. - np.arange(3) / 3.
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                            amp * ratios)
+    columns = [d_rep, d_broadening.sum(axis=-1), d_amps.dot(ratios)]
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+linrepplusreps3fixedpeakratio.jacobian = linrepplusreps3fixedpeakratio_jacobian
+linrepplusreps3fixedpeakratio.linear_params = (
+    'amp', 'ampreplocs', 'bgslope', 'bgoffset')
+
+
 def linrepplusreps3fixedpeakratiovectorinput(vectorin):
     (x_values, rep, broadening,
      amp,
@@ -307,8 +445,7 @@ def linrepplusreps3fixedpeakamp(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(3):
-        rpd = rpd +  amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 3)
     
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -325,9 +462,8 @@ def offsetlinrepplusreps3fixedpeakampflatbg(x_values, rep, broadening,
                    bgoffset
                    ):
     rpd = bgoffset + 0. * x_values # Linear background
-    for i in range(3):
-        rpd = rpd +  amp * model.pairwise_correlation_1d(
-                                    x_values, peakoffset + (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 3,
+                              offset=peakoffset)
     
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
 
@@ -341,9 +477,8 @@ def offsetlinrep3fixedpeakamp(x_values, rep, broadening,
     """Offset peak plus 3 more at repeat distance.
     """
     rpd = bgoffset + 0. * x_values # Linear background
-    for i in range(4):
-        rpd = rpd +  amp * model.pairwise_correlation_1d(
-                                    x_values, peakoffset + i * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 4,
+                              first_multiple=0, offset=peakoffset)
     
     #reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec ** 2))
@@ -360,9 +495,8 @@ def offsetlinrep3fixedpeakampnobg(x_values, rep, broadening,
     """Offset peak plus 3 more at repeat distance.
     """
     rpd = 0. * x_values # Linear background
-    for i in range(4):
-        rpd = rpd +  amp * model.pairwise_correlation_1d(
-                                    x_values, peakoffset + i * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 4,
+                              first_multiple=0, offset=peakoffset)
     
     #reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec ** 2))
@@ -380,8 +514,8 @@ def linrepbroadsplusreps3fixedpeakratio(x_values, rep,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     b = [b1, b2, b3]
-    for i in range(3):
-        rpd = rpd + (1. - i / 3.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, b[i])    
+    rpd = rpd + _repeat_peaks(x_values, rep, b,
+                              amp * (1. - np.arange(3) / 3.))
     
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -398,8 +532,8 @@ def linrep19plusreps3fixedpeakratio(x_values, broadening,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     rep = 19.2
-    for i in range(3):
-        rpd = rpd + (1. - i / 3.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(3) / 3.))
     
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -414,8 +548,8 @@ def linrepnoreps3fixedpeakratio(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(3):
-        rpd = rpd + (1. - i / 3.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(3) / 3.))
 
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -428,8 +562,8 @@ def linrep19noreps3fixedpeakratio(x_values, broadening,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     rep = 19.2
-    for i in range(3):
-        rpd = rpd + (1. - i / 3.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(3) / 3.))
 
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -441,8 +575,7 @@ def linrepnoreps3fixedpeaks(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(3):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 3)
  
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -456,8 +589,7 @@ def linrepplusreps4(x_values, rep, broadening,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     amps = [a, b, c, d]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
 
     return rpd
@@ -468,14 +600,37 @@ def linrepplusreps4fixedpeakratio(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(4):
-        rpd = rpd + (1. - i / 4.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(4) / 4.))
     
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
 
     return rpd
 
 
+def linrepplusreps4fixedpeakratio_jacobian(x_values, rep, broadening,
+                                           amp,
+                                           locprec, ampreplocs,
+                                           bgslope, bgoffset
+                                           ):
+    """Jacobian of linrepplusreps4fixedpeakratio
+    (see modelling_general.model_jacobian)."""
+    ratios = 1. - np.arange(4) / 4.
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                            amp * ratios)
+    columns = [d_rep, d_broadening.sum(axis=-1), d_amps.dot(ratios)]
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+linrepplusreps4fixedpeakratio.jacobian = linrepplusreps4fixedpeakratio_jacobian
+linrepplusreps4fixedpeakratio.linear_params = (
+    'amp', 'ampreplocs', 'bgslope', 'bgoffset')
+
+
 def linrepplusreps4fixedpeakratiovectorinput(vectorin):
     (x_values, rep, broadening,
      amp,
@@ -494,8 +649,8 @@ def linrepplusreps4fixedpeakrationobg(x_values, rep, broadening,
                    locprec, ampreplocs,
                    ):
     rpd = 0. * x_values # Linear background
-    for i in range(4):
-        rpd = rpd + (1. - i / 4.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(4) / 4.))
     
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec)
 
@@ -509,8 +664,8 @@ def linrepbroadsplusreps4fixedpeakratio(x_values, rep,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     b = [b1, b2, b3, b4]
-    for i in range(4):
-        rpd = rpd + (1. - i / 4.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, b[i])
+    rpd = rpd + _repeat_peaks(x_values, rep, b,
+                              amp * (1. - np.arange(4) / 4.))
     
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -528,8 +683,8 @@ def linrep19plusreps4fixedpeakratio(x_values, broadening,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     rep = 19.2
-    for i in range(4):
-        rpd = rpd + (1. - i / 4.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(4) / 4.))
     
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -547,10 +702,7 @@ def linrepnoreps4_bg_linear(x_values, rep, broadening,
                   ):
     rpd = bgoffset + bgslope * x_values  # Background
     amps = [a, b, c, d]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values,
-                                                        (i + 1) * rep,
-                                                        broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     return rpd
 
 
@@ -573,10 +725,7 @@ def linrepnoreps4_bg_zero(x_values, rep, broadening,
                   ):
     rpd = 0
     amps = [a, b, c, d]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values,
-                                                        (i + 1) * rep,
-                                                        broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     return rpd
 
 
@@ -610,8 +759,7 @@ def linrepnoreps4fixedpeaks(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(4):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 4)
 
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -623,8 +771,8 @@ def linrepnoreps4fixedpeakratio(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(4):
-        rpd = rpd + (1. - i / 4.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(4) / 4.))
 
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -638,8 +786,8 @@ def linrep19noreps4fixedpeakratio(x_values, broadening,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     rep = 19.2
-    for i in range(4):
-        rpd = rpd + (1. - i / 4.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(4) / 4.))
 
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -654,14 +802,33 @@ def lin_repeat_after_offset_4(x_values, rep, broadening,
                               ):
     rpd = bgoffset + bgslope * x_values  # Linear background
     amps = [a, b, c, d]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * pairwise_correlation_1d(x_values,
-                                                  first_peak_offset
-                                                  + (i + 1) * rep,
-                                                  broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps,
+                              offset=first_peak_offset)
     return rpd
 
 
+def lin_repeat_after_offset_4_jacobian(x_values, rep, broadening,
+                                       first_peak_offset,
+                                       a, b, c, d,
+                                       bgslope, bgoffset
+                                       ):
+    """Jacobian of lin_repeat_after_offset_4
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, d_offset) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                                   [a, b, c, d],
+                                                   offset=first_peak_offset)
+    columns = [d_rep, d_broadening.sum(axis=-1), d_offset]
+    columns += list(np.moveaxis(d_amps, -1, 0))
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+lin_repeat_after_offset_4.jacobian = lin_repeat_after_offset_4_jacobian
+lin_repeat_after_offset_4.linear_params = (
+    'a', 'b', 'c', 'd', 'bgslope', 'bgoffset')
+
+
 def lin_repeat_after_offset_4_vectorargs(vector_input):
     (x_values, rep, broadening,
      first_peak_offset,
@@ -682,8 +849,7 @@ def linrepplusreps5(x_values, rep, broadening,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     amps = [a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec) # rep locs
 
     return rpd
@@ -696,13 +862,35 @@ def linrepplusreps5_bg_flat(x_values, rep, broadening,
                    ):
     rpd = x_values * 0. + bgoffset # Background
     amps = [a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec) # rep locs
 
     return rpd
 
 
+def linrepplusreps5_bg_flat_jacobian(x_values, rep, broadening,
+                                     a, b, c, d, e,
+                                     locprec, ampreplocs,
+                                     bgoffset
+                                     ):
+    """Jacobian of linrepplusreps5_bg_flat
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                            [a, b, c, d, e])
+    columns = [d_rep, d_broadening.sum(axis=-1)]
+    columns += list(np.moveaxis(d_amps, -1, 0))
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values, slope=False)
+    return np.stack(columns, axis=-1)
+
+
+linrepplusreps5_bg_flat.jacobian = linrepplusreps5_bg_flat_jacobian
+linrepplusreps5_bg_flat.linear_params = (
+    'a', 'b', 'c', 'd', 'e', 'ampreplocs', 'bgoffset')
+
+
 def linrepplusreps5_bg_flat_vectorinput(vector_input):
     (x_values, rep, broadening,
      a, b, c, d, e,
@@ -722,10 +910,7 @@ def linrepnoreps5_bg_linear(x_values, rep, broadening,
                   ):
     rpd = bgoffset + bgslope * x_values  # Background
     amps = [a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values,
-                                                        (i + 1) * rep,
-                                                        broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     return rpd
 
 
@@ -735,13 +920,29 @@ def linrepnoreps5_bg_flat(x_values, rep, broadening,
                   ):
     rpd = x_values * 0. + bgoffset  # Background
     amps = [a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values,
-                                                        (i + 1) * rep,
-                                                        broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     return rpd
 
 
+def linrepnoreps5_bg_flat_jacobian(x_values, rep, broadening,
+                                   a, b, c, d, e,
+                                   bgoffset
+                                   ):
+    """Jacobian of linrepnoreps5_bg_flat
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                            [a, b, c, d, e])
+    columns = [d_rep, d_broadening.sum(axis=-1)]
+    columns += list(np.moveaxis(d_amps, -1, 0))
+    columns += _background_columns(x_values, slope=False)
+    return np.stack(columns, axis=-1)
+
+
+linrepnoreps5_bg_flat.jacobian = linrepnoreps5_bg_flat_jacobian
+linrepnoreps5_bg_flat.linear_params = ('a', 'b', 'c', 'd', 'e', 'bgoffset')
+
+
 def linrepnoreps5_bg_non_negative(x_values, rep, broadening,
                                   a, b, c, d, e,
                                   bgslope, bgoffset
@@ -752,10 +953,7 @@ def linrepnoreps5_bg_non_negative(x_values, rep, broadening,
     # Include five peaks on linear repeat
     rpd = np.zeros(len(x_values))
     amps = [a, b, c, d, e] # Amplitudes of five peaks
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values,
-                                                        (i + 1) * rep,
-                                                        broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     
     # Add background
     rpd = rpd + background
@@ -763,15 +961,33 @@ def linrepnoreps5_bg_non_negative(x_values, rep, broadening,
     return rpd
 
 
+def linrepnoreps5_bg_non_negative_jacobian(x_values, rep, broadening,
+                                           a, b, c, d, e,
+                                           bgslope, bgoffset
+                                           ):
+    """Jacobian of linrepnoreps5_bg_non_negative
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                            [a, b, c, d, e])
+    columns = [d_rep, d_broadening.sum(axis=-1)]
+    columns += list(np.moveaxis(d_amps, -1, 0))
+    # The background is zero where it would be negative.
+    positive = (bgoffset + bgslope * x_values) > 0.
+    columns += [column * positive for column in _background_columns(x_values)]
+    return np.stack(columns, axis=-1)
+
+
+linrepnoreps5_bg_non_negative.jacobian = linrepnoreps5_bg_non_negative_jacobian
+linrepnoreps5_bg_non_negative.linear_params = ('a', 'b', 'c', 'd', 'e')
+
+
 def linrepnoreps5_bg_zero(x_values, rep, broadening,
                   a, b, c, d, e
                   ):
     rpd = 0
     amps = [a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values,
-                                                        (i + 1) * rep,
-                                                        broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     return rpd
 
 
@@ -822,8 +1038,8 @@ def randplusreps5(x_values, broadening,
     rpd = bgoffset + bgslope * x_values # Linear background
     xs = [xa, xb, xc, xd, xe]
     amps = [a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, xs[i], broadening)    
+    rpd = rpd + pair_correlation.sum_pair_correlations(x_values, xs, broadening,
+                                                       amps, dims=1)
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
     rpd = rpd + reps
@@ -838,8 +1054,7 @@ def linrepplusreps5fixedpeak(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(5):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 5)
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
     rpd = rpd + reps
@@ -854,14 +1069,37 @@ def linrepplusreps5fixedpeakratio(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(5):
-        rpd = rpd + (1. - i / 5.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(5) / 5.))
     
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec) # rep locs
 
     return rpd
 
 
+def linrepplusreps5fixedpeakratio_jacobian(x_values, rep, broadening,
+                                           amp,
+                                           locprec, ampreplocs,
+                                           bgslope, bgoffset
+                                           ):
+    """Jacobian of linrepplusreps5fixedpeakratio
+    (see modelling_general.model_jacobian)."""
+    ratios = 1. - np.arange(5) / 5.
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                            amp * ratios)
+    columns = [d_rep, d_broadening.sum(axis=-1), d_amps.dot(ratios)]
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+linrepplusreps5fixedpeakratio.jacobian = linrepplusreps5fixedpeakratio_jacobian
+linrepplusreps5fixedpeakratio.linear_params = (
+    'amp', 'ampreplocs', 'bgslope', 'bgoffset')
+
+
 def linrepplusreps5fixedpeakratiovectorinput(vectorin):
     (x_values, rep, broadening,
      amp,
@@ -880,12 +1118,31 @@ def linrepnoreps5_fixedpeakratio(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(5):
-        rpd = rpd + (1. - i / 5.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(5) / 5.))
 
     return rpd
 
 
+def linrepnoreps5_fixedpeakratio_jacobian(x_values, rep, broadening,
+                                          amp,
+                                          bgslope, bgoffset
+                                          ):
+    """Jacobian of linrepnoreps5_fixedpeakratio
+    (see modelling_general.model_jacobian)."""
+    ratios = 1. - np.arange(5) / 5.
+    (d_rep, d_broadening,
+     d_amps, _) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                            amp * ratios)
+    columns = [d_rep, d_broadening.sum(axis=-1), d_amps.dot(ratios)]
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+linrepnoreps5_fixedpeakratio.jacobian = linrepnoreps5_fixedpeakratio_jacobian
+linrepnoreps5_fixedpeakratio.linear_params = ('amp', 'bgslope', 'bgoffset')
+
+
 def linrepnoreps5_fixedpeakratio_vectorinput(vectorin):
     (x_values, rep, broadening,
      amp,
@@ -904,14 +1161,34 @@ def lin_repeat_after_offset_5(x_values, rep, broadening,
                               ):
     rpd = bgoffset + bgslope * x_values  # Linear background
     amps = [amp0, a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * pairwise_correlation_1d(x_values,
-                                                  first_peak_offset
-                                                  + i * rep,
-                                                  broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps,
+                              first_multiple=0, offset=first_peak_offset)
     return rpd
 
 
+def lin_repeat_after_offset_5_jacobian(x_values, rep, broadening,
+                                       first_peak_offset,
+                                       amp0, a, b, c, d, e,
+                                       bgslope, bgoffset
+                                       ):
+    """Jacobian of lin_repeat_after_offset_5
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, d_offset) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                                   [amp0, a, b, c, d, e],
+                                                   first_multiple=0,
+                                                   offset=first_peak_offset)
+    columns = [d_rep, d_broadening.sum(axis=-1), d_offset]
+    columns += list(np.moveaxis(d_amps, -1, 0))
+    columns += _background_columns(x_values)
+    return np.stack(columns, axis=-1)
+
+
+lin_repeat_after_offset_5.jacobian = lin_repeat_after_offset_5_jacobian
+lin_repeat_after_offset_5.linear_params = (
+    'amp0', 'a', 'b', 'c', 'd', 'e', 'bgslope', 'bgoffset')
+
+
 def lin_repeat_after_offset_5_vectorargs(vector_input):
     (x_values, rep, broadening,
      first_peak_offset,
@@ -931,11 +1208,8 @@ def lin_repeat_after_offset_5_no_bg(x_values, rep, broadening,
                               ):
     rpd = 0. * x_values
     amps = [amp0, a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * pairwise_correlation_1d(x_values,
-                                                  first_peak_offset
-                                                  + (i) * rep,
-                                                  broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps,
+                              first_multiple=0, offset=first_peak_offset)
     return rpd
 
 
@@ -958,17 +1232,40 @@ def lin_repeat_after_offset_5_flat_bg_replocs(x_values, rep, broadening,
     rpd = 0. * x_values + bgoffset # Background
     
     amps = [amp0, a, b, c, d, e]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * pairwise_correlation_1d(x_values,
-                                                  first_peak_offset
-                                                  + (i) * rep,
-                                                  broadening)
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps,
+                              first_multiple=0, offset=first_peak_offset)
     
     rpd = rpd + ampreplocs * model.pairwise_correlation_1d(x_values, 0., np.sqrt(2) * locprec) # rep locs
     
     return rpd
 
 
+def lin_repeat_after_offset_5_flat_bg_replocs_jacobian(x_values, rep, broadening,
+                                                       first_peak_offset,
+                                                       amp0, a, b, c, d, e,
+                                                       locprec, ampreplocs,
+                                                       bgoffset):
+    """Jacobian of lin_repeat_after_offset_5_flat_bg_replocs
+    (see modelling_general.model_jacobian)."""
+    (d_rep, d_broadening,
+     d_amps, d_offset) = _repeat_peaks_derivatives(x_values, rep, broadening,
+                                                   [amp0, a, b, c, d, e],
+                                                   first_multiple=0,
+                                                   offset=first_peak_offset)
+    columns = [d_rep, d_broadening.sum(axis=-1), d_offset]
+    columns += list(np.moveaxis(d_amps, -1, 0))
+    columns += pair_correlation.zero_separation_derivatives(
+        x_values, locprec, ampreplocs, dims=1)
+    columns += _background_columns(x_values, slope=False)
+    return np.stack(columns, axis=-1)
+
+
+lin_repeat_after_offset_5_flat_bg_replocs.jacobian = (
+    lin_repeat_after_offset_5_flat_bg_replocs_jacobian)
+lin_repeat_after_offset_5_flat_bg_replocs.linear_params = (
+    'amp0', 'a', 'b', 'c', 'd', 'e', 'ampreplocs', 'bgoffset')
+
+
 def lin_repeat_after_offset_5_flat_bg_replocs_vectorargs(vector_input):
     (x_values, rep, broadening,
      first_peak_offset,
@@ -988,8 +1285,7 @@ def linrepnoreps5fixedpeak(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(5):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, [amp] * 5)
     
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -1001,8 +1297,8 @@ def linrepnoreps5fixedpeakratios(x_values, rep, broadening,
                    bgslope, bgoffset
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
-    for i in range(5):
-        rpd = rpd + (1. - i / 5.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(5) / 5.))
     
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -1013,8 +1309,8 @@ def nobg5fixedpeakratios(x_values, rep, broadening,
                    amp
                    ):
     rpd = x_values - x_values # Linear background
-    for i in range(5):
-        rpd = rpd + (1. - i / 5.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(5) / 5.))
     
     #reps2 = ampreplocs2 * x_values / (2 * locprec2 ** 2) * np.exp(
     #                                           -(x_values ** 2) / (4 * locprec2 ** 2))
@@ -1026,8 +1322,8 @@ def nobg5fixedpeakratiosplusreps(x_values, rep, broadening,
                    locprec, ampreplocs
                    ):
     rpd = x_values - x_values # Linear background
-    for i in range(5):
-        rpd = rpd + (1. - i / 5.) * amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening,
+                              amp * (1. - np.arange(5) / 5.))
 
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -1044,8 +1340,7 @@ def linrepplusreps6(x_values, rep, broadening,
                    ):
     rpd = bgoffset + bgslope * x_values # Linear background
     amps = [a, b, c, d, e, f]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, (i + 1) * rep, broadening)    
+    rpd = rpd + _repeat_peaks(x_values, rep, broadening, amps)
     
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
@@ -1083,8 +1378,8 @@ def randplusreps6(x_values, broadening,
     rpd = bgoffset + bgslope * x_values # Linear background
     xs = [xa, xb, xc, xd, xe, xf]
     amps = [a, b, c, d, e, f]
-    for i, amp in enumerate(amps):
-        rpd = rpd + amp * model.pairwise_correlation_1d(x_values, xs[i], broadening)    
+    rpd = rpd + pair_correlation.sum_pair_correlations(x_values, xs, broadening,
+                                                       amps, dims=1)
     reps = ampreplocs * x_values / (2 * locprec ** 2) * np.exp(
                                                -(x_values ** 2) / (4 * locprec ** 2))
     rpd = rpd + reps
@@ -0,0 +1,488 @@
+"""
+model_composition.py
+
+Builds model relative position distributions (RPDs) from components, instead
+of writing out each variant by hand (e.g. linrepplusreps5_bg_flat in
+linearrepeatmodels.py, with its Jacobian and vector-input version).
+
+The components are:
+    repeat_peaks: peaks on a linear repeat, each with its own amplitude;
+    fixed_ratio_peaks: peaks on a linear repeat with amplitudes in fixed
+        ratios;
+    repeated_localisations: the peak at zero separation from repeated
+        localisations of the same molecule;
+    substructure: a peak at zero separation from unresolvable substructure;
+    background: a flat, linear, non-negative linear, linear after an onset,
+        or exponentially decaying (see background_models) background.
+
+compose_model joins them into one model. All the peaks are evaluated
+together, in one call to pair_correlation.sum_pair_correlations, and the
+Jacobian comes from one call to
+pair_correlation.sum_pair_correlations_derivatives and the chain rule. The
+model is returned in a ModelWithFitSettings, with its vector-input version,
+parameter names, linear parameters (for
+modelling_general.fit_model_variable_projection), initial parameters and
+bounds. For example, linrepplusreps5_bg_flat is
+
+    compose_model([repeat_peaks(5), repeated_localisations(),
+                   background('flat')], dims=1,
+                  name='linrepplusreps5_bg_flat')
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import inspect
+import string
+import numpy as np
+from background_models import exponential_decay_1d_pair_corr
+from modelling_general import ModelWithFitSettings
+import pair_correlation
+
+# Default initial value, lower bound and upper bound for each kind of
+# parameter. These suit distances in nm, and can be changed for each model in
+# compose_model.
+DISTANCE_DEFAULTS = (20., 0., np.inf)
+SPREAD_DEFAULTS = (5., 0., np.inf)
+AMPLITUDE_DEFAULTS = (1., 0., np.inf)
+SLOPE_DEFAULTS = (0., -np.inf, np.inf)
+
+BACKGROUNDS = ('flat', 'linear', 'non_negative', 'onset', 'exponential')
+
+
+class ModelComponent:
+    """Class containing one part of a model RPD, for compose_model.
+
+    Attributes
+    ----------
+    names (tuple of strings):
+        The names of the parameters of the component, in order.
+
+    linear_params (tuple of strings):
+        The parameters the component is linear in.
+
+    defaults (dict):
+        The default initial value, lower bound and upper bound of each
+        parameter, by name.
+
+    peaks (function or None):
+        For peaks, called as peaks(values, derivatives=False) with the values
+        of the parameters. Returns the means, sigmas and amplitudes of the
+        peaks, and, with derivatives, their derivatives with respect to the
+        parameters, with shape (number of peaks, number of parameters).
+
+    background (function or None):
+        For a background, called as background(x_values, values,
+        derivatives=False). Returns the background at x_values, and, with
+        derivatives, a list of its derivatives with respect to each
+        parameter.
+    """
+    def __init__(self, names,
+                 linear_params=(),
+                 defaults=None,
+                 peaks=None,
+                 background=None):
+        self.names = tuple(names)
+        self.linear_params = tuple(linear_params)
+        self.defaults = defaults or {}
+        self.peaks = peaks
+        self.background = background
+
+
+def _linear_repeat(multiples, amp_matrix, offset):
+    """Peaks function (see ModelComponent) for peaks at (offset +)
+    multiples * rep, with parameters rep, broadening, (first_peak_offset,)
+    then amplitudes, whose peak amplitudes are amp_matrix.dot(amplitudes)."""
+    n_peaks = len(multiples)
+    n_shape = 3 if offset else 2
+    d_means = np.zeros((n_peaks, n_shape + amp_matrix.shape[1]))
+    d_means[:, 0] = multiples
+    if offset:
+        d_means[:, 2] = 1.
+    d_sigmas = np.zeros(d_means.shape)
+    d_sigmas[:, 1] = 1.
+    d_amps = np.zeros(d_means.shape)
+    d_amps[:, n_shape:] = amp_matrix
+
+    def peaks(values, derivatives=False):
+        means = multiples * values[0]
+        if offset:
+            means = means + values[2]
+        sigmas = np.full(n_peaks, values[1])
+        amps = amp_matrix.dot(values[n_shape:])
+        if derivatives:
+            return means, sigmas, amps, d_means, d_sigmas, d_amps
+        return means, sigmas, amps
+
+    return peaks
+
+
+def _linear_repeat_defaults(amp_names, offset):
+    """Defaults for the parameters of peaks on a linear repeat."""
+    defaults = {'rep': DISTANCE_DEFAULTS, 'broadening': SPREAD_DEFAULTS}
+    if offset:
+        defaults['first_peak_offset'] = (1., 0., np.inf)
+    defaults.update((name, AMPLITUDE_DEFAULTS) for name in amp_names)
+    return defaults
+
+
+def repeat_peaks(n_peaks, first_multiple=1, offset=False, amp_names=None):
+    """Peaks at multiples of a repeat distance, each with its own amplitude,
+    as in linearrepeatmodels.linrepnoreps5_bg_flat.
+
+    The parameters are rep, broadening, first_peak_offset (if offset), then
+    the amplitudes.
+
+    Args:
+        n_peaks (int): The number of peaks.
+        first_multiple (int):
+            The multiple of the repeat distance for the first peak.
+        offset (Boolean):
+            Shift all the peaks by a fitted distance, first_peak_offset.
+        amp_names (list of strings):
+            The names of the amplitudes, by default 'a', 'b', 'c', ...
+
+    Returns:
+        component (ModelComponent): The peaks.
+    """
+    if amp_names is None:
+        amp_names = string.ascii_lowercase[:n_peaks]
+    if len(amp_names) != n_peaks:
+        raise ValueError('%d amplitude names are needed, not %d'
+                         % (n_peaks, len(amp_names)))
+    names = ['rep', 'broadening'] + (['first_peak_offset'] if offset else [])
+    return ModelComponent(
+        names + list(amp_names),
+        linear_params=amp_names,
+        defaults=_linear_repeat_defaults(amp_names, offset),
+        peaks=_linear_repeat(first_multiple + np.arange(n_peaks),
+                             np.eye(n_peaks), offset))
+
+
+def fixed_ratio_peaks(ratios, first_multiple=1, offset=False):
+    """Peaks at multiples of a repeat distance, with amplitudes in fixed
+    ratios, as in linearrepeatmodels.linrepplusreps5fixedpeakratio.
+
+    The parameters are rep, broadening, first_peak_offset (if offset), then
+    amp, the amplitude for a ratio of 1.
+
+    Args:
+        ratios (list of floats): The ratios of the amplitudes of the peaks.
+        first_multiple (int):
+            The multiple of the repeat distance for the first peak.
+        offset (Boolean):
+            Shift all the peaks by a fitted distance, first_peak_offset.
+
+    Returns:
+        component (ModelComponent): The peaks.
+    """
+    ratios = np.asarray(ratios, dtype=float)
+    names = ['rep', 'broadening'] + (['first_peak_offset'] if offset else [])
+    return ModelComponent(
+        names + ['amp'],
+        linear_params=['amp'],
+        defaults=_linear_repeat_defaults(['amp'], offset),
+        peaks=_linear_repeat(first_multiple + np.arange(len(ratios)),
+                             ratios[:, np.newaxis], offset))
+
+
+def _zero_separation_peak(values, derivatives=False):
+    """Peaks function (see ModelComponent) for a peak at zero separation
+    with sigma sqrt(2) * spread, as for pairs of localisations of the same
+    molecule, with parameters spread then amplitude."""
+    means = np.zeros(1)
+    sigmas = np.array([np.sqrt(2) * values[0]])
+    amps = np.array([values[1]])
+    if derivatives:
+        return (means, sigmas, amps,
+                np.zeros((1, 2)), np.array([[np.sqrt(2), 0.]]),
+                np.array([[0., 1.]]))
+    return means, sigmas, amps
+
+
+def repeated_localisations(names=('locprec', 'ampreplocs')):
+    """The peak at zero separation from repeated localisations of the same
+    molecule with localisation precision locprec.
+
+    Args:
+        names (2-tuple of strings):
+            The names of the localisation precision and the amplitude.
+
+    Returns:
+        component (ModelComponent): The peak.
+    """
+    return ModelComponent(names, linear_params=names[1:],
+                          defaults={names[0]: (3., 0., np.inf),
+                                    names[1]: AMPLITUDE_DEFAULTS},
+                          peaks=_zero_separation_peak)
+
+
+def substructure(names=('substructspread', 'substructamp')):
+    """The peak at zero separation from unresolvable substructure, or
+    mislocalisations from simultaneous nearby emitters, spread by
+    substructspread for each localisation.
+
+    Args:
+        names (2-tuple of strings):
+            The names of the spread and the amplitude.
+
+    Returns:
+        component (ModelComponent): The peak.
+    """
+    return ModelComponent(names, linear_params=names[1:],
+                          defaults={names[0]: SPREAD_DEFAULTS,
+                                    names[1]: AMPLITUDE_DEFAULTS},
+                          peaks=_zero_separation_peak)
+
+
+def _flat_background(x_values, values, derivatives=False):
+    rpd = values[0] + 0. * x_values
+    if derivatives:
+        return rpd, [np.ones(np.shape(x_values))]
+    return rpd
+
+
+def _linear_background(x_values, values, derivatives=False):
+    rpd = values[1] + values[0] * x_values
+    if derivatives:
+        return rpd, [x_values + 0. * rpd, np.ones(np.shape(x_values))]
+    return rpd
+
+
+def _non_negative_background(x_values, values, derivatives=False):
+    linear = values[1] + values[0] * x_values
+    rpd = np.maximum(linear, 0.)
+    if derivatives:
+        positive = linear > 0.
+        return rpd, [x_values * positive, 1. * positive]
+    return rpd
+
+
+def _onset_background(x_values, values, derivatives=False):
+    gradient, onset = values
+    rpd = np.maximum(gradient * (x_values - onset), 0.)
+    if derivatives:
+        # Zero before the onset (for a positive gradient, including when the
+        # gradient is zero).
+        after_onset = np.where(gradient < 0, x_values < onset,
+                               x_values > onset)
+        return rpd, [(x_values - onset) * after_onset,
+                     -gradient * after_onset]
+    return rpd
+
+
+def _exponential_background(x_values, values, derivatives=False):
+    amplitude, scale = values
+    rpd = exponential_decay_1d_pair_corr(x_values, amplitude, scale)
+    if derivatives:
+        return rpd, [np.exp(-x_values / scale), rpd * x_values / scale ** 2]
+    return rpd
+
+
+def background(kind='linear'):
+    """A background term.
+
+    Args:
+        kind (str):
+            'flat' (parameter bgoffset),
+            'linear' (bgoffset + bgslope * x: bgslope, bgoffset),
+            'non_negative' (linear, but zero where that is negative:
+            bgslope, bgoffset),
+            'onset' (zero up to bgonset, then increasing linearly with
+            gradient bggrad, as for rotationally symmetric structures that
+            exclude one another: bggrad, bgonset; the model is only linear
+            in bggrad for bggrad >= 0, so its lower bound must not be
+            negative for variable projection),
+            or 'exponential' (background_models.exponential_decay_1d_pair_corr:
+            bgamp, bgdecay).
+
+    Returns:
+        component (ModelComponent): The background.
+    """
+    if kind == 'flat':
+        return ModelComponent(['bgoffset'], linear_params=['bgoffset'],
+                              defaults={'bgoffset': AMPLITUDE_DEFAULTS},
+                              background=_flat_background)
+    if kind in ('linear', 'non_negative'):
+        defaults = {'bgslope': SLOPE_DEFAULTS,
+                    'bgoffset': (1., -np.inf, np.inf)}
+        if kind == 'linear':
+            return ModelComponent(['bgslope', 'bgoffset'],
+                                  linear_params=['bgslope', 'bgoffset'],
+                                  defaults=defaults,
+                                  background=_linear_background)
+        return ModelComponent(['bgslope', 'bgoffset'], defaults=defaults,
+                              background=_non_negative_background)
+    if kind == 'onset':
+        return ModelComponent(['bggrad', 'bgonset'], linear_params=['bggrad'],
+                              defaults={'bggrad': (0.01, 0., np.inf),
+                                        'bgonset': DISTANCE_DEFAULTS},
+                              background=_onset_background)
+    if kind == 'exponential':
+        return ModelComponent(['bgamp', 'bgdecay'], linear_params=['bgamp'],
+                              defaults={'bgamp': AMPLITUDE_DEFAULTS,
+                                        'bgdecay': (50., 0., np.inf)},
+                              background=_exponential_background)
+    raise ValueError('kind must be one of %s, not %r'
+                     % (', '.join(BACKGROUNDS), kind))
+
+
+def compose_model(components, dims=1, name='composed_model',
+                  initial_params=None, lower_bounds=None, upper_bounds=None):
+    """Make a model RPD from components, with its Jacobian, vector-input
+    version and fitting settings.
+
+    The parameters of the model are those of each component in turn. A
+    parameter can appear in more than one component (e.g. rep, for two sets
+    of peaks on the same repeat), and is then shared by them.
+
+    Args:
+        components (list of ModelComponents):
+            The parts of the model, e.g. [repeat_peaks(5),
+            repeated_localisations(), background('flat')].
+        dims (int):
+            1, 2 or 3, the dimensions of the separations the model is for.
+        name (str): The name of the model function.
+        initial_params (dict):
+            Initial values for the fit, by parameter name, to use instead
+            of the defaults of the components.
+        lower_bounds, upper_bounds (dicts):
+            Bounds on the parameters for the fit, by parameter name, to use
+            instead of the defaults.
+
+    Returns:
+        A ModelWithFitSettings object containing:
+            model_rpd (function):
+                The model, called as model_rpd(x_values, *params), with
+                jacobian and linear_params attributes (see
+                modelling_general.model_jacobian and
+                modelling_general.linear_parameter_indices).
+            initial_params (list):
+                Starting guesses for the parameter values by
+                scipy.optimize.curve_fit.
+            param_bounds (2-tuple of lists):
+                The lower and upper bounds on the parameter values.
+            vector_input_model (function):
+                The same model, called with a vector input of the
+                distances then the parameters, for
+                modelling_general.stdev_of_model.
+    """
+    if dims not in (1, 2, 3):
+        raise ValueError('dims must be 1, 2 or 3, not %s' % dims)
+    names = []
+    defaults = {}
+    linear_params = []
+    for component in components:
+        for param_name in component.names:
+            if param_name not in names:
+                names.append(param_name)
+                defaults[param_name] = component.defaults.get(
+                    param_name, (1., -np.inf, np.inf))
+        linear_params += [param_name for param_name in component.linear_params
+                          if param_name not in linear_params]
+    # The positions of the parameters of each component among those of the
+    # model.
+    positions = [np.array([names.index(param_name)
+                           for param_name in component.names], dtype=int)
+                 for component in components]
+    peak_parts = [(component.peaks, indices)
+                  for component, indices in zip(components, positions)
+                  if component.peaks is not None]
+    background_parts = [(component.background, indices)
+                        for component, indices in zip(components, positions)
+                        if component.background is not None]
+
+    def parameter_values(params):
+        """The parameters as an array, checking there are the right
+        number."""
+        if len(params) != len(names):
+            raise TypeError('%d parameters are needed (%s), not %d'
+                            % (len(names), ', '.join(names), len(params)))
+        return np.asarray(params, dtype=float)
+
+    def model_rpd(x_values, *params):
+        values = parameter_values(params)
+        rpd = 0. * np.asarray(x_values, dtype=float)
+        if peak_parts:
+            means, sigmas, amps = [
+                np.concatenate(arrays) for arrays in
+                zip(*[peaks(values[indices])
+                      for peaks, indices in peak_parts])]
+            rpd = rpd + pair_correlation.sum_pair_correlations(
+                x_values, means, sigmas, amps, dims=dims)
+        for background_function, indices in background_parts:
+            rpd = rpd + background_function(x_values, values[indices])
+        return rpd
+
+    def model_rpd_jacobian(x_values, *params):
+        values = parameter_values(params)
+        jacobian = np.zeros(np.shape(x_values) + (len(names),))
+        if peak_parts:
+            parts = [peaks(values[indices], derivatives=True)
+                     for peaks, indices in peak_parts]
+            means, sigmas, amps = [np.concatenate(arrays)
+                                   for arrays in list(zip(*parts))[:3]]
+            # The derivatives of the means, sigmas and amplitudes of all the
+            # peaks with respect to the parameters of the model.
+            chain = np.zeros((3, len(means), len(names)))
+            start = 0
+            for part, (_, indices) in zip(parts, peak_parts):
+                stop = start + len(part[0])
+                for derivatives, peak_derivatives in zip(chain, part[3:]):
+                    derivatives[start:stop, indices] = peak_derivatives
+                start = stop
+            (_, d_means,
+             d_sigmas,
+             d_amps) = pair_correlation.sum_pair_correlations_derivatives(
+                 x_values, means, sigmas, amps, dims=dims)
+            jacobian += (d_means.dot(chain[0]) + d_sigmas.dot(chain[1])
+                         + d_amps.dot(chain[2]))
+        for background_function, indices in background_parts:
+            _, columns = background_function(x_values, values[indices],
+                                              derivatives=True)
+            for index, column in zip(indices, columns):
+                jacobian[..., index] += column
+        return jacobian
+
+    def model_rpd_vectorargs(input_vector):
+        return model_rpd(*input_vector)
+
+    parameter = inspect.Parameter.POSITIONAL_OR_KEYWORD
+    for function, suffix in ((model_rpd, ''),
+                             (model_rpd_jacobian, '_jacobian')):
+        function.__name__ = function.__qualname__ = name + suffix
+        function.__signature__ = inspect.Signature(
+            [inspect.Parameter(param_name, parameter)
+             for param_name in ['x_values'] + names])
+    model_rpd_vectorargs.__name__ = name + '_vectorargs'
+    model_rpd_vectorargs.__qualname__ = model_rpd_vectorargs.__name__
+    model_rpd.__doc__ = ('Model RPD with parameters ' + ', '.join(names)
+                         + ' (see model_composition.compose_model).')
+    model_rpd.jacobian = model_rpd_jacobian
+    model_rpd.linear_params = tuple(linear_params)
+
+    settings = []
+    for column, overrides in enumerate((initial_params, lower_bounds,
+                                        upper_bounds)):
+        overrides = overrides or {}
+        unknown = set(overrides) - set(names)
+        if unknown:
+            raise ValueError('%s not parameters of the model (%s)'
+                             % (', '.join(sorted(unknown)), ', '.join(names)))
+        settings.append([overrides.get(param_name, defaults[param_name][column])
+                         for param_name in names])
+
+    return ModelWithFitSettings(model_rpd,
+                                initial_params=settings[0],
+                                param_bounds=(settings[1], settings[2]),
+                                vector_input_model=model_rpd_vectorargs)
@@ -30,13 +30,21 @@ specific language governing permissions and limitations under the License.
 """
 
 # import time
+import functools
+import inspect
+import warnings
 import numpy as np
-import numdifftools as nd
 import matplotlib.pyplot as plt
 from scipy.spatial.transform import Rotation
-from scipy import i0
 from scipy import stats
-from scipy.optimize import curve_fit
+from scipy.optimize import curve_fit, least_squares, lsq_linear
+import instrumentation
+import pair_correlation
+
+# Relative step in the parameters for the central differences in
+# jacobian_of_model (about the cube root of the machine precision, which
+# balances truncation and rounding errors).
+FINITE_DIFFERENCE_STEP = 1e-5
 
 
 class ModelWithFitSettings:
@@ -76,36 +84,22 @@ class ModelWithFitSettings:
 
 def pairwise_correlation_3d(r, rmean, sigma):
     """
-    Apparent density of separations(r) for two repeatedly localised fluorophores in 2D
+    Apparent density of separations(r) for two repeatedly localised fluorophores in 3D
     with true separation rmean.
     sigma = sum in quadrature of sigma for each fluorophore,
     so sigma ** 2 = 2 * loc.prec ** 2. for repeated locs of the same molecule.
     From Churchman, Biophys J 90, 668-671 (2006).
-    Need Bessel function, imported as i0(x)
+    Evaluated for all r at once, without overflow of sinh() for large
+    separations (see pair_correlation.py).
     Args:
-        r:
-        r_mean:
-        sigma:
+        r: Numpy array (or single value) of distances at which to evaluate
+           the density.
+        r_mean: The true separation.
+        sigma: The spread of the separations.
     Return:
-        p:
+        p: The density at r.
     """
-    if rmean == 0:
-        # Using approximation of sinh from
-        # http://mathworld.wolfram.com/SeriesExpansion.html
-        p = np.sqrt(2 / np.pi) \
-            * (r ** 2 / sigma ** 3) \
-            * (np.exp(-(rmean ** 2 + r ** 2)
-               / (2 * sigma ** 2))
-               )
-    # if rmean < (sigma * 5.):
-    elif (np.max(r) * rmean / sigma ** 2) < 700.:
-        p = np.sqrt(2 / np.pi) * (r / (sigma * rmean)) \
-                * (np.exp(-(rmean ** 2 + r ** 2) / (2 * sigma ** 2)) \
-                * np.sinh(r * rmean / sigma ** 2))
-    else:  # Approximate overly large sinh()
-        p = 1. / 2. * np.sqrt(2 / np.pi) * (r / (sigma * rmean)) \
-            * np.exp(-((r - rmean) ** 2) / (2 * sigma ** 2))
-    return p
+    return pair_correlation.pair_correlation_3d(r, rmean, sigma)
 
 
 def pairwise_correlation_2d(r, rmean, sigma):
@@ -117,7 +111,9 @@ def pairwise_correlation_2d(r, rmean, sigma):
     sigma = sum in quadrature of sigma for each fluorophore,
     so sigma ** 2 = 2 * loc.prec ** 2. for repeated locs of the same molecule.
     From Churchman, Biophys J 90, 668-671 (2006).
-    Need Bessel function, imported as i0(x)
+    Evaluated for all r at once, with the exponentially scaled Bessel
+    function i0e(), so without overflow of i0() for large separations
+    (see pair_correlation.py).
 
     Args:
         r: Numpy array of distances at which you want to evaluate a correlation
@@ -129,32 +125,7 @@ def pairwise_correlation_2d(r, rmean, sigma):
         p: Numpy array of the probability density of the correclation function
            at the values of r.
     """
-    # If r is a single value, rather than an array:
-    if np.isscalar(r):
-        p = 0 # Might help to diagnose if there are problems
-        if (rmean * r / sigma ** 2) < 700:   
-            p = (r / sigma ** 2) * (np.exp(-(rmean ** 2 + r ** 2) \
-                / (2 * sigma ** 2)) * i0(r * rmean / sigma ** 2))
-        else:  # Approximate overly large i0()
-            p = 1 / (np.sqrt(2 * np.pi) * sigma) * np.sqrt(r / rmean) \
-                * np.exp(-((r - rmean) ** 2) / (2 * sigma ** 2))
-
-    # If z is an array of distances at which to evaluate the function:    
-    else:
-        if (np.max(r) * rmean / sigma ** 2) < 700.:
-            p = (r / sigma ** 2
-                    * (np.exp(-(rmean ** 2 + r ** 2)
-                                / (2 * sigma ** 2)
-                                )
-                        * i0(r * rmean / sigma ** 2)
-                        )
-                    )
-        else:  # Approximate for overly large i0()
-            p = (1 / (np.sqrt(2 * np.pi) * sigma)
-                    * np.sqrt(r / rmean)
-                    * np.exp(-((r - rmean) ** 2) / (2 * sigma ** 2))
-                    )
-    return p
+    return pair_correlation.pair_correlation_2d(r, rmean, sigma)
 
 
 def pair_corr_2d_standardised(r, rmean, sigma):
@@ -166,7 +137,7 @@ def pair_corr_2d_standardised(r, rmean, sigma):
     sigma = sum in quadrature of sigma for each fluorophore,
     so sigma ** 2 = 2 * loc.prec ** 2. for repeated locs of the same molecule.
     From Churchman, Biophys J 90, 668-671 (2006).
-    Need Bessel function, imported as i0(x)
+    See pair_correlation.py.
 
     Args:
         r: Numpy array of distances at which you want to evaluate a correlation
@@ -178,32 +149,7 @@ def pair_corr_2d_standardised(r, rmean, sigma):
         p: Numpy array of the probability density of the correclation function
            at the values of r.
     """
-    # If r is a single value, rather than an array:
-    if np.isscalar(r):
-        p = 0 # Might help to diagnose if there are problems
-        if (rmean * r / sigma ** 2) < 700:   
-            p = 1 / r * (r / sigma ** 2) * (np.exp(-(rmean ** 2 + r ** 2) \
-                / (2 * sigma ** 2)) * i0(r * rmean / sigma ** 2))
-        else:  # Approximate overly large i0()
-            p = 1 / r / (np.sqrt(2 * np.pi) * sigma) * np.sqrt(r / rmean) \
-                * np.exp(-((r - rmean) ** 2) / (2 * sigma ** 2))
-
-    # If z is an array of distances at which to evaluate the function:    
-    else:
-        if (np.max(r) * rmean / sigma ** 2) < 700.:
-            p = 1 / r * (r / sigma ** 2
-                    * (np.exp(-(rmean ** 2 + r ** 2)
-                                / (2 * sigma ** 2)
-                                )
-                        * i0(r * rmean / sigma ** 2)
-                        )
-                    )
-        else:  # Approximate for overly large i0()
-            p = 1 / r * (1 / (np.sqrt(2 * np.pi) * sigma)
-                    * np.sqrt(r / rmean)
-                    * np.exp(-((r - rmean) ** 2) / (2 * sigma ** 2))
-                    )
-    return p
+    return pair_correlation.pair_correlation_2d_standardised(r, rmean, sigma)
 
 
 def pairwise_correlation_1d(z, zmean, sigma):
@@ -213,52 +159,10 @@ def pairwise_correlation_1d(z, zmean, sigma):
     Sigma = sum in quadrature of sigma for each fluorophore,
     so sigma ** 2 = 2 * loc.prec ** 2. for repeated locs of the same molecule.
     From Churchman, Biophys J 90, 668-671 (2006).
-    Need Bessel function, imported as j0(x)
+    Evaluated for all z at once, without overflow of cosh() for large
+    separations (see pair_correlation.py).
     """
-    # Improve approximation to depend on z as well as zmean wrt sigma
-
-    # If z is a single value, rather than an array:
-    if np.isscalar(z):
-        p = 0 # Might help to diagnose if there are problems
-        if (zmean * z / sigma ** 2) < 500:
-            p = (np.sqrt(2 / np.pi) * 1. / sigma
-                 * (np.exp(-(zmean ** 2 + z ** 2)
-                 / (2 * sigma ** 2)) * np.cosh(zmean * z / sigma ** 2))
-            )
-        else:
-            p = ((1. / 2.) * np.sqrt(2 / np.pi) * 1. / sigma
-                 * (np.exp(-((z - zmean) ** 2) / (2 * sigma ** 2)))
-            )
-
-    # If z is an array of distances at which to evaluate the function:
-    else:
-        p = z * 0.
-        for i, test_z in enumerate(z):
-            if (zmean * test_z / sigma ** 2) < 500:
-                p[i] = (np.sqrt(2 / np.pi) * 1. / sigma
-                        * np.exp(-(zmean ** 2 + test_z ** 2)
-                                 / (2 * sigma ** 2)
-                                )
-                        * np.cosh(zmean * test_z / sigma ** 2)
-                )
-            else:
-                p[i] = ((1. / 2.) * np.sqrt(2 / np.pi) * 1. / sigma
-                        * (np.exp(-((test_z - zmean) ** 2) / (2 * sigma ** 2)))
-                )
-
-    #if zmean < (sigma * 10.):
-    #    p = np.sqrt(2 / np.pi) * 1 / sigma * (np.exp(-(zmean ** 2 + z ** 2) \
-    #                / (2 * sigma ** 2)) * np.cosh(zmean * z / sigma ** 2))
-    #else:  # Approximate overly large np.cosh()
-    #    """ Old version - mistakenly kept z/zmean factor from 2D case
-    #    in multiplier. Obviously, this is 1 at z=zmean. """
-        # p = 1. / 2. * np.sqrt(2 / np.pi) * 1 / sigma * np.sqrt(z / zmean) * (
-        #        np.exp(-((z - zmean) ** 2) / (2 * sigma ** 2))
-        #        )
-    #    """ New version - removed z/zmean in multiplier. """
-    #    p = (1. / 2.) * np.sqrt(2 / np.pi) * 1 / sigma \
-    #        * (np.exp(-((z - zmean) ** 2) / (2 * sigma ** 2)))
-    return p
+    return pair_correlation.pair_correlation_1d(z, zmean, sigma)
 
 
 def gauss1d(x_values, xmean, sigma):
@@ -290,6 +194,43 @@ def generate_polygon_points(n, d):
     return v
 
 
+@functools.lru_cache(maxsize=None)
+def _unit_polygon_chords(n):
+    """Chords of a polygon with n vertices on a circle of diameter 1, and
+    their multiplicities (see polygon_chords). Calculated once for each n.
+    """
+    steps = np.arange(1, n // 2 + 1)
+    chords = np.sin(np.pi * steps / n)
+    # Each chord joins n pairs of vertices, except the diameters of an
+    # even polygon, which join n / 2 pairs.
+    multiplicities = np.where(2 * steps == n, n // 2, n)
+    chords.flags.writeable = False
+    multiplicities.flags.writeable = False
+    return chords, multiplicities
+
+
+def polygon_chords(n, d):
+    """The different distances between the vertices of a regular polygon,
+    d * sin(pi * k / n) for k = 1 to n // 2, and the number of pairs of
+    vertices separated by each distance (n, or n / 2 for the diameter of a
+    polygon with an even number of vertices). This gives the same distances
+    as finding the distances between the points from generate_polygon_points,
+    without searching for them.
+
+    Args:
+        n: Number of vertices.
+        d: Diameter of circle on which the vertices are found.
+
+    Returns:
+        chords: Numpy array of the n // 2 different distances between
+            vertices, in increasing order.
+        multiplicities: Numpy array of the number of pairs of vertices
+            separated by each distance. These add up to n * (n - 1) / 2.
+    """
+    unit_chords, multiplicities = _unit_polygon_chords(int(n))
+    return d * unit_chords, multiplicities
+
+
 def linear_fit(x_values, slope, offset):
     """Generate (return) y values for a linear function at given values of
     x, slope and offset.
@@ -451,11 +392,295 @@ def kde_1nm(distances, locprec, fitlength):
     return x, kde
 
 
+def model_jacobian(model):
+    """The analytic Jacobian of a model RPD, if it has one. A Jacobian is
+    attached to a model function as its jacobian attribute, and takes the
+    same arguments as the model. It returns the derivatives of the model
+    with respect to each parameter at each distance, with shape
+    (number of distances, number of parameters), as scipy.optimize.curve_fit
+    requires for its jac argument.
+
+    Args:
+        model (function): Parametric model distribution.
+
+    Returns:
+        jacobian (function or None):
+            The Jacobian of the model, or None if it does not have one,
+            when curve_fit estimates it by finite differences.
+    """
+    return getattr(model, 'jacobian', None)
+
+
+def model_parameter_names(model):
+    """The names of the parameters of a model RPD that are fitted: the
+    positional arguments after the distances. Keyword-only arguments (e.g.
+    the order of symmetry in rot_2d_symm_fit) are settings of the model, and
+    are not fitted.
+
+    Args:
+        model (function): Parametric model distribution.
+
+    Returns:
+        names (list of strings):
+            Names of the fitted parameters, in order.
+    """
+    positional = (inspect.Parameter.POSITIONAL_ONLY,
+                  inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    return [name for name, parameter
+            in list(inspect.signature(model).parameters.items())[1:]
+            if parameter.kind in positional]
+
+
+def linear_parameter_indices(model):
+    """The positions, among the parameters of a model RPD, of the parameters
+    the model is linear in (amplitudes and background slopes and offsets).
+    These are declared by naming them in a linear_params attribute of the
+    model function, and are solved exactly in
+    fit_model_variable_projection.
+
+    Args:
+        model (function): Parametric model distribution.
+
+    Returns:
+        indices (list of ints):
+            Positions of the linear parameters (not counting the distances
+            argument), or an empty list if the model declares none.
+    """
+    names = model_parameter_names(model)
+    return [names.index(name) for name in getattr(model, 'linear_params', ())]
+
+
+def _parameter_bounds(param_bounds, n_params):
+    """Lower and upper bounds as arrays, from bounds in the form accepted by
+    scipy.optimize.curve_fit."""
+    if param_bounds is None:
+        param_bounds = (-np.inf, np.inf)
+    lower = np.broadcast_to(np.asarray(param_bounds[0], dtype=float),
+                            (n_params,))
+    upper = np.broadcast_to(np.asarray(param_bounds[1], dtype=float),
+                            (n_params,))
+    return lower, upper
+
+
+def _covariance_from_jacobian(jacobian_values, residuals, n_params):
+    """Covariance matrix of the parameters of a least-squares fit, from the
+    Jacobian of the model at the optimised parameters, as
+    scipy.optimize.curve_fit calculates it (with absolute_sigma=False)."""
+    _, singular_values, v_transpose = np.linalg.svd(jacobian_values,
+                                                    full_matrices=False)
+    threshold = (np.finfo(float).eps * max(jacobian_values.shape)
+                 * singular_values[0])
+    singular_values = singular_values[singular_values > threshold]
+    v_transpose = v_transpose[:singular_values.size]
+    params_covar = np.dot(v_transpose.T / singular_values ** 2, v_transpose)
+
+    if len(residuals) > n_params and not np.any(np.isnan(params_covar)):
+        params_covar = (params_covar * np.sum(residuals ** 2)
+                        / (len(residuals) - n_params))
+    else:
+        params_covar = np.full((n_params, n_params), np.inf)
+        warnings.warn('Covariance of the parameters could not be estimated')
+    return params_covar
+
+
+def _check_linear_params(model, x_values, params, linear, lower, upper):
+    """Check that a model is linear in each of its declared linear
+    parameters across their bounds, at the given values of the other
+    parameters: steps from zero of up to one (or to a bound) either way must
+    change the model in proportion to the size of the step. A model such as
+    a background that is zero before an onset distance is only linear in
+    its gradient for gradients of one sign.
+
+    Raises:
+        ValueError: if the model is not linear in a parameter.
+    """
+    params = np.array(params, dtype=float)
+    params[linear] = 0.
+    constant_terms = np.broadcast_to(model(x_values, *params), x_values.shape)
+    for index in np.flatnonzero(linear):
+        steps = []
+        if upper[index] > 0.:
+            steps += [min(upper[index], 1.), min(upper[index], 1.) / 2.]
+        if lower[index] < 0.:
+            steps += [max(lower[index], -1.), max(lower[index], -1.) / 2.]
+        terms = []
+        for step in steps:
+            params[index] = step
+            terms.append((model(x_values, *params) - constant_terms) / step)
+        params[index] = 0.
+        for term in terms[1:]:
+            if not np.allclose(term, terms[0], rtol=1e-6,
+                               atol=1e-9 * np.max(np.abs(terms[0]))):
+                raise ValueError(
+                    '%s is not linear in %s between its bounds (%s, %s); '
+                    'narrow the bounds or fit with curve_fit.'
+                    % (model.__name__,
+                       list(inspect.signature(model).parameters)[index + 1],
+                       lower[index], upper[index]))
+
+
+def fit_model_variable_projection(expt,
+                                  model,
+                                  param_guesses,
+                                  param_bounds,
+                                  fitlength=400., stage=None, **kwargs):
+    """Least-squares fitting of a model relative position distribution to an
+    experimental distribution by variable projection. Only the parameters
+    the model is non-linear in (e.g. distances and spreads) are optimised by
+    scipy.optimize.least_squares. For each set of these, the parameters it
+    is linear in (see linear_parameter_indices) are solved exactly by
+    bounded linear least squares (non-negative least squares for amplitudes
+    with a lower bound of zero).
+
+    The fit does not depend on the guesses for the linear parameters.
+    However, while the amplitude of a component of the model is solved as
+    zero, the non-linear parameters of that component (e.g. its distance)
+    do not affect the fit, so they should start close enough for the
+    component to contribute. The model must be linear in the linear
+    parameters across their bounds (e.g. a background that is zero before an
+    onset distance is only linear in a gradient of one sign), which is
+    checked at the starting guesses.
+
+    Args:
+        expt:
+            Experimental pairwise distance distribution, evaluated
+            at n + 0.5 nm, when n is an integer (histogram bin values).
+        model:
+            Parametric model distribution, declaring its linear parameters.
+        param_guesses:
+            Starting guesses for parameter values. Guesses for the linear
+            parameters are not needed, and are ignored.
+        param_bounds:
+            Bounds on the allowed parameter values during optimisation,
+            as for scipy's curve_fit.
+        fitlength:
+            Maximum distance included in the fit.
+        stage:
+            Optional record of a stage of the run (see instrumentation.py),
+            to which the number of fits and model evaluations are added.
+        kwargs:
+            Passed on to least_squares.
+
+    Returns:
+        params_optimised:
+            Optimised parameters.
+        params_covar:
+            Covariance matrix between all the parameters, as from
+            fit_model_to_experiment.
+        params_1sd_error:
+            Error (1 SD) on parameters.
+    """
+    x_values = np.arange(fitlength) + 0.5
+    expt = np.asarray(expt, dtype=float)
+    n_params = len(model_parameter_names(model))
+    linear = np.zeros(n_params, dtype=bool)
+    linear[linear_parameter_indices(model)] = True
+    if not np.any(linear):
+        raise ValueError(model.__name__ + ' declares no linear parameters '
+                         'for variable projection.')
+    if param_guesses is None:
+        param_guesses = np.ones(n_params)
+    lower, upper = _parameter_bounds(param_bounds, n_params)
+    _check_linear_params(model, x_values, param_guesses, linear, lower, upper)
+
+    jacobian = model_jacobian(model)
+    if stage is not None:
+        model = instrumentation.CountCalls(model)
+        if jacobian is not None:
+            jacobian = instrumentation.CountCalls(jacobian)
+
+    last_solution = {}
+
+    def solve_linear_params(nonlinear_params):
+        """The parameters with the best linear parameters for these
+        non-linear parameters, the model without the linear terms, and the
+        linear terms for each linear parameter of one."""
+        if ('nonlinear_params' in last_solution
+                and np.array_equal(nonlinear_params,
+                                   last_solution['nonlinear_params'])):
+            return last_solution['solution']
+        params = np.zeros(n_params)
+        params[~linear] = nonlinear_params
+        constant_terms = np.broadcast_to(model(x_values, *params),
+                                         x_values.shape)
+        if jacobian is not None:
+            linear_terms = jacobian(x_values, *params)[:, linear]
+        else:
+            linear_terms = np.empty((len(x_values), np.sum(linear)))
+            for i, index in enumerate(np.flatnonzero(linear)):
+                params[index] = 1.
+                linear_terms[:, i] = (model(x_values, *params)
+                                      - constant_terms)
+                params[index] = 0.
+        params[linear] = lsq_linear(linear_terms,
+                                    expt - constant_terms,
+                                    bounds=(lower[linear], upper[linear]),
+                                    method='bvls').x
+        solution = (params, constant_terms, linear_terms)
+        last_solution['nonlinear_params'] = np.copy(nonlinear_params)
+        last_solution['solution'] = solution
+        return solution
+
+    def residuals(nonlinear_params):
+        params, constant_terms, linear_terms = solve_linear_params(
+            nonlinear_params)
+        return constant_terms + np.dot(linear_terms, params[linear]) - expt
+
+    def residuals_jacobian(nonlinear_params):
+        # Kaufman's approximation: derivatives of the model with respect to
+        # the non-linear parameters, less their projection onto the linear
+        # terms whose parameters are not held at their bounds.
+        params, _, linear_terms = solve_linear_params(nonlinear_params)
+        derivatives = jacobian(x_values, *params)[:, ~linear]
+        free = ((params[linear] > lower[linear])
+                & (params[linear] < upper[linear]))
+        if np.any(free):
+            derivatives = derivatives - np.dot(
+                linear_terms[:, free],
+                np.linalg.lstsq(linear_terms[:, free], derivatives,
+                                rcond=None)[0])
+        return derivatives
+
+    if jacobian is not None:
+        kwargs.setdefault('jac', residuals_jacobian)
+    result = least_squares(residuals,
+                           np.asarray(param_guesses, dtype=float)[~linear],
+                           bounds=(lower[~linear], upper[~linear]),
+                           **kwargs)
+    if not result.success:
+        raise RuntimeError('Optimal parameters not found: ' + result.message)
+    params_optimised = solve_linear_params(result.x)[0]
+
+    # Covariance of all the parameters, from the Jacobian of the model.
+    if jacobian is not None:
+        jacobian_values = jacobian(x_values, *params_optimised)
+    else:
+        jacobian_values = jacobian_of_model(
+            x_values, params_optimised,
+            lambda input_vector: model(input_vector[0], *input_vector[1:]))
+    params_covar = _covariance_from_jacobian(jacobian_values,
+                                             residuals(result.x),
+                                             n_params)
+
+    if stage is not None:
+        instrumentation.add_count(stage, 'fits', 1)
+        instrumentation.add_count(stage, 'model evaluations', model.calls)
+        if jacobian is not None:
+            instrumentation.add_count(stage, 'jacobian evaluations',
+                                      jacobian.calls)
+
+    # Calculate uncertainty (1 SD)
+    params_1sd_err = np.sqrt(np.diag(params_covar))
+
+    return params_optimised, params_covar, params_1sd_err
+
+
 def fit_model_to_experiment(expt,
                             model,
                             param_guesses,
                             param_bounds,
-                            fitlength=400., **kwargs):
+                            fitlength=400., stage=None,
+                            variable_projection=False, **kwargs):
     """Use scipy.optimize.curve_fit to do non-linear least-squares fitting
     of model relative position distribution to an experimental distribution,
     e.g. histogram or kernel density estimation.
@@ -473,6 +698,17 @@ def fit_model_to_experiment(expt,
             in scipy's curve_fit.
         fitlength:
             Maximum distance included in the fit.
+        stage:
+            Optional record of a stage of the run (see instrumentation.py),
+            to which the number of fits and model evaluations are added.
+        variable_projection:
+            If True, and the model declares the parameters it is linear in,
+            fit with fit_model_variable_projection instead, solving the
+            linear parameters exactly at each step.
+        kwargs:
+            Passed on to curve_fit (or least_squares, for variable
+            projection). Unless jac is given, the analytic Jacobian of the
+            model is used if it has one (see model_jacobian).
 
     Returns:
         params_optimised:
@@ -482,6 +718,22 @@ def fit_model_to_experiment(expt,
         params_1sd_error:
             Error (1 SD) on parameters.
     """
+    if variable_projection and linear_parameter_indices(model):
+        return fit_model_variable_projection(expt,
+                                             model,
+                                             param_guesses,
+                                             param_bounds,
+                                             fitlength=fitlength,
+                                             stage=stage,
+                                             **kwargs)
+
+    if 'jac' not in kwargs:
+        kwargs['jac'] = model_jacobian(model)
+    if stage is not None:
+        model = instrumentation.CountCalls(model)
+        if callable(kwargs['jac']):
+            kwargs['jac'] = instrumentation.CountCalls(kwargs['jac'])
+
     # Find estimates and covariances of model parameters
     (params_optimised,
      params_covar) = curve_fit(model,
@@ -492,6 +744,13 @@ def fit_model_to_experiment(expt,
                                **kwargs
                                )
 
+    if stage is not None:
+        instrumentation.add_count(stage, 'fits', 1)
+        instrumentation.add_count(stage, 'model evaluations', model.calls)
+        if callable(kwargs['jac']):
+            instrumentation.add_count(stage, 'jacobian evaluations',
+                                      kwargs['jac'].calls)
+
     # Calculate uncertainty (1 SD)
     params_1sd_err = np.sqrt(np.diag(params_covar))
 
@@ -502,14 +761,62 @@ def fit_model_to_experiment(expt,
     return params_optimised, params_covar, params_1sd_err
 
 
+def jacobian_of_model(x_values,
+                      params_optimised,
+                      vector_input_model,
+                      jacobian=None):
+    """Derivatives of a model relative position distribution with respect to
+    each of its parameters, at all the x_values at once. These come from the
+    analytic Jacobian of the model if it is given, and otherwise from central
+    differences of the model over all the x_values, with one pair of model
+    evaluations for each parameter.
+
+    Args:
+        x_values (numpy array):
+            Distances at which the model is evaluated.
+        params_optimised (numpy array):
+            The parameter values at which the derivatives are found.
+        vector_input_model (function):
+            The model, taking one vector: the x_values followed by the
+            parameters.
+        jacobian (function or None):
+            The analytic Jacobian of the model, taking the x_values and the
+            parameters as separate arguments (see model_jacobian).
+
+    Returns:
+        jacobian_values (numpy array):
+            The derivatives, with shape
+            (number of x_values, number of parameters).
+    """
+    x_values = np.asarray(x_values, dtype=float)
+    params = np.array(params_optimised, dtype=float)
+    if jacobian is not None:
+        return np.broadcast_to(jacobian(x_values, *params),
+                               x_values.shape + params.shape)
+
+    steps = FINITE_DIFFERENCE_STEP * np.maximum(np.abs(params), 1.)
+    columns = []
+    for i, step in enumerate(steps):
+        params_upper = params.copy()
+        params_upper[i] = params_upper[i] + step
+        params_lower = params.copy()
+        params_lower[i] = params_lower[i] - step
+        difference = (vector_input_model([x_values] + list(params_upper))
+                      - vector_input_model([x_values] + list(params_lower)))
+        columns.append(np.broadcast_to(difference / (2 * step),
+                                       x_values.shape))
+    return np.stack(columns, axis=-1)
+
+
 def stdev_of_model(x_values,
                    params_optimised,
                    params_covar,
-                   vector_input_model):
-    """Use automatic differentiation to acquire derivatives, and multiply
-    with covariance matrix to acquire variance, then sd of a model relative
-    position distribution. When numdifftools.Gradient runs, output to screen
-    from the function it is differentiating is suppressed.
+                   vector_input_model,
+                   jacobian=None):
+    """Acquire derivatives of a model relative position distribution with
+    respect to its parameters at all the x_values (see jacobian_of_model),
+    and multiply with covariance matrix to acquire variance, then sd of the
+    model.
 
     Args:
         x_values (numpy array):
@@ -520,10 +827,13 @@ def stdev_of_model(x_values,
         params_covar (numpy array):
             The covariance matrix for the parameters that have been optimised.
         vector_input_model (function):
-            The name of a function that will be passed to
-            numdifftools.Gradient. This function must have one arguments, which
-            is a vector. The first element of the vector is also the vector of
-            x_values.
+            The name of a function with one argument, which is a vector. The
+            first element of the vector is the vector of x_values, and the
+            others are the parameters.
+        jacobian (function or None):
+            The analytic Jacobian of the model, if it has one
+            (see model_jacobian). Otherwise, the derivatives are found by
+            finite differences of vector_input_model.
 
     Returns:
         stdev (numpy array):
@@ -531,30 +841,16 @@ def stdev_of_model(x_values,
             evaluated at each x_value.
 
     """
-    #print('Starting calculation of uncertainty on the model estimates.')
-    #start_time = time.time()
-
-    # We will calculate 1 sd at each x-value
-    stdev = np.zeros(len(x_values))
-
-    for i, x_value in enumerate(x_values):
-
-        # Pass arguments as required for differentiation
-        vector_input = np.concatenate(([x_value], params_optimised))
-        grads = nd.Gradient(vector_input_model)(vector_input)
-
-        # From gradients with respect to each parameter and the covariance
-        # matrix, calculate the total variance.
-        jacobian = grads[1:]
-        variance = np.dot(jacobian, np.dot(params_covar, jacobian))
-        stdev[i] = np.sqrt(variance)
-    
-        # Update
-        # if (i + 1) % 20 == 0:
-        #     time_elapsed = time.time() - start_time
-        #     print('Done ' + repr(i + 1) + ' calculations of '
-        #           + repr(len(x_values)) + ' in '
-        #           + repr(time_elapsed) + '.')
+    jacobian_values = jacobian_of_model(x_values,
+                                        params_optimised,
+                                        vector_input_model,
+                                        jacobian=jacobian)
+
+    # From gradients with respect to each parameter and the covariance
+    # matrix, calculate the total variance at every x_value together.
+    variance = np.sum(np.dot(jacobian_values, params_covar)
+                      * jacobian_values, axis=-1)
+    stdev = np.sqrt(variance)
 
     return stdev
 
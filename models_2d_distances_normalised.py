@@ -71,8 +71,8 @@ def onepeakplusreps_normalised_flat_bg(x_values, dist_1, broadening,
 
 def onepeakplusreps_normalised_flat_bg_vectorinput(vector_input):
     """Version of onepeakplusreps_normalised_flat_bg to take vector input
-    so that numdifftools can calculate the Jacobian, and we can get confidence
-    intervals.
+    so that stdev_of_model can calculate the Jacobian, and we can get
+    confidence intervals.
     """
     (x_values, rep, broadening,
      amp,
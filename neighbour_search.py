@@ -0,0 +1,675 @@
+"""
+neighbour_search.py
+
+Cell-list neighbour search for finding pairs of localisations that lie within
+a filter distance of each other, in 2D or 3D. Used by relative_positions.py
+in place of testing every localisation against the whole data set.
+
+Localisations are binned into square (2D) or cubic (3D) cells with sides of
+length filterdist. Every neighbour within the filter distance of a
+localisation then lies in the same cell or in one of the adjacent cells,
+so only those cells need to be searched. Each pair of localisations is
+enumerated once, and pairs are produced in blocks of bounded size so that
+callers can write them into preallocated output arrays (or accumulate
+histograms) without holding every candidate pair in memory at once.
+
+The test for whether a pair is within the filter distance is the same as in
+the original relative_positions.getdistances: the 'to' localisation must lie
+strictly inside the box of half-width filterdist (in every dimension) about
+the 'from' localisation.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import itertools
+import numpy as np
+
+
+# Maximum number of candidate pairs of localisations handled at once.
+DEFAULT_BLOCK_SIZE = 2 ** 20
+
+# Cells are made very slightly larger than the filter distance, so that
+# rounding when calculating cell coordinates can never put two localisations
+# within the filter distance into cells that are not adjacent.
+CELL_SIZE_TOLERANCE = 1e-9
+
+
+class CellList:
+    """Localisations binned into cells with sides of length filterdist.
+
+    Attributes
+    ----------
+    xyz_values (numpy array):
+        The localisations, shape (N, 2 or 3).
+    filterdist (float):
+        The cell size, equal to the filter distance of the search.
+    dims (int):
+        Number of spatial dimensions (2 or 3).
+    origin (numpy array):
+        Coordinates of the corner of the first cell.
+    grid_shape (numpy array):
+        Number of cells along each axis.
+    cell_ids_per_loc (numpy array):
+        Identifier of the cell containing each localisation
+        (-1 for localisations with non-finite coordinates).
+    order (numpy array):
+        Indices of the (finite) localisations, sorted by cell. Within a cell,
+        indices are in ascending order.
+    cell_ids (numpy array):
+        Sorted unique identifiers of the occupied cells.
+    cell_starts (numpy array):
+        Position in order of the first localisation in each occupied cell.
+    cell_counts (numpy array):
+        Number of localisations in each occupied cell.
+    """
+    def __init__(self, xyz_values, filterdist, origin=None, grid_shape=None):
+        xyz_values = np.asarray(xyz_values)
+        if xyz_values.ndim != 2 or xyz_values.shape[1] not in (2, 3):
+            raise ValueError('Localisations must have shape (N, 2) or (N, 3).')
+        if not filterdist > 0:
+            raise ValueError('The filter distance must be greater than zero.')
+
+        self.xyz_values = xyz_values
+        self.filterdist = filterdist
+        self.dims = xyz_values.shape[1]
+
+        # Localisations with NaN or infinite coordinates can never pass the
+        # filter test, so leave them out of the cells.
+        finite = np.all(np.isfinite(xyz_values), axis=1)
+        finite_indices = np.nonzero(finite)[0]
+        finite_values = xyz_values[finite_indices]
+
+        if origin is None:
+            origin, grid_shape = common_grid(filterdist, xyz_values)
+        self.origin = np.asarray(origin, dtype=float)
+        self.grid_shape = np.asarray(grid_shape, dtype=np.int64)
+
+        cell_coords = cell_coordinates(finite_values, filterdist, self.origin)
+        self.cell_ids_per_loc = np.full(len(xyz_values), -1, dtype=np.int64)
+        self.cell_ids_per_loc[finite_indices] = self.ravel(cell_coords)
+
+        # Stable sort keeps the localisations in each cell in index order.
+        sort_order = np.argsort(self.cell_ids_per_loc[finite_indices],
+                                kind='mergesort')
+        self.order = finite_indices[sort_order]
+        (self.cell_ids,
+         self.cell_starts,
+         self.cell_counts) = np.unique(self.cell_ids_per_loc[self.order],
+                                       return_index=True,
+                                       return_counts=True)
+
+    @property
+    def padded_shape(self):
+        """Grid shape with a layer of empty cells on every side, so that
+        the neighbours of edge cells have valid, unique identifiers."""
+        return self.grid_shape + 2
+
+    def ravel(self, cell_coords):
+        """Convert integer cell coordinates, shape (N, dims), to cell
+        identifiers."""
+        if len(cell_coords) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.ravel_multi_index(tuple((cell_coords + 1).T),
+                                    tuple(self.padded_shape))
+
+    def offset_id(self, offset):
+        """Difference in cell identifier between a cell and its neighbour
+        at an offset of (-1, 0 or 1) cells along each axis."""
+        strides = np.append(np.cumprod(self.padded_shape[:0:-1])[::-1], 1)
+        return int(np.dot(offset, strides))
+
+    def contains(self, xyz_values):
+        """Whether the grid covers all the finite localisations given."""
+        finite_values = xyz_values[np.all(np.isfinite(xyz_values), axis=1)]
+        cell_coords = cell_coordinates(finite_values, self.filterdist, self.origin)
+        return bool(np.all(cell_coords >= 0) and np.all(cell_coords < self.grid_shape))
+
+    def appended(self, xyz_values_new):
+        """The cell list of these localisations followed by xyz_values_new,
+        on the same grid. The new localisations are merged into the sorted
+        cells, rather than sorting all the localisations again, but the
+        result is the same as CellList of all of them.
+
+        Args:
+            xyz_values_new (numpy array):
+                Localisations to add, which must be within the grid (see
+                contains).
+
+        Returns:
+            cells (CellList)
+        """
+        if not self.contains(xyz_values_new):
+            raise ValueError('New localisations must be within the grid of cells.')
+        new_cells = CellList(xyz_values_new, self.filterdist, self.origin, self.grid_shape)
+        cells = CellList.__new__(CellList)
+        cells.xyz_values = np.concatenate((self.xyz_values, new_cells.xyz_values))
+        cells.filterdist = self.filterdist
+        cells.dims = self.dims
+        cells.origin = self.origin
+        cells.grid_shape = self.grid_shape
+        cells.cell_ids_per_loc = np.concatenate((self.cell_ids_per_loc,
+                                                 new_cells.cell_ids_per_loc))
+
+        # New localisations go after the old ones in the same cell, so that
+        # each cell stays in index order.
+        old_sorted = self.cell_ids_per_loc[self.order]
+        new_sorted = new_cells.cell_ids_per_loc[new_cells.order]
+        positions = np.searchsorted(old_sorted, new_sorted, side='right')
+        cells.order = np.insert(self.order, positions,
+                                new_cells.order + len(self.xyz_values))
+        sorted_ids = np.insert(old_sorted, positions, new_sorted)
+
+        if len(sorted_ids) == 0:
+            cells.cell_starts = np.zeros(0, dtype=np.int64)
+        else:
+            cells.cell_starts = np.append(0, np.flatnonzero(np.diff(sorted_ids)) + 1)
+        cells.cell_ids = sorted_ids[cells.cell_starts]
+        cells.cell_counts = np.diff(np.append(cells.cell_starts, len(sorted_ids)))
+        return cells
+
+
+def common_grid(filterdist, *xyz_arrays):
+    """Find a grid of cells with sides of length filterdist that covers all
+    the finite localisations in one or more arrays, so that localisations
+    from different arrays can be binned into the same cells.
+
+    Args:
+        filterdist (float):
+            The cell size.
+        xyz_arrays (numpy arrays):
+            Localisations, each of shape (N, dims).
+
+    Returns:
+        origin (numpy array):
+            Coordinates of the corner of the first cell.
+        grid_shape (numpy array):
+            Number of cells along each axis.
+    """
+    dims = xyz_arrays[0].shape[1]
+    finite_values = [values[np.all(np.isfinite(values), axis=1)]
+                     for values in xyz_arrays]
+    finite_values = [values for values in finite_values if len(values) > 0]
+    if len(finite_values) == 0:
+        return np.zeros(dims), np.ones(dims, dtype=np.int64)
+
+    mins = np.min([np.min(values, axis=0) for values in finite_values], axis=0)
+    maxs = np.max([np.max(values, axis=0) for values in finite_values], axis=0)
+    origin = mins.astype(float)
+    grid_shape = cell_coordinates(maxs[np.newaxis, :], filterdist, origin)[0] + 1
+
+    if np.prod((grid_shape + 2).astype(float)) >= np.iinfo(np.int64).max:
+        raise ValueError('The filter distance is too small for the extent of '
+                         'the data to be divided into cells.')
+
+    return origin, grid_shape
+
+
+def cell_coordinates(xyz_values, filterdist, origin):
+    """Integer coordinates of the cells containing localisations."""
+    cell_size = filterdist * (1. + CELL_SIZE_TOLERANCE)
+    return np.floor((xyz_values - origin) / cell_size).astype(np.int64)
+
+
+def neighbour_offsets(dims, half=False):
+    """Offsets (in cells) from a cell to itself and its adjacent cells.
+
+    Args:
+        dims (int):
+            Number of spatial dimensions.
+        half (Boolean):
+            If True, return only the zero offset and the offsets that are
+            lexicographically positive, so that each pair of adjacent cells
+            is visited once.
+
+    Returns:
+        offsets (list of tuples):
+            The offsets, starting with the zero offset.
+    """
+    offsets = [offset for offset in itertools.product((-1, 0, 1), repeat=dims)
+               if offset >= (0,) * dims or not half]
+    offsets.sort(key=lambda offset: offset != (0,) * dims)
+    return offsets
+
+
+def _split_cell_pairs(a_starts, a_counts, b_counts, block_size):
+    """Split pairs of cells whose localisations would give more than
+    block_size candidate pairs into several pairs of cells, each using a
+    subset of the localisations in the first cell.
+
+    Returns:
+        unit (numpy array):
+            For each new pair of cells, the index of the original pair.
+        a_starts, a_counts (numpy arrays):
+            The new starts and counts for the first cell of each pair.
+    """
+    rows_per_unit = np.maximum(1, block_size // np.maximum(b_counts, 1))
+    units_per_pair = -(-a_counts // rows_per_unit)
+    unit = np.repeat(np.arange(len(a_counts)), units_per_pair)
+    sub_index = (np.arange(len(unit))
+                 - np.repeat(np.cumsum(units_per_pair) - units_per_pair,
+                             units_per_pair))
+    first_row = sub_index * rows_per_unit[unit]
+    new_a_starts = a_starts[unit] + first_row
+    new_a_counts = np.minimum(rows_per_unit[unit], a_counts[unit] - first_row)
+    return unit, new_a_starts, new_a_counts
+
+
+def _expand_cell_pairs(a_starts, a_counts, b_starts, b_counts, block_size):
+    """Generate every pairing of a localisation in one cell with a
+    localisation in another cell, for many pairs of cells at once.
+
+    Yields:
+        a_positions, b_positions (numpy arrays):
+            Positions (in the order attributes of the cell lists) of the
+            localisations in each candidate pair, at most block_size pairs
+            (or one pair of cells' worth) at a time.
+    """
+    totals = a_counts * b_counts
+    cumulative = np.cumsum(totals)
+    n_pairs_of_cells = len(totals)
+    low = 0
+    while low < n_pairs_of_cells:
+        already = cumulative[low] - totals[low]
+        high = int(np.searchsorted(cumulative, already + block_size,
+                                   side='right'))
+        high = max(high, low + 1)
+
+        block_totals = totals[low:high]
+        n_candidates = int(np.sum(block_totals))
+        if n_candidates > 0:
+            first = np.repeat(np.cumsum(block_totals) - block_totals,
+                              block_totals)
+            local = np.arange(n_candidates, dtype=np.int64) - first
+            b_count_each = np.repeat(b_counts[low:high], block_totals)
+            a_positions = (np.repeat(a_starts[low:high], block_totals)
+                           + local // b_count_each)
+            b_positions = (np.repeat(b_starts[low:high], block_totals)
+                           + local % b_count_each)
+            yield a_positions, b_positions
+        low = high
+
+
+def _matching_cells(cells_a, cells_b, offset):
+    """Find occupied cells in cells_b at an offset from occupied cells
+    in cells_a (both on the same grid).
+
+    Returns:
+        a_index, b_index (numpy arrays):
+            Indices into cell_ids of cells_a and cells_b for each match.
+    """
+    if len(cells_a.cell_ids) == 0 or len(cells_b.cell_ids) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    targets = cells_a.cell_ids + cells_a.offset_id(offset)
+    b_index = np.searchsorted(cells_b.cell_ids, targets)
+    b_index_clipped = np.minimum(b_index, len(cells_b.cell_ids) - 1)
+    found = cells_b.cell_ids[b_index_clipped] == targets
+    return np.nonzero(found)[0], b_index[found]
+
+
+def iter_candidate_pairs(cells_a, cells_b=None, block_size=DEFAULT_BLOCK_SIZE,
+                         cell_mask=None):
+    """Generate pairs of localisations in the same or adjacent cells.
+
+    Args:
+        cells_a (CellList):
+            Cells containing the 'from' localisations.
+        cells_b (CellList):
+            Cells (on the same grid) containing the 'to' localisations.
+            If None, pairs are found within cells_a, each unordered pair of
+            different localisations once, with i < j.
+        block_size (int):
+            Approximate maximum number of candidate pairs per block.
+        cell_mask (numpy array of Booleans):
+            Optional selection of the occupied cells of cells_a whose
+            localisations are used as the 'from' (or, within one set,
+            first) localisation of a pair. Used to divide the search
+            between tiles.
+
+    Yields:
+        i_values, j_values (numpy arrays):
+            Indices of the localisations in each candidate pair,
+            into cells_a.xyz_values and cells_b.xyz_values.
+    """
+    single_set = cells_b is None
+    if single_set:
+        cells_b = cells_a
+
+    for offset in neighbour_offsets(cells_a.dims, half=single_set):
+        a_index, b_index = _matching_cells(cells_a, cells_b, offset)
+        if cell_mask is not None:
+            keep = cell_mask[a_index]
+            a_index, b_index = a_index[keep], b_index[keep]
+        if len(a_index) == 0:
+            continue
+
+        b_counts = cells_b.cell_counts[b_index]
+        (unit,
+         a_starts,
+         a_counts) = _split_cell_pairs(cells_a.cell_starts[a_index],
+                                       cells_a.cell_counts[a_index],
+                                       b_counts,
+                                       block_size)
+        same_cell = single_set and not any(offset)
+
+        for a_positions, b_positions in _expand_cell_pairs(
+                a_starts, a_counts,
+                cells_b.cell_starts[b_index][unit], b_counts[unit],
+                block_size):
+            if same_cell:
+                # Each pair within a cell once, without self-pairs.
+                upper = a_positions < b_positions
+                a_positions = a_positions[upper]
+                b_positions = b_positions[upper]
+            i_values = cells_a.order[a_positions]
+            j_values = cells_b.order[b_positions]
+            if single_set and not same_cell:
+                i_values, j_values = (np.minimum(i_values, j_values),
+                                      np.maximum(i_values, j_values))
+            yield i_values, j_values
+
+
+def candidate_pair_counts(cells_a, cells_b=None):
+    """Count the candidate pairs that iter_candidate_pairs would generate,
+    without generating them.
+
+    Args:
+        cells_a (CellList):
+            Cells containing the 'from' localisations.
+        cells_b (CellList):
+            Optional cells (on the same grid) containing the 'to'
+            localisations, as for iter_candidate_pairs.
+
+    Returns:
+        counts (numpy array):
+            For each occupied cell of cells_a, the number of candidate pairs
+            with their 'from' (or, within one set, first) localisation in
+            that cell.
+    """
+    single_set = cells_b is None
+    if single_set:
+        cells_b = cells_a
+
+    counts = np.zeros(len(cells_a.cell_ids), dtype=np.int64)
+    for offset in neighbour_offsets(cells_a.dims, half=single_set):
+        a_index, b_index = _matching_cells(cells_a, cells_b, offset)
+        a_counts = cells_a.cell_counts[a_index]
+        if single_set and not any(offset):
+            # Each pair within a cell once, without self-pairs.
+            counts[a_index] += a_counts * (a_counts - 1) // 2
+        else:
+            counts[a_index] += a_counts * cells_b.cell_counts[b_index]
+    return counts
+
+
+def within_filter(xyz_from, xyz_to, filterdist):
+    """Test whether localisations are within the filter distance of each
+    other, in the same way as the original relative_positions.getdistances:
+    the 'to' localisation must lie strictly inside the box of half-width
+    filterdist, in every dimension, about the 'from' localisation.
+
+    Args:
+        xyz_from, xyz_to (numpy arrays):
+            Matching rows of 'from' and 'to' localisations, shape (N, dims).
+        filterdist (float):
+            The filter distance.
+
+    Returns:
+        numpy array of Booleans, one per row.
+    """
+    return np.all(np.logical_and(xyz_to > xyz_from - filterdist,
+                                 xyz_to < xyz_from + filterdist),
+                  axis=1)
+
+
+def iter_neighbour_pairs(xyz_values, filterdist, block_size=DEFAULT_BLOCK_SIZE,
+                         cells=None, cell_mask=None):
+    """Generate every pair of localisations within the filter distance of
+    each other, once per pair.
+
+    A pair is accepted if it passes within_filter with either localisation
+    as the reference. For pairs not within rounding error of the filter
+    boundary, the two tests always agree.
+
+    Args:
+        xyz_values (numpy array):
+            Localisations, shape (N, 2 or 3).
+        filterdist (float):
+            The filter distance.
+        block_size (int):
+            Approximate maximum number of candidate pairs per block.
+        cells (CellList):
+            Optional, previously built cell list for xyz_values.
+        cell_mask (numpy array of Booleans):
+            Optional selection of occupied cells, see iter_candidate_pairs.
+
+    Yields:
+        i_values, j_values (numpy arrays):
+            Indices of the localisations in each pair, with i < j.
+    """
+    if cells is None:
+        cells = CellList(xyz_values, filterdist)
+    for i_values, j_values in iter_candidate_pairs(cells,
+                                                   block_size=block_size,
+                                                   cell_mask=cell_mask):
+        xyz_i = xyz_values[i_values]
+        xyz_j = xyz_values[j_values]
+        accept = np.logical_and(within_filter(xyz_i, xyz_j, filterdist),
+                                within_filter(xyz_j, xyz_i, filterdist))
+        if np.any(accept):
+            yield i_values[accept], j_values[accept]
+
+
+def iter_neighbour_pairs_between(xyz_values_start, xyz_values_end, filterdist,
+                                 block_size=DEFAULT_BLOCK_SIZE,
+                                 cells=None, cell_mask=None):
+    """Generate every pair of a 'from' localisation and a 'to' localisation
+    within the filter distance of it.
+
+    Args:
+        xyz_values_start (numpy array):
+            'From' localisations, shape (N, 2 or 3).
+        xyz_values_end (numpy array):
+            'To' localisations, shape (M, 2 or 3).
+        filterdist (float):
+            The filter distance.
+        block_size (int):
+            Approximate maximum number of candidate pairs per block.
+        cells (tuple of two CellLists):
+            Optional, previously built cell lists for the 'from' and 'to'
+            localisations, on the same grid.
+        cell_mask (numpy array of Booleans):
+            Optional selection of occupied 'from' cells,
+            see iter_candidate_pairs.
+
+    Yields:
+        i_values, j_values (numpy arrays):
+            Indices of the 'from' and 'to' localisations in each pair.
+    """
+    if cells is None:
+        cells = cell_lists_between(xyz_values_start, xyz_values_end, filterdist)
+    cells_start, cells_end = cells
+    for i_values, j_values in iter_candidate_pairs(cells_start, cells_end,
+                                                   block_size=block_size,
+                                                   cell_mask=cell_mask):
+        accept = within_filter(xyz_values_start[i_values],
+                               xyz_values_end[j_values],
+                               filterdist)
+        if np.any(accept):
+            yield i_values[accept], j_values[accept]
+
+
+def iter_channel_pairs(xyz_values, channel_ids, filterdist,
+                       block_size=DEFAULT_BLOCK_SIZE, cells=None, cell_mask=None):
+    """Generate, from one search of localisations in several colour channels,
+    the pairs of localisations within the filter distance for every
+    combination of a 'from' channel and a 'to' channel.
+
+    Pairs in the same channel are tested and given once per pair, as by
+    iter_neighbour_pairs for that channel alone. Pairs in different channels
+    are tested in each direction, as by iter_neighbour_pairs_between from one
+    channel to the other, and given once for each direction that passes.
+
+    Args:
+        xyz_values (numpy array):
+            Localisations in all channels, shape (N, 2 or 3).
+        channel_ids (numpy array of ints):
+            The channel of each localisation.
+        filterdist (float):
+            The filter distance.
+        block_size (int):
+            Approximate maximum number of candidate pairs per block.
+        cells (CellList):
+            Optional, previously built cell list for xyz_values.
+        cell_mask (numpy array of Booleans):
+            Optional selection of occupied cells, see iter_candidate_pairs.
+
+    Yields:
+        i_values, j_values (numpy arrays):
+            Indices of the 'from' and 'to' localisations in each pair
+            (with i < j for pairs in the same channel).
+    """
+    if cells is None:
+        cells = CellList(xyz_values, filterdist)
+    for i_values, j_values in iter_candidate_pairs(cells,
+                                                   block_size=block_size,
+                                                   cell_mask=cell_mask):
+        xyz_i = xyz_values[i_values]
+        xyz_j = xyz_values[j_values]
+        forward = within_filter(xyz_i, xyz_j, filterdist)
+        backward = within_filter(xyz_j, xyz_i, filterdist)
+        same_channel = channel_ids[i_values] == channel_ids[j_values]
+        forward &= backward | ~same_channel
+        backward &= ~same_channel
+        if np.any(forward) or np.any(backward):
+            yield (np.concatenate((i_values[forward], j_values[backward])),
+                   np.concatenate((j_values[forward], i_values[backward])))
+
+
+def cell_lists_between(xyz_values_start, xyz_values_end, filterdist):
+    """Build cell lists on a common grid for 'from' and 'to' localisations."""
+    origin, grid_shape = common_grid(filterdist, xyz_values_start, xyz_values_end)
+    return (CellList(xyz_values_start, filterdist, origin, grid_shape),
+            CellList(xyz_values_end, filterdist, origin, grid_shape))
+
+
+def pair_separations(xyz_from, xyz_to, i_values, j_values, columns=3):
+    """Vectors from 'from' localisations to 'to' localisations, written into
+    a preallocated array with zeros in any columns beyond the spatial
+    dimensions of the data (e.g. Z for 2D data).
+
+    Args:
+        xyz_from, xyz_to (numpy arrays):
+            Localisations, shape (N, dims) and (M, dims).
+        i_values, j_values (numpy arrays):
+            Indices into xyz_from and xyz_to of each pair.
+        columns (int):
+            Number of columns in the output.
+
+    Returns:
+        separation_values (numpy array):
+            Vectors xyz_to[j] - xyz_from[i], shape (len(i_values), columns).
+    """
+    dims = xyz_from.shape[1]
+    dtype = np.result_type(xyz_from, xyz_to)
+    if dims < columns:
+        dtype = np.result_type(dtype, np.float64)
+    separation_values = np.zeros((len(i_values), columns), dtype=dtype)
+    np.subtract(xyz_to[j_values], xyz_from[i_values],
+                out=separation_values[:, :dims])
+    return separation_values
+
+
+def coincident_counts(xyz_values_start, xyz_values_end):
+    """For each 'from' localisation, the number of 'to' localisations at
+    exactly the same position (giving a [0, 0, 0] vector).
+
+    Args:
+        xyz_values_start (numpy array):
+            'From' localisations, shape (N, 2 or 3).
+        xyz_values_end (numpy array):
+            'To' localisations, shape (M, 2 or 3).
+
+    Returns:
+        counts (numpy array of ints), length N.
+    """
+    if len(xyz_values_start) == 0 or len(xyz_values_end) == 0:
+        return np.zeros(len(xyz_values_start), dtype=np.int64)
+    positions = np.concatenate((xyz_values_start, xyz_values_end))
+    position_ids = np.unique(positions, axis=0, return_inverse=True)[1].reshape(-1)
+    end_counts = np.bincount(position_ids[len(xyz_values_start):],
+                             minlength=position_ids.max() + 1)
+    return end_counts[position_ids[:len(xyz_values_start)]]
+
+
+def nonzero_separations(separation_values):
+    """Select vectors that are not [0, 0, 0], i.e. that are not between
+    localisations at identical positions."""
+    return np.any(separation_values != 0, axis=1)
+
+
+def canonical_orientation(separation_values):
+    """Reverse, in place, any vectors that are lexicographically negative
+    (first non-zero component negative), so that of the two vectors between
+    a pair of localisations, the same one is always kept. Zero components
+    remain +0.0, as they would for the vector calculated in the other
+    direction.
+
+    Args:
+        separation_values (numpy array):
+            Vectors, one per row.
+
+    Returns:
+        separation_values (numpy array):
+            The same array, modified.
+    """
+    negative = np.zeros(len(separation_values), dtype=bool)
+    leading_zeros = np.ones(len(separation_values), dtype=bool)
+    for column in range(separation_values.shape[1]):
+        negative |= leading_zeros & (separation_values[:, column] < 0)
+        leading_zeros &= separation_values[:, column] == 0
+    separation_values[negative] = 0. - separation_values[negative]
+    return separation_values
+
+
+def lexicographic_order(separation_values):
+    """Indices that sort vectors by X, then Y, then Z.
+
+    Sorts on X only, then sorts the (usually few) runs of equal X by the
+    remaining columns, which is much faster than numpy.lexsort on all
+    columns. Vectors equal in every column may appear in any order.
+    """
+    order = np.argsort(separation_values[:, 0])
+    if len(order) < 2 or separation_values.shape[1] < 2:
+        return order
+
+    x_sorted = separation_values[order, 0]
+    same_as_previous = x_sorted[1:] == x_sorted[:-1]
+    if not np.any(same_as_previous):
+        return order
+
+    # Positions in runs of equal X, numbered by run.
+    in_run = np.zeros(len(order), dtype=bool)
+    in_run[1:] |= same_as_previous
+    in_run[:-1] |= same_as_previous
+    positions = np.nonzero(in_run)[0]
+    run_starts = np.ones(len(positions), dtype=bool)
+    run_starts[1:] = ~same_as_previous[positions[1:] - 1]
+    run_numbers = np.cumsum(run_starts)
+
+    tied = order[positions]
+    keys = [separation_values[tied, column]
+            for column in range(separation_values.shape[1] - 1, 0, -1)]
+    order[positions] = tied[np.lexsort(keys + [run_numbers])]
+    return order
@@ -0,0 +1,313 @@
+"""
+pair_correlation.py
+
+Vectorised pair-correlation kernels of Churchman, Biophys J 90, 668-671
+(2006): the apparent density of separations between repeated localisations
+of two fluorophores with true separation rmean, when each localisation is
+spread by a Gaussian. sigma is the sum in quadrature of the spread for each
+fluorophore, so sigma ** 2 = 2 * loc.prec ** 2 for repeated localisations of
+the same molecule.
+
+Each density is a Gaussian term exp(-(rmean ** 2 + r ** 2) / (2 sigma ** 2))
+times a term that grows exponentially with r * rmean / sigma ** 2 (cosh in
+1D, the Bessel function i0 in 2D and sinh in 3D). Here the two are combined
+in log space, as exp(-(|r| - |rmean|) ** 2 / (2 sigma ** 2)) times the
+exponentially scaled cosh, i0 (scipy.special.i0e) or sinh, which are between
+0 and 1. Nothing can overflow, so the same expression is used for all
+separations, without switching to an approximation for large separations,
+and the results are the same as the direct formulae where those can be
+evaluated. In 1D, this is simply the sum of Gaussians at zmean and -zmean.
+
+All the arguments can be numpy arrays (broadcast against each other) or
+single numbers. sum_pair_correlations adds the densities for many peaks,
+e.g. one per distance between the vertices of a structure, in one
+evaluation over all the separations and peaks.
+
+pair_correlation_derivatives and sum_pair_correlations_derivatives give the
+derivatives of the densities with respect to rmean and sigma (and the
+amplitudes), from which analytic Jacobians of the models are built for
+fitting.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import numpy as np
+from scipy.special import i0e, i1e
+
+
+# Smallest argument used for sinh(x) / x, which is 1 at x = 0.
+_TINY = 1e-300
+
+# Below this, coth(x) - 1 / x is found from its series, to avoid cancellation.
+_LANGEVIN_SERIES_LIMIT = 0.1
+
+# Largest number of density values (separations x peaks) evaluated at once by
+# sum_pair_correlations (about 8 MB per array of float64).
+MAX_KERNEL_ELEMENTS = 2 ** 20
+
+
+def _scaled_gaussian(r, rmean, sigma):
+    """exp(-(rmean ** 2 + r ** 2) / (2 sigma ** 2)) * exp(|r * rmean| / sigma ** 2),
+    and the argument r * rmean / sigma ** 2."""
+    argument = r * rmean / sigma ** 2
+    gaussian = np.exp(-(np.abs(r) - np.abs(rmean)) ** 2 / (2 * sigma ** 2))
+    return gaussian, argument
+
+
+def pair_correlation_1d(z, zmean, sigma):
+    """Apparent density of separations z (z >= 0) in 1D for two repeatedly
+    localised fluorophores with true separation zmean:
+    sqrt(2 / pi) / sigma * exp(-(zmean ** 2 + z ** 2) / (2 * sigma ** 2))
+    * cosh(zmean * z / sigma ** 2).
+
+    Args:
+        z (numpy array or float): Separations at which to evaluate the density.
+        zmean (numpy array or float): The true separation.
+        sigma (numpy array or float): The spread of the separations.
+
+    Returns:
+        p (numpy array or float): The density at z.
+    """
+    # exp(-(zmean ** 2 + z ** 2) / (2 * sigma ** 2)) * cosh(zmean * z / sigma ** 2)
+    # is the mean of two Gaussians, at zmean and -zmean.
+    two_variance = 2 * sigma ** 2
+    return (np.exp(-(z - zmean) ** 2 / two_variance)
+            + np.exp(-(z + zmean) ** 2 / two_variance)) / (np.sqrt(2 * np.pi) * sigma)
+
+
+def pair_correlation_2d(r, rmean, sigma):
+    """Apparent density of separations r in 2D for two repeatedly localised
+    fluorophores with true separation rmean:
+    r / sigma ** 2 * exp(-(rmean ** 2 + r ** 2) / (2 * sigma ** 2))
+    * i0(r * rmean / sigma ** 2).
+
+    Args:
+        r (numpy array or float): Separations at which to evaluate the density.
+        rmean (numpy array or float): The true separation.
+        sigma (numpy array or float): The spread of the separations.
+
+    Returns:
+        p (numpy array or float): The density at r.
+    """
+    gaussian, argument = _scaled_gaussian(r, rmean, sigma)
+    return r / sigma ** 2 * gaussian * i0e(argument)
+
+
+def pair_correlation_2d_standardised(r, rmean, sigma):
+    """pair_correlation_2d divided by r, e.g. for the density of relative
+    positions per unit area rather than per unit distance. This is finite
+    at r = 0.
+
+    Args:
+        r (numpy array or float): Separations at which to evaluate the density.
+        rmean (numpy array or float): The true separation.
+        sigma (numpy array or float): The spread of the separations.
+
+    Returns:
+        p (numpy array or float): The density at r, divided by r.
+    """
+    gaussian, argument = _scaled_gaussian(r, rmean, sigma)
+    return gaussian * i0e(argument) / sigma ** 2
+
+
+def pair_correlation_3d(r, rmean, sigma):
+    """Apparent density of separations r in 3D for two repeatedly localised
+    fluorophores with true separation rmean:
+    sqrt(2 / pi) * r / (sigma * rmean)
+    * exp(-(rmean ** 2 + r ** 2) / (2 * sigma ** 2))
+    * sinh(r * rmean / sigma ** 2),
+    which is sqrt(2 / pi) * r ** 2 / sigma ** 3
+    * exp(-r ** 2 / (2 * sigma ** 2)) when rmean = 0.
+
+    Args:
+        r (numpy array or float): Separations at which to evaluate the density.
+        rmean (numpy array or float): The true separation.
+        sigma (numpy array or float): The spread of the separations.
+
+    Returns:
+        p (numpy array or float): The density at r.
+    """
+    gaussian, argument = _scaled_gaussian(r, rmean, sigma)
+    # sinh(x) / x * exp(-|x|), which is 1 at x = 0.
+    twice = np.maximum(2. * np.abs(argument), _TINY)
+    scaled_sinhc = -np.expm1(-twice) / twice
+    return np.sqrt(2 / np.pi) * r ** 2 / sigma ** 3 * gaussian * scaled_sinhc
+
+
+_KERNELS = {1: pair_correlation_1d,
+            2: pair_correlation_2d,
+            3: pair_correlation_3d}
+
+
+def sum_pair_correlations(r, peak_means, sigmas, amplitudes=1., dims=2,
+                          max_elements=MAX_KERNEL_ELEMENTS):
+    """Sum of the pair-correlation densities for several peaks, e.g. one for
+    each distance between the vertices of a structure. The densities for all
+    the peaks are evaluated together, in chunks of peaks with up to
+    max_elements values.
+
+    Args:
+        r (numpy array or float): Separations at which to evaluate the sum.
+        peak_means (numpy array or float):
+            The true separation for each peak.
+        sigmas (numpy array or float):
+            The spread of the separations, for all peaks or for each peak.
+        amplitudes (numpy array or float):
+            The amplitude of the density, for all peaks or for each peak.
+        dims (int): 1, 2 or 3, the dimensions of the separations.
+        max_elements (int):
+            The most density values to hold in memory at once.
+
+    Returns:
+        rpd (numpy array or float):
+            The sum of the densities at r, with the shape of r.
+    """
+    try:
+        kernel = _KERNELS[dims]
+    except KeyError:
+        raise ValueError('dims must be 1, 2 or 3, not %s' % dims)
+    r = np.asarray(r)
+    peak_means, sigmas, amplitudes = [
+        np.ravel(values) for values in np.broadcast_arrays(peak_means,
+                                                           sigmas,
+                                                           amplitudes)]
+    r_values = r.ravel()[:, np.newaxis]
+    rpd = np.zeros(len(r_values),
+                   dtype=np.result_type(r, peak_means, sigmas, amplitudes, 1.))
+    chunk = max(1, max_elements // max(len(r_values), 1))
+    for start in range(0, len(peak_means), chunk):
+        peaks = slice(start, start + chunk)
+        rpd += kernel(r_values, peak_means[peaks], sigmas[peaks]).dot(amplitudes[peaks])
+    return rpd.reshape(r.shape)[()]
+
+
+def _langevin(x):
+    """coth(x) - 1 / x, which is x / 3 for small x."""
+    x = np.asarray(x, dtype=float)
+    small = np.abs(x) < _LANGEVIN_SERIES_LIMIT
+    safe_x = np.where(small, 1., x)
+    x_squared = x ** 2
+    series = x * (1. / 3. - x_squared * (1. / 45. - x_squared
+                                           * (2. / 945. - x_squared / 4725.)))
+    return np.where(small, series, 1. / np.tanh(safe_x) - 1. / safe_x)
+
+
+def pair_correlation_derivatives(r, rmean, sigma, dims=2):
+    """The pair-correlation density (pair_correlation_1d, _2d or _3d) and
+    its derivatives with respect to rmean and sigma.
+
+    Args:
+        r (numpy array or float): Separations at which to evaluate the density.
+        rmean (numpy array or float): The true separation.
+        sigma (numpy array or float): The spread of the separations.
+        dims (int): 1, 2 or 3, the dimensions of the separations.
+
+    Returns:
+        p (numpy array or float): The density at r.
+        dp_drmean (numpy array or float):
+            The derivative of the density with respect to rmean.
+        dp_dsigma (numpy array or float):
+            The derivative of the density with respect to sigma.
+    """
+    if dims == 1:
+        # Two Gaussians, at rmean and -rmean.
+        below = r - rmean
+        above = r + rmean
+        scale = 1. / (np.sqrt(2 * np.pi) * sigma)
+        gauss_below = scale * np.exp(-below ** 2 / (2 * sigma ** 2))
+        gauss_above = scale * np.exp(-above ** 2 / (2 * sigma ** 2))
+        p = gauss_below + gauss_above
+        dp_drmean = (gauss_below * below - gauss_above * above) / sigma ** 2
+        dp_dsigma = ((gauss_below * below ** 2 + gauss_above * above ** 2)
+                     / sigma ** 3 - p / sigma)
+        return p, dp_drmean, dp_dsigma
+
+    if dims == 2:
+        p = pair_correlation_2d(r, rmean, sigma)
+        gaussian, argument = _scaled_gaussian(r, rmean, sigma)
+        # i1(x) / i0(x), the derivative of log(i0(x)).
+        bessel_ratio = i1e(argument) / i0e(argument)
+        dlogp_drmean = (r * bessel_ratio - rmean) / sigma ** 2
+        dlogp_dsigma = (-2. / sigma + (r ** 2 + rmean ** 2) / sigma ** 3
+                        - 2. * argument * bessel_ratio / sigma)
+    elif dims == 3:
+        p = pair_correlation_3d(r, rmean, sigma)
+        gaussian, argument = _scaled_gaussian(r, rmean, sigma)
+        # The derivative of log(sinh(x) / x) is coth(x) - 1 / x.
+        langevin = _langevin(argument)
+        dlogp_drmean = (r * langevin - rmean) / sigma ** 2
+        dlogp_dsigma = (-3. / sigma + (r ** 2 + rmean ** 2) / sigma ** 3
+                        - 2. * argument * langevin / sigma)
+    else:
+        raise ValueError('dims must be 1, 2 or 3, not %s' % dims)
+    return p, p * dlogp_drmean, p * dlogp_dsigma
+
+
+def zero_separation_derivatives(r, spread, amplitude=1., dims=2):
+    """Derivatives of amplitude * the pair-correlation density with true
+    separation 0 and sigma = sqrt(2) * spread, as for repeated localisations
+    of the same molecule with localisation precision spread, or for
+    unresolvable substructure, with respect to spread and amplitude.
+
+    Args:
+        r (numpy array or float): Separations at which to evaluate the density.
+        spread (float): The spread of each localisation.
+        amplitude (float): The amplitude of the density.
+        dims (int): 1, 2 or 3, the dimensions of the separations.
+
+    Returns:
+        derivatives (list):
+            The derivatives with respect to spread and to amplitude.
+    """
+    p, _, dp_dsigma = pair_correlation_derivatives(r, 0., np.sqrt(2) * spread,
+                                                   dims)
+    return [amplitude * np.sqrt(2) * dp_dsigma, p]
+
+
+def sum_pair_correlations_derivatives(r, peak_means, sigmas, amplitudes=1.,
+                                      dims=2):
+    """The sum of pair-correlation densities (see sum_pair_correlations),
+    with its derivatives with respect to the mean, sigma and amplitude of
+    each peak, from which the Jacobian of a model is found with the chain
+    rule.
+
+    Args:
+        r (numpy array or float): Separations at which to evaluate the sum.
+        peak_means (numpy array or float):
+            The true separation for each peak.
+        sigmas (numpy array or float):
+            The spread of the separations, for all peaks or for each peak.
+        amplitudes (numpy array or float):
+            The amplitude of the density, for all peaks or for each peak.
+        dims (int): 1, 2 or 3, the dimensions of the separations.
+
+    Returns:
+        rpd (numpy array or float):
+            The sum of the densities at r, with the shape of r.
+        d_means, d_sigmas, d_amplitudes (numpy arrays):
+            The derivatives of the sum with respect to the mean, sigma and
+            amplitude of each peak, with shape r.shape + (number of peaks,).
+    """
+    peak_means, sigmas, amplitudes = [
+        np.ravel(values) for values in np.broadcast_arrays(peak_means,
+                                                           sigmas,
+                                                           amplitudes)]
+    r_values = np.asarray(r)[..., np.newaxis]
+    p, dp_dmeans, dp_dsigmas = pair_correlation_derivatives(r_values,
+                                                            peak_means,
+                                                            sigmas, dims)
+    return (p.dot(amplitudes)[()],
+            dp_dmeans * amplitudes,
+            dp_dsigmas * amplitudes,
+            p)
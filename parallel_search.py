@@ -0,0 +1,260 @@
+"""
+parallel_search.py
+
+Runs the cell-list neighbour search (neighbour_search.py) on several
+processes at once, by dividing the field of view into tiles.
+
+Tiles are slabs of whole cells along X. Each tile owns the localisations in
+its slab, and also sees those in the cells either side of it (a halo of
+width filterdist), so that every pair of localisations within the filter
+distance is found by the tile that owns its first ('from') localisation,
+and by no other tile.
+
+The localisations are copied once into shared memory, so that worker
+processes read them without each receiving a pickled copy. Each tile is
+processed by a function that returns a result for the tile (e.g. its
+relative positions, or histograms of them), and the results are returned in
+tile order, so that callers can combine them in a way that does not depend
+on how many workers were used.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import multiprocessing
+import numpy as np
+import neighbour_search
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+# Number of tiles per worker, so that workers finishing sparse tiles early
+# can go on to others.
+TILES_PER_WORKER = 4
+
+# Shared arrays attached in a worker process, by name.
+_WORKER_ARRAYS = {}
+
+
+class Tile:
+    """A slab of cells, with the localisations it owns and those in its
+    halo.
+
+    For a search within one set of localisations:
+        xyz_values (numpy array):
+            Localisations in the tile and its halo.
+        indices (numpy array):
+            Their indices in the full set of localisations, in ascending
+            order.
+        cells (CellList):
+            Cells of xyz_values, on the grid used for the whole data set.
+        cell_mask (numpy array of Booleans):
+            Which of the occupied cells are owned by the tile.
+
+    For a search from one set of localisations to another:
+        xyz_values_start, start_indices:
+            'From' localisations owned by the tile, and their indices.
+        xyz_values_end, end_indices:
+            'To' localisations in the tile and its halo, and their indices.
+        cells (tuple of two CellLists):
+            Cells of the 'from' and 'to' localisations.
+    """
+    def __init__(self, filterdist, origin, grid_shape, cell_range,
+                 xyz_values, x_sorted, xyz_values_end=None, x_sorted_end=None):
+        self.filterdist = filterdist
+        self.cell_range = cell_range
+        first, last = cell_range
+        self.dims = xyz_values.shape[1]
+
+        if xyz_values_end is None:
+            self.indices = _indices_in_cells(x_sorted, first - 1, last + 1)
+            self.xyz_values = xyz_values[self.indices]
+            self.cells = neighbour_search.CellList(self.xyz_values, filterdist,
+                                                   origin, grid_shape)
+            cell_x = np.unravel_index(self.cells.cell_ids,
+                                      tuple(self.cells.padded_shape))[0] - 1
+            self.cell_mask = (cell_x >= first) & (cell_x < last)
+        else:
+            self.start_indices = _indices_in_cells(x_sorted, first, last)
+            self.end_indices = _indices_in_cells(x_sorted_end, first - 1, last + 1)
+            self.xyz_values_start = xyz_values[self.start_indices]
+            self.xyz_values_end = xyz_values_end[self.end_indices]
+            self.cells = (neighbour_search.CellList(self.xyz_values_start,
+                                                    filterdist, origin, grid_shape),
+                          neighbour_search.CellList(self.xyz_values_end,
+                                                    filterdist, origin, grid_shape))
+
+    def neighbour_pairs(self, block_size=neighbour_search.DEFAULT_BLOCK_SIZE):
+        """Pairs of localisations within the filter distance, with the first
+        localisation owned by the tile, as indices into xyz_values (i < j)."""
+        return neighbour_search.iter_neighbour_pairs(
+            self.xyz_values, self.filterdist, block_size=block_size,
+            cells=self.cells, cell_mask=self.cell_mask)
+
+    def neighbour_pairs_between(self, block_size=neighbour_search.DEFAULT_BLOCK_SIZE):
+        """Pairs of 'from' and 'to' localisations within the filter
+        distance, as indices into xyz_values_start and xyz_values_end."""
+        return neighbour_search.iter_neighbour_pairs_between(
+            self.xyz_values_start, self.xyz_values_end, self.filterdist,
+            block_size=block_size, cells=self.cells)
+
+
+def _indices_in_cells(x_sorted, first, last):
+    """Indices of localisations with cell X coordinates from first to
+    last - 1, in ascending order."""
+    cell_x, indices = x_sorted
+    low, high = np.searchsorted(cell_x, [first, last])
+    return np.sort(indices[low:high])
+
+
+def sort_by_cell_x(xyz_values, filterdist, origin):
+    """Sort the finite localisations by the X coordinate of their cell.
+
+    Returns:
+        cell_x (numpy array):
+            Sorted cell X coordinates.
+        indices (numpy array):
+            Indices of the localisations in the same order.
+    """
+    finite_indices = np.nonzero(np.all(np.isfinite(xyz_values), axis=1))[0]
+    cell_x = neighbour_search.cell_coordinates(
+        xyz_values[finite_indices, 0:1], filterdist, origin[0:1])[:, 0]
+    order = np.argsort(cell_x, kind='mergesort')
+    return cell_x[order], finite_indices[order]
+
+
+def tile_cell_ranges(cell_x, n_tiles):
+    """Divide the cell X coordinates into ranges with similar numbers of
+    localisations.
+
+    Args:
+        cell_x (numpy array):
+            Sorted cell X coordinates of the localisations.
+        n_tiles (int):
+            Maximum number of tiles.
+
+    Returns:
+        ranges (list of tuples):
+            (first, last) cell X coordinates of each tile, last not included.
+    """
+    if len(cell_x) == 0:
+        return [(0, 1)]
+    positions = np.linspace(0, len(cell_x), n_tiles + 1)[1:-1].astype(np.int64)
+    edges = np.unique(np.concatenate(([cell_x[0]], cell_x[positions],
+                                      [cell_x[-1] + 1])))
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def _share(array):
+    """Copy an array into a new block of shared memory."""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _attach(descriptors):
+    """Worker process initialiser: attach to the shared arrays."""
+    for key, (name, shape, dtype) in descriptors.items():
+        block = shared_memory.SharedMemory(name=name)
+        _WORKER_ARRAYS[key] = (block,
+                               np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf))
+
+
+def _run_tile(task):
+    """Build a tile from the shared arrays and apply the tile function."""
+    tile_function, args, filterdist, origin, grid_shape, cell_range = task
+    arrays = {key: value[1] for key, value in _WORKER_ARRAYS.items()}
+    return _apply(tile_function, args, filterdist, origin, grid_shape,
+                  cell_range, arrays)
+
+
+def _apply(tile_function, args, filterdist, origin, grid_shape, cell_range, arrays):
+    if 'xyz_values_end' in arrays:
+        tile = Tile(filterdist, origin, grid_shape, cell_range,
+                    arrays['xyz_values'],
+                    (arrays['cell_x'], arrays['indices']),
+                    arrays['xyz_values_end'],
+                    (arrays['cell_x_end'], arrays['indices_end']))
+    else:
+        tile = Tile(filterdist, origin, grid_shape, cell_range,
+                    arrays['xyz_values'],
+                    (arrays['cell_x'], arrays['indices']))
+    return tile_function(tile, *args)
+
+
+def map_tiles(tile_function, xyz_values, filterdist, xyz_values_end=None,
+              workers=1, args=()):
+    """Apply a function to every tile of the data, on several processes.
+
+    Args:
+        tile_function (function):
+            Called as tile_function(tile, *args) for each Tile. It must be
+            defined at the top level of a module, so that it can be sent to
+            the worker processes.
+        xyz_values (numpy array):
+            Localisations, shape (N, 2 or 3). For a search between two sets of
+            localisations, these are the 'from' localisations.
+        filterdist (float):
+            The filter distance.
+        xyz_values_end (numpy array):
+            Optional 'to' localisations.
+        workers (int):
+            Number of worker processes. With 1, or where shared memory is
+            not available, the tiles are processed in this process.
+        args (tuple):
+            Further arguments for tile_function.
+
+    Yields:
+        The result of tile_function for each tile, in tile order.
+    """
+    xyz_arrays = [xyz_values] if xyz_values_end is None else [xyz_values,
+                                                              xyz_values_end]
+    origin, grid_shape = neighbour_search.common_grid(filterdist, *xyz_arrays)
+
+    arrays = {'xyz_values': xyz_values}
+    arrays['cell_x'], arrays['indices'] = sort_by_cell_x(xyz_values, filterdist, origin)
+    if xyz_values_end is not None:
+        arrays['xyz_values_end'] = xyz_values_end
+        (arrays['cell_x_end'],
+         arrays['indices_end']) = sort_by_cell_x(xyz_values_end, filterdist, origin)
+
+    cell_ranges = tile_cell_ranges(arrays['cell_x'], max(1, workers) * TILES_PER_WORKER)
+
+    if workers <= 1 or shared_memory is None or len(cell_ranges) == 1:
+        for cell_range in cell_ranges:
+            yield _apply(tile_function, args, filterdist, origin, grid_shape,
+                         cell_range, arrays)
+        return
+
+    blocks = []
+    try:
+        descriptors = {}
+        for key, array in arrays.items():
+            block, descriptors[key] = _share(array)
+            blocks.append(block)
+        tasks = [(tile_function, args, filterdist, origin, grid_shape, cell_range)
+                 for cell_range in cell_ranges]
+        with multiprocessing.Pool(min(workers, len(cell_ranges)),
+                                  initializer=_attach,
+                                  initargs=(descriptors,)) as pool:
+            for result in pool.imap(_run_tile, tasks):
+                yield result
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
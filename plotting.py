@@ -40,6 +40,7 @@ from scipy.ndimage.filters import gaussian_filter1d
 from scipy.ndimage.filters import gaussian_filter
 from skimage.external.tifffile import TiffWriter
 import modelling_general as models
+import pair_correlation
 # information on backends is here
 # https://matplotlib.org/3.1.1/tutorials/introductory/usage.html#backends
 #if _platform == "linux" or _platform == "linux2":
@@ -252,6 +253,35 @@ def plot_histograms(d_values, dims, filter_distance, info, binsize=1):
         plot_histogram(np.absolute(d_values[:, 2]), "z", filter_distance, info, binsize=binsize)
 
 
+def plot_histograms_from_counts(histograms, dims, filter_distance, info, binsize=1):
+    """Plots the same histograms as plot_histograms, from counts accumulated
+    while the relative positions were found, rather than from a table of
+    relative positions.
+
+    Args:
+       histograms (distance_histograms.DistanceHistograms): The accumulated
+            counts of distances between localisations.
+       dims (int): The dimensions of the data ie 2D or 3D.
+       filterdist (int): The distance within which relative positions were calculated.
+       info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+
+    Returns:
+        Nothing is returned.
+    """
+    plots = [("xy", None), ("xy", '2d'), ("x", None), ("y", None)]
+    if dims == 3:
+        plots = plots + [("xz", None), ("yz", None), ("xyz", None), ("z", None)]
+
+    for data_description, standardise in plots:
+        bins = histogram_bin_edges(histograms.maxima[data_description],
+                                   filter_distance, binsize)
+        bin_heights = histograms.counts_in_bins(data_description, bins,
+                                                below=filter_distance)
+        plot_histogram_counts(bin_heights, bins, data_description, info,
+                              binsize=binsize, standardise=standardise)
+
+
 def plot_new_histogram(data_values):
     """Creates a histogram with a smooth curve fitted to it.
 
@@ -312,8 +342,30 @@ def plot_histogram(data_values, data_description, filterdist, info, binsize=1, s
 
     """
 
-    data_max = data_values.max()
+    bins = histogram_bin_edges(data_values.max(), filterdist, binsize)
+
+    # Get histogram count values and bin positions
+    bin_heights, bin_edges = np.histogram(data_values[data_values < filterdist], bins)
+
+    return plot_histogram_counts(bin_heights, bin_edges, data_description, info,
+                                 binsize=binsize, standardise=standardise)
+
+
+def histogram_bin_edges(data_max, filterdist, binsize=1):
+    """Chooses the bin edges for a distance histogram. Bins run up to the
+    filter distance, or to the maximum distance if this is less than 5 nm.
+
+    Args:
+        data_max (float):
+            The largest distance to be histogrammed.
+        filterdist (int):
+            The distance within which relative positions were calculated.
+        binsize (int):
+            The width of the bins (nm).
 
+    Returns:
+        bins (numpy array): The bin edges.
+    """
     if data_max < 5:
         start = 0.0
         end = math.ceil(data_max*10)/10
@@ -337,6 +389,34 @@ def plot_histogram(data_values, data_description, filterdist, info, binsize=1, s
         else:
             bins = np.arange(start, end, binsize)
 
+    return bins
+
+
+def plot_histogram_counts(bin_heights, bin_edges, data_description, info,
+                          binsize=1, standardise=None):
+    """Plots histogram counts that have already been calculated, and saves
+    the plot in a .png file and the counts in a .csv file.
+
+    Args:
+        bin_heights (numpy array):
+            The counts in each bin.
+        bin_edges (numpy array):
+            The edges of the bins.
+        data_description (str):
+            A description of the distance eg xy or xz that
+            is added to the name of the .png file.
+        info (dict):
+            A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+        binsize (int):
+            The width of the bins (nm).
+        standardise (string): None, '2d' or '3d'
+            Standardisation of distance distributions, as for plot_histogram.
+
+    Returns:
+       histogram_values (numpy array): A numpy array of the normalised probability
+           density values for each bin.
+    """
     # Set up axes object for plotting
     fig_hist = plt.figure(num=None,
                           figsize=(10, 8),
@@ -369,8 +449,6 @@ def plot_histogram(data_values, data_description, filterdist, info, binsize=1, s
     if standardise is '3d':
         plt.ylabel('Counts / distance ^ 2 (nm ^ 2)')
 
-    # Get histogram count values and bin positions
-    bin_heights, bin_edges = np.histogram(data_values[data_values < filterdist], bins)
     bin_centres = (bin_edges[0:len(bin_edges) - 1] + bin_edges[1:len(bin_edges)]) / 2
 
     # Standardise bin counts if desired
@@ -393,6 +471,9 @@ def plot_histogram(data_values, data_description, filterdist, info, binsize=1, s
              color='lightgrey')
 
     fig_hist.savefig(filename, bbox_inches='tight')
+    # Close the figure, since the histograms for many pairs of channels may be
+    # plotted in one run.
+    plt.close(fig_hist)
     #fig_hist.show()
 
     # Save histogram data
@@ -432,19 +513,17 @@ def estimate_rpd_churchman_1d(input_distances,
         calculation_points (numpy array):
             The distances at which the RPD will be estimated.
         combined_precision (float):
-            The width (sigma) of the smoothing function. In later version,
-            this may be an array with one values per input distance.
+            The width (sigma) of the smoothing function, for all the
+            input distances or an array with one value per input distance.
 
     Returns:
         estimated_rpd (numpy array):
             The 1D RPD estimated at the calculation points.
     """
-    estimated_rpd = np.zeros(len(calculation_points))
-    for input_distance in input_distances:
-        estimated_rpd = estimated_rpd + models.pairwise_correlation_1d(
-            calculation_points, input_distance, combined_precision
-        )
-    return estimated_rpd
+    return pair_correlation.sum_pair_correlations(calculation_points,
+                                                  input_distances,
+                                                  combined_precision,
+                                                  dims=1)
 
 
 def estimate_rpd_churchman_2d(input_distances,
@@ -461,20 +540,18 @@ def estimate_rpd_churchman_2d(input_distances,
         calculation_points (numpy array):
             The distances at which the RPD will be estimated.
         combined_precision (float):
-            The width (sigma) of the smoothing function. In later versions,
-            this may be an array with one values per input distance.
+            The width (sigma) of the smoothing function, for all the
+            input distances or an array with one value per input distance.
 
     Returns:
         estimated_rpd (numpy array):
             The distance distribution for the 2D RPD estimated at the
             calculation points.
     """
-    estimated_rpd = np.zeros(len(calculation_points))
-    for input_distance in input_distances:
-        estimated_rpd = estimated_rpd + models.pairwise_correlation_2d(
-            calculation_points, input_distance, combined_precision
-        )
-    return estimated_rpd
+    return pair_correlation.sum_pair_correlations(calculation_points,
+                                                  input_distances,
+                                                  combined_precision,
+                                                  dims=2)
 
 
 def create_histogram_3d(rel_pos_xyz, filterdist, smoothing=None):
@@ -600,7 +677,7 @@ def plot_histogram_with_curves(bin_values, xy_histogram, symmetries, x_values, c
                   curve_values[i],
                   label=line_label)
 
-    plt.title('5-fold to 11-fold fits',
+    plt.title('%i-fold to %i-fold fits' % (min(symmetries), max(symmetries)),
               fontsize=14,
               color='black')
     plt.xlabel('XY separation (nm)', fontsize=14, color='black')
@@ -670,4 +747,5 @@ def plot_rot_2d_geometry(sym, diameter, info):
     plt.ylabel('y (nm)')
 
     fig.savefig(filename, bbox_inches='tight')
+    plt.close(fig)
     #fig.show()
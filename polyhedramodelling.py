@@ -29,8 +29,22 @@ CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
 
+import functools
+import inspect
 import numpy as np
-import modelling_general as model
+import pair_correlation
+
+
+# Distances to the nearest and next-nearest neighbours on a square grid, in
+# units of the grid spacing.
+SQUARE_GRID_NEIGHBOURS = np.array([1., np.sqrt(2.)])
+
+# Two sets of up to 10 lengths with no rational relation between them
+# (square roots and logarithms of primes), at which distances between
+# vertices are equal only if they are equal for any lengths
+# (see vertex_distance_groups).
+_PRIMES = np.array([2., 3., 5., 7., 11., 13., 17., 19., 23., 29., 31.])
+_GENERIC_LENGTHS = (np.sqrt(_PRIMES[:-1]), np.log(_PRIMES[1:]))
 
 
 def tri_prism_vertices(a, b):
@@ -79,6 +93,41 @@ def tri_pyramid_vertices(a, b):
     return vv
 
 
+def tri_prism_1_length_vertices(a):
+    """Model triangular prism with all sides a."""
+    return tri_prism_vertices(a, a)
+
+
+def square_base_cuboid_vertices(a, b):
+    """Model cuboid with square base of sides a and height b."""
+    return cuboid_vertices(a, a, b)
+
+
+def cube_vertices(a):
+    """Model cube with sides a."""
+    return cuboid_vertices(a, a, a)
+
+
+def fixed_vertices(coordinates):
+    """A vertices function for a polyhedron with fixed, user-supplied
+    coordinates, for vertex_distances and polyhedron_model.
+
+    Args:
+        coordinates (array_like): The vertices, with shape (N, 3).
+
+    Returns:
+        vertices_function (function):
+            A function with no arguments returning the vertices.
+    """
+    coordinates = np.array(coordinates, dtype=float)
+    coordinates.setflags(write=False)
+
+    def fixed_vertices():
+        return coordinates
+
+    return fixed_vertices
+
+
 def get_1d_relpos_no_filter(xyz):
     """Store all relative positions in a numpy array. No need for a filter
     distance for searching.
@@ -90,9 +139,8 @@ def get_1d_relpos_no_filter(xyz):
     Returns:
         Numpy (N) array of Euclidean distances between vertices.
     """
-    relpos = xyz - xyz[0]
-    for i, loc in enumerate(xyz[1:len(xyz)]):
-        relpos = np.append(relpos, xyz - loc, axis=0)
+    # The positions of all the vertices relative to each vertex in turn.
+    relpos = (xyz[np.newaxis, :, :] - xyz[:, np.newaxis, :]).reshape(-1, xyz.shape[1])
 
     # Remove [0., 0.] relative positions (self-referencing)
     relpos = relpos[np.any(relpos != 0., axis=1)]
@@ -100,24 +148,340 @@ def get_1d_relpos_no_filter(xyz):
     return(relpos)
 
 
+@functools.lru_cache(maxsize=64)
+def vertex_distance_groups(vertices_function):
+    """The pairs of vertices of a polyhedron that are the same distance apart
+    as one another, whatever the lengths defining the polyhedron, so that a
+    model needs one pair-correlation peak for each group, instead of one for
+    each pair of vertices.
+
+    The groups are found from the distances at two sets of unrelated lengths,
+    and are remembered for each vertices_function, so that they are found
+    once for a fit. The distances themselves are found for each set of
+    lengths, from one pair of vertices in each group (see vertex_distances).
+
+    Args:
+        vertices_function (function):
+            Gives the vertices from the lengths defining the polyhedron,
+            e.g. cuboid_vertices. For fixed, user-supplied coordinates, this
+            is a function with no arguments returning them.
+
+    Returns:
+        first, second (numpy arrays):
+            The indices of the vertices of one pair in each group.
+        multiplicities (numpy array):
+            The number of pairs of vertices in each group. Each pair is
+            counted in both orders, as in get_1d_relpos_no_filter.
+    """
+    n_lengths = len(inspect.signature(vertices_function).parameters)
+    dists = []
+    for lengths in _GENERIC_LENGTHS:
+        verts = vertices_function(*lengths[:n_lengths])
+        first, second = np.nonzero(~np.eye(len(verts), dtype=bool))
+        pair_dists = np.sqrt(np.sum((verts[second] - verts[first]) ** 2,
+                                    axis=1))
+        dists.append(pair_dists / np.max(pair_dists))
+    (_, pairs,
+     multiplicities) = np.unique(np.round(np.column_stack(dists), 9), axis=0,
+                                 return_index=True, return_counts=True)
+    groups = (first[pairs], second[pairs], multiplicities.astype(float))
+    for values in groups:
+        # The cached arrays are shared by every call.
+        values.setflags(write=False)
+    return groups
+
+
+def vertex_distances(vertices_function, lengths):
+    """The different distances between the vertices of a polyhedron, and how
+    many pairs of vertices are separated by each.
+
+    Args:
+        vertices_function (function):
+            Gives the vertices from the lengths, e.g. cuboid_vertices
+            (see vertex_distance_groups).
+        lengths (list): The lengths to pass to vertices_function.
+
+    Returns:
+        dists (numpy array):
+            The different distances between the vertices.
+        multiplicities (numpy array):
+            The number of pairs of vertices at each distance, counting each
+            pair in both orders.
+    """
+    first, second, multiplicities = vertex_distance_groups(vertices_function)
+    verts = vertices_function(*lengths)
+    dists = np.sqrt(np.sum((verts[second] - verts[first]) ** 2, axis=1))
+    return dists, multiplicities
+
+
+def vertex_distance_derivatives(vertices_function, lengths):
+    """Distances between the vertices of a polyhedron, as from
+    vertex_distances, and their derivatives with respect to the lengths
+    defining the polyhedron, for the Jacobians of the models
+    (see modelling_general.model_jacobian).
+
+    Args:
+        vertices_function (function):
+            Gives the vertices from the lengths, e.g. cuboid_vertices. The
+            vertices must be proportional to the lengths, as for all the
+            polyhedra here.
+        lengths (list): The lengths to pass to vertices_function.
+
+    Returns:
+        dists (numpy array):
+            The different distances between the vertices.
+        multiplicities (numpy array):
+            The number of pairs of vertices at each distance.
+        d_dists (list of numpy arrays):
+            The derivatives of the distances with respect to each length.
+    """
+    first, second, multiplicities = vertex_distance_groups(vertices_function)
+    verts = vertices_function(*lengths)
+    relpos = verts[second] - verts[first]
+    dists = np.sqrt(np.sum(relpos ** 2, axis=1))
+    d_dists = []
+    for unit_lengths in np.eye(len(lengths)):
+        # The change in the relative positions for a unit change in a length.
+        unit_verts = vertices_function(*unit_lengths)
+        unit_relpos = unit_verts[second] - unit_verts[first]
+        d_dists.append(np.sum(relpos * unit_relpos, axis=1) / dists)
+    return dists, multiplicities, d_dists
+
+
+def _polyhedron_peaks(dists, multiplicities, locamp, locprec,
+                      structamp, spread, substructure):
+    """The means, spreads and amplitudes of the 3D pair-correlation peaks of
+    a polyhedron model: one for each distance between vertices, then one at
+    zero separation for repeated localisations and, optionally, one for
+    unresolvable substructure."""
+    means = [dists, [0.]]
+    sigmas = [np.full(len(dists), spread), [np.sqrt(2) * locprec]]
+    amplitudes = [structamp * multiplicities, [locamp]]
+    if substructure is not None:
+        substructamp, substructspread = substructure
+        means.append([0.])
+        sigmas.append([np.sqrt(2) * substructspread])
+        amplitudes.append([substructamp])
+    return [np.concatenate(values) for values in (means, sigmas, amplitudes)]
+
+
+def polyhedron_rpd(r, vertices_function, lengths,
+                   locamp, locprec, structamp, spread,
+                   substructure=None, grid=None, bgslope=None, bgscale=None):
+    """Model relative position distribution (RPD) for localisations at the
+    vertices of a polyhedron, on which the polyhedra models here are built.
+
+    The peaks for the distances between vertices (one for each different
+    distance, see vertex_distances) and at zero separation are evaluated
+    together, as are the peaks for neighbouring complexes on a square grid.
+
+    Args:
+        r (numpy array):
+            Distances over which the model needs to be evaluated,
+            e.g. 0.5, 1.5, 2.5, 3.5, ... nm
+        vertices_function (function):
+            Gives the vertices from the lengths, e.g. cuboid_vertices.
+        lengths (list): The lengths to pass to vertices_function.
+        locamp: Amplitude of sinlge molecule localisation precision component
+        locprec: Average single molecule localisation precision
+        structamp: Amplitude of components reflecting the structural features
+            of the complex (for each pair of vertices).
+        spread: Spread owing to unresolvable complexity or inhomogeneity
+            between complexes.
+        substructure (tuple):
+            Optional (substructamp, substructspread), for unresolvable
+            substructure at one vertex.
+        grid (tuple):
+            Optional (gridspace, gridamp, gridspread), for neighbouring
+            complexes on a square grid.
+        bgslope: Optional slope of a 2D (linear) background.
+        bgscale: Optional scale of a 3D (quadratic) background.
+
+    Returns:
+        rpd (numpy array):
+            The relative position density given by the model at r.
+    """
+    dists, multiplicities = vertex_distances(vertices_function, lengths)
+    means, sigmas, amplitudes = _polyhedron_peaks(dists, multiplicities,
+                                                  locamp, locprec,
+                                                  structamp, spread,
+                                                  substructure)
+    rpd = pair_correlation.sum_pair_correlations(r, means, sigmas, amplitudes,
+                                                 dims=3)
+
+    # Include neighbouring complexes on square grid:
+    if grid is not None:
+        gridspace, gridamp, gridspread = grid
+        rpd = rpd + pair_correlation.sum_pair_correlations(
+            r, gridspace * SQUARE_GRID_NEIGHBOURS, gridspread, gridamp)
+
+    # Include background
+    if bgslope is not None:
+        rpd = rpd + r * bgslope
+    if bgscale is not None:
+        rpd = rpd + r * r * bgscale
+
+    return rpd
+
+
+def polyhedron_rpd_jacobian(r, vertices_function, lengths,
+                            locamp, locprec, structamp, spread,
+                            substructure=None, grid=None,
+                            bgslope=None, bgscale=None):
+    """Jacobian of polyhedron_rpd with respect to the lengths and the
+    parameters which follow them, in the order of the arguments
+    (see modelling_general.model_jacobian)."""
+    dists, multiplicities, d_dists = vertex_distance_derivatives(
+        vertices_function, lengths)
+    means, sigmas, amplitudes = _polyhedron_peaks(dists, multiplicities,
+                                                  locamp, locprec,
+                                                  structamp, spread,
+                                                  substructure)
+    (_, d_means,
+     d_sigmas,
+     d_amplitudes) = pair_correlation.sum_pair_correlations_derivatives(
+         r, means, sigmas, amplitudes, dims=3)
+    n_dists = len(dists)
+    columns = [d_means[..., :n_dists].dot(d_length_dists)
+               for d_length_dists in d_dists]
+    columns += [d_amplitudes[..., n_dists],
+                np.sqrt(2) * d_sigmas[..., n_dists],
+                d_amplitudes[..., :n_dists].dot(multiplicities),
+                d_sigmas[..., :n_dists].sum(axis=-1)]
+    if substructure is not None:
+        columns += [d_amplitudes[..., n_dists + 1],
+                    np.sqrt(2) * d_sigmas[..., n_dists + 1]]
+
+    if grid is not None:
+        gridspace, gridamp, gridspread = grid
+        (_, d_grid_means,
+         d_gridspreads,
+         d_gridamps) = pair_correlation.sum_pair_correlations_derivatives(
+             r, gridspace * SQUARE_GRID_NEIGHBOURS, gridspread, gridamp)
+        columns += [d_grid_means.dot(SQUARE_GRID_NEIGHBOURS),
+                    d_gridamps.sum(axis=-1),
+                    d_gridspreads.sum(axis=-1)]
+
+    ones = np.ones(np.shape(columns[0]))
+    if bgslope is not None:
+        columns.append(r * ones)
+    if bgscale is not None:
+        columns.append(r * r * ones)
+    return np.stack(columns, axis=-1)
+
+
+def polyhedron_model(vertices_function, substructure=False, grid=False,
+                     background=None):
+    """Make a model RPD for localisations at the vertices of any polyhedron,
+    with polyhedron_rpd, for fitting with
+    modelling_general.fit_model_to_experiment.
+
+    The parameters of the model are the lengths taken by vertices_function,
+    then locamp, locprec, structamp, spread, then, as chosen,
+    substructamp, substructspread, then gridspace, gridamp, gridspread,
+    then bgslope or bgscale (see polyhedron_rpd). The model has an analytic
+    Jacobian if the vertices are proportional to the lengths.
+
+    Args:
+        vertices_function (function):
+            Gives the vertices from the lengths, e.g. cuboid_vertices, or,
+            for fixed user-supplied coordinates, a function with no
+            arguments returning them.
+        substructure (Boolean):
+            Include unresolvable substructure at the vertices.
+        grid (Boolean):
+            Include neighbouring complexes on a square grid.
+        background (str):
+            None, '2d' for a linear background, or '3d' for a quadratic
+            background.
+
+    Returns:
+        model_rpd (function):
+            The model, called as model_rpd(r, *params).
+        model_rpd_vectorargs (function):
+            The same model, called with a vector input of the distances then
+            the parameters, for modelling_general.stdev_of_model.
+    """
+    if background not in (None, '2d', '3d'):
+        raise ValueError("background must be None, '2d' or '3d', not %r"
+                         % (background,))
+    length_names = list(inspect.signature(vertices_function).parameters)
+    names = length_names + ['locamp', 'locprec', 'structamp', 'spread']
+    linear_params = ['locamp', 'structamp']
+    if substructure:
+        names += ['substructamp', 'substructspread']
+        linear_params.append('substructamp')
+    if grid:
+        names += ['gridspace', 'gridamp', 'gridspread']
+        linear_params.append('gridamp')
+    if background is not None:
+        names.append({'2d': 'bgslope', '3d': 'bgscale'}[background])
+        linear_params.append(names[-1])
+
+    def arguments(params):
+        """The arguments for polyhedron_rpd, from the model parameters."""
+        if len(params) != len(names):
+            raise TypeError('%d parameters are needed (%s), not %d'
+                            % (len(names), ', '.join(names), len(params)))
+        values = dict(zip(names, params))
+        kwargs = {}
+        if substructure:
+            kwargs['substructure'] = (values['substructamp'],
+                                      values['substructspread'])
+        if grid:
+            kwargs['grid'] = (values['gridspace'], values['gridamp'],
+                              values['gridspread'])
+        if background == '2d':
+            kwargs['bgslope'] = values['bgslope']
+        if background == '3d':
+            kwargs['bgscale'] = values['bgscale']
+        args = ([values[name] for name in length_names],
+                values['locamp'], values['locprec'],
+                values['structamp'], values['spread'])
+        return args, kwargs
+
+    def model_rpd(r, *params):
+        args, kwargs = arguments(params)
+        return polyhedron_rpd(r, vertices_function, *args, **kwargs)
+
+    def model_rpd_jacobian(r, *params):
+        args, kwargs = arguments(params)
+        return polyhedron_rpd_jacobian(r, vertices_function, *args, **kwargs)
+
+    def model_rpd_vectorargs(input_vector):
+        return model_rpd(*input_vector)
+
+    name = vertices_function.__name__.replace('_vertices', '') + '_rpd'
+    parameter = inspect.Parameter.POSITIONAL_OR_KEYWORD
+    for function, suffix in ((model_rpd, ''),
+                             (model_rpd_jacobian, '_jacobian')):
+        function.__name__ = function.__qualname__ = name + suffix
+        function.__signature__ = inspect.Signature(
+            [inspect.Parameter(param_name, parameter)
+             for param_name in ['r'] + names])
+    model_rpd_vectorargs.__name__ = name + '_vectorargs'
+    model_rpd_vectorargs.__qualname__ = model_rpd_vectorargs.__name__
+    model_rpd.__doc__ = ('Model RPD for localisations at the vertices from '
+                         + vertices_function.__name__
+                         + ' (see polyhedramodelling.polyhedron_model).')
+    # The derivatives of the distances need the vertices to be proportional
+    # to the lengths (see vertex_distance_derivatives).
+    unit_verts = [vertices_function(*unit_lengths)
+                  for unit_lengths in np.eye(len(length_names))]
+    lengths = _GENERIC_LENGTHS[0][:len(length_names)]
+    if unit_verts and np.allclose(vertices_function(*lengths),
+                                  np.tensordot(lengths, unit_verts, axes=1)):
+        model_rpd.jacobian = model_rpd_jacobian
+    model_rpd.linear_params = tuple(linear_params)
+    return model_rpd, model_rpd_vectorargs
+
+
 def tri_prism_rpd(r, a, b, locamp, locprec, structamp, spread):
     """r are distances over which the model needs to be evaluated,
     e.g. 0.5, 1.5, 2.5, 3.5, ... nm
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, b)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_vertices, (a, b),
+                          locamp, locprec, structamp, spread)
 
 
 def tri_prism_on_grid_rpd(r, a, b, locamp, locprec, structamp, spread,
@@ -137,25 +501,9 @@ def tri_prism_on_grid_rpd(r, a, b, locamp, locprec, structamp, spread,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, b)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_vertices, (a, b),
+                          locamp, locprec, structamp, spread,
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def tri_prism_on_grid_substructure_rpd(r, a, b,
@@ -182,28 +530,10 @@ def tri_prism_on_grid_substructure_rpd(r, a, b,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, b)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_vertices, (a, b),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def tri_prism_on_grid_2disobg_substructure_rpd(r, a, b,
@@ -233,38 +563,41 @@ def tri_prism_on_grid_2disobg_substructure_rpd(r, a, b,
     bgslope: Approximate background to 2D (relatively flat); this is the
         linear slope.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, b)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-    # Include background
-    rpd = rpd + r * bgslope
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_vertices, (a, b),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread),
+                          bgslope=bgslope)
+
+
+def tri_prism_on_grid_2disobg_substructure_rpd_jacobian(r,
+                                                        a, b,
+                                                        locamp, locprec,
+                                                        structamp, spread,
+                                                        substructamp, substructspread,
+                                                        gridspace, gridamp, gridspread,
+                                                        bgslope):
+    """Jacobian of tri_prism_on_grid_2disobg_substructure_rpd
+    (see modelling_general.model_jacobian)."""
+    return polyhedron_rpd_jacobian(r, tri_prism_vertices, (a, b),
+                                   locamp, locprec, structamp, spread,
+                                   substructure=(substructamp, substructspread),
+                                   grid=(gridspace, gridamp, gridspread),
+                                   bgslope=bgslope)
+
+
+tri_prism_on_grid_2disobg_substructure_rpd.jacobian = (
+    tri_prism_on_grid_2disobg_substructure_rpd_jacobian)
+tri_prism_on_grid_2disobg_substructure_rpd.linear_params = (
+    'locamp', 'structamp', 'substructamp', 'gridamp', 'bgslope')
 
 
 def tri_prism_on_grid_2disobg_substructure_rpd_vectorargs(
         input_vector):
     """Function to calculate the values given by
     tri_prism_on_grid_2disobg_substructure_rpd, but using a
-    vector input for the parameters, so that the numdifftools package can be
-    used to calculate partial derivatives for correct error propagation in the
+    vector input for the parameters, so that modelling_general.stdev_of_model
+    can calculate partial derivatives for correct error propagation in the
     model.
 
     Args:
@@ -318,25 +651,9 @@ def tri_prism_on_grid_1_length(r, a, locamp, locprec, structamp, spread,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_1_length_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def tri_prism_on_grid_1_length_2disobg(r,
@@ -362,28 +679,10 @@ def tri_prism_on_grid_1_length_2disobg(r,
     bgslope: Approximate background to 2D (relatively flat); this is the
         linear slope.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    # Include background
-    rpd = rpd + r * bgslope
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_1_length_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          grid=(gridspace, gridamp, gridspread),
+                          bgslope=bgslope)
 
 
 def tri_prism_on_grid_1_length_substructure_rpd(r, a, locamp, locprec,
@@ -409,27 +708,10 @@ def tri_prism_on_grid_1_length_substructure_rpd(r, a, locamp, locprec,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_1_length_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def tri_prism_on_grid_1_length_2disobg_substruct_rpd(r,
@@ -459,38 +741,40 @@ def tri_prism_on_grid_1_length_2disobg_substruct_rpd(r,
     bgslope: Approximate background to 2D (relatively flat); this is the
         linear slope.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    # Include background
-    rpd = rpd + r * bgslope
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_1_length_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread),
+                          bgslope=bgslope)
+
+
+def tri_prism_on_grid_1_length_2disobg_substruct_rpd_jacobian(r,
+                                                              a,
+                                                              locamp, locprec,
+                                                              structamp, spread,
+                                                              substructamp, substructspread,
+                                                              gridspace, gridamp, gridspread,
+                                                              bgslope):
+    """Jacobian of tri_prism_on_grid_1_length_2disobg_substruct_rpd
+    (see modelling_general.model_jacobian)."""
+    return polyhedron_rpd_jacobian(r, tri_prism_1_length_vertices, (a,),
+                                   locamp, locprec, structamp, spread,
+                                   substructure=(substructamp, substructspread),
+                                   grid=(gridspace, gridamp, gridspread),
+                                   bgslope=bgslope)
+
+
+tri_prism_on_grid_1_length_2disobg_substruct_rpd.jacobian = (
+    tri_prism_on_grid_1_length_2disobg_substruct_rpd_jacobian)
+tri_prism_on_grid_1_length_2disobg_substruct_rpd.linear_params = (
+    'locamp', 'structamp', 'substructamp', 'gridamp', 'bgslope')
 
 
 def tri_prism_on_grid_1_length_2disobg_substruct_rpd_vectorargs(input_vector):
     """Function to calculate the values given by
     tri_prism_on_grid_1_length_2disobg_substruct_rpd, but using a
-    vector input for the parameters, so that the numdifftools package can be
-    used to calculate partial derivatives for correct error propagation in the
+    vector input for the parameters, so that modelling_general.stdev_of_model
+    can calculate partial derivatives for correct error propagation in the
     model.
 
     Args:
@@ -553,31 +837,11 @@ def tri_prism_on_grid_1_length_3disobg_substruct_rpd(r,
     gridspread: Spread owing to different orientation at different grid points.
     bgscale: 3D isotropic background.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    # Include background
-    rpd = rpd + r * r * bgscale
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_1_length_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread),
+                          bgscale=bgscale)
 
 
 def tri_prism_1_length_3disobg_substruct_rpd(r,
@@ -601,26 +865,10 @@ def tri_prism_1_length_3disobg_substruct_rpd(r,
         unresolvable substructure there.
     bgscale: 3D isotropic background.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-
-    # Include background
-    rpd = rpd + r * r * bgscale
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_1_length_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          bgscale=bgscale)
 
 
 def tri_prism_on_grid_1_length_1_prec_rpd(r, a, locamp, locprec, structamp,
@@ -640,25 +888,9 @@ def tri_prism_on_grid_1_length_1_prec_rpd(r, a, locamp, locprec, structamp,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_prism_vertices(a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, np.sqrt(2) * locprec)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, tri_prism_1_length_vertices, (a,),
+                          locamp, locprec, structamp, np.sqrt(2) * locprec,
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def tri_pyramid_on_grid_rpd(r, a, b, locamp, locprec, structamp, spread,
@@ -678,25 +910,9 @@ def tri_pyramid_on_grid_rpd(r, a, b, locamp, locprec, structamp, spread,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_pyramid_vertices(a, b)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, tri_pyramid_vertices, (a, b),
+                          locamp, locprec, structamp, spread,
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def tri_pyramid_on_grid_2disobg_substructure_rpd(r,
@@ -727,32 +943,33 @@ def tri_pyramid_on_grid_2disobg_substructure_rpd(r,
     bgslope: Approximate background to 2D (relatively flat); this is the
         linear slope.
     """
-    # Set up distances between tringular prism vertices
-    verts = tri_pyramid_vertices(a, b)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    # Include background
-    rpd = rpd + r * bgslope
-
-    return rpd
+    return polyhedron_rpd(r, tri_pyramid_vertices, (a, b),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread),
+                          bgslope=bgslope)
+
+
+def tri_pyramid_on_grid_2disobg_substructure_rpd_jacobian(r,
+                                                          a, b,
+                                                          locamp, locprec,
+                                                          structamp, spread,
+                                                          substructamp, substructspread,
+                                                          gridspace, gridamp, gridspread,
+                                                          bgslope):
+    """Jacobian of tri_pyramid_on_grid_2disobg_substructure_rpd
+    (see modelling_general.model_jacobian)."""
+    return polyhedron_rpd_jacobian(r, tri_pyramid_vertices, (a, b),
+                                   locamp, locprec, structamp, spread,
+                                   substructure=(substructamp, substructspread),
+                                   grid=(gridspace, gridamp, gridspread),
+                                   bgslope=bgslope)
+
+
+tri_pyramid_on_grid_2disobg_substructure_rpd.jacobian = (
+    tri_pyramid_on_grid_2disobg_substructure_rpd_jacobian)
+tri_pyramid_on_grid_2disobg_substructure_rpd.linear_params = (
+    'locamp', 'structamp', 'substructamp', 'gridamp', 'bgslope')
 
 
 def cuboid_on_grid_rpd(r, a, b, c, locamp, locprec, structamp, spread,
@@ -771,25 +988,9 @@ def cuboid_on_grid_rpd(r, a, b, c, locamp, locprec, structamp, spread,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = cuboid_vertices(a, b, c)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, cuboid_vertices, (a, b, c),
+                          locamp, locprec, structamp, spread,
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def cuboid_on_grid_substructure_rpd(r,
@@ -816,28 +1017,10 @@ def cuboid_on_grid_substructure_rpd(r,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = cuboid_vertices(a, b, c)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, cuboid_vertices, (a, b, c),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def cuboid_on_grid_2disobg_substructure_rpd(r,
@@ -867,30 +1050,33 @@ def cuboid_on_grid_2disobg_substructure_rpd(r,
     bgslope: Approximate background to 2D (relatively flat); this is the
         linear slope.
     """
-    # Set up distances between tringular prism vertices
-    verts = cuboid_vertices(a, b, c)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
+    return polyhedron_rpd(r, cuboid_vertices, (a, b, c),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread),
+                          bgslope=bgslope)
 
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-    # Include background
-    rpd = rpd + r * bgslope
 
-    return rpd
+def cuboid_on_grid_2disobg_substructure_rpd_jacobian(r,
+                                                     a, b, c,
+                                                     locamp, locprec,
+                                                     structamp, spread,
+                                                     substructamp, substructspread,
+                                                     gridspace, gridamp, gridspread,
+                                                     bgslope):
+    """Jacobian of cuboid_on_grid_2disobg_substructure_rpd
+    (see modelling_general.model_jacobian)."""
+    return polyhedron_rpd_jacobian(r, cuboid_vertices, (a, b, c),
+                                   locamp, locprec, structamp, spread,
+                                   substructure=(substructamp, substructspread),
+                                   grid=(gridspace, gridamp, gridspread),
+                                   bgslope=bgslope)
+
+
+cuboid_on_grid_2disobg_substructure_rpd.jacobian = (
+    cuboid_on_grid_2disobg_substructure_rpd_jacobian)
+cuboid_on_grid_2disobg_substructure_rpd.linear_params = (
+    'locamp', 'structamp', 'substructamp', 'gridamp', 'bgslope')
 
 
 def cuboid_on_grid_square_base_rpd(r, a, b, locamp, locprec, structamp, spread,
@@ -909,25 +1095,9 @@ def cuboid_on_grid_square_base_rpd(r, a, b, locamp, locprec, structamp, spread,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = cuboid_vertices(a, a, b)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, square_base_cuboid_vertices, (a, b),
+                          locamp, locprec, structamp, spread,
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def cube_on_grid_rpd(r, a, locamp, locprec, structamp, spread,
@@ -950,25 +1120,9 @@ def cube_on_grid_rpd(r, a, locamp, locprec, structamp, spread,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = cuboid_vertices(a, a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, cube_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def cube_on_grid_substructure_rpd(r, a, locamp, locprec, structamp, spread,
@@ -992,27 +1146,10 @@ def cube_on_grid_substructure_rpd(r, a, locamp, locprec, structamp, spread,
         nearby grid points.
     gridspread: Spread owing to different orientation at different grid points.
     """
-    # Set up distances between tringular prism vertices
-    verts = cuboid_vertices(a, a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread                                                    np.sqrt(2) * substructspread)
-    rpd = rpd + substructamp * model.pairwise_correlation_3d(r, 0.,
-                                                             np.sqrt(2) * substructspread)
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp \
-            * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2), gridspread)
-
-    return rpd
+    return polyhedron_rpd(r, cube_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread))
 
 
 def cube_on_grid_2disobg_substructure_rpd(r, a, locamp, locprec, structamp, spread,
@@ -1039,27 +1176,8 @@ def cube_on_grid_2disobg_substructure_rpd(r, a, locamp, locprec, structamp, spre
     bgslope: Approximate background to 2D (relatively flat); this is the
         linear slope.
     """
-    # Set up distances between tringular prism vertices
-    verts = cuboid_vertices(a, a, a)
-    relpos = get_1d_relpos_no_filter(verts)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2 + relpos[:, 2] ** 2)
-    # Initialise rpd array
-    rpd = r * 0.
-    # Fill with pair correlations between 3D Gaussian spreads at vertices
-    for d in dists:
-        rpd = rpd + structamp * model.pairwise_correlation_3d(r, d, spread)
-    # Include single molecule localisation precision
-    # This is approximated to isotropic
-    rpd = rpd + locamp * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * locprec)
-    # Include substructure spread
-    rpd = rpd + substructamp \
-            * model.pairwise_correlation_3d(r, 0., np.sqrt(2) * substructspread)
-
-    # Include neighbouring complexes on square grid:
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace, gridspread)
-    rpd = rpd + gridamp * model.pairwise_correlation_2d(r, gridspace * np.sqrt(2),
-                                                        gridspread)
-    # Include background
-    rpd = rpd + r * bgslope
-
-    return rpd
+    return polyhedron_rpd(r, cube_vertices, (a,),
+                          locamp, locprec, structamp, spread,
+                          substructure=(substructamp, substructspread),
+                          grid=(gridspace, gridamp, gridspread),
+                          bgslope=bgslope)
@@ -34,6 +34,7 @@ specific language governing permissions and limitations under the License.
 
 import os
 import sys
+import shutil
 import argparse
 import datetime
 import timeit
@@ -41,6 +42,16 @@ import time
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 import numpy as np
+import neighbour_search
+import parallel_search
+import relpos_writer
+import relpos_files
+import relpos_table
+import ingest
+import relpos_cache
+import relpos_estimate
+import instrumentation
+import distance_histograms
 import plotting
 import utils
 import reports
@@ -201,7 +212,10 @@ def read_data_in(info):
             This dictionary is modified to contain information about the data read
             during the function.
     Returns:
-               xyz_values (numpy array): A numpy array of the x, y (and z) localisations.
+               xyz_values (numpy array): A numpy array of the x, y (and z) localisations,
+                   followed by their colour channels if colours are analysed.
+                   Other columns are not read. Rows are read only if they pass
+                   info['row_filters'] (see ingest.read_table).
     """
 
     in_file = info['in_file_and_path']
@@ -209,34 +223,24 @@ def read_data_in(info):
     if not os.path.exists(in_file):
         sys.exit("ERROR; The input file does not exist.")
 
-
-    if in_file[-4:] == '.npy':
-        try:
-            xyzcolour_values = np.load(in_file)
-        except (EOFError, IOError, OSError) as exception:
-            print("\n\nCould not read file: ", in_file)
-            print("\n\n", type(exception))
-            sys.exit("Could not read the input file "+in_file+".\n")
-    elif in_file[-4:] == '.csv' or in_file[-4:] == '.txt':
+    if in_file[-4:] in ('.npy', '.csv', '.txt'):
+        # Only the X, Y(, Z) and channel columns are read.
+        columns = info.get('xyz_columns')
+        if columns is None:
+            columns = list(range(info['dims']))
+        if info['colours_analysed'] is not None:
+            columns = list(columns) + [info.get('channel_column', -1)]
+        dtype = np.float32 if info.get('float32') else np.float64
         try:
-            skip = 0
-            line = open(in_file).readline()
-            for cell in line.split(','):
-                try:
-                    float(cell)
-                except ValueError:
-                    #print("Not a float")
-                    skip = 1
-            xyzcolour_values = np.loadtxt(in_file,
-                                          delimiter=',',
-                                          skiprows=skip,
-                                          # Remove to allow colours at end
-                                          # of many columns
-                                          # usecols=range(info['dims'])
-                                          )
-        except (EOFError, IOError, OSError) as exception:
+            n_columns = ingest.read_header(in_file)[1]
+            xyzcolour_values = ingest.read_table(in_file,
+                                                 columns=columns,
+                                                 filters=info.get('row_filters'),
+                                                 dtype=dtype,
+                                                 workers=info.get('workers', 1))
+        except (EOFError, IOError, OSError, ValueError) as exception:
             print("\n\nCould not read file: ", in_file)
-            print("\n\n", type(exception))
+            print("\n\n", type(exception), exception)
             sys.exit("Could not read the input file "+in_file+".\n")
     else:
         xyzcolour_values = 'Ouch'
@@ -245,9 +249,9 @@ def read_data_in(info):
 
 
     info['values'] = xyzcolour_values.shape[0]
-    info['columns'] = xyzcolour_values.shape[1]
+    info['columns'] = n_columns
     info['total_values'] = xyzcolour_values.shape[0]
-    info['total_columns'] = xyzcolour_values.shape[1]
+    info['total_columns'] = n_columns
     # Get the unique channel numbers in use
     if info['colours_analysed'] is not None:
         info['unique_colour_values'] = np.unique(xyzcolour_values[:,-1])
@@ -344,10 +348,18 @@ def choose_channels(info):
 def getdistances(xyz_values,
                  filterdist,
                  verbose=False,
-                 sort_and_halve=True):
+                 sort_and_halve=True,
+                 workers=1,
+                 canonical=True,
+                 keep_coincident=False):
     """Store all vectors between points within a chosen distance of each other
     in all three dimensions in a numpy array. Also works for 2D.
 
+    Neighbours are found with a cell-list search (see neighbour_search.py),
+    which enumerates each pair of localisations once, rather than comparing
+    every localisation with the whole data set. One vector per pair is
+    therefore found directly, without finding both and removing duplicates.
+
     Args:
         xyz (numpy array):
             Numpy array of localisations with shape (N, 2 or 3),
@@ -360,122 +372,159 @@ def getdistances(xyz_values,
         verbose (Boolean):
             Choice whether to print updates to screen. Defaults to False.
         sort_and_halve (Boolean):
-            Choice whether to perform sorting and duplicate removal.
+            Choice whether to give one vector per pair, sorted.
             Defaults to True.
+            If True, one vector is given per pair of localisations (see
+            canonical), and the vectors are sorted by X, then Y, then Z
+            separation.
+            If False, both vectors for each pair are given, ordered by the
+            index of the reference localisation, then of its neighbour.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
+            The result is the same for any number of workers.
+            Defaults to 1.
+        canonical (Boolean):
+            Used if sort_and_halve is True. If True, the vector given for
+            each pair is the one with its first non-zero component positive
+            (see neighbour_search.canonical_orientation). If False, it is the
+            vector from the localisation earlier in xyz_values to the later
+            one. Defaults to True.
+        keep_coincident (Boolean):
+            Choice whether to keep the [0, 0, 0] vectors between different
+            localisations at identical positions. These are usually
+            duplicates, which can overwhelm the result. Defaults to False.
 
     Returns:
         d (numpy array):
             A numpy array of vectors of neighbours within the filter distance
-            for every localisation.
+            for every localisation, shape (P, 3). For 2D data, the third
+            column is zero.
     """
 
     start_time = time.time()  # Start timing it.
 
-    xyz_filter_values = np.array([filterdist, filterdist, filterdist])
-
     if verbose:
         print('\nFinding vectors to nearby localisations:\n')
 
-    # Add 3rd column to 2D localisations
-    if xyz_values.shape[1] == 2:
-        xyz_values = np.column_stack((xyz_values, np.zeros(xyz_values.shape[0])))
-
-    # Initialise d (array of relative positions)
-    separation_values = []
-
-    # Find relative positions of near neighbours to first point.
-    # Keep going through the list of points until at least one near neighbour
-    # is found.
-    xyz_index = 0
-
-    # finding all the separtions in x, y (and z) for the first locatisation
-    while len(separation_values) == 0:
-        if xyz_index > len(xyz_values) -1:
-            break
-
-        one_xyz_value = xyz_values[xyz_index]  # Reference localisation
-
-
-        # A filter to find localisation coordinates within filterdist of loc
-        # Gives np.array of True / False
-        boolean_test_results = np.logical_and(
-            xyz_values > one_xyz_value - xyz_filter_values,
-            xyz_values < one_xyz_value + xyz_filter_values)
-
-
-        # Find indices of localisations within filterdist
-        # in all three dimensions (all True) and select these
-        test_results_indices = np.all(boolean_test_results, axis=1)
-        subxyz = xyz_values[test_results_indices]
+    if workers > 1:
+        blocks = parallel_search.map_tiles(
+            _tile_separations, xyz_values, filterdist, workers=workers,
+            args=(sort_and_halve, canonical, keep_coincident))
+    else:
+        blocks = _separation_blocks(
+            xyz_values, neighbour_search.iter_neighbour_pairs(xyz_values, filterdist),
+            sort_and_halve, canonical, keep_coincident)
 
-        sys.stdout.flush()
+    separation_blocks = []
+    reference_blocks = []
+    neighbour_blocks = []
 
-        # Populate d with any near neighbours.
-        # len(subxyz) == 1 would mean only the reference localisation was
-        # within filterdist.
-        # Remove [0,0,0], these are duplicates and can overwhelm the result.
-        # Store the vectors from reference loc to the filtered subset
-        # of all locs.
-        if len(subxyz) != 1:
-            separation_values = subxyz - one_xyz_value
-            selectnonzeros = np.any(separation_values != 0, axis=1)
-            separation_values = np.compress(selectnonzeros, separation_values, axis=0)
-
-
-        # Increment reference localisation
-        # in search of next localisation with near neighbours.
-        xyz_index = xyz_index + 1
-
-
-    # Continue appending to the array d
-    # with vectors to the near-enough neighbours of other localisations.
-    for xyz_index in range(xyz_index, len(xyz_values)):
-        one_xyz_value = xyz_values[xyz_index]
-        boolean_test_results = np.logical_and(xyz_values > one_xyz_value - xyz_filter_values,
-                                              xyz_values < one_xyz_value + xyz_filter_values)
-        test_results_indices = np.all(boolean_test_results, axis=1)
-        subxyz = xyz_values[test_results_indices]
-        if len(subxyz) != 1:
-            subd = subxyz - one_xyz_value  #  Array of vectors to near-enough neighbours
-            selectnonzeros = np.any(subd != 0, axis=1)
-            subd = np.compress(selectnonzeros, subd, axis=0)
-            separation_values = np.append(separation_values, subd, axis=0)
+    for subd, i_values, j_values in blocks:
+        if sort_and_halve is True:
+            separation_blocks.append(subd)
+        else:
+            # Vectors in both directions, with their reference localisations.
+            separation_blocks.extend([subd, np.subtract(0, subd)])
+            reference_blocks.extend([i_values, j_values])
+            neighbour_blocks.extend([j_values, i_values])
 
         # Progress message
-        if verbose and xyz_index % 5000 == 0:
-            print('Found neighbours for localisation', xyz_index, 'of', repr(len(xyz_values)) +'.')
+        if verbose:
+            print('Found %i vectors so far.'
+                  % sum(len(block) for block in separation_blocks))
             print('%i seconds so far.' % (time.time() - start_time))
 
+    if len(separation_blocks) == 0:
+        separation_values = neighbour_search.pair_separations(
+            xyz_values, xyz_values, np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+    else:
+        separation_values = np.concatenate(separation_blocks)
+    del separation_blocks
+
     if verbose:
         print('Found %i vectors between all localisations' % len(separation_values))
         print('in %i seconds.' % (time.time() - start_time))
 
     if sort_and_halve is True:
-        separation_values = separation_values[separation_values[:, 2].argsort()]
-
-        separation_values = separation_values[separation_values[:, 1].argsort(kind='mergesort')]
+        return separation_values[neighbour_search.lexicographic_order(separation_values)]
 
-        separation_values = separation_values[separation_values[:, 0].argsort(kind='mergesort')]
+    if len(reference_blocks) > 0:
+        order = np.lexsort((np.concatenate(neighbour_blocks),
+                            np.concatenate(reference_blocks)))
+        separation_values = separation_values[order]
 
-        #size, cols = separation_values.shape
-
-        separation_values = np.array_split(separation_values, 2)
+    return separation_values
 
-        return separation_values[1]
 
-    else:
-        return separation_values
+def _separation_blocks(xyz_values, pair_blocks, sort_and_halve,
+                       canonical=True, keep_coincident=False):
+    """Vectors between pairs of localisations, for getdistances.
+
+    Yields:
+        subd (numpy array):
+            Vectors for a block of pairs, from the earlier localisation in
+            each pair to the later one, without [0, 0, 0] unless
+            keep_coincident is True. If sort_and_halve and canonical are
+            True, these are in canonical orientation (see
+            neighbour_search.canonical_orientation).
+        i_values, j_values (numpy arrays):
+            Indices of the localisations in each pair, if sort_and_halve is
+            False, else None.
+    """
+    for i_values, j_values in pair_blocks:
+        subd = neighbour_search.pair_separations(
+            xyz_values, xyz_values, i_values, j_values)
+
+        if keep_coincident is False:
+            # Remove [0,0,0], these are duplicates and can overwhelm the result.
+            selectnonzeros = neighbour_search.nonzero_separations(subd)
+            subd = subd[selectnonzeros]
+            i_values = i_values[selectnonzeros]
+            j_values = j_values[selectnonzeros]
+
+        if sort_and_halve is True:
+            if canonical is True:
+                neighbour_search.canonical_orientation(subd)
+            yield subd, None, None
+        else:
+            yield subd, i_values, j_values
+
+
+def _tile_separations(tile, sort_and_halve, canonical=True, keep_coincident=False):
+    """Vectors between pairs of localisations found in one tile, with
+    localisation indices for the whole data set, for getdistances."""
+    # Tiles order localisations by cell, so the indices are kept to orient
+    # the vectors by their order in the whole data set.
+    blocks = list(_separation_blocks(tile.xyz_values, tile.neighbour_pairs(),
+                                     False, keep_coincident=keep_coincident))
+    if len(blocks) == 0:
+        no_pairs = np.zeros(0, dtype=np.int64)
+        blocks = [(neighbour_search.pair_separations(
+            tile.xyz_values, tile.xyz_values, no_pairs, no_pairs), no_pairs, no_pairs)]
+    subd = np.concatenate([block[0] for block in blocks])
+    i_values = tile.indices[np.concatenate([block[1] for block in blocks])]
+    j_values = tile.indices[np.concatenate([block[2] for block in blocks])]
+    if sort_and_halve is True:
+        if canonical is True:
+            neighbour_search.canonical_orientation(subd)
+        else:
+            later_first = i_values > j_values
+            subd[later_first] = 0. - subd[later_first]
+        return subd, None, None
+    return subd, i_values, j_values
 
 
 def getdistances_two_colours(
     xyz_values_start, filterdist, xyz_values_end,
-    verbose=False
+    verbose=False, workers=1
     ):
     """Store all vectors (relative positions) between points within a chosen
     distance of each other in 3D from a list of points in one numpy array
     to another.
     Also works for 2D.
 
+    Neighbours are found with a cell-list search (see neighbour_search.py).
+
     Args:
         xyz_values_start (numpy array):
             Numpy array of localisations with one row per localisation and
@@ -492,11 +541,16 @@ def getdistances_two_colours(
             Defaults to None.
         verbose (Boolean):
             Choice whether to print updates to screen. Defaults to False.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
+            The result is the same for any number of workers.
+            Defaults to 1.
 
     Returns:
         d (numpy array):
             A numpy array of vectors of neighbours within the filter distance
-            for every localisation.
+            for every localisation, ordered by the index of the 'from'
+            localisation, then of the 'to' localisation.
     """
 
     start_time = time.time()  # Start timing it.
@@ -512,95 +566,549 @@ def getdistances_two_colours(
                 'They currently have ' +repr(xyz_values_start.shape[1])+
                 ' and ' +repr(xyz_values_end.shape[1])+ 'dimensions, '
                 'respectively.\n')
-        # Add 3rd column to 2D localisations
-        if xyz_values_end.shape[1] == 2:
-            xyz_values_end = np.column_stack((xyz_values_end, np.zeros(xyz_values_end.shape[0])))
-
-    # Set up distance filter
-    xyz_filter_values = np.array([filterdist, filterdist, filterdist])
 
     if verbose:
         print('\nFinding vectors to nearby localisations:\n')
 
-    # Add 3rd column to 2D 'from' localisations
-    if xyz_values_start.shape[1] == 2:
-        xyz_values_start = np.column_stack((xyz_values_start, np.zeros(xyz_values_start.shape[0])))
-
-    # Initialise d (array of relative positions)
-    separation_values = []
-
-    # Find relative positions of near neighbours in 'from' to the first point
-    # in the 'from' set. Keep going through the list of points until at least
-    # one near neighbour is found.
-    xyz_index = 0
-
-    # Find all the separtions in x, y (and z) from the first 'from'
-    # localisation to the 'to' localisations.
-    while len(separation_values) == 0:
-        if xyz_index > len(xyz_values_start) -1:
-            break
-
-        one_xyz_value = xyz_values_start[xyz_index]  # Reference 'from' loc
-
-        # A filter to find 'to' localisation coordinates within filterdist of
-        # 'from' loc. Gives np.array of True / False
-        boolean_test_results = np.logical_and(
-            xyz_values_end > one_xyz_value - xyz_filter_values,
-            xyz_values_end < one_xyz_value + xyz_filter_values
-            )
-
-        # Find indices of 'to' locs within filterdist of 'from'
-        # loc in all three dimensions (all True) and select these.
-        test_results_indices = np.all(boolean_test_results, axis=1)
-        subxyz_end = xyz_values_end[test_results_indices]
-
-        sys.stdout.flush()
-
-        # Populate separation_values with any near neighbours.
-        # len(subxyz) == 1 would mean the reference 'from' loc was
-        # duplicated in the 'to' set and was the only locs within
-        # filterdist of itself.
-        # Remove [0,0,0], these are duplicates and can overwhelm the result
-        # when there is not a second 'to' dataset.
-        # Very unlikely that [0,0,0] occurs at all when there are different
-        # from and two datasets.
-        # Store the vectors from the reference 'from' loc to the filtered subset
-        # of all 'from' locs.
-        if len(subxyz_end) != 1:
-            separation_values = subxyz_end - one_xyz_value
-            selectnonzeros = np.any(separation_values != 0, axis=1)
-            separation_values = np.compress(selectnonzeros, separation_values, axis=0)
-
-        # Increment reference 'from' localisation
-        # in search of next 'from' localisation with near neighbours.
-        xyz_index = xyz_index + 1
-
-    # Continue appending to the array separation_values
-    # with vectors to the near-enough neighbours of other localisations.
-    for xyz_index in range(xyz_index, len(xyz_values_start)):
-        one_xyz_value = xyz_values_start[xyz_index]
-        boolean_test_results = np.logical_and(
-            xyz_values_end > one_xyz_value - xyz_filter_values,
-            xyz_values_end < one_xyz_value + xyz_filter_values)
-        test_results_indices = np.all(boolean_test_results, axis=1)
-        subxyz_end = xyz_values_end[test_results_indices]
-        if len(subxyz_end) != 1:
-            subd = subxyz_end - one_xyz_value  #  Array of vectors to near-enough neighbours
-            selectnonzeros = np.any(subd != 0, axis=1)
-            subd = np.compress(selectnonzeros, subd, axis=0)
-            separation_values = np.append(separation_values, subd, axis=0)
+    if workers > 1:
+        # Each tile owns its 'from' locs, so has all of their neighbours.
+        tile_results = list(parallel_search.map_tiles(
+            _tile_separations_between, xyz_values_start, filterdist,
+            xyz_values_end=xyz_values_end, workers=workers))
+        start_indices = np.concatenate([result[1] for result in tile_results])
+        end_indices = np.concatenate([result[2] for result in tile_results])
+        order = np.lexsort((end_indices, start_indices))
+        separation_values = np.concatenate(
+            [result[0] for result in tile_results])[order]
+    else:
+        separation_values = _separations_between(
+            xyz_values_start, xyz_values_end,
+            neighbour_search.iter_neighbour_pairs_between(
+                xyz_values_start, xyz_values_end, filterdist),
+            verbose=verbose, start_time=start_time)[0]
+
+    if verbose:
+        print('Found %i vectors between all localisations' % len(separation_values))
+        print('in %i seconds.' % (time.time() - start_time))
+
+    return separation_values
+
+
+def _separations_between(xyz_values_start, xyz_values_end, pair_blocks,
+                         verbose=False, start_time=None):
+    """Vectors from 'from' to 'to' localisations, for
+    getdistances_two_colours.
+
+    Returns:
+        separation_values (numpy array):
+            Non-zero vectors, ordered by the index of the 'from'
+            localisation, then of the 'to' localisation.
+        start_indices, end_indices (numpy arrays):
+            Indices of the localisations for each vector.
+    """
+    start_blocks = []
+    end_blocks = []
+    for i_values, j_values in pair_blocks:
+        start_blocks.append(i_values)
+        end_blocks.append(j_values)
+
+        # Progress message
+        if verbose:
+            print('Found %i vectors so far.'
+                  % sum(len(block) for block in start_blocks))
+            print('%i seconds so far.' % (time.time() - start_time))
+
+    if len(start_blocks) == 0:
+        start_blocks, end_blocks = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+    start_indices = np.concatenate(start_blocks)
+    end_indices = np.concatenate(end_blocks)
+    del start_blocks, end_blocks
+
+    # A 'from' loc with only one 'to' loc within filterdist is skipped,
+    # since that one loc would be the reference 'from' loc itself if the
+    # 'from' and 'to' sets were the same.
+    neighbour_counts = np.bincount(start_indices, minlength=len(xyz_values_start))
+    keep = neighbour_counts[start_indices] != 1
+
+    order = np.lexsort((end_indices[keep], start_indices[keep]))
+    start_indices = start_indices[keep][order]
+    end_indices = end_indices[keep][order]
+    separation_values = neighbour_search.pair_separations(
+        xyz_values_start, xyz_values_end, start_indices, end_indices)
+
+    # Remove [0,0,0], these are duplicates and can overwhelm the result
+    # when there is not a second 'to' dataset.
+    # Very unlikely that [0,0,0] occurs at all when there are different
+    # from and two datasets.
+    selectnonzeros = neighbour_search.nonzero_separations(separation_values)
+
+    return (separation_values[selectnonzeros],
+            start_indices[selectnonzeros],
+            end_indices[selectnonzeros])
+
+
+def _tile_separations_between(tile):
+    """Vectors from the 'from' localisations owned by one tile, with
+    localisation indices for the whole data set."""
+    separation_values, start_indices, end_indices = _separations_between(
+        tile.xyz_values_start, tile.xyz_values_end, tile.neighbour_pairs_between())
+    return (separation_values,
+            tile.start_indices[start_indices],
+            tile.end_indices[end_indices])
+
+
+def gethistograms(xyz_values, filterdist, verbose=False, workers=1):
+    """Histogram the distances between points within a chosen distance of
+    each other in all three dimensions, without storing the vectors between
+    them. Also works for 2D.
+
+    The histograms are those that would be made from the output of
+    getdistances (with sort_and_halve=True) and get_vectors, but memory use
+    does not grow with the number of relative positions.
+
+    Args:
+        xyz_values (numpy array):
+            Numpy array of localisations with shape (N, 2 or 3),
+            where N is the number of localisations.
+        filterdist (float):
+            Distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        verbose (Boolean):
+            Choice whether to print updates to screen. Defaults to False.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
+            Defaults to 1.
+
+    Returns:
+        histograms (distance_histograms.DistanceHistograms):
+            Counts of the X, Y (and Z) separations and XY (and XZ, YZ, XYZ)
+            distances in 1-nm bins.
+    """
+
+    start_time = time.time()  # Start timing it.
+
+    if verbose:
+        print('\nHistogramming vectors to nearby localisations:\n')
+
+    histograms = distance_histograms.DistanceHistograms(xyz_values.shape[1], filterdist)
+
+    if workers > 1:
+        for tile_histograms in parallel_search.map_tiles(
+                _tile_histograms, xyz_values, filterdist, workers=workers):
+            histograms.merge(tile_histograms)
+
+            # Progress message
+            if verbose:
+                print('Found %i vectors so far.' % histograms.total)
+                print('%i seconds so far.' % (time.time() - start_time))
+    else:
+        _accumulate_histograms(
+            histograms, xyz_values,
+            neighbour_search.iter_neighbour_pairs(xyz_values, filterdist),
+            verbose=verbose, start_time=start_time)
+
+    if verbose:
+        print('Found %i vectors between all localisations' % histograms.total)
+        print('in %i seconds.' % (time.time() - start_time))
+
+    return histograms
+
+
+def _accumulate_histograms(histograms, xyz_values, pair_blocks,
+                           verbose=False, start_time=None):
+    """Add the vectors between pairs of localisations to histograms, for
+    gethistograms."""
+    for i_values, j_values in pair_blocks:
+        subd = neighbour_search.pair_separations(
+            xyz_values, xyz_values, i_values, j_values)
+
+        # Remove [0,0,0], these are duplicates and can overwhelm the result.
+        histograms.add_separations(subd[neighbour_search.nonzero_separations(subd)])
 
         # Progress message
-        if verbose and xyz_index % 5000 == 0:
-            print('Found neighbours for localisation', xyz_index, 'of',
-                repr(len(xyz_values_start)) +'.')
+        if verbose:
+            print('Found %i vectors so far.' % histograms.total)
             print('%i seconds so far.' % (time.time() - start_time))
 
+
+def _tile_histograms(tile):
+    """Histograms of the vectors between pairs of localisations found in
+    one tile."""
+    histograms = distance_histograms.DistanceHistograms(tile.dims, tile.filterdist)
+    _accumulate_histograms(histograms, tile.xyz_values, tile.neighbour_pairs())
+    return histograms
+
+
+def gethistograms_two_colours(
+    xyz_values_start, filterdist, xyz_values_end,
+    verbose=False, workers=1
+    ):
+    """Histogram the distances from one set of points to another, within a
+    chosen distance in all three dimensions, without storing the vectors
+    between them. Also works for 2D.
+
+    The histograms are those that would be made from the output of
+    getdistances_two_colours and get_vectors.
+
+    Args:
+        xyz_values_start (numpy array):
+            Numpy array of localisations to calculate relative positions
+            'from', with shape (N, 2 or 3).
+        filterdist (float):
+            Distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        xyz_values_end (numpy array):
+            Numpy array of localisations to calculate relative positions
+            'to'.
+        verbose (Boolean):
+            Choice whether to print updates to screen. Defaults to False.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
+            Defaults to 1.
+
+    Returns:
+        histograms (distance_histograms.DistanceHistograms):
+            Counts of the X, Y (and Z) separations and XY (and XZ, YZ, XYZ)
+            distances in 1-nm bins.
+    """
+
+    start_time = time.time()  # Start timing it.
+
+    if xyz_values_start.shape[1] != xyz_values_end.shape[1]:
+        sys.exit(
+            '\nYour start and end sets of posistions must have '
+            'the same dimensionality.\n'
+            'They currently have ' +repr(xyz_values_start.shape[1])+
+            ' and ' +repr(xyz_values_end.shape[1])+ 'dimensions, '
+            'respectively.\n')
+
     if verbose:
-        print('Found %i vectors between all localisations' % len(separation_values))
+        print('\nHistogramming vectors to nearby localisations:\n')
+
+    dims = xyz_values_start.shape[1]
+    histograms = distance_histograms.DistanceHistograms(dims, filterdist)
+
+    if workers > 1:
+        for tile_histograms in parallel_search.map_tiles(
+                _tile_histograms_between, xyz_values_start, filterdist,
+                xyz_values_end=xyz_values_end, workers=workers):
+            histograms.merge(tile_histograms)
+
+            # Progress message
+            if verbose:
+                print('Found %i vectors so far.' % histograms.total)
+                print('%i seconds so far.' % (time.time() - start_time))
+    else:
+        _accumulate_histograms_between(
+            histograms, xyz_values_start, xyz_values_end,
+            neighbour_search.iter_neighbour_pairs_between(
+                xyz_values_start, xyz_values_end, filterdist),
+            verbose=verbose, start_time=start_time)
+
+    if verbose:
+        print('Found %i vectors between all localisations' % histograms.total)
         print('in %i seconds.' % (time.time() - start_time))
 
-    return separation_values
+    return histograms
+
+
+def _accumulate_histograms_between(histograms, xyz_values_start, xyz_values_end,
+                                   pair_blocks, verbose=False, start_time=None):
+    """Add the vectors from 'from' to 'to' localisations to histograms, for
+    gethistograms_two_colours."""
+    accumulator = HistogramsBetween(histograms, xyz_values_start, xyz_values_end)
+    for i_values, j_values in pair_blocks:
+        accumulator.add(i_values, j_values)
+
+        # Progress message
+        if verbose:
+            print('Found %i vectors so far.' % histograms.total)
+            print('%i seconds so far.' % (time.time() - start_time))
+
+    accumulator.finish()
+
+
+class HistogramsBetween:
+    """Adds the vectors from 'from' to 'to' localisations to histograms, a
+    block of pairs at a time, to give the histograms of the output of
+    getdistances_two_colours.
+
+    getdistances_two_colours skips 'from' locs with only one 'to' loc
+    within filterdist. Which locs these are is only known at the end, so
+    the first 'to' loc and the largest distances for each 'from' loc are
+    kept, to take them out of the histograms in finish().
+
+    Args:
+        histograms (distance_histograms.DistanceHistograms):
+            The histograms to add to.
+        xyz_values_start, xyz_values_end (numpy arrays):
+            The 'from' and 'to' localisations.
+    """
+    def __init__(self, histograms, xyz_values_start, xyz_values_end):
+        self.histograms = histograms
+        self.xyz_values_start = xyz_values_start
+        self.xyz_values_end = xyz_values_end
+        n_start = len(xyz_values_start)
+        self.neighbour_counts = np.zeros(n_start, dtype=np.int64)
+        self.first_neighbours = np.full(n_start, -1, dtype=np.int64)
+        self.loc_maxima = {description: np.zeros(n_start)
+                           for description in histograms.descriptions}
+        self.maxima = dict(histograms.maxima)
+
+    def add(self, i_values, j_values):
+        """Add the vectors for a block of pairs of 'from' and 'to' locs."""
+        self.neighbour_counts = self.neighbour_counts + np.bincount(
+            i_values, minlength=len(self.xyz_values_start))
+        new_locs, first_pair = np.unique(i_values, return_index=True)
+        unseen = self.first_neighbours[new_locs] == -1
+        self.first_neighbours[new_locs[unseen]] = j_values[first_pair[unseen]]
+
+        subd = neighbour_search.pair_separations(
+            self.xyz_values_start, self.xyz_values_end, i_values, j_values)
+        selectnonzeros = neighbour_search.nonzero_separations(subd)
+        distances = distance_histograms.separation_distances(subd[selectnonzeros],
+                                                             self.histograms.dims)
+        self.histograms.add_distances(distances)
+        for description in self.histograms.descriptions:
+            np.maximum.at(self.loc_maxima[description], i_values[selectnonzeros],
+                          distances[description])
+
+    def finish(self):
+        """Take out the vectors from 'from' locs with one 'to' loc."""
+        single_locs = np.flatnonzero(self.neighbour_counts == 1)
+        subd = neighbour_search.pair_separations(
+            self.xyz_values_start, self.xyz_values_end,
+            single_locs, self.first_neighbours[single_locs])
+        self.histograms.remove_separations(
+            subd[neighbour_search.nonzero_separations(subd)])
+        kept_locs = self.neighbour_counts > 1
+        for description in self.histograms.descriptions:
+            self.histograms.maxima[description] = max(
+                self.maxima[description],
+                float(np.max(self.loc_maxima[description][kept_locs], initial=0.)))
+
+
+def _tile_histograms_between(tile):
+    """Histograms of the vectors from the 'from' localisations owned by one
+    tile."""
+    histograms = distance_histograms.DistanceHistograms(tile.dims, tile.filterdist)
+    _accumulate_histograms_between(histograms, tile.xyz_values_start,
+                                   tile.xyz_values_end, tile.neighbour_pairs_between())
+    return histograms
+
+
+def _channel_sets(xyzcolour_values, channels, dims):
+    """The localisations in the chosen colour channels, for a search of all
+    pairs of channels.
+
+    Returns:
+        xyz_values (numpy array):
+            The localisations in any of the channels.
+        channel_ids (numpy array of ints):
+            The index in channels of the channel of each localisation.
+        local_indices (numpy array of ints):
+            The index of each localisation among those in its channel.
+        xyz_sets (list of numpy arrays):
+            The localisations in each channel, as selected for a search of
+            that channel alone.
+    """
+    channel_ids = np.full(len(xyzcolour_values), -1, dtype=np.int64)
+    for channel_id, channel in enumerate(channels):
+        channel_ids[xyzcolour_values[:, -1] == channel] = channel_id
+    selected = channel_ids >= 0
+    xyz_values = xyzcolour_values[:, 0:dims][selected]
+    channel_ids = channel_ids[selected]
+
+    local_indices = np.zeros(len(channel_ids), dtype=np.int64)
+    xyz_sets = []
+    for channel_id in range(len(channels)):
+        in_channel = channel_ids == channel_id
+        local_indices[in_channel] = np.arange(np.count_nonzero(in_channel))
+        xyz_sets.append(xyz_values[in_channel])
+    return xyz_values, channel_ids, local_indices, xyz_sets
+
+
+def _channel_pair_blocks(xyz_values, channel_ids, local_indices, n_channels,
+                         filterdist, workers=1):
+    """Pairs of localisations within the filter distance, found with one
+    search of all channels (see neighbour_search.iter_channel_pairs), split
+    by 'from' and 'to' channel.
+
+    Yields:
+        channel_pair (tuple of ints):
+            Indices of the 'from' and 'to' channels.
+        i_values, j_values (numpy arrays):
+            Indices of the localisations in each pair, among those in their
+            channels.
+    """
+    if workers > 1:
+        pair_blocks = parallel_search.map_tiles(
+            _tile_channel_pairs, xyz_values, filterdist, workers=workers,
+            args=(channel_ids,))
+    else:
+        pair_blocks = neighbour_search.iter_channel_pairs(xyz_values, channel_ids,
+                                                          filterdist)
+
+    for i_values, j_values in pair_blocks:
+        pair_ids = channel_ids[i_values] * n_channels + channel_ids[j_values]
+        order = np.argsort(pair_ids, kind='stable')
+        bounds = np.searchsorted(pair_ids[order], np.arange(n_channels ** 2 + 1))
+        for pair_id in range(n_channels ** 2):
+            block = order[bounds[pair_id]:bounds[pair_id + 1]]
+            if len(block) > 0:
+                yield (divmod(pair_id, n_channels),
+                       local_indices[i_values[block]],
+                       local_indices[j_values[block]])
+
+
+def _tile_channel_pairs(tile, channel_ids):
+    """Pairs of localisations in any channels, with the first localisation
+    owned by one tile, with localisation indices for the whole data set."""
+    blocks = list(neighbour_search.iter_channel_pairs(
+        tile.xyz_values, channel_ids[tile.indices], tile.filterdist,
+        cells=tile.cells, cell_mask=tile.cell_mask))
+    if len(blocks) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return (tile.indices[np.concatenate([block[0] for block in blocks])],
+            tile.indices[np.concatenate([block[1] for block in blocks])])
+
+
+def getdistances_channel_pairs(xyzcolour_values, channels, filterdist, dims,
+                               verbose=False, workers=1):
+    """Store the vectors between points within a chosen distance of each
+    other, for every combination of a 'from' and a 'to' colour channel, with
+    one search of the localisations in all the channels.
+
+    Args:
+        xyzcolour_values (numpy array):
+            Localisations, with their colour channels in the last column.
+        channels (list):
+            The colour channel values to use.
+        filterdist (float):
+            Distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+        verbose (Boolean):
+            Choice whether to print updates to screen. Defaults to False.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
+            Defaults to 1.
+
+    Returns:
+        d_values (dict):
+            For each (from channel, to channel), the vectors that getdistances
+            gives for the localisations of a channel with itself, or that
+            getdistances_two_colours gives from one channel to another.
+    """
+    start_time = time.time()  # Start timing it.
+
+    if verbose:
+        print('\nFinding vectors to nearby localisations in all channels:\n')
+
+    xyz_values, channel_ids, local_indices, xyz_sets = _channel_sets(
+        xyzcolour_values, channels, dims)
+
+    pair_blocks = {}
+    n_pairs = 0
+    for channel_pair, i_values, j_values in _channel_pair_blocks(
+            xyz_values, channel_ids, local_indices, len(channels), filterdist,
+            workers=workers):
+        pair_blocks.setdefault(channel_pair, []).append((i_values, j_values))
+
+        # Progress message
+        n_pairs = n_pairs + len(i_values)
+        if verbose:
+            print('Found %i pairs of localisations so far.' % n_pairs)
+            print('%i seconds so far.' % (time.time() - start_time))
+
+    d_values = {}
+    for start_id, start_channel in enumerate(channels):
+        for end_id, end_channel in enumerate(channels):
+            blocks = pair_blocks.pop((start_id, end_id), [])
+            if start_id == end_id:
+                separation_blocks = [block[0] for block in _separation_blocks(
+                    xyz_sets[start_id], blocks, True)]
+                if len(separation_blocks) == 0:
+                    no_pairs = np.zeros(0, dtype=np.int64)
+                    separation_blocks = [neighbour_search.pair_separations(
+                        xyz_sets[start_id], xyz_sets[start_id], no_pairs, no_pairs)]
+                separation_values = np.concatenate(separation_blocks)
+                separation_values = separation_values[
+                    neighbour_search.lexicographic_order(separation_values)]
+            else:
+                separation_values = _separations_between(
+                    xyz_sets[start_id], xyz_sets[end_id], blocks)[0]
+            d_values[(start_channel, end_channel)] = separation_values
+
+    if verbose:
+        print('Found %i vectors between all localisations'
+              % sum(len(values) for values in d_values.values()))
+        print('in %i seconds.' % (time.time() - start_time))
+
+    return d_values
+
+
+def gethistograms_channel_pairs(xyzcolour_values, channels, filterdist, dims,
+                                verbose=False, workers=1):
+    """Histogram the distances between points within a chosen distance of
+    each other, for every combination of a 'from' and a 'to' colour channel,
+    with one search of the localisations in all the channels, without storing
+    the vectors between them.
+
+    Args:
+        As getdistances_channel_pairs.
+
+    Returns:
+        histograms (dict):
+            For each (from channel, to channel), the
+            distance_histograms.DistanceHistograms that gethistograms gives
+            for the localisations of a channel with itself, or that
+            gethistograms_two_colours gives from one channel to another.
+    """
+    start_time = time.time()  # Start timing it.
+
+    if verbose:
+        print('\nHistogramming vectors to nearby localisations in all channels:\n')
+
+    xyz_values, channel_ids, local_indices, xyz_sets = _channel_sets(
+        xyzcolour_values, channels, dims)
+
+    histograms = {}
+    accumulators = {}
+    for start_id in range(len(channels)):
+        for end_id in range(len(channels)):
+            histograms[(start_id, end_id)] = distance_histograms.DistanceHistograms(
+                dims, filterdist)
+            if start_id != end_id:
+                accumulators[(start_id, end_id)] = HistogramsBetween(
+                    histograms[(start_id, end_id)], xyz_sets[start_id], xyz_sets[end_id])
+
+    for channel_pair, i_values, j_values in _channel_pair_blocks(
+            xyz_values, channel_ids, local_indices, len(channels), filterdist,
+            workers=workers):
+        if channel_pair in accumulators:
+            accumulators[channel_pair].add(i_values, j_values)
+        else:
+            _accumulate_histograms(histograms[channel_pair], xyz_sets[channel_pair[0]],
+                                   [(i_values, j_values)])
+
+        # Progress message
+        if verbose:
+            print('Found %i vectors so far.'
+                  % sum(values.total for values in histograms.values()))
+            print('%i seconds so far.' % (time.time() - start_time))
+
+    for accumulator in accumulators.values():
+        accumulator.finish()
+
+    if verbose:
+        print('Found %i vectors between all localisations'
+              % sum(values.total for values in histograms.values()))
+        print('in %i seconds.' % (time.time() - start_time))
+
+    return {(channels[start_id], channels[end_id]): values
+            for (start_id, end_id), values in histograms.items()}
 
 
 def get_vectors(d_values, dims):
@@ -615,46 +1123,295 @@ def get_vectors(d_values, dims):
     Returns:
         d_values (numpy array): Array of vector components.
     """
-    #for i in range(0, 10):
-    #    print(d_values[i])
-    x_square_values = np.square(d_values[:, 0])
-    y_square_values = np.square(d_values[:, 1])
+    # Distances across planes and 3D space are included in the output table,
+    # which is sorted by the last of them.
+    return get_relative_positions(d_values, dims).table()
 
-    if dims == 3:
-        z_square_values = np.square(d_values[:, 2])
 
-    # Calculate distances across planes and 3D space
-    xy_distance_values = np.sqrt(x_square_values + y_square_values)
+def get_relative_positions(d_values, dims, dtype=None):
+    """Finds the same table of relative positions as get_vectors, in a
+    relpos_table.RelativePositions, which stores only the vector components
+    and calculates the distance columns when they are used.
 
-    if dims == 3:
-        xz_distance_values = np.sqrt(x_square_values + z_square_values)
-        yz_distance_values = np.sqrt(y_square_values + z_square_values)
-        xyz_distance_values = np.sqrt(x_square_values + y_square_values + z_square_values)
+    Args:
+        d_values: numpy array of vectors between localisations, as from
+                  getdistances or getdistances_two_colours.
+        dims: The dimensions of the data ie 2D or 3D.
+        dtype (numpy dtype):
+            Optional, type to store the components as, e.g. np.float32.
+
+    Returns:
+        relative_positions (relpos_table.RelativePositions):
+            The relative positions, sorted as get_vectors sorts them.
+    """
+    return relpos_table.RelativePositions(d_values, dims, dtype=dtype).sort()
 
-    # Include these distances in the output table
-    d_values = np.column_stack((d_values, xy_distance_values))
 
-    if dims == 3:
-        d_values = np.column_stack((d_values, xz_distance_values))
-        d_values = np.column_stack((d_values, yz_distance_values))
-        d_values = np.column_stack((d_values, xyz_distance_values))
+def get_vectors_and_pairs(xyz_values_start, filterdist, dims, xyz_values_end=None,
+                          verbose=False, workers=1):
+    """Finds the relative positions, as get_vectors does for the output of
+    getdistances (or getdistances_two_colours), together with the indices of
+    the localisations that each is between, e.g. for relpos_cache.py.
+
+    Args:
+        xyz_values_start (numpy array):
+            Numpy array of localisations with shape (N, 2 or 3).
+        filterdist: distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        dims: The dimensions of the data ie 2D or 3D.
+        xyz_values_end (numpy array):
+            Optional, localisations to find relative positions 'to', from
+            xyz_values_start.
+        verbose (Boolean):
+            Choice whether to print updates to screen. Defaults to False.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
 
-    if dims == 2:
-        d_values.view('f8,f8,f8,f8').sort(order=['f3'], axis=0)
+    Returns:
+        v_values (numpy array):
+            The table of relative positions, as from get_vectors.
+        start_indices, end_indices (numpy arrays):
+            For each row, the indices of the localisations in xyz_values_start
+            and in xyz_values_end (or xyz_values_start, for one set of
+            localisations).
+    """
+    start_time = time.time()  # Start timing it.
 
-    if dims == 3:
-        d_values.view('f8,f8,f8,f8,f8,f8,f8').sort(order=['f6'], axis=0)
+    if verbose:
+        print('\nFinding vectors to nearby localisations:\n')
 
-    return d_values
+    if xyz_values_end is None:
+        if workers > 1:
+            blocks = parallel_search.map_tiles(_tile_separations, xyz_values_start,
+                                               filterdist, workers=workers,
+                                               args=(False,))
+        else:
+            blocks = _separation_blocks(
+                xyz_values_start,
+                neighbour_search.iter_neighbour_pairs(xyz_values_start, filterdist),
+                False)
+    elif workers > 1:
+        blocks = parallel_search.map_tiles(
+            _tile_separations_between, xyz_values_start, filterdist,
+            xyz_values_end=xyz_values_end, workers=workers)
+    else:
+        blocks = [_separations_between(
+            xyz_values_start, xyz_values_end,
+            neighbour_search.iter_neighbour_pairs_between(
+                xyz_values_start, xyz_values_end, filterdist))]
+    blocks = list(blocks)
+
+    if len(blocks) == 0:
+        no_pairs = np.zeros(0, dtype=np.int64)
+        blocks = [(neighbour_search.pair_separations(
+            xyz_values_start, xyz_values_start, no_pairs, no_pairs), no_pairs, no_pairs)]
+    separation_values = np.concatenate([block[0] for block in blocks])
+    start_indices = np.concatenate([block[1] for block in blocks])
+    end_indices = np.concatenate([block[2] for block in blocks])
+    del blocks
+
+    if xyz_values_end is None:
+        # One vector per pair, as getdistances with sort_and_halve.
+        neighbour_search.canonical_orientation(separation_values)
+
+    v_values = relpos_writer.vector_columns(separation_values, dims)
+    del separation_values
+    order = relpos_writer.distance_order(v_values)
+
+    if verbose:
+        print('Found %i vectors between all localisations' % len(v_values))
+        print('in %i seconds.' % (time.time() - start_time))
+
+    return v_values[order], start_indices[order], end_indices[order]
+
+
+def get_vectors_cached(xyz_values_start, filterdist, dims, info, xyz_values_end=None,
+                       verbose=False, workers=1, return_pairs=False):
+    """Finds the relative positions, as get_vectors does for the output of
+    getdistances (or getdistances_two_colours), using the cache in
+    info['cache_dir'] (see relpos_cache.py). The relative positions are taken
+    from the cache if the same localisations have been searched with the
+    same or a larger filter distance, and otherwise found and stored.
+
+    Args:
+        xyz_values_start (numpy array):
+            Numpy array of localisations with shape (N, 2 or 3).
+        filterdist: distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        dims: The dimensions of the data ie 2D or 3D.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths. The filter distance of the cached
+            result used, if any, is recorded in info['cached_filter_dist'].
+        xyz_values_end (numpy array):
+            Optional, localisations to find relative positions 'to', from
+            xyz_values_start.
+        verbose (Boolean):
+            Choice whether to print updates to screen. Defaults to False.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
+        return_pairs (Boolean):
+            Choice whether to also return the localisations each relative
+            position is between, as get_vectors_and_pairs does.
+
+    Returns:
+        v_values (numpy array):
+            The table of relative positions, as from get_vectors.
+        start_indices, end_indices (numpy arrays):
+            If return_pairs is True.
+    """
+    try:
+        cache = relpos_cache.RelativePositionCache(
+            info['cache_dir'], info.get('cache_size', relpos_cache.DEFAULT_CACHE_SIZE))
+    except OSError:
+        print("Unexpected error:", sys.exc_info()[0])
+        sys.exit("Could not create the cache directory.")
+    key = relpos_cache.localisations_key(xyz_values_start, xyz_values_end)
+
+    (v_values, start_indices, end_indices,
+     info['cached_filter_dist']) = cache.lookup(key, filterdist,
+                                                xyz_values_start, xyz_values_end)
+    if v_values is not None:
+        if verbose:
+            print('\nRelative positions taken from the cache (found with a '
+                  'filter distance of %g nm).' % info['cached_filter_dist'])
+    else:
+        v_values, start_indices, end_indices = get_vectors_and_pairs(
+            xyz_values_start, filterdist, dims, xyz_values_end=xyz_values_end,
+            verbose=verbose, workers=workers)
+        try:
+            cache.store(key, filterdist, dims, v_values, start_indices, end_indices)
+        except (IOError, OSError):
+            print("Could not store the relative positions in the cache:",
+                  sys.exc_info()[0])
+
+    if return_pairs:
+        return v_values, start_indices, end_indices
+    return v_values
+
+
+def relative_positions_file_name(filterdist, info):
+    """The path and filename of the relative positions file.
+
+    Args:
+        filterdist: distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+
+    Returns:
+        out_file_name (str): A .csv file, or a .npy file if info['relpos_format']
+            is 'npy'.
+    """
+    extension = '.' + info.get('relpos_format', 'csv')
+    out_file_name = info['results_dir']+r'//'+ info['in_file_no_extension'] + \
+        '_PERPL-relpos_%.1ffilter' % filterdist + extension
+
+    if info['short_names']:
+        out_file_name = info['short_results_dir']+r'//'+ \
+            info['short_filename_without_extension'] + \
+            '_PERPL-relpos_%.1ffilter' % filterdist + extension
+
+    return out_file_name
+
+
+def save_relative_positions_out_of_core(
+    xyz_values_start, filterdist, dims, info, xyz_values_end=None,
+    max_memory=relpos_writer.DEFAULT_MAX_MEMORY, verbose=False, workers=1
+    ):
+    """Finds the relative positions and saves them in a csv file (or .npy
+    file, see relpos_files.py), without holding them all in memory. The file
+    is the same as that from
+    getdistances (or getdistances_two_colours), get_vectors and
+    save_relative_positions.
+
+    Args:
+        xyz_values_start (numpy array):
+            Numpy array of localisations with shape (N, 2 or 3).
+        filterdist: distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        dims: The dimensions of the data ie 2D or 3D.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+        xyz_values_end (numpy array):
+            Optional, localisations to find relative positions 'to', from
+            xyz_values_start.
+        max_memory (float):
+            Approximate memory (MB) to use for holding relative positions.
+        verbose (Boolean):
+            Choice whether to print updates to screen. Defaults to False.
+        workers (int):
+            Number of processes to search with (see parallel_search.py).
+
+    Returns:
+        writer (relpos_writer.RelativePositionWriter):
+            The writer, with the number of relative positions saved (total),
+            histograms of their distances (histograms) and the output file
+            (out_file_name).
+    """
+    start_time = time.time()  # Start timing it.
+
+    if verbose:
+        print('\nFinding vectors to nearby localisations, using up to %i MB '
+              'for relative positions:\n' % max_memory)
+
+    writer = relpos_writer.RelativePositionWriter(
+        relative_positions_file_name(filterdist, info), dims, filterdist,
+        max_memory=max_memory, info=info)
+    excluded_starts = None
+
+    if xyz_values_end is None:
+        if workers > 1:
+            blocks = parallel_search.map_tiles(_tile_separations, xyz_values_start,
+                                               filterdist, workers=workers,
+                                               args=(True,))
+        else:
+            blocks = _separation_blocks(
+                xyz_values_start,
+                neighbour_search.iter_neighbour_pairs(xyz_values_start, filterdist),
+                True)
+        for subd, _, _ in blocks:
+            writer.add(subd)
+    elif workers > 1:
+        # Each tile owns its 'from' locs, so skips those with one neighbour.
+        for subd, _, _ in parallel_search.map_tiles(
+                _tile_separations_between, xyz_values_start, filterdist,
+                xyz_values_end=xyz_values_end, workers=workers):
+            writer.add(subd)
+    else:
+        # 'From' locs with only one 'to' loc within filterdist are skipped
+        # (see getdistances_two_colours), once all neighbours are counted.
+        neighbour_counts = np.zeros(len(xyz_values_start), dtype=np.int64)
+        for i_values, j_values in neighbour_search.iter_neighbour_pairs_between(
+                xyz_values_start, xyz_values_end, filterdist):
+            neighbour_counts = neighbour_counts + np.bincount(
+                i_values, minlength=len(xyz_values_start))
+            subd = neighbour_search.pair_separations(
+                xyz_values_start, xyz_values_end, i_values, j_values)
+            selectnonzeros = neighbour_search.nonzero_separations(subd)
+            writer.add(subd[selectnonzeros], start_indices=i_values[selectnonzeros])
+        excluded_starts = neighbour_counts == 1
+
+    if verbose:
+        print('Found all vectors in %i seconds.' % (time.time() - start_time))
+
+    writer.close(excluded_starts=excluded_starts, verbose=verbose)
+
+    if verbose:
+        print('Saved %i vectors between all localisations' % writer.total)
+        print('in %i seconds.' % (time.time() - start_time))
+
+    return writer
 
 
 def save_relative_positions(d_values, filterdist, dims, info):
-    """Saves the relative positions that have been found in a csv file. This
-    function saves both 2D and 3D data.
+    """Saves the relative positions that have been found in a csv file, or in
+    a memory-mappable .npy file with a JSON sidecar if info['relpos_format']
+    is 'npy' (see relpos_files.py). This function saves both 2D and 3D data.
 
     Args:
         d_values: numpy array of localisations with distances between the
-                  localisations.
+                  localisations (as from get_vectors), or a
+                  relpos_table.RelativePositions.
         filterdist: distance (in all three dimensions) between points within
             which relative positions are calculated. This can be chosen by user
             input as the function runs, or by specifying when calling the
@@ -667,23 +1424,55 @@ def save_relative_positions(d_values, filterdist, dims, info):
         outfilename: The path and filename of the output data file. This is
            recorded in the log file.
     """
+    out_file_name = relative_positions_file_name(filterdist, info)
+
+    head = relpos_files.RELPOS_HEADERS[dims]
+
+
+    try:
+        if info.get('relpos_format') == 'npy':
+            relpos_files.save_relpos_npy(d_values, out_file_name, dims, filterdist, info)
+        elif isinstance(d_values, relpos_table.RelativePositions):
+            # The full table is made a block of rows at a time.
+            with open(out_file_name, 'w') as fout:
+                fout.write(head + '\n')
+                for v_values in d_values.iter_tables():
+                    np.savetxt(fout, v_values, delimiter=',')
+        else:
+            np.savetxt(out_file_name, d_values, delimiter=',', header=head, comments='')
+    except (EOFError, IOError, OSError):
+        print("Unexpected error:", sys.exc_info()[0])
+        sys.exit("Could not create and open the output data file.")
+
+    return out_file_name
+
+
+def save_histograms(histograms, filterdist, info):
+    """Saves histograms of distances between localisations in a numpy .npz
+    file, which can be used in place of the relative positions file for
+    model fitting (e.g. by rot_2d_symm_fit.py).
+
+    Args:
+        histograms (distance_histograms.DistanceHistograms):
+            The histograms to save.
+        filterdist: distance (in all three dimensions) between points within
+            which relative positions are calculated.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+
+    Returns:
+        outfilename: The path and filename of the output data file.
+    """
     out_file_name = info['results_dir']+r'//'+ info['in_file_no_extension'] + \
-        '_PERPL-relpos_%.1ffilter.csv' % filterdist
+        '_PERPL-histograms_%.1ffilter.npz' % filterdist
 
     if info['short_names']:
         out_file_name = info['short_results_dir']+r'//'+ \
             info['short_filename_without_extension'] + \
-            '_PERPL-relpos_%.1ffilter.csv' % filterdist
-
-    if dims == 2:
-        head = "xx_separation,yy_separation, ,xy_separation"
-    elif dims == 3:
-        head = ("xx_separation,yy_separation,zz_separation,xy_separation,"
-                "xz_separation,yz_separation,xyz_separation")
-
+            '_PERPL-histograms_%.1ffilter.npz' % filterdist
 
     try:
-        np.savetxt(out_file_name, d_values, delimiter=',', header=head, comments='')
+        histograms.save(out_file_name)
     except (EOFError, IOError, OSError):
         print("Unexpected error:", sys.exc_info()[0])
         sys.exit("Could not create and open the output data file.")
@@ -691,10 +1480,354 @@ def save_relative_positions(d_values, filterdist, dims, info):
     return out_file_name
 
 
+def parse_filter_distances(text):
+    """Reads one or more filter distances given on the command line: a
+    number, numbers separated by commas (e.g. 50,100,200) or a range given
+    as start:stop:step, including stop (e.g. 50:400:50).
+
+    Args:
+        text (str): The filter distances.
+
+    Returns:
+        filter_distances (list): The filter distances, smallest first, as
+            int where they are whole numbers (so that results directories
+            are named as for a single filter distance).
+    """
+    filter_distances = []
+    for item in text.split(','):
+        try:
+            if ':' in item:
+                start, stop, step = [float(value) for value in item.split(':')]
+                if step <= 0:
+                    raise ValueError
+                count = int(np.floor((stop - start) / step + 1e-9)) + 1
+                filter_distances.extend(start + step * np.arange(count))
+            else:
+                filter_distances.append(float(item))
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                "invalid filter distance(s): %r" % text)
+    if len(filter_distances) == 0 or min(filter_distances) <= 0:
+        raise argparse.ArgumentTypeError(
+            "filter distances must be greater than 0: %r" % text)
+    return sorted(set(int(filterdist) if float(filterdist).is_integer()
+                      else float(filterdist) for filterdist in filter_distances))
+
+
+def make_results_dir(info):
+    """Sets up the names of the results directory and files for the filter
+    distance in info['filter_dist'] (see utils.primary_filename_and_path_setup)
+    and makes the directory.
+
+    Args:
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+
+    Returns:
+        results_dir (str): The results directory.
+    """
+    utils.primary_filename_and_path_setup(info)
+
+    if info['short_names'] is True:
+        results_dir = info['short_results_dir']
+    else:
+        results_dir = info['results_dir']
+    try:
+        os.makedirs(results_dir)
+    except OSError:
+        print("Unexpected error:", sys.exc_info()[0])
+        sys.exit("Could not create directory for the results.")
+
+    return results_dir
+
+
+def draw_scatter_plots(xyzcolour_values, info, results_dir, scatter_plots_dir=None):
+    """Draws the scatter plot of the localisations and of the zoomed region,
+    or copies them into results_dir if they have already been drawn for the
+    same localisations.
+
+    Args:
+        xyzcolour_values (numpy array):
+            The localisations read in.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+        results_dir (str):
+            The results directory set up for info (see make_results_dir).
+        scatter_plots_dir (str):
+            Optional, a results directory where the scatter plots have
+            already been drawn.
+
+    Returns:
+        scatter_plots_dir (str): The directory the scatter plots were drawn in.
+    """
+    if scatter_plots_dir is None:
+        plotting.draw_2d_scatter_plots(xyzcolour_values, info['dims'], info, 0)
+        plotting.draw_2d_scatter_plots(xyzcolour_values, info['dims'], info, info['zoom'])
+        return results_dir
+
+    for filename in os.listdir(scatter_plots_dir):
+        if filename.startswith('scatter_plot'):
+            shutil.copy(os.path.join(scatter_plots_dir, filename), results_dir)
+    return scatter_plots_dir
+
+
+def sweep_filter_distances(xyzcolour_values, xyz_values_start, info,
+                           xyz_values_end=None):
+    """Finds relative positions once, with the largest of the filter distances
+    in info['filter_distances'], and saves the results for every filter
+    distance (plots, relative positions file and report) in its own results
+    directory, as separate runs with each filter distance would.
+
+    The relative positions for a smaller filter distance are those whose
+    localisations pass the filter of the neighbour search with it (see
+    relpos_cache.relative_positions_within), so each table is the same as
+    searching with that filter distance.
+
+    Args:
+        xyzcolour_values (numpy array):
+            The localisations read in, for the scatter plots.
+        xyz_values_start (numpy array):
+            Numpy array of localisations with shape (N, 2 or 3).
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+        xyz_values_end (numpy array):
+            Optional, localisations to find relative positions 'to', from
+            xyz_values_start.
+
+    Returns:
+        out_file_names (list): The relative positions files, largest filter
+            distance first. A filter distance within which there are no
+            relative positions is skipped, with a message, unless it is the
+            largest.
+    """
+    filter_distances = sorted(info['filter_distances'], reverse=True)
+    with instrumentation.stage(info, 'search') as stage:
+        if info['cache_dir'] is not None:
+            v_values, start_indices, end_indices = get_vectors_cached(
+                xyz_values_start, filter_distances[0], info['dims'], info,
+                xyz_values_end=xyz_values_end, verbose=info['verbose'],
+                workers=info['workers'], return_pairs=True)
+        else:
+            v_values, start_indices, end_indices = get_vectors_and_pairs(
+                xyz_values_start, filter_distances[0], info['dims'],
+                xyz_values_end=xyz_values_end, verbose=info['verbose'],
+                workers=info['workers'])
+        stage['counts']['localisations'] = _searched_count(xyz_values_start,
+                                                           xyz_values_end)
+        stage['counts']['pairs'] = len(v_values)
+
+    out_file_names = []
+    scatter_plots_dir = None
+    for filterdist in filter_distances:
+        # Each filter distance keeps a subset of the relative positions kept
+        # for the one before.
+        keep = relpos_cache.relative_positions_within(
+            xyz_values_start, xyz_values_end, start_indices, end_indices, filterdist)
+        v_values = v_values[keep]
+        start_indices = start_indices[keep]
+        end_indices = end_indices[keep]
+
+        if len(v_values) == 0:
+            if filterdist == filter_distances[0]:
+                print("No data found so we are exiting.")
+                sys.exit("No data found so we are exiting.")
+            print('No relative positions were found within the filter distance of '
+                  + str(filterdist) + ' nm, so no results are saved for it.')
+            continue
+
+        info['filter_dist'] = filterdist
+        results_dir = make_results_dir(info)
+
+        if info['verbose']:
+            print('\nThere are %i vectors within the filter distance of %s nm.'
+                  % (len(v_values), filterdist))
+
+        with instrumentation.stage(info, 'plots, ' + str(filterdist) + ' nm'):
+            # The scatter plots do not depend on the filter distance.
+            scatter_plots_dir = draw_scatter_plots(xyzcolour_values, info, results_dir,
+                                                   scatter_plots_dir)
+            plotting.plot_histograms(
+                v_values, info['dims'], filterdist, info, binsize=info['bin_size'])
+        with instrumentation.stage(info, 'save, ' + str(filterdist) + ' nm') as stage:
+            out_file_names.append(
+                save_relative_positions(v_values, filterdist, info['dims'], info))
+            stage['counts']['pairs'] = len(v_values)
+        write_report(info)
+
+    return out_file_names
+
+
+def analyse_all_channel_pairs(xyzcolour_values, info):
+    """Finds relative positions (or, with info['histogram_only'], their
+    histograms) for every combination of a 'from' and a 'to' colour channel
+    in info['unique_colour_values'], with one search, and saves the results
+    for each in its own results directory, as separate runs with --from and
+    --to would.
+
+    Args:
+        xyzcolour_values (numpy array):
+            The localisations read in, with their colour channels in the
+            last column.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+
+    Returns:
+        out_file_names (list): The relative positions (or histograms) files.
+    """
+    channels = _all_channels(info)
+    with instrumentation.stage(info, 'search') as stage:
+        if info['histogram_only']:
+            results = gethistograms_channel_pairs(
+                xyzcolour_values, channels, info['filter_dist'], info['dims'],
+                verbose=info['verbose'], workers=info['workers'])
+            pairs = sum(result.total for result in results.values())
+        else:
+            results = getdistances_channel_pairs(
+                xyzcolour_values, channels, info['filter_dist'], info['dims'],
+                verbose=info['verbose'], workers=info['workers'])
+            pairs = sum(len(result) for result in results.values())
+        stage['counts']['localisations'] = len(xyzcolour_values)
+        stage['counts']['pairs'] = pairs
+
+    out_file_names = []
+    scatter_plots_dir = None
+    for start_channel, end_channel in sorted(results):
+        result = results[(start_channel, end_channel)]
+        if info['histogram_only']:
+            total = result.total
+        else:
+            total = len(result)
+        if total == 0:
+            print('No relative positions were found from channel ' + repr(start_channel)
+                  + ' to channel ' + repr(end_channel) + '.')
+            continue
+
+        info['start_channel'] = start_channel
+        if start_channel == end_channel:
+            info['colours_analysed'] = 1
+            info['end_channel'] = None
+        else:
+            info['colours_analysed'] = 2
+            info['end_channel'] = end_channel
+        results_dir = make_results_dir(info)
+
+        with instrumentation.stage(info, 'plots and save, channel ' + repr(start_channel)
+                                   + ' to ' + repr(end_channel)) as stage:
+            # The scatter plots show all channels, so are the same for every pair.
+            scatter_plots_dir = draw_scatter_plots(xyzcolour_values, info, results_dir,
+                                                   scatter_plots_dir)
+
+            if info['histogram_only']:
+                plotting.plot_histograms_from_counts(
+                    result, info['dims'], info['filter_dist'], info,
+                    binsize=info['bin_size'])
+                out_file_names.append(save_histograms(result, info['filter_dist'], info))
+            else:
+                v_values = get_relative_positions(
+                    result, info['dims'], dtype=np.float32 if info['float32'] else None)
+                plotting.plot_histograms(
+                    v_values, info['dims'], info['filter_dist'], info,
+                    binsize=info['bin_size'])
+                out_file_names.append(save_relative_positions(
+                    v_values, info['filter_dist'], info['dims'], info))
+            stage['counts']['pairs'] = total
+        write_report(info)
+
+    return out_file_names
+
+
+def _searched_count(xyz_values_start, xyz_values_end=None):
+    """The number of localisations in a search, for its throughput."""
+    if xyz_values_end is None:
+        return len(xyz_values_start)
+    return len(xyz_values_start) + len(xyz_values_end)
+
+
+def write_report(info):
+    """Saves the performance of the stages of the run so far (see
+    instrumentation.py), if they are being recorded, and writes the html
+    report, in the results directory.
+
+    Args:
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+    """
+    instrumentation.save_stages(info)
+    reports.write_rel_pos_html_report(info)
+
+
+def _all_channels(info):
+    """The colour channels in the data, as ints where they are whole numbers."""
+    return [int(channel) if float(channel).is_integer() else float(channel)
+            for channel in info['unique_colour_values']]
+
 
+def estimate_search(xyz_values_start, info, xyz_values_end=None):
+    """Estimates the number of relative positions, output size, peak memory
+    and time for the search that main will run (see relpos_estimate.py),
+    without running it.
 
+    Args:
+        xyz_values_start (numpy array):
+            The localisations to search, or the 'from' localisations.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+        xyz_values_end (numpy array):
+            Optional 'to' localisations.
+
+    Returns:
+        estimate (dict): As from relpos_estimate.estimate_search.
+    """
+    return relpos_estimate.estimate_search(
+        xyz_values_start, info['filter_dist'], xyz_values_end=xyz_values_end,
+        histogram_only=info['histogram_only'], max_memory=info['max_memory'],
+        float32=info['float32'], relpos_format=info['relpos_format'],
+        workers=info['workers'])
+
+
+def estimate_all_channel_pairs(xyzcolour_values, info):
+    """Estimates the search of analyse_all_channel_pairs, as the searches for
+    each pair of colour channels added together.
+
+    Returns:
+        estimate (dict): As from relpos_estimate.estimate_search.
+    """
+    xyz_sets = _channel_sets(xyzcolour_values, _all_channels(info), info['dims'])[3]
+    estimates = []
+    for xyz_values_start in xyz_sets:
+        for xyz_values_end in xyz_sets:
+            if xyz_values_end is xyz_values_start:
+                estimates.append(estimate_search(xyz_values_start, info))
+            else:
+                estimates.append(estimate_search(xyz_values_start, info,
+                                                 xyz_values_end=xyz_values_end))
+    estimate = relpos_estimate.combine_estimates(estimates)
+    estimate['localisations'] = sum(len(xyz_values) for xyz_values in xyz_sets)
+    return estimate
 
 
+def check_search_estimate(estimate, info):
+    """Prints the estimate for a search, and exits if it is above the
+    limits set with --max-estimated-memory or --max-estimated-time.
+
+    Args:
+        estimate (dict): As from relpos_estimate.estimate_search.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+    """
+    print('\nEstimate for a filter distance of ' + str(info['filter_dist']) + ' nm:')
+    print('\n'.join(relpos_estimate.estimate_lines(estimate)))
+
+    if (info['max_estimated_memory'] is not None
+            and estimate['peak_memory_bytes'] > info['max_estimated_memory'] * 1024 ** 2):
+        sys.exit("ERROR; the estimated peak memory is more than --max-estimated-memory "
+                 "(" + str(info['max_estimated_memory']) + " MB). Use a smaller "
+                 "filter distance, --histogram-only or --max-memory.")
+    if (info['max_estimated_time'] is not None
+            and estimate['seconds'] > info['max_estimated_time'] * 60):
+        sys.exit("ERROR; the estimated time is more than --max-estimated-time "
+                 "(" + str(info['max_estimated_time']) + " minutes). Use a smaller "
+                 "filter distance or more workers (-w).")
 
 
 def main():
@@ -710,7 +1843,8 @@ def main():
                            comma delimiters) or .npy and containing N
                            localisations in N rows.
         dims (int): The dimensions of the data. This can be 2 or 3.
-        filter_dist (int): The filter distance.
+        filter_dist (str): The filter distance, or filter distances to
+                           sweep (e.g. 50,100,200 or 50:400:50).
         zoom (int): A magnified scatter plot of the centre of the principal
                     view is produced at this level of zoom. Default is 10.
         verbose (Boolean): Increases the output to screen during execution.
@@ -771,9 +1905,15 @@ def main():
 
     parser.add_argument('-f', '--filter_distance',
                         dest='filter_dist',
-                        type=int,
-                        default=150,
-                        help="Filter distance.")
+                        type=parse_filter_distances,
+                        default='150',
+                        help="Filter distance. Several filter distances can "
+                        "be given, separated by commas (e.g. 50,100,200) or "
+                        "as a range start:stop:step (e.g. 50:400:50). The "
+                        "neighbour search is then done once, with the largest "
+                        "filter distance, and the results for each filter "
+                        "distance are saved in their own results directory. "
+                        "Not used with --max-memory or --histogram-only.")
 
     parser.add_argument('-b', '--bin_size',
                         dest='bin_size',
@@ -802,6 +1942,143 @@ def main():
                         help="Increase output verbosity",
                         action="store_true")
 
+    parser.add_argument('-w', '--workers',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help="Number of processes used to find relative "
+                        "positions. The field of view is divided into tiles "
+                        "that are searched in parallel. The results do not "
+                        "depend on the number of processes.")
+
+    parser.add_argument('-m', '--max-memory',
+                        dest='max_memory',
+                        type=int,
+                        default=None,
+                        help="Approximate memory (MB) to use for holding "
+                        "relative positions. If given, relative positions are "
+                        "sorted in blocks on disk, next to the output file, "
+                        "and merged into the output file, so that results "
+                        "larger than the memory available can be saved. "
+                        "The output file is the same as without this option.")
+
+    parser.add_argument('--format',
+                        dest='relpos_format',
+                        choices=['csv', 'npy'],
+                        default='csv',
+                        help="Format of the relative positions file. With npy, "
+                        "the relative positions are saved in a binary .npy "
+                        "file with a .json file describing it, which "
+                        "rot_2d_symm_fit.py and two_layer_fitting.py open "
+                        "memory-mapped, reading only the columns they use. "
+                        "Default: csv.")
+
+    parser.add_argument('--histogram-only',
+                        dest='histogram_only',
+                        help="Save only the distance histograms, accumulated "
+                        "as the relative positions are found, instead of the "
+                        "table of relative positions. Memory use then does "
+                        "not grow with the number of relative positions. The "
+                        "histograms are also saved in a .npz file that can be "
+                        "used as input to rot_2d_symm_fit.py.",
+                        action="store_true")
+
+    parser.add_argument('--cache-dir',
+                        dest='cache_dir',
+                        default=None,
+                        help="Directory for a cache of relative positions. "
+                        "Relative positions found for the same localisations "
+                        "with the same or a larger filter distance are taken "
+                        "from the cache instead of being found again, e.g. "
+                        "when only the bin size or zoom is changed. Not used "
+                        "with --max-memory or --histogram-only.")
+
+    parser.add_argument('--cache-size',
+                        dest='cache_size',
+                        type=int,
+                        default=relpos_cache.DEFAULT_CACHE_SIZE,
+                        help="Maximum size of the cache (MB). The least "
+                        "recently used relative positions are removed to keep "
+                        "it below this size. Default: %(default)s.")
+
+    parser.add_argument('--all-channel-pairs',
+                        dest='all_channel_pairs',
+                        help="Find relative positions for every combination of "
+                        "a 'from' and a 'to' colour channel in the data (within "
+                        "each channel, and from each channel to each other "
+                        "channel), with one search of all the localisations. "
+                        "The results for each are saved in their own results "
+                        "directory, the same as from separate runs with --from "
+                        "and --to. Can be used with --histogram-only.",
+                        action="store_true")
+
+    parser.add_argument('--dry-run',
+                        dest='dry_run',
+                        help="Estimate the number of relative positions, the "
+                        "size of the output file, the peak memory and the time "
+                        "for the search from a sample of the data, print the "
+                        "estimate and exit without searching.",
+                        action="store_true")
+
+    parser.add_argument('--max-estimated-memory',
+                        dest='max_estimated_memory',
+                        type=float,
+                        default=None,
+                        help="Estimate the search first (as --dry-run) and exit "
+                        "without searching if the estimated peak memory is more "
+                        "than this (MB).")
+
+    parser.add_argument('--max-estimated-time',
+                        dest='max_estimated_time',
+                        type=float,
+                        default=None,
+                        help="Estimate the search first (as --dry-run) and exit "
+                        "without searching if the estimated time is more than "
+                        "this (minutes).")
+
+    parser.add_argument('--trace-memory',
+                        dest='trace_memory',
+                        help="Record the peak memory allocated in each stage "
+                        "of the run (with tracemalloc, which slows the run "
+                        "down), as well as the times taken and the peak "
+                        "resident memory, which are always saved in "
+                        "performance.json in the results directory.",
+                        action="store_true")
+
+    parser.add_argument('--columns',
+                        dest='xyz_columns',
+                        default=None,
+                        help="Columns of the input file holding X, Y (and Z), "
+                        "separated by commas, by index (from 0) or by name in "
+                        "the header, e.g. 'x,y' for a ThunderSTORM file with "
+                        "columns \"x [nm]\" and \"y [nm]\". Default: the first "
+                        "2 or 3 columns. Other columns are not read.")
+
+    parser.add_argument('--channel-column',
+                        dest='channel_column',
+                        default='-1',
+                        help="Column holding the colour channel, by index or "
+                        "name. Default: the last column.")
+
+    parser.add_argument('--row-filter',
+                        dest='row_filters',
+                        action='append',
+                        default=None,
+                        metavar='FILTER',
+                        help="Use only localisations passing a filter, given as "
+                        "a column (index or name), a comparison and a number, "
+                        "e.g. 'precision<20' or 'channel==1'. Rows are "
+                        "filtered as the file is read. Can be given more than "
+                        "once.")
+
+    parser.add_argument('--float32',
+                        dest='float32',
+                        help="Hold the localisations as 32-bit floating point "
+                        "numbers, to halve the memory used for them. The "
+                        "relative positions found are also held as 32-bit "
+                        "numbers, until they are saved.",
+                        action="store_true")
+
     args = parser.parse_args()
 
 
@@ -811,32 +2088,85 @@ def main():
     if args.dims < 2 or args.dims > 3:
         sys.exit("ERROR; The data can only have 2 or 3 dimensions.")
 
+    if args.workers < 1:
+        sys.exit("ERROR; The number of workers must be at least 1.")
+
+    if args.max_memory is not None and args.max_memory < 1:
+        sys.exit("ERROR; The memory to use must be at least 1 MB.")
+
+    if len(args.filter_dist) > 1 and (args.max_memory is not None
+                                      or args.histogram_only):
+        sys.exit("ERROR; Several filter distances cannot be used with "
+                 "--max-memory or --histogram-only.")
+
+    if args.all_channel_pairs and (args.max_memory is not None
+                                   or args.cache_dir is not None
+                                   or len(args.filter_dist) > 1):
+        sys.exit("ERROR; --all-channel-pairs cannot be used with --max-memory, "
+                 "--cache-dir or several filter distances.")
+
     info['dims'] = args.dims
     info['bin_size'] = args.bin_size
     info['colours_analysed'] = args.colours
     info['start_channel'] = args.start_channel
     info['end_channel'] = args.end_channel
-    info['filter_dist'] = args.filter_dist
+    info['filter_distances'] = args.filter_dist
+    info['filter_dist'] = max(args.filter_dist)
 
 
     info['zoom'] = args.zoom
     info['verbose'] = args.verbose
     info['short_names'] = args.short_names
+    info['histogram_only'] = args.histogram_only
+    info['workers'] = args.workers
+    info['max_memory'] = args.max_memory
+    info['relpos_format'] = args.relpos_format
+    info['channel_column'] = args.channel_column
+    info['cache_dir'] = args.cache_dir
+    info['cache_size'] = args.cache_size
+    info['float32'] = args.float32
+    info['all_channel_pairs'] = args.all_channel_pairs
+    info['dry_run'] = args.dry_run
+    info['max_estimated_memory'] = args.max_estimated_memory
+    info['max_estimated_time'] = args.max_estimated_time
+    info['trace_memory'] = args.trace_memory
+    if args.all_channel_pairs and info['colours_analysed'] is None:
+        # Read the colour channels.
+        info['colours_analysed'] = 2
+
+    info['xyz_columns'] = None
+    if args.xyz_columns is not None:
+        info['xyz_columns'] = args.xyz_columns.split(',')
+        if len(info['xyz_columns']) != args.dims:
+            sys.exit("ERROR; --columns must give one column for each of the "
+                     + str(args.dims) + " dimensions.")
+
+    info['row_filters'] = []
+    for row_filter in args.row_filters or []:
+        try:
+            info['row_filters'].append(ingest.parse_filter(row_filter))
+        except ValueError as exception:
+            sys.exit("ERROR; " + str(exception))
 
     if args.input_file is None:
         #print("Get the data from the command line as the program executes.")
         get_inputs(info)
+        info['filter_distances'] = [info['filter_dist']]
         # print('Colours: ' + repr(info['colours_analysed'])) # Debug
     else:
         info['in_file_and_path'] = args.input_file.name
 
     info['host'], info['ip_address'], info['operating_system'] = utils.find_hostname_and_ip()
 
+    recorder = instrumentation.StageRecorder(trace_memory=info['trace_memory'])
+    info['stage_recorder'] = recorder
+
     # GET THE INPUT LOCALISATIONS with possible colour channels
-    read_start = timeit.default_timer()
-    xyzcolour_values = read_data_in(info)
+    with recorder.stage('read') as stage:
+        xyzcolour_values = read_data_in(info)
+        stage['counts']['localisations'] = len(xyzcolour_values)
     read_end = timeit.default_timer()
-    reading_time = (read_end-read_start)/60
+    reading_time = recorder.stages[-1]['wall_seconds']/60
 
     if info['verbose']:
         print('\nInput file:')
@@ -848,38 +2178,36 @@ def main():
 
     # For colour channel information, choose channel(s) to analyse,
     # if not given as arguments in the shell command
+    estimate_first = (info['dry_run'] or info['max_estimated_memory'] is not None
+                      or info['max_estimated_time'] is not None)
+
+    if info['all_channel_pairs']:
+        if estimate_first:
+            with recorder.stage('estimate') as stage:
+                estimate = estimate_all_channel_pairs(xyzcolour_values, info)
+                stage['counts']['localisations'] = len(xyzcolour_values)
+            check_search_estimate(estimate, info)
+            if info['dry_run']:
+                return
+        xyz_filenames = analyse_all_channel_pairs(xyzcolour_values, info)
+        if info['verbose']:
+            print("\nTime to find and save the results for all pairs of channels "
+                  "was: " + str(round((timeit.default_timer()-read_end)/60, 3))
+                  + " minutes.")
+            print('\nResults are saved in the files:\n' + '\n'.join(xyz_filenames))
+        return
+
     if info['colours_analysed'] is not None and info['start_channel'] is None:
         info['start_channel'], info['end_channel'] = choose_channels(info)
 
-    utils.primary_filename_and_path_setup(info)
-
-    if info['short_names'] is True:
-        try:
-            os.makedirs(info['short_results_dir'])
-        except OSError:
-            print("Unexpected error:", sys.exc_info()[0])
-            sys.exit("Could not create directory for the results.")
-    else:
-        try:
-            os.makedirs(info['results_dir'])
-        except OSError:
-            print("Unexpected error:", sys.exc_info()[0])
-            sys.exit("Could not create directory for the results.")
-
     # GET RELATIVE POSITIONS!
     # For single channel
     if info['colours_analysed'] is None:
         xyz_values_start = xyzcolour_values[:, 0:info['dims']]
-        d_values = getdistances(
-            xyz_values_start, info['filter_dist'], verbose=info['verbose']
-            )
 
     if info['colours_analysed'] == 1:
         xyz_values_start = \
             xyzcolour_values[:, 0:info['dims']][xyzcolour_values[:, -1] == info['start_channel']]
-        d_values = getdistances(
-            xyz_values_start, info['filter_dist'], verbose=info['verbose']
-            )
 
     # For two channels
     if info['colours_analysed'] == 2:
@@ -887,60 +2215,164 @@ def main():
             xyzcolour_values[:, 0:info['dims']][xyzcolour_values[:, -1] == info['start_channel']]
         xyz_values_end = \
             xyzcolour_values[:, 0:info['dims']][xyzcolour_values[:, -1] == info['end_channel']]
-        d_values = getdistances_two_colours(
-            xyz_values_start, info['filter_dist'], xyz_values_end, verbose=info['verbose']
-            )
-
-
-    # Draw scatterplot and zoomed region
-    plotting.draw_2d_scatter_plots(xyzcolour_values, info['dims'], info, 0)
-    plotting.draw_2d_scatter_plots(xyzcolour_values, info['dims'], info, info['zoom'])
-
-    try:
-        len(d_values)
-    except TypeError:
-        print("No data found so we are exiting.")
-        sys.exit("No data found so we are exiting.")
-
-    # Get vector components of relative positions.
-    d_values = get_vectors(d_values, info['dims'])
-
-    # Summarise
-    if info['verbose']:
-        print(
-            '\nWhen symmetric duplicates are removed (done by default for a '
-            'single colour channel, '
-            'never for two-colour data), there are %i vectors within the '
-            'filter distance in all dimensions for all localisations.'
-             % len(d_values))
-
-    # Plot vector component results
-    plotting.plot_histograms(
-        d_values, info['dims'], info['filter_dist'], info, binsize=info['bin_size']
-        )
-
-    filter_end = timeit.default_timer()
-    filter_time = (filter_end-read_end)/60
-
-    if info['verbose']:
-        print("\nTime to filter the data was: "+ str(round(filter_time, 3)) +\
-              " minutes.")
 
+    if info['colours_analysed'] != 2:
+        xyz_values_end = None
+
+    if estimate_first:
+        with recorder.stage('estimate') as stage:
+            estimate = estimate_search(xyz_values_start, info, xyz_values_end)
+            stage['counts']['localisations'] = _searched_count(xyz_values_start,
+                                                               xyz_values_end)
+        check_search_estimate(estimate, info)
+        if info['dry_run']:
+            return
+
+    if len(info['filter_distances']) == 1:
+        make_results_dir(info)
+
+    if len(info['filter_distances']) > 1:
+        xyz_filenames = sweep_filter_distances(xyzcolour_values, xyz_values_start,
+                                               info, xyz_values_end=xyz_values_end)
+        if info['verbose']:
+            print("\nTime to find and save the relative positions for all filter "
+                  "distances was: " + str(round((timeit.default_timer()-read_end)/60, 3))
+                  + " minutes.")
+            print('\nRelative positions are saved in the files:\n'
+                  + '\n'.join(xyz_filenames))
+        return
+
+    with recorder.stage('search') as stage:
+        if info['max_memory'] is not None and not info['histogram_only']:
+            writer = save_relative_positions_out_of_core(
+                xyz_values_start, info['filter_dist'], info['dims'], info,
+                xyz_values_end=xyz_values_end, max_memory=info['max_memory'],
+                verbose=info['verbose'], workers=info['workers']
+                )
+            histograms = writer.histograms
+            xyz_filename = writer.out_file_name
+        elif info['histogram_only']:
+            if info['colours_analysed'] == 2:
+                histograms = gethistograms_two_colours(
+                    xyz_values_start, info['filter_dist'], xyz_values_end,
+                    verbose=info['verbose'], workers=info['workers']
+                    )
+            else:
+                histograms = gethistograms(
+                    xyz_values_start, info['filter_dist'],
+                    verbose=info['verbose'], workers=info['workers']
+                    )
+        elif info['cache_dir'] is not None:
+            d_values = get_vectors_cached(
+                xyz_values_start, info['filter_dist'], info['dims'], info,
+                xyz_values_end=xyz_values_end, verbose=info['verbose'],
+                workers=info['workers']
+                )
+        elif info['colours_analysed'] == 2:
+            d_values = getdistances_two_colours(
+                xyz_values_start, info['filter_dist'], xyz_values_end,
+                verbose=info['verbose'], workers=info['workers']
+                )
+        else:
+            d_values = getdistances(
+                xyz_values_start, info['filter_dist'],
+                verbose=info['verbose'], workers=info['workers']
+                )
+        stage['counts']['localisations'] = _searched_count(xyz_values_start,
+                                                           xyz_values_end)
+        if info['histogram_only'] or info['max_memory'] is not None:
+            stage['counts']['pairs'] = histograms.total
+        else:
+            stage['counts']['pairs'] = len(d_values)
 
-    # Save relative positions and vector components.
-    xyz_filename = save_relative_positions(d_values, info['filter_dist'], info['dims'], info)
 
-    save_data_end = timeit.default_timer()
-    filtering_time = (save_data_end-filter_end)/60
-    if info['verbose']:
-        print("\nTime to write the data was: "+str(round(filtering_time, 3))+" minutes.")
+    # Draw scatterplot and zoomed region
+    with recorder.stage('scatter plots'):
+        plotting.draw_2d_scatter_plots(xyzcolour_values, info['dims'], info, 0)
+        plotting.draw_2d_scatter_plots(xyzcolour_values, info['dims'], info, info['zoom'])
+
+    if info['histogram_only'] or info['max_memory'] is not None:
+        if histograms.total == 0:
+            print("No data found so we are exiting.")
+            sys.exit("No data found so we are exiting.")
+
+        if info['verbose']:
+            print(
+                '\nThere are %i vectors within the filter distance in all '
+                'dimensions for all localisations.' % histograms.total)
+
+        # Plot vector component results
+        with recorder.stage('histogram plots'):
+            plotting.plot_histograms_from_counts(
+                histograms, info['dims'], info['filter_dist'], info, binsize=info['bin_size']
+                )
+
+        filter_end = timeit.default_timer()
+        if info['verbose']:
+            print("\nTime to filter the data was: "
+                  + str(round((filter_end-read_end)/60, 3)) + " minutes.")
+
+        if info['histogram_only']:
+            with recorder.stage('save'):
+                xyz_filename = save_histograms(histograms, info['filter_dist'], info)
 
-    # Create html report.
-    reports.write_rel_pos_html_report(info)
+    else:
+        try:
+            len(d_values)
+        except TypeError:
+            print("No data found so we are exiting.")
+            sys.exit("No data found so we are exiting.")
+
+        # Get vector components of relative positions.
+        if info['cache_dir'] is None:
+            with recorder.stage('sort') as stage:
+                d_values = get_relative_positions(
+                    d_values, info['dims'], dtype=np.float32 if info['float32'] else None)
+                stage['counts']['pairs'] = len(d_values)
+
+        # Summarise
+        if info['verbose']:
+            print(
+                '\nWhen symmetric duplicates are removed (done by default for a '
+                'single colour channel, '
+                'never for two-colour data), there are %i vectors within the '
+                'filter distance in all dimensions for all localisations.'
+                 % len(d_values))
+
+        # Plot vector component results
+        with recorder.stage('histogram plots') as stage:
+            plotting.plot_histograms(
+                d_values, info['dims'], info['filter_dist'], info, binsize=info['bin_size']
+                )
+            stage['counts']['pairs'] = len(d_values)
+
+        filter_end = timeit.default_timer()
+        filter_time = (filter_end-read_end)/60
+
+        if info['verbose']:
+            print("\nTime to filter the data was: "+ str(round(filter_time, 3)) +\
+                  " minutes.")
+
+
+        # Save relative positions and vector components.
+        with recorder.stage('save') as stage:
+            xyz_filename = save_relative_positions(d_values, info['filter_dist'],
+                                                   info['dims'], info)
+            stage['counts']['pairs'] = len(d_values)
+
+        filtering_time = recorder.stages[-1]['wall_seconds']/60
+        if info['verbose']:
+            print("\nTime to write the data was: "+str(round(filtering_time, 3))+" minutes.")
+
+    # Create html report, with the performance of each stage.
+    write_report(info)
 
     # Direct user to the location of the output.
     if info['verbose']:
-        print('\nRelative positions are saved in the file:\n' + xyz_filename)
+        if info['histogram_only']:
+            print('\nDistance histograms are saved in the file:\n' + xyz_filename)
+        else:
+            print('\nRelative positions are saved in the file:\n' + xyz_filename)
 
 
 
@@ -0,0 +1,264 @@
+"""
+relpos_cache.py
+
+A cache on disk of relative positions found by relative_positions.py, so that
+analysing the same localisations again (e.g. with a different bin size or
+zoom) does not repeat the neighbour search.
+
+Results are stored under a key calculated from the localisations searched
+(their coordinates, after choosing columns, channels and rows), so that any
+change to the input file or to how it was read gives a different key. For
+each key, the relative positions for the largest filter distance used so far
+are kept, with the indices of the localisations that each is between. A
+smaller filter distance is then served by testing those pairs of
+localisations against it, in the same way as the neighbour search does,
+which gives the same table as searching again.
+
+The cache is kept below a maximum size by removing the least recently used
+results.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import neighbour_search
+import relpos_files
+
+
+# Default maximum size of the cache (MB).
+DEFAULT_CACHE_SIZE = 10240
+
+# Files of a cached result.
+RELPOS_FILE = 'relpos.npy'
+PAIRS_FILE = 'pairs.npy'
+
+
+def localisations_key(xyz_values_start, xyz_values_end=None):
+    """The cache key of a search: a hash of the localisations searched.
+
+    Args:
+        xyz_values_start (numpy array):
+            Localisations, shape (N, 2 or 3), or the 'from' localisations for
+            a search between two sets.
+        xyz_values_end (numpy array):
+            Optional 'to' localisations.
+
+    Returns:
+        key (str)
+    """
+    digest = hashlib.sha256()
+    arrays = [xyz_values_start] if xyz_values_end is None else [xyz_values_start,
+                                                                xyz_values_end]
+    digest.update(('%i sets' % len(arrays)).encode())
+    for xyz_values in arrays:
+        xyz_values = np.ascontiguousarray(xyz_values)
+        digest.update(('%s %r' % (xyz_values.dtype.str, xyz_values.shape)).encode())
+        digest.update(xyz_values.data)
+    return digest.hexdigest()
+
+
+def pairs_within(xyz_values_start, xyz_values_end, start_indices, end_indices,
+                 filterdist):
+    """Which pairs of localisations are within a filter distance, tested as
+    in neighbour_search.iter_neighbour_pairs (for one set of localisations,
+    xyz_values_end is None) or iter_neighbour_pairs_between.
+
+    Returns:
+        numpy array of Booleans, one per pair.
+    """
+    if xyz_values_end is None:
+        xyz_i = xyz_values_start[start_indices]
+        xyz_j = xyz_values_start[end_indices]
+        return np.logical_and(neighbour_search.within_filter(xyz_i, xyz_j, filterdist),
+                              neighbour_search.within_filter(xyz_j, xyz_i, filterdist))
+    return neighbour_search.within_filter(xyz_values_start[start_indices],
+                                          xyz_values_end[end_indices], filterdist)
+
+
+def relative_positions_within(xyz_values_start, xyz_values_end, start_indices,
+                              end_indices, filterdist):
+    """Which relative positions found with one filter distance would be found
+    with a smaller one, as by relative_positions.get_vectors_and_pairs.
+
+    Args:
+        xyz_values_start, xyz_values_end (numpy arrays):
+            The localisations searched (xyz_values_end is None for one set).
+        start_indices, end_indices (numpy arrays):
+            The localisations each relative position is between.
+        filterdist (float):
+            The smaller filter distance.
+
+    Returns:
+        numpy array of Booleans, one per relative position.
+    """
+    keep = pairs_within(xyz_values_start, xyz_values_end,
+                        start_indices, end_indices, filterdist)
+    if xyz_values_end is not None:
+        # 'From' localisations with one 'to' localisation within the filter
+        # distance, counting any at the same position, are left out (see
+        # relative_positions.getdistances_two_colours).
+        neighbour_counts = np.bincount(start_indices[keep],
+                                       minlength=len(xyz_values_start)) + \
+            neighbour_search.coincident_counts(xyz_values_start, xyz_values_end)
+        keep = keep & (neighbour_counts[start_indices] != 1)
+    return keep
+
+
+def _directory_size(directory):
+    return sum(os.path.getsize(os.path.join(path, filename))
+               for path, _, filenames in os.walk(directory)
+               for filename in filenames)
+
+
+class RelativePositionCache:
+    """Relative positions stored on disk, by localisations and filter distance.
+
+    Args:
+        cache_dir (str):
+            The directory of the cache. It is made if it does not exist.
+        max_size (float):
+            Maximum size of the cache (MB).
+    """
+    def __init__(self, cache_dir, max_size=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def entries(self, key):
+        """The filter distances of the results stored for a key, and their
+        directories, largest filter distance first."""
+        key_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(key_dir):
+            return []
+        entries = []
+        for name in os.listdir(key_dir):
+            if name.startswith('incomplete_'):
+                continue
+            metadata = relpos_files.read_relpos_metadata(
+                os.path.join(key_dir, name, RELPOS_FILE))
+            if metadata is not None:
+                entries.append((float(metadata['filter_dist']),
+                                os.path.join(key_dir, name)))
+        return sorted(entries, reverse=True)
+
+    def lookup(self, key, filterdist, xyz_values_start, xyz_values_end=None):
+        """Find relative positions for a filter distance, from a result for
+        the same or a larger filter distance.
+
+        Args:
+            key (str):
+                From localisations_key.
+            filterdist (float):
+                The filter distance.
+            xyz_values_start, xyz_values_end (numpy arrays):
+                The localisations the key was calculated from.
+
+        Returns:
+            v_values (numpy array):
+                The table of relative positions, as from
+                relative_positions.get_vectors, or None if there is no result
+                that can be used.
+            start_indices, end_indices (numpy arrays):
+                The localisations each relative position is between, or None.
+            cached_filterdist (float):
+                The filter distance of the result used, or None.
+        """
+        usable = [entry for entry in self.entries(key) if entry[0] >= filterdist]
+        if len(usable) == 0:
+            return None, None, None, None
+        cached_filterdist, entry_dir = usable[-1]
+
+        relpos_file = os.path.join(entry_dir, RELPOS_FILE)
+        v_values = relpos_files.read_relpos_npy(relpos_file)[0]
+        # Mark the result as recently used.
+        os.utime(relpos_file, None)
+        pairs = np.load(os.path.join(entry_dir, PAIRS_FILE), mmap_mode='r')
+        start_indices = np.array(pairs[:, 0])
+        end_indices = np.array(pairs[:, 1])
+        if cached_filterdist == filterdist:
+            return np.array(v_values), start_indices, end_indices, cached_filterdist
+
+        keep = relative_positions_within(xyz_values_start, xyz_values_end,
+                                         start_indices, end_indices, filterdist)
+        return (np.array(v_values[keep]), start_indices[keep], end_indices[keep],
+                cached_filterdist)
+
+    def store(self, key, filterdist, dims, v_values, start_indices, end_indices):
+        """Store relative positions, unless a result for a larger filter
+        distance is already stored. Results for smaller filter distances are
+        replaced.
+
+        Args:
+            key (str):
+                From localisations_key.
+            filterdist (float):
+                The filter distance.
+            dims (int):
+                The dimensions of the data ie 2D or 3D.
+            v_values (numpy array):
+                The table of relative positions.
+            start_indices, end_indices (numpy arrays):
+                The localisations each relative position is between, from
+                relative_positions.get_vectors_and_pairs.
+        """
+        entries = self.entries(key)
+        if len(entries) > 0 and entries[0][0] >= filterdist:
+            return
+
+        key_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(key_dir):
+            os.makedirs(key_dir)
+        # Written in a temporary directory, then moved into place, so that an
+        # interrupted run does not leave an incomplete result.
+        temp_dir = tempfile.mkdtemp(prefix='incomplete_', dir=key_dir)
+        try:
+            relpos_files.save_relpos_npy(v_values, os.path.join(temp_dir, RELPOS_FILE),
+                                         dims, filterdist)
+            np.save(os.path.join(temp_dir, PAIRS_FILE),
+                    np.column_stack((start_indices, end_indices)).astype(np.int64))
+            os.rename(temp_dir, os.path.join(key_dir, 'filter_%r' % float(filterdist)))
+        except (IOError, OSError):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        for _, entry_dir in entries:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the cache is no larger
+        than its maximum size."""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            key_dir = os.path.join(self.cache_dir, key)
+            if not os.path.isdir(key_dir):
+                continue
+            for _, entry_dir in self.entries(key):
+                entries.append((os.path.getmtime(os.path.join(entry_dir, RELPOS_FILE)),
+                                _directory_size(entry_dir), entry_dir))
+        total = sum(entry[1] for entry in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_size * 2 ** 20:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total = total - size
+        for key in os.listdir(self.cache_dir):
+            key_dir = os.path.join(self.cache_dir, key)
+            if os.path.isdir(key_dir) and len(os.listdir(key_dir)) == 0:
+                os.rmdir(key_dir)
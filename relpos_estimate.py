@@ -0,0 +1,296 @@
+"""
+relpos_estimate.py
+
+Estimates, before a search for relative positions, how many relative
+positions it will find, the size of the output file, the memory it will use
+and how long it will take, so that a search that would run for hours or run
+out of memory can be changed or stopped before it starts.
+
+The localisations are binned into cells with sides of length filterdist, as
+for the search (see neighbour_search.py). The number of candidate pairs of
+localisations (in the same or adjacent cells) follows exactly from the
+number of localisations in each cell. The search is then run from a random
+sample of the cells, which gives the fraction of candidate pairs that are
+within the filter distance, and the time taken per candidate pair on this
+computer. Sorting and saving the relative positions found are timed in the
+same way. The estimates scale these up to all the cells, so they follow the
+local density of the localisations, and for small data sets, where the
+sample is all the cells, the number of relative positions is exact.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import io
+import timeit
+import numpy as np
+import neighbour_search
+import relpos_table
+
+
+# Approximate number of candidate pairs searched from the sample of cells.
+DEFAULT_SAMPLE_CANDIDATES = 2 ** 20
+
+# Maximum number of relative positions from the sample timed when saving.
+SAVE_SAMPLE_ROWS = 10000
+
+# Approximate memory used for each candidate pair in a block of the search
+# (indices, coordinates and the filter test).
+BYTES_PER_CANDIDATE = 128
+
+# Size of the header of a .npy file.
+NPY_HEADER_BYTES = 128
+
+
+def search_sample(xyz_values_start, filterdist, xyz_values_end=None,
+                  sample_candidates=DEFAULT_SAMPLE_CANDIDATES, seed=0):
+    """Count the candidate pairs for a search, and search from a random
+    sample of the cells.
+
+    Args:
+        xyz_values_start (numpy array):
+            Localisations, shape (N, 2 or 3). For a search between two sets
+            of localisations, these are the 'from' localisations.
+        filterdist (float):
+            The filter distance.
+        xyz_values_end (numpy array):
+            Optional 'to' localisations.
+        sample_candidates (int):
+            Approximate number of candidate pairs to search. Cells are added
+            to the sample in random order until there are at least this many.
+        seed (int):
+            Seed for the random choice of cells.
+
+    Returns:
+        candidates (int):
+            The number of candidate pairs in the whole search.
+        sample (dict):
+            'candidates': The number of candidate pairs searched,
+            'separations': The relative positions found in the sample, as
+            from relative_positions.getdistances (without sorting),
+            'seconds': The time taken to search the sample.
+    """
+    if xyz_values_end is None:
+        cells = neighbour_search.CellList(xyz_values_start, filterdist)
+        counts = neighbour_search.candidate_pair_counts(cells)
+    else:
+        cells = neighbour_search.cell_lists_between(xyz_values_start, xyz_values_end,
+                                                    filterdist)
+        counts = neighbour_search.candidate_pair_counts(*cells)
+
+    # Take cells in random order until the sample is large enough.
+    order = np.random.default_rng(seed).permutation(len(counts))
+    n_cells = int(np.searchsorted(np.cumsum(counts[order]), sample_candidates)) + 1
+    cell_mask = np.zeros(len(counts), dtype=bool)
+    cell_mask[order[:n_cells]] = True
+
+    start_time = timeit.default_timer()
+    separation_blocks = []
+    if xyz_values_end is None:
+        for i_values, j_values in neighbour_search.iter_neighbour_pairs(
+                xyz_values_start, filterdist, cells=cells, cell_mask=cell_mask):
+            subd = neighbour_search.pair_separations(
+                xyz_values_start, xyz_values_start, i_values, j_values)
+            subd = subd[neighbour_search.nonzero_separations(subd)]
+            separation_blocks.append(neighbour_search.canonical_orientation(subd))
+    else:
+        start_blocks = []
+        for i_values, j_values in neighbour_search.iter_neighbour_pairs_between(
+                xyz_values_start, xyz_values_end, filterdist,
+                cells=cells, cell_mask=cell_mask):
+            start_blocks.append(i_values)
+            separation_blocks.append(neighbour_search.pair_separations(
+                xyz_values_start, xyz_values_end, i_values, j_values))
+        if len(start_blocks) > 0:
+            # As getdistances_two_colours, skip 'from' localisations with
+            # only one 'to' localisation within filterdist. The sample has
+            # all the neighbours of the 'from' localisations in it.
+            start_indices = np.concatenate(start_blocks)
+            subd = np.concatenate(separation_blocks)
+            keep = np.bincount(start_indices)[start_indices] != 1
+            keep &= neighbour_search.nonzero_separations(subd)
+            separation_blocks = [subd[keep]]
+    seconds = timeit.default_timer() - start_time
+
+    if len(separation_blocks) == 0:
+        separation_values = np.zeros((0, 3))
+    else:
+        separation_values = np.concatenate(separation_blocks)
+
+    sample = {'candidates': int(np.sum(counts[cell_mask])),
+              'separations': separation_values,
+              'seconds': seconds}
+    return int(np.sum(counts)), sample
+
+
+def peak_memory(pairs, candidates, n_localisations, dims, histogram_only=False,
+                max_memory=None, float32=False, workers=1):
+    """Approximate peak memory used by relative_positions.py to find and
+    save relative positions (or their histograms).
+
+    Args:
+        pairs (int): The number of relative positions found.
+        candidates (int): The number of candidate pairs tested.
+        n_localisations (int): The number of localisations searched.
+        dims (int): The dimensions of the data ie 2D or 3D.
+        histogram_only (Boolean): Whether only histograms are kept.
+        max_memory (float): Optional memory budget (MB) for sorting the
+            relative positions in blocks (--max-memory).
+        float32 (Boolean): Whether the relative positions are held as
+            32-bit numbers (--float32).
+        workers (int): Number of processes searching.
+
+    Returns:
+        peak_bytes (int)
+    """
+    # The cell list, and a block of candidate pairs for each process.
+    block_size = min(neighbour_search.DEFAULT_BLOCK_SIZE, candidates)
+    search_bytes = (n_localisations * 3 * 8
+                    + max(1, workers) * block_size * BYTES_PER_CANDIDATE)
+    if histogram_only:
+        return int(search_bytes)
+
+    # getdistances holds the blocks of vectors found and their concatenation
+    # (then the concatenation and its sorted copy). The vectors are then held
+    # while a relpos_table.RelativePositions is made from them and sorted.
+    itemsize = 4 if float32 else 8
+    n_distances = len(relpos_table.TABLE_COLUMNS[dims]) - 3
+    bytes_per_pair = max(2 * 3 * 8 + 8,
+                         3 * 8 + 8 + itemsize * (2 * dims + n_distances + 1))
+    pairs_bytes = pairs * bytes_per_pair
+    if max_memory is not None:
+        pairs_bytes = min(pairs_bytes, max_memory * 1024 ** 2 + pairs * 8)
+    return int(search_bytes + pairs_bytes)
+
+
+def estimate_search(xyz_values_start, filterdist, xyz_values_end=None,
+                    histogram_only=False, max_memory=None, float32=False,
+                    relpos_format='csv', workers=1,
+                    sample_candidates=DEFAULT_SAMPLE_CANDIDATES, seed=0):
+    """Estimate the number of relative positions, output size, peak memory
+    and time taken for a search, before running it.
+
+    Args:
+        xyz_values_start (numpy array):
+            Localisations, shape (N, 2 or 3). For a search between two sets
+            of localisations, these are the 'from' localisations.
+        filterdist (float):
+            The filter distance.
+        xyz_values_end (numpy array):
+            Optional 'to' localisations.
+        histogram_only (Boolean):
+            Whether only histograms of the distances are kept.
+        max_memory (float):
+            Optional memory budget (MB) for sorting the relative positions.
+        float32 (Boolean):
+            Whether the relative positions are held as 32-bit numbers.
+        relpos_format (str):
+            'csv' or 'npy', the format the relative positions are saved in.
+        workers (int):
+            Number of processes searching.
+        sample_candidates (int):
+            Approximate number of candidate pairs to search in the sample.
+        seed (int):
+            Seed for the random choice of cells in the sample.
+
+    Returns:
+        estimate (dict):
+            'localisations': The number of localisations searched,
+            'candidate_pairs': The number of candidate pairs to test,
+            'pairs': The estimated number of relative positions,
+            'sampled_fraction': The fraction of candidate pairs searched in
+            the sample (1 if the estimate of pairs is exact),
+            'output_bytes': The estimated size of the relative positions
+            file (0 for histograms only),
+            'peak_memory_bytes': The estimated peak memory,
+            'seconds': The estimated time to search, sort and save.
+    """
+    dims = xyz_values_start.shape[1]
+    candidates, sample = search_sample(xyz_values_start, filterdist, xyz_values_end,
+                                       sample_candidates=sample_candidates, seed=seed)
+    n_localisations = len(xyz_values_start)
+    if xyz_values_end is not None:
+        n_localisations += len(xyz_values_end)
+
+    if sample['candidates'] == 0:
+        scale = 0.
+        sampled_fraction = 1.
+    else:
+        scale = candidates / sample['candidates']
+        sampled_fraction = sample['candidates'] / candidates
+    pairs = int(round(len(sample['separations']) * scale))
+
+    # Search time, shared between the processes.
+    seconds = sample['seconds'] * scale / max(1, workers)
+
+    output_bytes = 0
+    n_sampled = len(sample['separations'])
+    if n_sampled > 0 and not histogram_only:
+        # Time sorting and saving the relative positions from the sample.
+        start_time = timeit.default_timer()
+        relative_positions = relpos_table.RelativePositions(
+            sample['separations'], dims,
+            dtype=np.float32 if float32 else None).sort()
+        seconds += (timeit.default_timer() - start_time) * pairs / n_sampled
+
+        v_values = relative_positions.table(0, SAVE_SAMPLE_ROWS)
+        if relpos_format == 'npy':
+            output_bytes = NPY_HEADER_BYTES + pairs * v_values.shape[1] * 8
+        else:
+            out_file = io.StringIO()
+            start_time = timeit.default_timer()
+            np.savetxt(out_file, v_values, delimiter=',')
+            seconds += (timeit.default_timer() - start_time) * pairs / len(v_values)
+            output_bytes = int(len(out_file.getvalue()) * pairs / len(v_values))
+
+    return {'localisations': n_localisations,
+            'candidate_pairs': candidates,
+            'pairs': pairs,
+            'sampled_fraction': sampled_fraction,
+            'output_bytes': output_bytes,
+            'peak_memory_bytes': peak_memory(pairs, candidates, n_localisations,
+                                             dims, histogram_only=histogram_only,
+                                             max_memory=max_memory,
+                                             float32=float32, workers=workers),
+            'seconds': seconds}
+
+
+def combine_estimates(estimates):
+    """Add estimates for several searches run one after another and kept
+    together in memory (e.g. every pair of colour channels)."""
+    combined = {}
+    for key in ('localisations', 'candidate_pairs', 'pairs', 'output_bytes',
+                'peak_memory_bytes', 'seconds'):
+        combined[key] = sum(estimate[key] for estimate in estimates)
+    combined['sampled_fraction'] = min(
+        [estimate['sampled_fraction'] for estimate in estimates] or [1.])
+    return combined
+
+
+def estimate_lines(estimate):
+    """Describe an estimate, as lines of text."""
+    if estimate['sampled_fraction'] >= 1.:
+        pairs_text = 'Relative positions: ' + str(estimate['pairs'])
+    else:
+        pairs_text = ('Relative positions (estimated from '
+                      + str(round(100. * estimate['sampled_fraction'], 2))
+                      + '% of the candidate pairs): about '
+                      + str(estimate['pairs']))
+    return ['Localisations: ' + str(estimate['localisations']),
+            'Candidate pairs to test: ' + str(estimate['candidate_pairs']),
+            pairs_text,
+            'Output file: about '
+            + str(round(estimate['output_bytes'] / 1024 ** 2, 1)) + ' MB',
+            'Peak memory: about '
+            + str(round(estimate['peak_memory_bytes'] / 1024 ** 2, 1)) + ' MB',
+            'Time: about ' + str(round(estimate['seconds'] / 60, 2)) + ' minutes']
@@ -0,0 +1,223 @@
+"""
+relpos_files.py
+
+Reads and writes relative positions in a binary format, as an alternative to
+the .csv files written by relative_positions.py.
+
+The table of relative positions (vector components and distances, one row
+per relative position, sorted as in the .csv file) is saved in a numpy .npy
+file in column-major (Fortran) order, so that each column is contiguous on
+disk. It can then be opened memory-mapped, and a program that uses only some
+of the columns (e.g. the XY distances) reads only those from disk.
+
+A JSON file alongside it (the sidecar, with the same name and the extension
+.json) records what the table contains: the dimensions of the data, the filter
+distance, the colour channels analysed and the names of the columns (the
+same as the header of the .csv file). Readers check the sidecar before using
+the table, as they check the header of a .csv file.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import json
+import numpy as np
+import ingest
+
+
+# Headers of the relative positions files.
+RELPOS_HEADERS = {2: "xx_separation,yy_separation, ,xy_separation",
+                  3: ("xx_separation,yy_separation,zz_separation,xy_separation,"
+                      "xz_separation,yz_separation,xyz_separation")}
+
+# Identifies the sidecar of a binary relative positions file.
+RELPOS_FORMAT = 'PERPL-relpos'
+RELPOS_FORMAT_VERSION = 1
+
+
+def sidecar_file_name(filename):
+    """The JSON sidecar file of a binary relative positions file."""
+    return os.path.splitext(filename)[0] + '.json'
+
+
+def relpos_metadata(dims, filterdist, n_rows, info=None):
+    """The contents of the sidecar of a binary relative positions file.
+
+    Args:
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+        filterdist (float):
+            The filter distance used to find the relative positions.
+        n_rows (int):
+            Number of relative positions.
+        info (dict):
+            Optional, the info dictionary of relative_positions.py, from which
+            the colour channels and input file are recorded.
+
+    Returns:
+        metadata (dict)
+    """
+    if info is None:
+        info = {}
+    return {'format': RELPOS_FORMAT,
+            'version': RELPOS_FORMAT_VERSION,
+            'dims': dims,
+            'filter_dist': filterdist,
+            'colours_analysed': info.get('colours_analysed'),
+            'start_channel': info.get('start_channel'),
+            'end_channel': info.get('end_channel'),
+            'source': info.get('in_file_no_path'),
+            'columns': RELPOS_HEADERS[dims].split(','),
+            'rows': n_rows,
+            'dtype': '<f8',
+            'order': 'F'}
+
+
+def create_relpos_npy(filename, n_rows, dims, filterdist, info=None):
+    """Create a binary relative positions file, and its sidecar, to be
+    filled in.
+
+    Args:
+        filename (str):
+            The .npy file.
+        n_rows (int):
+            Number of relative positions.
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+        filterdist (float):
+            The filter distance used to find the relative positions.
+        info (dict):
+            Optional, the info dictionary of relative_positions.py.
+
+    Returns:
+        v_values (numpy memmap):
+            The table, shape (n_rows, 4 or 7), memory-mapped for writing.
+    """
+    metadata = relpos_metadata(dims, filterdist, n_rows, info)
+    v_values = np.lib.format.open_memmap(
+        filename, mode='w+', dtype=np.dtype(metadata['dtype']),
+        shape=(n_rows, len(metadata['columns'])), fortran_order=True)
+    with open(sidecar_file_name(filename), 'w') as fout:
+        json.dump(metadata, fout, indent=2)
+    return v_values
+
+
+def save_relpos_npy(v_values, filename, dims, filterdist, info=None):
+    """Save a table of relative positions (as from
+    relative_positions.get_vectors) in the binary format.
+
+    Args:
+        v_values (numpy array):
+            The table, shape (P, 4 or 7).
+        filename (str):
+            The .npy file.
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+        filterdist (float):
+            The filter distance used to find the relative positions.
+        info (dict):
+            Optional, the info dictionary of relative_positions.py.
+
+    Returns:
+        filename (str)
+    """
+    out_values = create_relpos_npy(filename, len(v_values), dims, filterdist, info)
+    # A column at a time, to avoid a second copy of the table in memory.
+    for column in range(out_values.shape[1]):
+        out_values[:, column] = v_values[:, column]
+    out_values.flush()
+    del out_values
+    return filename
+
+
+def read_relpos_metadata(filename):
+    """Read and check the sidecar of a binary relative positions file.
+
+    Args:
+        filename (str):
+            The .npy file.
+
+    Returns:
+        metadata (dict):
+            The sidecar contents, or None if there is no sidecar or it does
+            not describe relative positions saved by relative_positions.py.
+    """
+    try:
+        with open(sidecar_file_name(filename)) as fin:
+            metadata = json.load(fin)
+    except (EOFError, IOError, OSError, ValueError):
+        return None
+    if not isinstance(metadata, dict) or metadata.get('format') != RELPOS_FORMAT:
+        return None
+    if ','.join(metadata.get('columns', [])) != RELPOS_HEADERS.get(metadata.get('dims')):
+        return None
+    return metadata
+
+
+def column_indices(columns, metadata):
+    """Indices of columns given by index or by name (e.g. 'xy_separation')."""
+    names = metadata['columns']
+    return [ingest.column_index(column, names, len(names)) for column in columns]
+
+
+def read_relpos_npy(filename, columns=None):
+    """Open a binary relative positions file, memory-mapped.
+
+    Args:
+        filename (str):
+            The .npy file.
+        columns (list):
+            Optional, the columns to read, by index or name. If not given,
+            the whole table is returned memory-mapped, so that columns are
+            read from disk as they are used.
+
+    Returns:
+        v_values (numpy array):
+            The table, or the chosen columns of it.
+        metadata (dict):
+            The sidecar contents.
+    """
+    metadata = read_relpos_metadata(filename)
+    if metadata is None:
+        raise ValueError('%s is not a relative positions file from '
+                         'relative_positions.py (no valid sidecar %s).'
+                         % (filename, sidecar_file_name(filename)))
+    v_values = np.load(filename, mmap_mode='r')
+    if v_values.ndim != 2 or v_values.shape != (metadata['rows'],
+                                                len(metadata['columns'])):
+        raise ValueError('%s does not match its sidecar %s.'
+                         % (filename, sidecar_file_name(filename)))
+    if columns is not None:
+        v_values = v_values[:, column_indices(columns, metadata)]
+    return v_values, metadata
+
+
+def read_relative_positions(filename, columns=None):
+    """Read relative positions saved by relative_positions.py, as a .csv file
+    or in the binary format.
+
+    Args:
+        filename (str):
+            The .csv or .npy file.
+        columns (list):
+            Optional, the columns to read, by index or name.
+
+    Returns:
+        v_values (numpy array):
+            The relative positions (memory-mapped for a .npy file, if
+            columns are not given).
+    """
+    if filename[-4:] == '.npy':
+        return read_relpos_npy(filename, columns)[0]
+    return ingest.read_table(filename, columns=columns)
@@ -0,0 +1,459 @@
+"""
+relpos_incremental.py
+
+Distance histograms of relative positions (as from relative_positions.py
+with --histogram-only) kept up to date as localisations are added, e.g.
+while a microscope is still writing the localisation file.
+
+Only the pairs of localisations that include a new localisation are found
+when localisations are added: pairs among the new localisations, and pairs
+of a new and an earlier localisation, found with the cells of the earlier
+localisations (see neighbour_search.CellList), into which the new
+localisations are then merged. After any sequence of additions, the
+histograms are the same as relative_positions.gethistograms gives for all
+the localisations at once.
+
+The localisations, their cells and the histograms can be saved in a state
+file, together with how much of the input file has been read, so that a
+later run continues where the last one stopped.
+
+Run as a script, it reads an input file (following it as it grows, with
+--follow) and refreshes the histogram plots and the .npz histograms file
+in the results directory after each update.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import sys
+import time
+import argparse
+import datetime
+import numpy as np
+import matplotlib.pyplot as plt
+import neighbour_search
+import distance_histograms
+import ingest
+import plotting
+import relative_positions
+
+
+# Cells added on each side of the grid when it is made, as a fraction of its
+# extent, so that new localisations usually fall within it.
+GRID_MARGIN = 0.5
+
+
+def _padded_grid(filterdist, *xyz_arrays):
+    """A grid of cells covering the localisations, with a margin."""
+    origin, grid_shape = neighbour_search.common_grid(filterdist, *xyz_arrays)
+    margin = (grid_shape * GRID_MARGIN).astype(np.int64) + 1
+    cell_size = filterdist * (1. + neighbour_search.CELL_SIZE_TOLERANCE)
+    return origin - margin * cell_size, grid_shape + 2 * margin
+
+
+class IncrementalHistograms:
+    """Distance histograms of the relative positions between localisations,
+    updated as localisations are added.
+
+    Args:
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+        filterdist (float):
+            Distance (in all three dimensions) between points within which
+            relative positions are calculated.
+
+    Attributes
+    ----------
+    xyz_values (numpy array):
+        All the localisations added.
+    cells (neighbour_search.CellList):
+        The cells of xyz_values, or None before any are added.
+    histograms (distance_histograms.DistanceHistograms):
+        The histograms of the relative positions between all the
+        localisations added.
+    offset (int):
+        Position (bytes) in the input file up to which localisations have
+        been added, for reading the rest later (see ingest.read_appended).
+    """
+    def __init__(self, dims, filterdist):
+        self.xyz_values = np.zeros((0, dims))
+        self.cells = None
+        self.histograms = distance_histograms.DistanceHistograms(dims, filterdist)
+        self.offset = 0
+
+    @property
+    def filterdist(self):
+        """The filter distance."""
+        return self.histograms.filterdist
+
+    def _add_pairs(self, xyz_from, xyz_to, i_values, j_values):
+        subd = neighbour_search.pair_separations(xyz_from, xyz_to, i_values, j_values)
+
+        # Remove [0,0,0], these are duplicates and can overwhelm the result.
+        self.histograms.add_separations(subd[neighbour_search.nonzero_separations(subd)])
+
+    def add(self, xyz_values_new):
+        """Add localisations, and the relative positions of the pairs of
+        localisations within the filter distance that include them.
+
+        Args:
+            xyz_values_new (numpy array):
+                The new localisations, shape (N, 2 or 3).
+
+        Returns:
+            added (int): The number of relative positions added.
+        """
+        total = self.histograms.total
+        if len(xyz_values_new) == 0:
+            return 0
+
+        # Pairs among the new localisations.
+        for i_values, j_values in neighbour_search.iter_neighbour_pairs(
+                xyz_values_new, self.filterdist):
+            self._add_pairs(xyz_values_new, xyz_values_new, i_values, j_values)
+
+        if self.cells is None:
+            self.cells = neighbour_search.CellList(
+                xyz_values_new, self.filterdist, *_padded_grid(self.filterdist,
+                                                               xyz_values_new))
+            self.xyz_values = self.cells.xyz_values
+            return self.histograms.total - total
+
+        if not self.cells.contains(xyz_values_new):
+            self.cells = neighbour_search.CellList(
+                self.xyz_values, self.filterdist,
+                *_padded_grid(self.filterdist, self.xyz_values, xyz_values_new))
+
+        # Pairs of a new and an earlier localisation, tested as
+        # neighbour_search.iter_neighbour_pairs does.
+        new_cells = neighbour_search.CellList(xyz_values_new, self.filterdist,
+                                              self.cells.origin, self.cells.grid_shape)
+        for i_values, j_values in neighbour_search.iter_candidate_pairs(new_cells,
+                                                                        self.cells):
+            xyz_i = xyz_values_new[i_values]
+            xyz_j = self.xyz_values[j_values]
+            accept = np.logical_and(
+                neighbour_search.within_filter(xyz_i, xyz_j, self.filterdist),
+                neighbour_search.within_filter(xyz_j, xyz_i, self.filterdist))
+            self._add_pairs(xyz_values_new, self.xyz_values,
+                            i_values[accept], j_values[accept])
+
+        self.cells = self.cells.appended(xyz_values_new)
+        self.xyz_values = self.cells.xyz_values
+        return self.histograms.total - total
+
+    def save(self, filename):
+        """Save the localisations, their cells, the histograms and the
+        offset in a numpy .npz file, replacing it only when complete."""
+        arrays = {'histogram_' + key: value
+                  for key, value in self.histograms.arrays().items()}
+        arrays['xyz_values'] = self.xyz_values
+        arrays['offset'] = self.offset
+        if self.cells is not None:
+            for key in ('origin', 'grid_shape', 'cell_ids_per_loc', 'order',
+                        'cell_ids', 'cell_starts', 'cell_counts'):
+                arrays['cells_' + key] = getattr(self.cells, key)
+        temp_file_name = filename + '.incomplete'
+        with open(temp_file_name, 'wb') as fout:
+            np.savez(fout, **arrays)
+        os.replace(temp_file_name, filename)
+
+
+def load_incremental_histograms(filename):
+    """Load the state saved by IncrementalHistograms.save.
+
+    Args:
+        filename (str):
+            The .npz file.
+
+    Returns:
+        incremental (IncrementalHistograms)
+
+    Raises:
+        KeyError if the file is not a saved IncrementalHistograms.
+    """
+    with np.load(filename) as arrays:
+        histograms = distance_histograms.histograms_from_arrays(
+            {key[len('histogram_'):]: arrays[key] for key in arrays.files
+             if key.startswith('histogram_')})
+        incremental = IncrementalHistograms(histograms.dims, histograms.filterdist)
+        incremental.histograms = histograms
+        incremental.xyz_values = arrays['xyz_values']
+        incremental.offset = int(arrays['offset'])
+        if 'cells_order' in arrays.files:
+            cells = neighbour_search.CellList.__new__(neighbour_search.CellList)
+            cells.xyz_values = incremental.xyz_values
+            cells.filterdist = histograms.filterdist
+            cells.dims = histograms.dims
+            for key in ('origin', 'grid_shape', 'cell_ids_per_loc', 'order',
+                        'cell_ids', 'cell_starts', 'cell_counts'):
+                setattr(cells, key, arrays['cells_' + key])
+            incremental.cells = cells
+    return incremental
+
+
+def update(incremental, info):
+    """Add the localisations written to the input file since it was last
+    read.
+
+    Args:
+        incremental (IncrementalHistograms):
+            The histograms to update.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+
+    Returns:
+        n_new (int): The number of localisations added.
+    """
+    in_file = info['in_file_and_path']
+    if os.path.getsize(in_file) < incremental.offset:
+        sys.exit("ERROR; The input file is shorter than when it was last read.")
+
+    columns = info['xyz_columns']
+    if columns is None:
+        columns = list(range(info['dims']))
+    if info['channel'] is not None:
+        columns = list(columns) + [info['channel_column']]
+    try:
+        values, incremental.offset = ingest.read_appended(
+            in_file, incremental.offset, columns=columns,
+            filters=info['row_filters'])
+    except (EOFError, IOError, OSError, ValueError) as exception:
+        print("\n\n", type(exception), exception)
+        sys.exit("Could not read the input file " + in_file + ".\n")
+
+    if info['channel'] is not None:
+        values = values[values[:, -1] == info['channel']]
+    incremental.add(values[:, 0:info['dims']])
+    return len(values)
+
+
+def refresh_outputs(incremental, info):
+    """Replot the histograms and save them (and the state file, if used)."""
+    histograms = incremental.histograms
+    if histograms.total > 0:
+        plotting.plot_histograms_from_counts(histograms, info['dims'], info['filter_dist'],
+                                             info, binsize=info['bin_size'])
+        plt.close('all')
+        relative_positions.save_histograms(histograms, info['filter_dist'], info)
+    if info['state_file'] is not None:
+        try:
+            incremental.save(info['state_file'])
+        except (IOError, OSError):
+            print("Unexpected error:", sys.exc_info()[0])
+            sys.exit("Could not save the state file.")
+
+
+def main():
+    """Reads localisations from a file, as it grows if following it, and keeps
+        the histograms of the relative positions between them up to date in a
+        results directory next to the input file.
+
+    Args:
+        input_file (FILE): File of localisations which is a .csv (or .txt with
+                           comma delimiters).
+        dims (int): The dimensions of the data. This can be 2 or 3.
+        filter_dist (int): The filter distance.
+        state (FILE): Optional, a state file to continue from and to save.
+        follow (Boolean): Keep reading the file as it grows.
+
+    Returns:
+        Nothing
+    """
+    prog = 'relpos_incremental'
+    prog_short_name = 'ri'
+    description = ('Keeping histograms of the relative positions of points up to '
+                   'date as points are added.')
+
+    info = {'prog':prog,
+            'prog_short_name':prog_short_name,
+            'description':description}
+
+    info['start'] = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+    parser = argparse.ArgumentParser(prog, description)
+
+    parser.add_argument('-i', '--input_file',
+                        dest='input_file',
+                        required=True,
+                        help='File of localisations which is a .csv (or .txt '
+                             'with comma delimiters) and containing N '
+                             'localisations in N rows.',
+                        metavar="FILE")
+
+    parser.add_argument('-d', '--dims',
+                        dest='dims',
+                        type=int,
+                        default=3,
+                        help="Dimensions of the data. It can be 2 or 3.")
+
+    parser.add_argument('-f', '--filter_distance',
+                        dest='filter_dist',
+                        type=int,
+                        default=150,
+                        help="Filter distance.")
+
+    parser.add_argument('-b', '--bin_size',
+                        dest='bin_size',
+                        type=int,
+                        default=1,
+                        help="Bin size in distance histograms (nm).")
+
+    parser.add_argument('--columns',
+                        dest='xyz_columns',
+                        default=None,
+                        help="Columns of the input file holding X, Y (and Z), "
+                        "as for relative_positions.py.")
+
+    parser.add_argument('--channel',
+                        dest='channel',
+                        type=int,
+                        default=None,
+                        help="Use only localisations in this colour channel.")
+
+    parser.add_argument('--channel-column',
+                        dest='channel_column',
+                        default='-1',
+                        help="Column holding the colour channel, by index or "
+                        "name. Default: the last column.")
+
+    parser.add_argument('--row-filter',
+                        dest='row_filters',
+                        action='append',
+                        default=None,
+                        metavar='FILTER',
+                        help="Use only localisations passing a filter, as for "
+                        "relative_positions.py. Can be given more than once.")
+
+    parser.add_argument('--state',
+                        dest='state_file',
+                        default=None,
+                        help="State file (.npz) holding the localisations read "
+                        "so far, their cells and the histograms. If it exists, "
+                        "only the part of the input file written since it was "
+                        "saved is read. It is saved after every update.")
+
+    parser.add_argument('--follow',
+                        dest='follow',
+                        help="Keep reading the input file as it grows (e.g. "
+                        "during an acquisition), refreshing the histograms "
+                        "after each update, until interrupted with Ctrl-C or "
+                        "until the file has not grown for --timeout seconds.",
+                        action="store_true")
+
+    parser.add_argument('--interval',
+                        dest='interval',
+                        type=float,
+                        default=5.,
+                        help="Seconds between reads of the input file with "
+                        "--follow. Default: %(default)s.")
+
+    parser.add_argument('--timeout',
+                        dest='timeout',
+                        type=float,
+                        default=None,
+                        help="With --follow, stop when the input file has not "
+                        "grown for this many seconds.")
+
+    parser.add_argument('-s', '--short_names',
+                        help="Uses shortened names for the results files and "
+                        "directories.",
+                        action="store_true")
+
+    parser.add_argument('-v', '--verbose',
+                        help="Increase output verbosity",
+                        action="store_true")
+
+    args = parser.parse_args()
+
+    if args.dims < 2 or args.dims > 3:
+        sys.exit("ERROR; The data can only have 2 or 3 dimensions.")
+
+    if not os.path.exists(args.input_file):
+        sys.exit("ERROR; The input file does not exist.")
+
+    info['in_file_and_path'] = args.input_file
+    info['dims'] = args.dims
+    info['filter_dist'] = args.filter_dist
+    info['bin_size'] = args.bin_size
+    info['channel'] = args.channel
+    info['channel_column'] = args.channel_column
+    info['state_file'] = args.state_file
+    info['short_names'] = args.short_names
+    info['verbose'] = args.verbose
+    info['colours_analysed'] = None if args.channel is None else 1
+    info['start_channel'] = args.channel
+    info['end_channel'] = None
+
+    info['xyz_columns'] = None
+    if args.xyz_columns is not None:
+        info['xyz_columns'] = args.xyz_columns.split(',')
+        if len(info['xyz_columns']) != args.dims:
+            sys.exit("ERROR; --columns must give one column for each of the "
+                     + str(args.dims) + " dimensions.")
+
+    info['row_filters'] = []
+    for row_filter in args.row_filters or []:
+        try:
+            info['row_filters'].append(ingest.parse_filter(row_filter))
+        except ValueError as exception:
+            sys.exit("ERROR; " + str(exception))
+
+    if info['state_file'] is not None and os.path.exists(info['state_file']):
+        try:
+            incremental = load_incremental_histograms(info['state_file'])
+        except (IOError, OSError, ValueError, KeyError):
+            print("Unexpected error:", sys.exc_info()[0])
+            sys.exit("Could not read the state file.")
+        if (incremental.histograms.dims != info['dims']
+                or incremental.filterdist != info['filter_dist']):
+            sys.exit("ERROR; The state file is for different dimensions or a "
+                     "different filter distance.")
+        if info['verbose']:
+            print('Continuing from %i localisations in the state file.'
+                  % len(incremental.xyz_values))
+    else:
+        incremental = IncrementalHistograms(info['dims'], info['filter_dist'])
+
+    relative_positions.make_results_dir(info)
+
+    last_growth = time.time()
+    try:
+        while True:
+            n_new = update(incremental, info)
+            if n_new > 0:
+                last_growth = time.time()
+                refresh_outputs(incremental, info)
+                if info['verbose']:
+                    print('%s: %i localisations added, %i in total, with %i '
+                          'relative positions.'
+                          % (datetime.datetime.now().strftime('%H:%M:%S'), n_new,
+                             len(incremental.xyz_values), incremental.histograms.total))
+            if not args.follow:
+                break
+            if args.timeout is not None and time.time() - last_growth > args.timeout:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print('\nStopped following the input file.')
+
+    if incremental.histograms.total == 0:
+        print("No relative positions were found.")
+    elif info['verbose']:
+        results_dir = info['short_results_dir'] if info['short_names'] else info['results_dir']
+        print('\nHistograms are saved in the directory:\n' + results_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+relpos_table.py
+
+A compact container for a table of relative positions, in place of the
+full table of vector components and distances from
+relative_positions.get_vectors.
+
+Only the X, Y (and Z) components of the relative positions are stored,
+optionally as 32-bit floating point numbers (12 bytes per relative position
+in 3D, rather than 56 for the full table). The distance columns (XY, and
+XZ, YZ and XYZ in 3D) are calculated when they are first used, and kept.
+Columns are read as from the full table (e.g. relative_positions[:, 3] for
+the XY distances), and the full table, in the same order and with the same
+values, can be made a block of rows at a time for saving.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import numpy as np
+
+
+# Columns of the full table, in the order of relpos_files.RELPOS_HEADERS.
+TABLE_COLUMNS = {2: ('x', 'y', 'z', 'xy'),
+                 3: ('x', 'y', 'z', 'xy', 'xz', 'yz', 'xyz')}
+
+# Rows of the full table made at a time when saving it.
+DEFAULT_BLOCK_ROWS = 2 ** 18
+
+
+class RelativePositions:
+    """Relative positions, stored as their vector components, with the
+    distances calculated as they are used.
+
+    Args:
+        d_values (numpy array):
+            Relative position vectors, shape (P, 3) (as from
+            relative_positions.getdistances) or (P, dims).
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+        dtype (numpy dtype):
+            Optional, type to store the components as, e.g. np.float32.
+            Defaults to that of d_values. Distances are calculated in the
+            same type.
+
+    Attributes
+    ----------
+    components (numpy array):
+        The X, Y (and Z) components, shape (P, dims), one column after
+        another in memory.
+    dims (int):
+        The dimensions of the data ie 2D or 3D.
+    """
+    __slots__ = ('components', 'dims', '_distances')
+
+    def __init__(self, d_values, dims, dtype=None):
+        if dtype is None:
+            dtype = d_values.dtype
+        self.components = np.asfortranarray(d_values[:, 0:dims], dtype=dtype)
+        self.dims = dims
+        self._distances = {}
+
+    def __len__(self):
+        return len(self.components)
+
+    @property
+    def shape(self):
+        """The shape of the full table."""
+        return (len(self), len(TABLE_COLUMNS[self.dims]))
+
+    def distance(self, description):
+        """The absolute separations (e.g. 'x') or distances (e.g. 'xy'), as
+        distance_histograms.separation_distances calculates them, in the
+        type the components are stored as."""
+        if description in ('x', 'y', 'z'):
+            if description == 'z' and self.dims == 2:
+                return np.zeros(len(self), dtype=self.components.dtype)
+            return np.absolute(self.components[:, 'xyz'.index(description)])
+        if description not in self._distances:
+            squares = [np.square(self.components[:, 'xyz'.index(axis)])
+                       for axis in description]
+            self._distances[description] = np.sqrt(sum(squares[1:], squares[0]))
+        return self._distances[description]
+
+    def column(self, index):
+        """A column of the full table (as float64), e.g. 3 for XY distances."""
+        description = TABLE_COLUMNS[self.dims][index]
+        if description in ('x', 'y', 'z'):
+            if description == 'z' and self.dims == 2:
+                return np.zeros(len(self))
+            return self.components[:, 'xyz'.index(description)].astype(np.float64)
+        return self.distance(description).astype(np.float64)
+
+    def __getitem__(self, key):
+        """Columns of the full table, as table[:, column]."""
+        if not (isinstance(key, tuple) and len(key) == 2
+                and isinstance(key[1], (int, np.integer))):
+            raise TypeError('RelativePositions are read a column at a time, '
+                            'e.g. relative_positions[:, 3].')
+        return self.column(key[1])[key[0]]
+
+    def table(self, start=0, stop=None):
+        """Rows of the full table of vector components and distances, as
+        relative_positions.get_vectors gives."""
+        rows = slice(start, stop)
+        n_rows = len(range(*rows.indices(len(self))))
+        v_values = np.zeros((n_rows, len(TABLE_COLUMNS[self.dims])))
+        v_values[:, 0:self.dims] = self.components[rows]
+        for index, description in enumerate(TABLE_COLUMNS[self.dims]):
+            if index >= 3:
+                v_values[:, index] = self.distance(description)[rows]
+        return v_values
+
+    def __array__(self, dtype=None):
+        v_values = self.table()
+        return v_values if dtype is None else v_values.astype(dtype)
+
+    def iter_tables(self, block_rows=DEFAULT_BLOCK_ROWS):
+        """The full table, a block of rows at a time."""
+        for start in range(0, len(self), block_rows):
+            yield self.table(start, start + block_rows)
+
+    def sort_order(self):
+        """Indices that sort the relative positions as
+        relpos_writer.sort_by_distance sorts the full table: by the last
+        distance column, with ties broken by X, Y and Z.
+
+        Sorts on the last distance only, then sorts the (usually few) runs
+        of equal distance by the components.
+        """
+        key = self.distance(TABLE_COLUMNS[self.dims][-1])
+        order = np.argsort(key, kind='stable')
+        if len(order) < 2:
+            return order
+
+        key_sorted = key[order]
+        same_as_previous = key_sorted[1:] == key_sorted[:-1]
+        if not np.any(same_as_previous):
+            return order
+
+        # Positions in runs of equal distance, numbered by run.
+        in_run = np.zeros(len(order), dtype=bool)
+        in_run[1:] |= same_as_previous
+        in_run[:-1] |= same_as_previous
+        positions = np.nonzero(in_run)[0]
+        run_starts = np.ones(len(positions), dtype=bool)
+        run_starts[1:] = ~same_as_previous[positions[1:] - 1]
+        run_numbers = np.cumsum(run_starts)
+
+        tied = order[positions]
+        keys = [self.components[tied, column]
+                for column in range(self.dims - 1, -1, -1)]
+        order[positions] = tied[np.lexsort(keys + [run_numbers])]
+        return order
+
+    def sort(self):
+        """Sort the relative positions in place (see sort_order)."""
+        order = self.sort_order()
+        self.components = np.asfortranarray(self.components[order])
+        self._distances = {description: values[order]
+                           for description, values in self._distances.items()}
+        return self
@@ -0,0 +1,314 @@
+"""
+relpos_writer.py
+
+Writes relative positions to a file without holding them all in memory.
+
+Vectors between localisations are added in blocks as they are found. They
+are collected up to a memory budget, then the distance columns are
+calculated, and the rows sorted and written to a temporary binary file (a
+sorted run). When all the vectors have been added, the runs are merged into
+the output .csv file (or binary .npy file, see relpos_files.py), in the same
+order and format as relative_positions.get_vectors and
+relative_positions.save_relative_positions would give for the whole table,
+reading only part of each run at a time.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import distance_histograms
+import relpos_files
+from relpos_files import RELPOS_HEADERS
+
+# Default memory budget (MB).
+DEFAULT_MAX_MEMORY = 1024
+
+
+def vector_columns(d_values, dims):
+    """Calculate the table of vector components and distances of relative
+    positions, as relative_positions.get_vectors, but without sorting.
+
+    Args:
+        d_values (numpy array):
+            Relative position vectors, shape (P, 3).
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+
+    Returns:
+        v_values (numpy array):
+            The vectors, followed by XY distances (2D), or XY, XZ, YZ and
+            XYZ distances (3D).
+    """
+    n_vector_columns = d_values.shape[1]
+    n_distance_columns = 1 if dims == 2 else 4
+    v_values = np.empty((len(d_values), n_vector_columns + n_distance_columns))
+    v_values[:, 0:n_vector_columns] = d_values
+    distance_values = v_values[:, n_vector_columns:]
+
+    x_square_values = np.square(d_values[:, 0])
+    y_square_values = np.square(d_values[:, 1])
+    np.sqrt(x_square_values + y_square_values, out=distance_values[:, 0])
+
+    if dims == 3:
+        z_square_values = np.square(d_values[:, 2])
+        np.sqrt(x_square_values + z_square_values, out=distance_values[:, 1])
+        np.sqrt(y_square_values + z_square_values, out=distance_values[:, 2])
+        np.sqrt(x_square_values + y_square_values + z_square_values,
+                out=distance_values[:, 3])
+
+    return v_values
+
+
+def sort_by_distance(v_values):
+    """Sort, in place, a table of vector components and distances by the
+    last distance column, as in relative_positions.get_vectors. Ties are
+    broken by the other columns, in order."""
+    n_columns = v_values.shape[1]
+    v_values.view(','.join(['f8'] * n_columns)).sort(order=['f%i' % (n_columns - 1)],
+                                                     axis=0)
+    return v_values
+
+
+def distance_order(v_values):
+    """The order in which sort_by_distance would put the rows of a table, so
+    that other arrays (e.g. localisation indices) can be put in the same
+    order."""
+    n_columns = v_values.shape[1]
+    return np.argsort(v_values.view(','.join(['f8'] * n_columns))[:, 0],
+                      order=['f%i' % (n_columns - 1)], kind='stable')
+
+
+def histogram_distances(v_values, dims):
+    """The distances histogrammed by distance_histograms.DistanceHistograms,
+    taken from a table of vector components and distances."""
+    if dims == 2:
+        columns = (0, 1, 3)
+    else:
+        columns = range(7)
+    return {description: np.absolute(v_values[:, column])
+            for description, column
+            in zip(distance_histograms.DISTANCE_DESCRIPTIONS[dims], columns)}
+
+
+class RelativePositionWriter:
+    """Collects relative positions and writes them, sorted by distance, to a
+    .csv file, or a binary .npy file, using a bounded amount of memory.
+
+    Args:
+        out_file_name (str):
+            The output .csv or .npy file.
+        dims (int):
+            The dimensions of the data ie 2D or 3D.
+        filterdist (float):
+            The filter distance, for the histograms of the distances.
+        max_memory (float):
+            Approximate memory (MB) to use for relative positions.
+        temp_dir (str):
+            Directory in which to make a temporary directory for the sorted
+            runs. Defaults to the directory of the output file.
+        info (dict):
+            Optional, the info dictionary of relative_positions.py, recorded
+            in the sidecar of a .npy file.
+    """
+    def __init__(self, out_file_name, dims, filterdist,
+                 max_memory=DEFAULT_MAX_MEMORY, temp_dir=None, info=None):
+        self.out_file_name = out_file_name
+        self.dims = dims
+        self.filterdist = filterdist
+        self.info = info
+        self.n_columns = 4 if dims == 2 else 7
+        self.histograms = distance_histograms.DistanceHistograms(dims, filterdist)
+        self.total = 0
+
+        # Vectors, the table they make and working space for sorting it.
+        bytes_per_row = 8 * (3 + 2 * self.n_columns)
+        self.max_memory = max_memory
+        self.chunk_rows = max(1, int(max_memory * 2 ** 20) // bytes_per_row)
+
+        if temp_dir is None:
+            temp_dir = os.path.dirname(os.path.abspath(out_file_name))
+        self.temp_dir = tempfile.mkdtemp(prefix='relpos_chunks_', dir=temp_dir)
+
+        self._blocks = []
+        self._start_blocks = []
+        self._buffered_rows = 0
+        self._runs = []
+        self._unfiltered_chunks = []
+
+    def add(self, separation_values, start_indices=None):
+        """Add a block of relative position vectors, shape (P, 3).
+
+        Args:
+            separation_values (numpy array):
+                The vectors.
+            start_indices (numpy array):
+                Optional, the index of the 'from' localisation of each
+                vector, so that vectors from some localisations can be left
+                out when the file is written (see close).
+        """
+        if len(separation_values) == 0:
+            return
+        self._blocks.append(np.asarray(separation_values, dtype=float))
+        if start_indices is not None:
+            self._start_blocks.append(start_indices)
+        self._buffered_rows = self._buffered_rows + len(separation_values)
+        if self._buffered_rows >= self.chunk_rows:
+            self._spill()
+
+    def _spill(self):
+        """Write the buffered vectors to disk."""
+        if self._buffered_rows == 0:
+            return
+        d_values = np.concatenate(self._blocks)
+        self._blocks = []
+        self._buffered_rows = 0
+        if len(self._start_blocks) > 0:
+            # Sorted later, when it is known which vectors to leave out.
+            filename = os.path.join(self.temp_dir,
+                                    'unfiltered_%i.npz' % len(self._unfiltered_chunks))
+            np.savez(filename, d_values=d_values,
+                     start_indices=np.concatenate(self._start_blocks))
+            self._start_blocks = []
+            self._unfiltered_chunks.append(filename)
+        else:
+            self._write_run(d_values)
+
+    def _write_run(self, d_values):
+        """Calculate the table for some vectors, sort it and save it."""
+        if len(d_values) == 0:
+            return
+        v_values = sort_by_distance(vector_columns(d_values, self.dims))
+        filename = os.path.join(self.temp_dir, 'run_%i.npy' % len(self._runs))
+        np.save(filename, v_values)
+        self._runs.append(filename)
+
+    def close(self, excluded_starts=None, verbose=False):
+        """Merge the sorted runs into the output file and remove the
+        temporary files.
+
+        Args:
+            excluded_starts (numpy array of Booleans):
+                Optional, for vectors added with start_indices, which 'from'
+                localisations to leave out.
+            verbose (Boolean):
+                Choice whether to print updates to screen.
+
+        Returns:
+            out_file_name (str):
+                The output file.
+        """
+        try:
+            self._spill()
+            for filename in self._unfiltered_chunks:
+                with np.load(filename) as chunk:
+                    d_values = chunk['d_values']
+                    if excluded_starts is not None:
+                        d_values = d_values[~excluded_starts[chunk['start_indices']]]
+                self._write_run(d_values)
+                os.remove(filename)
+            if verbose:
+                print('Merging %i sorted blocks of relative positions.' % len(self._runs))
+            if self.out_file_name[-4:] == '.npy':
+                self._write_npy()
+            else:
+                with open(self.out_file_name, 'w') as fout:
+                    fout.write(RELPOS_HEADERS[self.dims] + '\n')
+                    for v_values in merge_sorted_runs(self._runs, self.n_columns,
+                                                      self.chunk_rows):
+                        self._count(v_values)
+                        np.savetxt(fout, v_values, delimiter=',')
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        return self.out_file_name
+
+    def _count(self, v_values):
+        """Add a block of the merged table to the total and histograms."""
+        self.total = self.total + len(v_values)
+        self.histograms.add_distances(histogram_distances(v_values, self.dims))
+
+    def _write_npy(self):
+        """Merge the sorted runs into a binary relative positions file."""
+        n_rows = sum(np.load(filename, mmap_mode='r').shape[0]
+                     for filename in self._runs)
+        out_values = relpos_files.create_relpos_npy(
+            self.out_file_name, n_rows, self.dims, self.filterdist, self.info)
+        for v_values in merge_sorted_runs(self._runs, self.n_columns,
+                                          self.chunk_rows):
+            out_values[self.total:self.total + len(v_values)] = v_values
+            self._count(v_values)
+        out_values.flush()
+        del out_values
+
+
+def merge_sorted_runs(run_filenames, n_columns, max_rows):
+    """Merge tables sorted by sort_by_distance, saved in .npy files, reading
+    part of each at a time.
+
+    Args:
+        run_filenames (list of str):
+            The sorted runs.
+        n_columns (int):
+            Number of columns in the tables.
+        max_rows (int):
+            Approximate number of rows to hold in memory.
+
+    Yields:
+        v_values (numpy array):
+            Consecutive blocks of the merged table.
+    """
+    runs = [np.load(filename, mmap_mode='r') for filename in run_filenames]
+    block_rows = max(1, max_rows // (2 * max(len(runs), 1)))
+    positions = [0] * len(runs)
+    buffers = [np.zeros((0, n_columns)) for run in runs]
+
+    while True:
+        for index, run in enumerate(runs):
+            if len(buffers[index]) == 0 and positions[index] < len(run):
+                buffers[index] = np.array(run[positions[index]:positions[index] + block_rows])
+                positions[index] = positions[index] + len(buffers[index])
+        if all(len(buffer) == 0 for buffer in buffers):
+            return
+
+        # Rows with distances below the last distance read from every run that
+        # has more rows to read can be written, as no later row is smaller.
+        unread = [index for index, run in enumerate(runs) if positions[index] < len(run)]
+        if len(unread) == 0:
+            bound = np.inf
+        else:
+            bound = min(buffers[index][-1, -1] for index in unread)
+
+        ready = []
+        for index, buffer in enumerate(buffers):
+            if bound == np.inf:
+                n_ready = len(buffer)
+            else:
+                n_ready = int(np.searchsorted(buffer[:, -1], bound, side='left'))
+            if n_ready > 0:
+                ready.append(buffer[:n_ready])
+                buffers[index] = buffer[n_ready:]
+
+        if len(ready) == 0:
+            # Every row read from a run ties with the bound: read more of it.
+            for index in unread:
+                if buffers[index][-1, -1] == bound:
+                    more = np.array(runs[index][positions[index]:positions[index] + block_rows])
+                    positions[index] = positions[index] + len(more)
+                    buffers[index] = np.concatenate((buffers[index], more))
+            continue
+
+        yield sort_by_distance(np.concatenate(ready))
+
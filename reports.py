@@ -84,6 +84,58 @@ def write_html_report_end(fout):
 
 
 
+def write_performance_section(fout, info):
+    """Writes a table of the performance of each stage of the run, recorded
+    in info['stage_recorder'] (see instrumentation.py), if there is one.
+
+    Args:
+        fout (file): The html report file.
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+    """
+    recorder = info.get('stage_recorder')
+    if recorder is None or len(recorder.stages) == 0:
+        return
+
+    fout.write("<h2>Performance</h2>\n")
+    fout.write("<p>The time taken, memory used and throughput of each stage of "
+               "the run, up to writing this report, are also saved in "
+               "performance.json in this directory. CPU time includes that of "
+               "worker processes. Peak resident memory is the largest for this "
+               "process up to the end of each stage.")
+    if recorder.trace_memory:
+        fout.write(" Peak allocated memory is the largest memory allocated "
+                   "during each stage, found with tracemalloc.")
+    fout.write("</p>\n")
+    fout.write("<table>\n")
+    fout.write("   <tr>\n")
+    fout.write("     <th>Stage</th>\n")
+    fout.write("     <th>Wall time (s)</th>\n")
+    fout.write("     <th>CPU time (s)</th>\n")
+    fout.write("     <th>Peak resident memory (MB)</th>\n")
+    if recorder.trace_memory:
+        fout.write("     <th>Peak allocated memory (MB)</th>\n")
+    fout.write("     <th>Throughput</th>\n")
+    fout.write("   </tr>\n")
+    for record in recorder.stages:
+        fout.write("   <tr>\n")
+        fout.write("     <td>" + record['stage'] + "</td>\n")
+        fout.write("     <td>%.3f</td>\n" % record['wall_seconds'])
+        fout.write("     <td>%.3f</td>\n" % record['cpu_seconds'])
+        if record['peak_rss_mb'] is None:
+            fout.write("     <td>-</td>\n")
+        else:
+            fout.write("     <td>%.1f</td>\n" % record['peak_rss_mb'])
+        if recorder.trace_memory:
+            fout.write("     <td>%.1f</td>\n" % record['peak_traced_mb'])
+        fout.write("     <td>" + "<br>".join(
+            '%.4g %s' % (rate, item) for item, rate in record['throughput'].items())
+                   + "</td>\n")
+        fout.write("   </tr>\n")
+    fout.write("</table>\n")
+    fout.write("<p></p>\n")
+
+
 def write_rot_2d_html_report(info, symmetries, aiccs, weights, table_values):
     """Creates and saves a html report. Contains images of graphs.
 
@@ -284,6 +336,8 @@ def write_rot_2d_html_report(info, symmetries, aiccs, weights, table_values):
         fout.write("</tbody>\n")
         fout.write("</table>\n\n")
 
+    write_performance_section(fout, info)
+
     write_html_report_end(fout)
 
 
@@ -338,6 +392,27 @@ def write_rel_pos_html_report(info):
         report_info = report_info + ('Relative positions were found from localisations '
             'in channel [' +repr(info['start_channel'])+ '] to localisations in channel ['
             +repr(info['end_channel'])+ ']. ')
+    if info.get('row_filters'):
+        report_info = report_info + ('Only localisations with '
+            + ', '.join('%s %s %g' % row_filter for row_filter in info['row_filters'])
+            + ' were read from the input file. ')
+    if info.get('cached_filter_dist') is not None:
+        report_info = report_info + ('The relative positions were taken from a cache '
+            'of an earlier search of the same localisations, with a filter distance of '
+            + str(info['cached_filter_dist']) + ' nm. ')
+    if info.get('all_channel_pairs'):
+        report_info = report_info + ('The relative positions for every pair of the '
+            'colour channels ' + repr([channel for channel in info['unique_colour_values']])
+            + ' were found with one search, with the results for each pair in a '
+            'separate directory. ')
+    if len(info.get('filter_distances', [])) > 1:
+        report_info = report_info + ('The relative positions were found once for '
+            'filter distances of ' + ', '.join(str(filterdist) for filterdist
+                                               in info['filter_distances'])
+            + ' nm, with the results for each in a separate directory. ')
+    if info.get('histogram_only'):
+        report_info = report_info + ('Only the distance histograms were saved, '
+            'not the table of relative positions. ')
     report_info = report_info + ("This report provides "
                    "images and information on experimental fluorescence super resolution "
                    "light microscopy data.</p>\n")
@@ -398,6 +473,6 @@ def write_rel_pos_html_report(info):
         line_dim_3 = line.replace("+++", "XYZ")
         fout.write(line_dim_3.replace("***", "histogram_xyz_separation_in_nm.png"))
 
-
+    write_performance_section(fout, info)
 
     write_html_report_end(fout)
@@ -31,7 +31,8 @@ import os
 import sys
 import argparse
 import datetime
-import timeit
+import functools
+import multiprocessing
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 import numpy as np
@@ -42,18 +43,11 @@ import modelling_general as models
 from modelling_general import ModelWithFitSettings
 from modelling_general import stdev_of_model
 import modelstats as stats
-from relative_positions import getdistances
+import pair_correlation
 import utils
 import plotting
 import reports
-
-
-class Number:
-    """Class object providing only a number, to be passed to rotational
-    symmetry models to provide the order of symmetry, without being fitted.
-    """
-    def __init__(self, number):
-        self.number = number
+import instrumentation
 
 
 def get_inputs(info):
@@ -112,18 +106,41 @@ def get_inputs(info):
     info['verbose'] = silent
 
 
+def vertex_separations(diameter, symmetry_order):
+    """The different distances between the vertices of a polygon with
+    symmetry_order vertices, and how many pairs of vertices are separated
+    by each (see modelling_general.polygon_chords).
+
+    Args:
+        diameter (float):
+            Diameter of the circle containing the vertices of the polygon.
+        symmetry_order (int):
+            Number of vertices.
+
+    Returns:
+        xy_separations (numpy array):
+            The different distances between the vertices.
+        multiplicities (numpy array):
+            The number of pairs of vertices at each distance.
+    """
+    return models.polygon_chords(symmetry_order, diameter)
+
+
 def rot_sym_only(separation_values,
                  diameter,
                  broadening,
-                 amplitude):
+                 amplitude,
+                 *, symmetry_order):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
     the model at a distance is termed the relative position density (RPD)
     at that distance. Broadening is modelled assuming Gaussian imprecision on
     the positions of the vertices.
 
-    Calls sym_order.number from outside, so that the degree of symmetry os
-    not fitted when this function is passed to scipy.optimize.curve_fit.
+    The order of symmetry is a keyword-only argument, so that it is not
+    fitted when this function is passed to scipy.optimize.curve_fit. Fit the
+    model for a particular order with bind_symmetry_order, so that fits for
+    different orders can run at the same time.
 
     Args:
         separation_values (numpy array):
@@ -134,41 +151,56 @@ def rot_sym_only(separation_values,
             Broadening of the peaks located at distances between the vertices.
         amplitude (float):
             Amplitude of the contribution of one inter-vertex distance.
+        symmetry_order (int):
+            Order of rotational symmetry (number of vertices).
 
     Returns:
         rpd (numpy array):
             The relative position density given by the model at the
             separation_values.
     """
-    vertices = models.generate_polygon_points(sym_order.number,
-                                              diameter)
-    filter_distance = (2 * diameter)
-    # getdistances includes removel of duplicates 27/11/2019
-    relative_positions = getdistances(vertices, filter_distance)
-    xy_separations = np.sqrt(relative_positions[:, 0] ** 2
-                             + relative_positions[:, 1] ** 2)
+    xy_separations, multiplicities = vertex_separations(diameter,
+                                                        symmetry_order)
 
-    # Initialise array for set of density values.
-    rpd = separation_values * 0.
-
-    # Add 2D pair correlations at the distances between vertices.
-    for distance in xy_separations:
-        rpd = (rpd
-               + (amplitude * models.pairwise_correlation_2d(separation_values,
-                                                             distance,
-                                                             broadening)
-                  )
-               )
+    # Add 2D pair correlations at the distances between vertices,
+    # for every pair of vertices.
+    rpd = pair_correlation.sum_pair_correlations(separation_values,
+                                                 xy_separations,
+                                                 broadening,
+                                                 amplitude * multiplicities)
 
     return rpd
 
 
+def rot_sym_only_jacobian(separation_values,
+                          diameter,
+                          broadening,
+                          amplitude,
+                          *, symmetry_order):
+    """Jacobian of rot_sym_only (see modelling_general.model_jacobian).
+    The distances between the vertices are proportional to the diameter."""
+    xy_separations, multiplicities = vertex_separations(diameter,
+                                                        symmetry_order)
+    (_, d_means,
+     d_broadenings,
+     d_amplitudes) = pair_correlation.sum_pair_correlations_derivatives(
+         separation_values, xy_separations, broadening,
+         amplitude * multiplicities)
+    return np.stack([d_means.dot(xy_separations / diameter),
+                     d_broadenings.sum(axis=-1),
+                     d_amplitudes.dot(multiplicities)], axis=-1)
+
+
+rot_sym_only.jacobian = rot_sym_only_jacobian
+rot_sym_only.linear_params = ('amplitude',)
+
+
 def rot_sym_with_replocs_and_substructure_isotropic_bg(
         r, dia,
         vertssd, vertsamp,
         replocssd, replocsamp,
         substructsd, substructamp,
-        bggrad, info):
+        bggrad, info, *, symmetry_order):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
     the model at a distance is termed the relative position density (RPD)
@@ -192,13 +224,15 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg(
                         substructure, or mislocalisations resulting from
                         a combination of simultaneous nearby emitters.
         bggrad: Gradient of an isotropic (linearly increasing) background term.
+        symmetry_order: Order of rotational symmetry (see rot_sym_only).
     Returns:
         rpd:    The relative position density given by the model
                     at distances r.
     """
     # Get RPD arising from rotationally symmetric structure with broadening
     # only from imprecision on single vertex points.
-    rpd = rot_sym_only(r, dia, vertssd, vertsamp)
+    rpd = rot_sym_only(r, dia, vertssd, vertsamp,
+                       symmetry_order=symmetry_order)
 
     # Add 2D isotropic background
     background = r * bggrad
@@ -219,7 +253,7 @@ def rot_sym_replocs_substructure_isotropic_bg_with_onset(
         vertssd, vertsamp,
         replocssd, replocsamp,
         substructsd, substructamp,
-        bggrad, bgonset):
+        bggrad, bgonset, *, symmetry_order):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
     the model at a distance is termed the relative position density (RPD)
@@ -261,6 +295,8 @@ def rot_sym_replocs_substructure_isotropic_bg_with_onset(
             Onset distance for linearly increasing background term,
             since rotationally symmetric structures may exclude
             one another.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
     Returns:
         rpd (numpy array):
             The relative position density given by the model
@@ -271,12 +307,14 @@ def rot_sym_replocs_substructure_isotropic_bg_with_onset(
 
     # Get RPD arising from rotationally symmetric structure with broadening
     # only from imprecision on single vertex points.
-    rpd = rot_sym_only(r, dia, vertssd, vertsamp)
+    rpd = rot_sym_only(r, dia, vertssd, vertsamp,
+                       symmetry_order=symmetry_order)
 
     # Isotropic 2D background after an onset distance.
     # Background is zero before the onset distance.
-    background = r * bggrad - bggrad * bgonset
-    background[background < 0] = 0
+    # (np.maximum so that r can also be a single distance, as from the
+    # vector-input version.)
+    background = np.maximum(r * bggrad - bggrad * bgonset, 0)
     rpd = rpd + background
 
     # Add pair correlation distribution for repeated localisations.
@@ -299,12 +337,41 @@ def rot_sym_replocs_substructure_isotropic_bg_with_onset(
     return rpd
 
 
+def rot_sym_replocs_substructure_isotropic_bg_with_onset_jacobian(
+        r, dia,
+        vertssd, vertsamp,
+        replocssd, replocsamp,
+        substructsd, substructamp,
+        bggrad, bgonset, *, symmetry_order):
+    """Jacobian of rot_sym_replocs_substructure_isotropic_bg_with_onset
+    (see modelling_general.model_jacobian)."""
+    columns = list(np.moveaxis(
+        rot_sym_only_jacobian(r, dia, vertssd, vertsamp,
+                              symmetry_order=symmetry_order),
+        -1, 0))
+    columns += pair_correlation.zero_separation_derivatives(r, replocssd,
+                                                           replocsamp)
+    columns += pair_correlation.zero_separation_derivatives(r, substructsd,
+                                                           substructamp)
+    # The background is zero before the onset distance (for a positive
+    # gradient, including when the gradient is zero).
+    after_onset = np.where(bggrad < 0, r < bgonset, r > bgonset)
+    columns += [(r - bgonset) * after_onset, -bggrad * after_onset]
+    return np.stack(columns, axis=-1)
+
+
+rot_sym_replocs_substructure_isotropic_bg_with_onset.jacobian = (
+    rot_sym_replocs_substructure_isotropic_bg_with_onset_jacobian)
+rot_sym_replocs_substructure_isotropic_bg_with_onset.linear_params = (
+    'vertsamp', 'replocsamp', 'substructamp', 'bggrad')
+
+
 def rot_sym_with_replocs_and_substructure_isotropic_bg_with_onset_vectorargs(
-        input_vector):
+        input_vector, *, symmetry_order):
     """Function to calculate the values given by
     rot_sym_with_replocs_and_substructure_isotropic_bg_with_onset, but using a
-    vector input for the parameters, so that the numdifftools package can be
-    used to calculate partial derivatives for correct error propagation in the
+    vector input for the parameters, so that modelling_general.stdev_of_model
+    can calculate partial derivatives for correct error propagation in the
     model.
 
     Args:
@@ -315,6 +382,8 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_with_onset_vectorargs(
 
                 2. The parameters used by
                 rot_sym_with_replocs_and_substructure_isotropic_bg_with_onset.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
     Returns:
         rpd (numpy array):
             The relative position density given by the model at the input
@@ -333,7 +402,7 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_with_onset_vectorargs(
         vertssd, vertsamp,
         replocssd, replocsamp,
         substructsd, substructamp,
-        bggrad, bgonset)
+        bggrad, bgonset, symmetry_order=symmetry_order)
 
     return rpd
 
@@ -344,7 +413,7 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_with_smooth_onset(
         vertssd, vertsamp,
         replocssd, replocsamp,
         substructsd, substructamp,
-        bggrad, bgonset, bgvariation):
+        bggrad, bgonset, bgvariation, *, symmetry_order):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
     the model at a distance is termed the relative position density (RPD)
@@ -388,6 +457,8 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_with_smooth_onset(
         bgvariation:
             Determines the amount of variation on the background term
             in the intermediate range.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
 
     Returns:
         rpd (numpy array):
@@ -399,7 +470,8 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_with_smooth_onset(
 
     # Get RPD arising from rotationally symmetric structure with broadening
     # only from imprecision on single vertex points.
-    rpd = rot_sym_only(separation_values, dia, vertssd, vertsamp)
+    rpd = rot_sym_only(separation_values, dia, vertssd, vertsamp,
+                       symmetry_order=symmetry_order)
 
     # Add 2D isotropic background with onset distance.
     background = zero_to_constant_gradient(separation_values,
@@ -432,11 +504,11 @@ def test_plot_withvectorinput(relpos,
     axes = plt.subplot(111)
     xy_histogram = models.make_xy_histogram_nm(relpos, fitlength=fitlength,
                                                axes=axes)[0]
-    sym_order.number = 8
+    model = bind_symmetry_order(model_with_info.model_rpd, 8)
     (params_optimised,
      params_covar,
      params_1sd_error) = models.fit_model_to_experiment(xy_histogram,
-                                                        model_with_info.model_rpd,
+                                                        model,
                                                         model_with_info.initial_params,
                                                         model_with_info.param_bounds,
                                                         fitlength=fitlength)
@@ -444,7 +516,8 @@ def test_plot_withvectorinput(relpos,
     x_values = np.arange(fitlength) + 0.5
 
     vector_input = np.concatenate(x_values, params_optimised)
-    rpd = rot_sym_with_replocs_and_substructure_isotropic_bg_with_onset_vectorargs(vector_input)
+    rpd = rot_sym_with_replocs_and_substructure_isotropic_bg_with_onset_vectorargs(
+        vector_input, symmetry_order=8)
 
     axes.plot(x_values, rpd)
 
@@ -453,7 +526,7 @@ def rotsym_withreplocs_nosubstructure_isotropicbgwithonset(
         r, dia,
         vertssd, vertsamp,
         replocssd, replocsamp,
-        bggrad, bgonset):
+        bggrad, bgonset, *, symmetry_order):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
     the model at a distance is termed the relative position density (RPD)
@@ -480,23 +553,19 @@ def rotsym_withreplocs_nosubstructure_isotropicbgwithonset(
         bgonset: Onset distance for linearly increasing background term,
                     since rotationally symmetric structures may exclude
                     one another.
+        symmetry_order: Order of rotational symmetry (see rot_sym_only).
     Returns:
         rpd:    The relative position density given by the model
                     at distances r.
     """
-    # Get positions of vertices, their relative positions
-    # and distances between them.
-    verts = models.generate_polygon_points(sym_order.number, dia)
-    relpos = getdistances(verts, filterdist=(2 * dia))
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2)
-    # Select unduplicated distances between the vertices.
-    dists = dists[0:(sym_order.number - 1)]
+    # Get the distances from one vertex to the others: each distance
+    # between vertices, for 2 of the n pairs at that distance per vertex.
+    dists, multiplicities = vertex_separations(dia, symmetry_order)
     # sigma = np.array([sigma0, sigma1, sigma2, sigma3])
-    # Initialise array for set of density values.
-    rpd = r * 0.
     # Add 2D pair correlations at the distances between vertices.
-    for dist in dists:
-        rpd = rpd + vertsamp * models.pairwise_correlation_2d(r, dist, vertssd)
+    rpd = pair_correlation.sum_pair_correlations(
+        r, dists, vertssd,
+        vertsamp * multiplicities * 2. / symmetry_order)
     # Add 2D isotropic background with onset distance.
     background = r * bggrad - bggrad * bgonset
     background[background < 0] = 0
@@ -512,7 +581,8 @@ def model_replocs_substruct_no_bg(
         diameter,
         vertices_broadening, vertices_amplitude,
         rept_locs_broadening, rept_locs_amplitude,
-        substructure_broadening, substructure_amplitude):
+        substructure_broadening, substructure_amplitude,
+        *, symmetry_order):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
     the model at a distance is termed the relative position density (RPD)
@@ -546,6 +616,8 @@ def model_replocs_substruct_no_bg(
             Amplitude of the contribution of unresolvable
             substructure, or mislocalisations resulting from
             a combination of simultaneous nearby emitters.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
 
     Returns:
         rpd (numpy array):
@@ -557,7 +629,8 @@ def model_replocs_substruct_no_bg(
     rpd = rot_sym_only(separation_values,
                        diameter,
                        vertices_broadening,
-                       vertices_amplitude
+                       vertices_amplitude,
+                       symmetry_order=symmetry_order
                        )
 
     # Add pair correlation distribution for repeated localisations.
@@ -578,11 +651,39 @@ def model_replocs_substruct_no_bg(
     return rpd
 
 
-def model_replocs_substruct_no_bg_vectorargs(input_vector):
+def model_replocs_substruct_no_bg_jacobian(
+        separation_values,
+        diameter,
+        vertices_broadening, vertices_amplitude,
+        rept_locs_broadening, rept_locs_amplitude,
+        substructure_broadening, substructure_amplitude,
+        *, symmetry_order):
+    """Jacobian of model_replocs_substruct_no_bg
+    (see modelling_general.model_jacobian)."""
+    columns = list(np.moveaxis(rot_sym_only_jacobian(separation_values,
+                                                     diameter,
+                                                     vertices_broadening,
+                                                     vertices_amplitude,
+                                                     symmetry_order=symmetry_order),
+                               -1, 0))
+    columns += pair_correlation.zero_separation_derivatives(
+        separation_values, rept_locs_broadening, rept_locs_amplitude)
+    columns += pair_correlation.zero_separation_derivatives(
+        separation_values, substructure_broadening, substructure_amplitude)
+    return np.stack(columns, axis=-1)
+
+
+model_replocs_substruct_no_bg.jacobian = model_replocs_substruct_no_bg_jacobian
+model_replocs_substruct_no_bg.linear_params = (
+    'vertices_amplitude', 'rept_locs_amplitude', 'substructure_amplitude')
+
+
+def model_replocs_substruct_no_bg_vectorargs(input_vector, *,
+                                             symmetry_order):
     """Function to calculate the values given by
     rot_sym_with_replocs_and_substructure_no_bg, but using a
-    vector input for the parameters, so that the numdifftools package can be
-    used to calculate partial derivatives for correct error propagation in the
+    vector input for the parameters, so that modelling_general.stdev_of_model
+    can calculate partial derivatives for correct error propagation in the
     model.
 
     Args:
@@ -593,6 +694,8 @@ def model_replocs_substruct_no_bg_vectorargs(input_vector):
 
                 2. The parameters used by
                 rot_sym_with_replocs_and_substructure_no_bg.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
     Returns:
         rpd (numpy array):
             The relative position density given by the model at the input
@@ -611,7 +714,8 @@ def model_replocs_substruct_no_bg_vectorargs(input_vector):
                                         rept_locs_broadening,
                                         rept_locs_amplitude,
                                         substructure_broadening,
-                                        substructure_amplitude)
+                                        substructure_amplitude,
+                                        symmetry_order=symmetry_order)
 
     return rpd
 
@@ -622,7 +726,7 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_after_onset(
         vertices_broadening, vertices_amplitude,
         rept_locs_broadening, rept_locs_amplitude,
         substructure_broadening, substructure_amplitude,
-        bg_grad, bg_onset):
+        bg_grad, bg_onset, *, symmetry_order):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
     the model at a distance is termed the relative position density (RPD)
@@ -664,6 +768,8 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_after_onset(
             Onset distance for linearly increasing background term,
             since rotationally symmetric structures may exclude
             one another.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
 
     Returns:
         rpd (numpy array):
@@ -675,7 +781,8 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_after_onset(
     rpd = rot_sym_only(separation_values,
                        diameter,
                        vertices_broadening,
-                       vertices_amplitude
+                       vertices_amplitude,
+                       symmetry_order=symmetry_order
                        )
 
     # Add pair correlation distribution for repeated localisations.
@@ -700,11 +807,12 @@ def rot_sym_with_replocs_and_substructure_isotropic_bg_after_onset(
     return rpd
 
 
-def model_linear_bg_after_onset_vectorargs(input_vector):
+def model_linear_bg_after_onset_vectorargs(input_vector, *,
+                                           symmetry_order):
     """Function to calculate the values given by
     rot_sym_with_replocs_and_substructure_isotropic_bg_after_onset, but using a
-    vector input for the parameters, so that the numdifftools package can be
-    used to calculate partial derivatives for correct error propagation in the
+    vector input for the parameters, so that modelling_general.stdev_of_model
+    can calculate partial derivatives for correct error propagation in the
     model.
 
     Args:
@@ -715,6 +823,8 @@ def model_linear_bg_after_onset_vectorargs(input_vector):
 
                 2. The parameters used by
                 rot_sym_with_replocs_and_substructure_isotropic_bg_after_onset.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
     Returns:
         rpd (numpy array):
             The relative position density given by the model at the input
@@ -736,7 +846,8 @@ def model_linear_bg_after_onset_vectorargs(input_vector):
                                                                          substructure_broadening,
                                                                          substructure_amplitude,
                                                                          bg_grad,
-                                                                         bg_onset)
+                                                                         bg_onset,
+                                                                         symmetry_order=symmetry_order)
 
     return rpd
 
@@ -747,7 +858,8 @@ def model_variable_vertices_replocs_substructure_no_bg(
         vertssd,
         vertamp1, vertamp2, vertamp3, vertamp4,
         replocssd, replocsamp,
-        substructsd, substructamp
+        substructsd, substructamp,
+        *, symmetry_order
         ):
     """Parametric model for distances between localisations on vertices
     of a polygon (order of symmetry = number of vertices). The value of
@@ -783,6 +895,8 @@ def model_variable_vertices_replocs_substructure_no_bg(
             Amplitude of the contribution of unresolvable
             substructure, or mislocalisations resulting from
             a combination of simultaneous nearby emitters.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
 
     Returns:
         rpd (numpy array):
@@ -793,27 +907,16 @@ def model_variable_vertices_replocs_substructure_no_bg(
     # for easy use.
     vertices_contributions = [vertamp1, vertamp2, vertamp3, vertamp4]
 
-    # Calculate the inter-vertex distances
-    vertices = models.generate_polygon_points(sym_order.number, diameter)
-
-    filter_distance = (2 * diameter)
-    relative_positions = getdistances(vertices, filter_distance)
-    xy_separations = np.sqrt(relative_positions[:, 0] ** 2
-                             + relative_positions[:, 1] ** 2)
-    # Select unduplicated inter-vertex distances
+    # Calculate the different inter-vertex distances
     # (round down from # vertices divided by 2).
-    xy_separations = xy_separations[0:int(np.floor(sym_order / 2))]
+    xy_separations = vertex_separations(diameter, symmetry_order)[0]
 
     # Include the contributions from the inter-vertex distance in the RPD.
-    rpd = separation_values * 0.
-    for i, distance in enumerate(xy_separations):
-        rpd = (rpd
-               + vertices_contributions[i]
-               * models.pairwise_correlation_2d(separation_values,
-                                                distance,
-                                                vertssd
-                                                )
-               )
+    rpd = pair_correlation.sum_pair_correlations(
+        separation_values,
+        xy_separations,
+        vertssd,
+        vertices_contributions[0:len(xy_separations)])
 
     # Add pair correlation distribution for repeated localisations.
     rpd = rpd + (replocsamp
@@ -839,10 +942,11 @@ def get_1sd_error_on_model_before_and_after_background_onset(
         x_values,
         params_optimised,
         params_covar,
-        bg_onset):
-    """Use stdev_of_models in modelling_general (uses numdifftools) to acquire
-    stdev of the models before and after the background onset distance, and
-    concatenate to provide output.
+        bg_onset,
+        symmetry_order=8):
+    """Use stdev_of_model in modelling_general, with the analytic Jacobians
+    of the models, to acquire stdev of the models before and after the
+    background onset distance, and concatenate to provide output.
 
     Args:
         x_values (numpy array):
@@ -854,11 +958,10 @@ def get_1sd_error_on_model_before_and_after_background_onset(
             experimental data.
         params_covar (numpy array):
             The covariance matrix for the parameters that have been optimised.
-        vector_input_model (function):
-            The name of a function that will be passed to
-            numdifftools.Gradient. This function must have one arguments, which
-            is a vector. The first element of the vector is also the vector of
-            x_values.
+        bg_onset (float):
+            The distance at which the background starts.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
 
     Returns:
         stdev_complete (numpy array):
@@ -876,7 +979,12 @@ def get_1sd_error_on_model_before_and_after_background_onset(
     stdev_before_onset = stdev_of_model(x_values_before_onset,
                                         params_optimised[0:-2],
                                         params_covar[0:-2, 0:-2],
-                                        model_replocs_substruct_no_bg_vectorargs
+                                        bind_symmetry_order(
+                                            model_replocs_substruct_no_bg_vectorargs,
+                                            symmetry_order),
+                                        jacobian=bind_symmetry_order(
+                                            model_replocs_substruct_no_bg_jacobian,
+                                            symmetry_order)
                                         )
     print('Calculated stdev before background onset.')
 
@@ -885,7 +993,12 @@ def get_1sd_error_on_model_before_and_after_background_onset(
     stdev_after_onset = stdev_of_model(x_values_after_onset,
                                        params_optimised,
                                        params_covar,
-                                       model_linear_bg_after_onset_vectorargs
+                                       bind_symmetry_order(
+                                           model_linear_bg_after_onset_vectorargs,
+                                           symmetry_order),
+                                       jacobian=bind_symmetry_order(
+                                           rot_sym_replocs_substructure_isotropic_bg_with_onset_jacobian,
+                                           symmetry_order)
                                        )
     print('Calculated stdev after background onset.')
 
@@ -897,7 +1010,8 @@ def get_1sd_error_on_model_before_and_after_background_onset(
 def nup_xy_fig_plot(
         relative_position_array,
         model_with_info,
-        fitlength=200.):
+        fitlength=200.,
+        symmetry_order=8):
     """Create a plot showing optimised model and uncertainties from fitting
     hard-onset Nup107 model.
 
@@ -911,6 +1025,8 @@ def nup_xy_fig_plot(
             The extent across the XY plane within which
             relative positions are included in the histogram, fitting
             and plotting.
+        symmetry_order (int):
+            Order of rotational symmetry (see rot_sym_only).
     Returns:
         stdev (numpy array):
             The uncertainties on the model at each separation used in the fit.
@@ -921,16 +1037,17 @@ def nup_xy_fig_plot(
                                                fitlength=fitlength,
                                                axes=axes)[0]
 
+    model = bind_symmetry_order(model_with_info.model_rpd, symmetry_order)
     (params_optimised,
      params_covar,
      params_1sd_error) = models.fit_model_to_experiment(xy_histogram,
-                                                        model_with_info.model_rpd,
+                                                        model,
                                                         model_with_info.initial_params,
                                                         model_with_info.param_bounds,
                                                         fitlength=fitlength)
     x_values = np.arange(fitlength) + 0.5
 
-    axes.plot(x_values, model_with_info.model_rpd(x_values,
+    axes.plot(x_values, model(x_values,
                                                   *params_optimised
                                                   ),
               lw=0.5, color='xkcd:red'
@@ -944,19 +1061,20 @@ def nup_xy_fig_plot(
                 x_values,
                 params_optimised,
                 params_covar,
-                bg_onset
+                bg_onset,
+                symmetry_order
                 )
     print('Calculated stdev for whole model.')
 
     axes.fill_between(x_values,
-                      (model_with_info.model_rpd(x_values,
-                                                 *params_optimised
-                                                 )
+                      (model(x_values,
+                             *params_optimised
+                             )
                        - stdev * 1.96
                        ),
-                      (model_with_info.model_rpd(x_values,
-                                                 *params_optimised
-                                                 )
+                      (model(x_values,
+                             *params_optimised
+                             )
                        + stdev * 1.96
                        ),
                       color='xkcd:red', alpha=0.25
@@ -968,12 +1086,14 @@ def nup_xy_fig_plot(
 def nup_xy_plot_model_components(
         relpos,
         model_with_info,
-        fitlength=200):
+        fitlength=200,
+        symmetry_order=8):
     """Creates a plot
     Args:
         relpos:
         model:
         fitlength:
+        symmetry_order:
     Returns:
         Nothing
     """
@@ -983,10 +1103,11 @@ def nup_xy_plot_model_components(
                                                fitlength=fitlength,
                                                axes=axes)[0]
 
+    model = bind_symmetry_order(model_with_info.model_rpd, symmetry_order)
     (params_optimised,
      params_covar,
      params_1sd_error) = models.fit_model_to_experiment(xy_histogram,
-                                                        model_with_info.model_rpd,
+                                                        model,
                                                         model_with_info.initial_params,
                                                         model_with_info.param_bounds,
                                                         fitlength=fitlength)
@@ -999,7 +1120,7 @@ def nup_xy_plot_model_components(
 
     x_values = np.arange(fitlength) + 0.5
     # Plot fitted model curve
-    axes.plot(x_values, model_with_info.model_rpd(x_values, *params_optimised))
+    axes.plot(x_values, model(x_values, *params_optimised))
     # Plot localisation precision component
     axes.plot(x_values,
               replocsamp
@@ -1017,13 +1138,7 @@ def nup_xy_plot_model_components(
                                                )
               )
     # Plot symmetry related peaks
-    verts = models.generate_polygon_points(sym_order.number, dia)
-    filterdist = (2 * dia)
-
-    relpos = getdistances(verts, filterdist)
-    dists = np.sqrt(relpos[:, 0] ** 2 + relpos[:, 1] ** 2)
-    dists = dists[0: 4]  # Select unduplicated distances between the vertices.
-    contributions = np.array([2, 2, 2, 1])
+    dists, contributions = vertex_separations(dia, symmetry_order)
     for peak, dist in enumerate(dists):
         axes.plot(x_values,
                   vertsamp * contributions[peak]
@@ -1114,7 +1229,7 @@ def set_up_model_replocs_substruct_iso_bg_with_onset_with_fit_settings():
     that increases linearly after an onset distance.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1199,7 +1314,7 @@ def set_up_model_replocs_substruct_no_bg_with_fit_settings():
     localisations and spread to unresolvable substructure.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1291,8 +1406,183 @@ def set_up_model_replocs_substruct_no_bg_with_fit_settings():
 
 
 
-# Set up callable symmetry order object, with default value
-sym_order = Number(8)
+def bind_symmetry_order(model, order):
+    """A rotational symmetry model (or its Jacobian or vector-input version)
+    for one order of symmetry. This does not change the model for other
+    callers, so that fits for different orders of symmetry can run at the
+    same time.
+
+    Args:
+        model (function):
+            A model taking the keyword-only argument symmetry_order, e.g.
+            rot_sym_replocs_substructure_isotropic_bg_with_onset.
+        order (int):
+            The order of symmetry (number of vertices).
+
+    Returns:
+        model_for_order (function):
+            The model with the order of symmetry bound. It has the name,
+            fitted parameters and linear parameters of the model, and its
+            Jacobian is also bound to the order, if the model has one.
+    """
+    def model_for_order(*args):
+        return model(*args, symmetry_order=order)
+
+    functools.update_wrapper(model_for_order, model)
+    jacobian = models.model_jacobian(model)
+    if jacobian is not None:
+        model_for_order.jacobian = bind_symmetry_order(jacobian, order)
+    model_for_order.symmetry_order = order
+    return model_for_order
+
+
+def parse_symmetries(text):
+    """Reads the orders of symmetry to fit given on the command line: a
+    range including both ends (e.g. 3-40), numbers separated by commas
+    (e.g. 5,8,9), or both (e.g. 5-11,16).
+
+    Args:
+        text (str): The orders of symmetry.
+
+    Returns:
+        symmetries (list): The orders of symmetry, smallest first.
+    """
+    symmetries = []
+    for item in text.split(','):
+        try:
+            if '-' in item:
+                start, stop = [int(value) for value in item.split('-')]
+                symmetries.extend(range(start, stop + 1))
+            else:
+                symmetries.append(int(item))
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                "invalid symmetries: %r" % text)
+    if len(symmetries) == 0 or min(symmetries) < 2:
+        raise argparse.ArgumentTypeError(
+            "symmetries must be at least 2: %r" % text)
+    return sorted(set(symmetries))
+
+
+def _fit_symmetry_run(task):
+    """Fit a model for each order of symmetry in a run of orders, in turn,
+    in one process (see fit_symmetries)."""
+    (xy_histogram, orders, model_rpd, initial_params, param_bounds,
+     fitlength, warm_start) = task
+    stage = {'counts': {}}
+    fits = []
+    param_guesses = initial_params
+    for order in orders:
+        model = bind_symmetry_order(model_rpd, order)
+        (params_optimised,
+         params_covar,
+         params_1sd_error) = models.fit_model_to_experiment(xy_histogram,
+                                                            model,
+                                                            param_guesses,
+                                                            param_bounds,
+                                                            fitlength=fitlength,
+                                                            stage=stage)
+        aicc = stats.aic_from_least_sqr_fit(xy_histogram,
+                                            model,
+                                            params_optimised,
+                                            fitlength=fitlength)[1]
+        fits.append((params_optimised, params_covar, params_1sd_error, aicc))
+        if warm_start:
+            param_guesses = params_optimised
+    return fits, stage['counts']
+
+
+def fit_symmetries(xy_histogram, symmetries, model_with_info, fitlength,
+                   workers=1, warm_start=False, stage=None):
+    """Fit a rotational symmetry model to a histogram of XY-distances, for
+    each of a number of orders of symmetry, on several processes.
+
+    The orders of symmetry are divided into runs of neighbouring orders, one
+    for each process, and the orders in a run are fitted in turn. With
+    warm_start, each fit after the first in a run starts from the optimised
+    parameters for the order before it, instead of from the initial
+    parameters of the model. Without warm_start, the results do not depend
+    on the number of processes.
+
+    Args:
+        xy_histogram (numpy array):
+            Histogram of XY-distances, in 1 nm bins from 0 nm.
+        symmetries (list of ints):
+            The orders of symmetry, smallest first.
+        model_with_info (ModelWithFitSettings):
+            The model, which takes the order of symmetry as a keyword-only
+            argument (see bind_symmetry_order), with its initial parameters
+            and bounds.
+        fitlength (int):
+            Maximum distance included in the fits.
+        workers (int):
+            Number of processes.
+        warm_start (Boolean):
+            Start each fit from the result for the order before it.
+        stage (dict):
+            Optional record of a stage of the run (see instrumentation.py),
+            to which the numbers of fits and model evaluations are added.
+
+    Returns:
+        fits (list):
+            For each order of symmetry, a tuple of the optimised parameters,
+            their covariance matrix, their errors (1 SD) and the AICc of the
+            fit.
+    """
+    n_runs = max(1, min(workers, len(symmetries)))
+    tasks = [(xy_histogram, orders.tolist(), model_with_info.model_rpd,
+              model_with_info.initial_params, model_with_info.param_bounds,
+              fitlength, warm_start)
+             for orders in np.array_split(np.asarray(symmetries), n_runs)]
+
+    if n_runs == 1:
+        results = [_fit_symmetry_run(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(n_runs) as pool:
+            results = pool.map(_fit_symmetry_run, tasks)
+
+    fits = []
+    for run_fits, counts in results:
+        fits.extend(run_fits)
+        for item, count in counts.items():
+            instrumentation.add_count(stage, item, count)
+    return fits
+
+
+def _plot_geometry(task):
+    """Plot the geometry for one order of symmetry (see plot_geometries)."""
+    sym, diameter, plot_info = task
+    plotting.plot_rot_2d_geometry(sym, diameter, plot_info)
+
+
+def plot_geometries(symmetries, diameter_values, info, workers=1):
+    """Plot the polygons for the fitted orders of symmetry
+    (see plotting.plot_rot_2d_geometry), on several processes.
+
+    Args:
+        symmetries (list of ints):
+            The orders of symmetry.
+        diameter_values (list of floats):
+            The fitted diameter for each order of symmetry.
+        info (dict): A python dictionary containing a collection of useful
+            parameters such as the filenames and paths.
+        workers (int):
+            Number of processes.
+
+    Returns:
+        Nothing
+    """
+    # Only the names of the results directories are sent to the workers.
+    plot_info = {key: info.get(key)
+                 for key in ('results_dir', 'short_results_dir', 'short_names')}
+    tasks = [(sym, diameter_values[i], plot_info)
+             for i, sym in enumerate(symmetries)]
+    if workers <= 1 or len(tasks) == 1:
+        for task in tasks:
+            _plot_geometry(task)
+    else:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            pool.map(_plot_geometry, tasks)
 
 
 def main():
@@ -1338,9 +1628,9 @@ def main():
     parser.add_argument('-i', '--input_file',
                         dest='input_file',
                         type=argparse.FileType('r'),
-                        help='File of localisations which is a .csv (or .txt '
-                             'with comma delimiters) or .npy and containing N '
-                             'localisations in N rows.',
+                        help='File of relative positions (.csv or .npy) or '
+                             'distance histograms (.npz) output from '
+                             'relative_positions.py.',
                         metavar="FILE")
 
     parser.add_argument('-f', '--filter_distance',
@@ -1364,6 +1654,38 @@ def main():
                         help="Increase output verbosity",
                         action="store_true")
 
+    parser.add_argument('--trace-memory',
+                        dest='trace_memory',
+                        help="Record the peak memory allocated in each stage "
+                        "of the run (with tracemalloc, which slows the run "
+                        "down), as well as the times taken and the peak "
+                        "resident memory, which are always saved in "
+                        "performance.json in the results directory.",
+                        action="store_true")
+
+    parser.add_argument('--symmetries',
+                        type=parse_symmetries,
+                        default=list(range(5, 12)),
+                        help="Orders of rotational symmetry to fit, as a "
+                        "range (e.g. 3-40) and/or numbers separated by commas "
+                        "(e.g. 5,8,9). Defaults to 5-11.")
+
+    parser.add_argument('-w', '--workers',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help="Number of processes used to fit the orders of "
+                        "symmetry and plot their geometries. The results do "
+                        "not depend on the number of processes, unless "
+                        "--warm-start is used.")
+
+    parser.add_argument('--warm-start',
+                        dest='warm_start',
+                        help="Start the fit for each order of symmetry from "
+                        "the optimised parameters for the order before it, "
+                        "within the orders fitted by each process.",
+                        action="store_true")
+
     args = parser.parse_args()
 
     print("\nargs: ", args)
@@ -1384,11 +1706,20 @@ def main():
 
     info['host'], info['ip_address'], info['operating_system'] = utils.find_hostname_and_ip()
 
-    read_start = timeit.default_timer()
-    xyz_values = utils.secondary_read_data_in(info)
+    recorder = instrumentation.StageRecorder(trace_memory=args.trace_memory)
+    info['stage_recorder'] = recorder
+
+    with recorder.stage('read') as stage:
+        if info['in_file_and_path'][-4:] == '.npz':
+            histograms = utils.secondary_read_histograms_in(info)
+        else:
+            histograms = None
+            # Only the X and Y separations are used.
+            xyz_values = utils.secondary_read_data_in(
+                info, columns=['xx_separation', 'yy_separation'])
+            stage['counts']['relative positions'] = len(xyz_values)
     # print("data read!!\n")
-    read_end = timeit.default_timer()
-    reading_time = (read_end-read_start)/60
+    reading_time = recorder.stages[-1]['wall_seconds']/60
 
     utils.secondary_filename_and_path_setup(info)
         
@@ -1415,18 +1746,24 @@ def main():
     # Get histogram data ready to fit to model
     #xy_histogram = models.make_xy_histogram_nm(xyz_values, fitlength=fitlength,
     #fig_toggle=False)[0]
-    xydists = np.sqrt(xyz_values[:, 0] ** 2 + xyz_values[:, 1] ** 2)
     fitlength = info['filter_dist']
-    bin_vals = np.arange(fitlength + 1)
+    with recorder.stage('histogram') as stage:
+        if histograms is not None:
+            # Histograms saved by relative_positions.py --histogram-only
+            xy_histogram, bin_values = histograms.normalised_1nm_histogram('xy', fitlength)
+        else:
+            xydists = np.sqrt(xyz_values[:, 0] ** 2 + xyz_values[:, 1] ** 2)
+            bin_vals = np.arange(fitlength + 1)
 
-    xy_histogram, bin_values = np.histogram(xydists,
-                                            weights=np.repeat(float(fitlength) / len(xydists),
-                                                              len(xydists)),
-                                            bins=bin_vals)
+            xy_histogram, bin_values = np.histogram(xydists,
+                                                    weights=np.repeat(float(fitlength) / len(xydists),
+                                                                      len(xydists)),
+                                                    bins=bin_vals)
+            stage['counts']['relative positions'] = len(xydists)
 
 
     # Define symmetries over which to perform and evaluate fit
-    symmetries = range(5, 12)
+    symmetries = args.symmetries
 
     # Prepare to record fit metric (AICc)
     aiccs = np.zeros(len(symmetries))
@@ -1449,68 +1786,59 @@ def main():
     table_param_values = []
 
 
-    for i, sym in enumerate(symmetries):
-        sym_order.number = sym
-
-        (params_optimised,
-         params_covar,
-         params_1sd_error) = models.fit_model_to_experiment(xy_histogram,
-                                                            model_with_info.model_rpd,
-                                                            model_with_info.initial_params,
-                                                            model_with_info.param_bounds,
-                                                            fitlength=fitlength)
-        aicc = stats.aic_from_least_sqr_fit(xy_histogram,
-                                            model_with_info.model_rpd,
-                                            params_optimised,
-                                            fitlength=fitlength)[1]
-        aiccs[i] = aicc
+    with recorder.stage('fit symmetries') as stage:
+        fits = fit_symmetries(xy_histogram, symmetries, model_with_info,
+                              fitlength, workers=args.workers,
+                              warm_start=args.warm_start, stage=stage)
         x_values = np.arange(fitlength) + 0.5
-        diameter_values.append(params_optimised[0])
-
-        curve_values.append(model_with_info.model_rpd(x_values, *params_optimised))
 
+        for i, sym in enumerate(symmetries):
+            params_optimised, _, params_1sd_error, aiccs[i] = fits[i]
+            diameter_values.append(params_optimised[0])
 
-        if info['verbose']:
-            print('\nSymmetry:', sym)
-            print("\nParameter    Optimised Value")
+            model = bind_symmetry_order(model_with_info.model_rpd, sym)
+            curve_values.append(model(x_values, *params_optimised))
 
-        param_string_values = []
-        uncertainty_string_values = []
 
-        for count, param_optimised in enumerate(params_optimised):
-            uncertainty = params_1sd_error[count]
+            if info['verbose']:
+                print('\nSymmetry:', sym)
+                print("\nParameter    Optimised Value")
 
-            value = param_optimised
+            param_string_values = []
+            uncertainty_string_values = []
 
-            value_str, uncertainty_str = utils.plus_and_minus(value, uncertainty)
+            for count, param_optimised in enumerate(params_optimised):
+                uncertainty = params_1sd_error[count]
 
-            param_string_values.append(value_str)
-            uncertainty_string_values.append(uncertainty_str)
+                value = param_optimised
 
-            if info['verbose']:
-                print('  %d            %s +/- %s ' % (count+1, value_str, uncertainty_str))
+                value_str, uncertainty_str = utils.plus_and_minus(value, uncertainty)
 
+                param_string_values.append(value_str)
+                uncertainty_string_values.append(uncertainty_str)
 
-        params = np.column_stack((params_optimised,
-                                  params_1sd_error,
-                                  param_string_values,
-                                  uncertainty_string_values))
+                if info['verbose']:
+                    print('  %d            %s +/- %s ' % (count+1, value_str, uncertainty_str))
 
 
-        table_param_values.append(params)
+            params = np.column_stack((params_optimised,
+                                      params_1sd_error,
+                                      param_string_values,
+                                      uncertainty_string_values))
 
-    plotting.plot_histogram_with_curves(bin_values,
-                                        xy_histogram,
-                                        symmetries,
-                                        x_values,
-                                        curve_values,
-                                        info)
 
+            table_param_values.append(params)
 
+    with recorder.stage('plots'):
+        plotting.plot_histogram_with_curves(bin_values,
+                                            xy_histogram,
+                                            symmetries,
+                                            x_values,
+                                            curve_values,
+                                            info)
 
-    for i, sym in enumerate(symmetries):
-        sym_order.number = sym
-        plotting.plot_rot_2d_geometry(sym, diameter_values[i], info)
+        plot_geometries(symmetries, diameter_values, info,
+                        workers=args.workers)
 
 
     weights = stats.akaike_weights(aiccs)
@@ -1524,6 +1852,7 @@ def main():
                                                       weights[index]))
                                                      
 
+    instrumentation.save_stages(info)
     reports.write_rot_2d_html_report(info, symmetries, aiccs, weights, table_param_values)
 
 
@@ -8,6 +8,7 @@ import numpy as np
 from read_file import read_file
 from get_relative_positions import get_relative_positions
 from get_vectors import get_vectors
+from estimate_search import estimate_search, estimate_lines
 from plotting import plot_histograms, draw_2d_scatter_plots
 
 # Set up the app
@@ -56,8 +57,11 @@ with tab1:
     # Filter distance
     filter_dist = st.number_input('Select a filter distance (nm)', 1, 1000, 50, 1)
     
-    if filter_dist >= 500:
-        st.warning("Filter distance is very large! This may take a long time.")
+    # Searches that may take a long time are found from the data, once it is
+    # read (see estimate_search.py).
+    max_minutes = st.number_input(
+        'Stop before searching if the estimated time is more than (minutes)',
+        1, 1440, 10, 1)
         
     # Divider
     st.write("---")
@@ -101,6 +105,13 @@ with tab1:
             for error in errors:
                 st.error(error, icon="🚨")
         
+        estimate = estimate_search(data, filter_dist, dimensions)
+        st.info('  \n'.join(estimate_lines(estimate)))
+        if estimate['seconds'] > max_minutes * 60:
+            st.warning("Filter distance is very large! The search is estimated "
+                       "to take longer than the time chosen, so has not been run.")
+            return
+        
         distance_values = get_relative_positions(
             xyzcolour_values=data,
             filter_dist= filter_dist,
@@ -0,0 +1,43 @@
+# Import standard libraries
+import os
+import sys
+from typing import List
+
+# Import third-party libraries
+import numpy as np
+import streamlit as st
+
+# The estimator (relpos_estimate.py) is in the directory above the app.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import relpos_estimate
+
+@st.cache(show_spinner=True)
+def estimate_search(
+                    xyzcolour_values: np.ndarray,
+                    filter_dist: float,
+                    dims: int,
+                    ) -> dict:
+    """Estimate the relative positions search before running it.
+
+    Parameters
+    ----------
+    xyzcolour_values : numpy.ndarray
+        Array of xyz coordinates and colour values.
+    filter_dist : float
+        Distance (in all three dimensions) between points within
+        which relative positions are calculated.
+    dims : int
+        Number of dimensions in the data.
+
+    Returns
+    -------
+    estimate : dict
+        The number of relative positions, output size, peak memory and
+        time, as from relpos_estimate.estimate_search.
+    """
+    return relpos_estimate.estimate_search(xyzcolour_values[:, 0:dims], filter_dist)
+
+
+def estimate_lines(estimate: dict) -> List[str]:
+    """Describe an estimate, as lines of text."""
+    return relpos_estimate.estimate_lines(estimate)
@@ -1,9 +1,14 @@
-from io import StringIO
+import os
+import sys
 from typing import List, Union
 
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 import numpy as np
 
+# The shared reader (ingest.py) is in the directory above the app.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ingest
+
 def read_file(file: List[UploadedFile], errors: list = []):
     if file.name.endswith('.npy'):
         try:
@@ -13,20 +18,8 @@ def read_file(file: List[UploadedFile], errors: list = []):
 
     elif file.name.endswith('.csv') or file.name.endswith('.txt'):
         try:
-            skip = 0
-            line = file.readline().decode('utf-8')
-            for cell in line.split(','):
-                try:
-                    float(cell)
-                except ValueError:
-                    skip = 1
-            return np.loadtxt(
-                            StringIO(file.read().decode('utf-8')),
-                            delimiter=',',
-                            skiprows=skip
-                            )
-        except (EOFError, IOError, OSError) as exception:
+            return ingest.read_table(file.getvalue())
+        except (EOFError, IOError, OSError, ValueError) as exception:
             errors.append("Could not read file")
     else:
         errors.append('Sorry, wrong format!')
-    
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+test_benchmarks.py
+
+Tests that the synthetic localisations for the benchmarks are reproducible,
+that the search and fitting benchmarks give a result for each case, with
+scaling exponents, and that slower results are found by comparison with a
+baseline.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import copy
+import unittest
+import numpy as np
+import benchmarks
+import relative_positions as rp
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    Test the functions from the benchmarks library
+    """
+
+    def test_synthetic_localisations(self):
+        """
+        The localisations are the same for the same seed, and half of them
+        are in rings, which are found as pairs of localisations close to the
+        ring diameter apart.
+        """
+        print("Start TestBenchmarks test_synthetic_localisations", flush=True)
+        for dims in (2, 3):
+            xyz_values = benchmarks.synthetic_localisations(4000, dims, seed=3)
+            self.assertEqual(xyz_values.shape, (4000, dims))
+            np.testing.assert_array_equal(
+                xyz_values, benchmarks.synthetic_localisations(4000, dims, seed=3))
+            self.assertFalse(np.array_equal(
+                xyz_values, benchmarks.synthetic_localisations(4000, dims, seed=4)))
+
+        # Many more pairs across rings than with CSR alone.
+        xyz_values = benchmarks.synthetic_localisations(4000, 2, seed=3)
+        csr_values = benchmarks.synthetic_localisations(4000, 2, ring_fraction=0.,
+                                                        seed=3)
+        for values, expected_more in ((xyz_values, True), (csr_values, False)):
+            d_values = rp.getdistances(values, 120.)
+            distances = np.sqrt(d_values[:, 0] ** 2 + d_values[:, 1] ** 2)
+            across = np.sum(np.abs(distances - benchmarks.RING_DIAMETER) < 10.)
+            near_csr = (len(values) ** 2 / 2 * benchmarks.DEFAULT_DENSITY * 1e-6
+                        * np.pi * ((benchmarks.RING_DIAMETER + 10.) ** 2
+                                   - (benchmarks.RING_DIAMETER - 10.) ** 2)
+                        / len(values))
+            self.assertEqual(across > 2 * near_csr, expected_more)
+
+    def test_run_and_compare(self):
+        """
+        Each benchmark gives a result for each case, with scaling exponents,
+        cases over the memory limit are skipped, and a result slower than the
+        baseline is a regression.
+        """
+        print("Start TestBenchmarks test_run_and_compare", flush=True)
+        results = benchmarks.run_search_benchmarks(sizes=(500, 2000),
+                                                   filter_distances=(50,),
+                                                   dims_values=(2,),
+                                                   repeats=1)
+        self.assertEqual(sorted(set(record['benchmark'] for record in results)),
+                         sorted(benchmarks.SEARCH_BENCHMARKS))
+        self.assertEqual(len(results), 2 * len(benchmarks.SEARCH_BENCHMARKS))
+        for record in results:
+            self.assertGreater(record['seconds'], 0.)
+            self.assertIn('localisations per second', record['throughput'])
+        self.assertEqual(
+            [record['pairs'] for record in results
+             if record['benchmark'] == 'getdistances'],
+            [len(rp.getdistances(benchmarks.synthetic_localisations(size, 2), 50.))
+             for size in (500, 2000)])
+        scaling = benchmarks.scaling_exponents(results)
+        self.assertEqual(len(scaling), len(benchmarks.SEARCH_BENCHMARKS))
+        json.dumps(results)
+
+        skipped = benchmarks.run_search_benchmarks(sizes=(2000,),
+                                                   filter_distances=(50,),
+                                                   dims_values=(2,),
+                                                   benchmarks=('getdistances',),
+                                                   max_memory=0.001)
+        self.assertIn('skipped', skipped[0])
+        self.assertEqual(benchmarks.scaling_exponents(skipped), [])
+
+        baseline = copy.deepcopy(results)
+        for record in baseline:
+            record['seconds'] = 1.
+        slower = copy.deepcopy(results)
+        slower[0]['seconds'] = 2.
+        comparisons = benchmarks.compare_with_baseline(slower, baseline,
+                                                       tolerance=0.25)
+        self.assertEqual(len(comparisons), len(results))
+        self.assertEqual([comparison['regression'] for comparison in comparisons],
+                         [True] + [False] * (len(results) - 1))
+
+    def test_fitting_benchmarks(self):
+        """
+        Each model is evaluated, fitted with its evaluations counted, and
+        has a confidence band, and the fitting results are compared with a
+        baseline by model, measure and fit length.
+        """
+        print("Start TestBenchmarks test_fitting_benchmarks", flush=True)
+        for name, _, _ in benchmarks.FIT_BENCHMARK_MODELS:
+            model_with_info = benchmarks.fit_benchmark_model(name)
+            vector_input = np.concatenate(([50.5], model_with_info.initial_params))
+            self.assertEqual(
+                np.shape(model_with_info.vector_input_model(vector_input)), ())
+        self.assertRaises(ValueError, benchmarks.fit_benchmark_model, 'unknown')
+
+        results = benchmarks.run_fitting_benchmarks(
+            fit_lengths=(60, 120),
+            model_names=('linear_repeat_5_variable_peaks',),
+            repeats=1, band_points=3)
+        self.assertEqual([(record['measure'], record['fit_length'])
+                          for record in results],
+                         [('evaluation', 60), ('fit', 60), ('confidence band', 60),
+                          ('evaluation', 120), ('fit', 120), ('confidence band', 120)])
+        for record in results:
+            self.assertNotIn('skipped', record)
+            self.assertGreater(record['seconds'], 0.)
+            self.assertEqual(record['parameters'], 9)
+        self.assertGreater(results[1]['evaluations'], 9)
+        self.assertEqual(results[2]['band_points'], 3)
+        self.assertEqual(benchmarks.scaling_exponents(results), [])
+        json.dumps(results)
+
+        comparisons = benchmarks.compare_with_baseline(results, results[:3])
+        self.assertEqual([comparison['measure'] for comparison in comparisons],
+                         ['evaluation', 'fit', 'confidence band'])
+        self.assertFalse(any(comparison['regression'] for comparison in comparisons))
+
+
+if __name__ == '__main__':
+    unittest.main()
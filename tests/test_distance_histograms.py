@@ -0,0 +1,132 @@
+"""
+test_distance_histograms.py
+
+Tests of the running distance histograms against numpy.histogram of the
+full set of distances.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import distance_histograms as dh
+
+
+def random_separations(rng, n_values, dims, filterdist):
+    """Random relative positions, including some at whole numbers of nm."""
+    separation_values = np.zeros((n_values, 3))
+    separation_values[:, 0:dims] = rng.uniform(-filterdist, filterdist,
+                                               (n_values, dims))
+    separation_values[::3] = np.round(separation_values[::3])
+    return separation_values
+
+
+class TestDistanceHistograms(unittest.TestCase):
+    """
+    Test the DistanceHistograms class from the distance_histograms library
+    """
+
+    def test_counts_match_numpy_histogram(self):
+        """
+        Counts accumulated in blocks are the same as numpy.histogram of all
+        the distances, for different bin sizes and with or without an upper
+        limit on the distances.
+        """
+        print("Start TestDistanceHistograms test_counts_match_numpy_histogram",
+              flush=True)
+        rng = np.random.default_rng(5)
+        for dims in (2, 3):
+            separation_values = random_separations(rng, 3000, dims, 40.)
+            histograms = dh.DistanceHistograms(dims, 40.)
+            for block in np.array_split(separation_values, 7):
+                histograms.add_separations(block)
+            distances = dh.separation_distances(separation_values, dims)
+            self.assertEqual(histograms.total, len(separation_values))
+            for description in histograms.descriptions:
+                values = distances[description]
+                self.assertEqual(histograms.maxima[description], values.max())
+                for binsize, end in ((1, 40), (4, 40), (3, 39), (1, 70)):
+                    bins = np.arange(0., end + binsize, binsize)
+                    np.testing.assert_array_equal(
+                        np.histogram(values, bins)[0],
+                        histograms.counts_in_bins(description, bins))
+                    np.testing.assert_array_equal(
+                        np.histogram(values[values < 40], bins)[0],
+                        histograms.counts_in_bins(description, bins, below=40))
+
+    def test_merge_remove_and_reload(self):
+        """
+        Merging two sets of histograms gives the counts for all their
+        distances, removing distances takes them out again, and saved
+        histograms are read back unchanged.
+        """
+        print("Start TestDistanceHistograms test_merge_remove_and_reload",
+              flush=True)
+        rng = np.random.default_rng(6)
+        first = random_separations(rng, 500, 3, 20.)
+        second = random_separations(rng, 300, 3, 20.)
+        histograms = dh.DistanceHistograms(3, 20.)
+        histograms.add_separations(first)
+        other = dh.DistanceHistograms(3, 20.)
+        other.add_separations(second)
+        histograms.merge(other)
+
+        expected = dh.DistanceHistograms(3, 20.)
+        expected.add_separations(np.concatenate((first, second)))
+        bins = np.arange(0., 36.)
+        for description in expected.descriptions:
+            np.testing.assert_array_equal(
+                expected.counts_in_bins(description, bins),
+                histograms.counts_in_bins(description, bins))
+
+        histograms.remove_separations(second)
+        only_first = dh.DistanceHistograms(3, 20.)
+        only_first.add_separations(first)
+        np.testing.assert_array_equal(only_first.counts_in_bins('xyz', bins),
+                                      histograms.counts_in_bins('xyz', bins))
+        self.assertEqual(histograms.total, len(first))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'histograms.npz')
+            expected.save(filename)
+            loaded = dh.load_histograms(filename)
+        self.assertEqual(loaded.total, expected.total)
+        self.assertEqual(loaded.maxima, expected.maxima)
+        for description in expected.descriptions:
+            np.testing.assert_array_equal(
+                expected.counts_in_bins(description, bins),
+                loaded.counts_in_bins(description, bins))
+
+    def test_normalised_1nm_histogram(self):
+        """
+        The normalised 1-nm histogram is the same as the weighted histogram
+        used for model fitting.
+        """
+        print("Start TestDistanceHistograms test_normalised_1nm_histogram",
+              flush=True)
+        rng = np.random.default_rng(7)
+        separation_values = random_separations(rng, 1000, 2, 50.)
+        histograms = dh.DistanceHistograms(2, 50.)
+        histograms.add_separations(separation_values)
+        xydists = dh.separation_distances(separation_values, 2)['xy']
+        expected = np.histogram(xydists,
+                                weights=np.repeat(50. / len(xydists), len(xydists)),
+                                bins=np.arange(51))[0]
+        np.testing.assert_allclose(expected,
+                                   histograms.normalised_1nm_histogram('xy', 50)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
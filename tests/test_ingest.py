@@ -0,0 +1,165 @@
+"""
+test_ingest.py
+
+Tests that tables read in chunks, with chosen columns and row filters, are
+the same as those read whole with numpy.loadtxt.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import ingest
+import relative_positions
+
+
+THUNDERSTORM_HEADER = ('"id","frame","x [nm]","y [nm]","sigma [nm]",'
+                       '"intensity [photon]","uncertainty_xy [nm]","channel"')
+
+
+def localisations(n_rows, seed):
+    """A table like a ThunderSTORM file, with a channel column."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack((np.arange(n_rows), rng.integers(0, 100, n_rows),
+                            rng.uniform(0., 5000., (n_rows, 2)),
+                            rng.uniform(100., 200., n_rows),
+                            rng.uniform(500., 5000., n_rows),
+                            rng.uniform(2., 40., n_rows),
+                            rng.integers(0, 2, n_rows)))
+
+
+class TestReadTable(unittest.TestCase):
+    """
+    Test the read_table function from the ingest library
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.values = localisations(3000, 1)
+        self.filename = os.path.join(self.temp_dir.name, 'locs.csv')
+        np.savetxt(self.filename, self.values, delimiter=',',
+                   header=THUNDERSTORM_HEADER, comments='')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_chunks_match_loadtxt(self):
+        """
+        Reading in small chunks, on one or two processes, gives the same
+        table as reading it whole.
+        """
+        print("Start TestReadTable test_chunks_match_loadtxt", flush=True)
+        expected = np.loadtxt(self.filename, delimiter=',', skiprows=1)
+        for workers in (1, 2):
+            values = ingest.read_table(self.filename, workers=workers,
+                                       chunk_bytes=1000)
+            np.testing.assert_array_equal(values, expected)
+        with open(self.filename, 'rb') as fin:
+            values = ingest.read_table(fin.read(), chunk_bytes=777)
+        np.testing.assert_array_equal(values, expected)
+
+    def test_columns_by_name(self):
+        """
+        ThunderSTORM columns are found by name without units, by alias, and
+        by index.
+        """
+        print("Start TestReadTable test_columns_by_name", flush=True)
+        values = ingest.read_table(self.filename,
+                                   columns=['x', 'y [nm]', 'precision', -1],
+                                   chunk_bytes=5000)
+        np.testing.assert_array_equal(values, self.values[:, [2, 3, 6, 7]])
+        with self.assertRaises(ValueError):
+            ingest.read_table(self.filename, columns=['z'])
+
+    def test_row_filters_and_float32(self):
+        """
+        Rows are filtered on columns that are not kept, and stored as float32.
+        """
+        print("Start TestReadTable test_row_filters_and_float32", flush=True)
+        values = ingest.read_table(self.filename, columns=['x', 'y'],
+                                   filters=['precision<20', ('channel', '==', 1)],
+                                   dtype=np.float32, chunk_bytes=4096)
+        keep = (self.values[:, 6] < 20) & (self.values[:, 7] == 1)
+        self.assertEqual(values.dtype, np.float32)
+        np.testing.assert_array_equal(values,
+                                      self.values[keep][:, [2, 3]].astype(np.float32))
+
+    def test_npy_and_no_header(self):
+        """
+        Columns and filters apply in the same way to .npy files and text files
+        without a header, by index.
+        """
+        print("Start TestReadTable test_npy_and_no_header", flush=True)
+        keep = self.values[:, 0] >= 1000
+        npy_file = os.path.join(self.temp_dir.name, 'locs.npy')
+        np.save(npy_file, self.values)
+        txt_file = os.path.join(self.temp_dir.name, 'locs.txt')
+        np.savetxt(txt_file, self.values, delimiter=',')
+        self.assertEqual(ingest.read_header(npy_file), (None, 8))
+        for filename in (npy_file, txt_file):
+            values = ingest.read_table(filename, columns=[2, 3, -1],
+                                       filters=['0>=1000'], chunk_bytes=2000)
+            np.testing.assert_array_equal(values, self.values[keep][:, [2, 3, 7]])
+
+    def test_read_appended(self):
+        """
+        Rows are read in parts as the file grows, up to the last complete
+        line.
+        """
+        print("Start TestReadTable test_read_appended", flush=True)
+        with open(self.filename, 'rb') as fin:
+            contents = fin.read()
+        growing_file = os.path.join(self.temp_dir.name, 'growing.csv')
+        parts = []
+        offset = 0
+        for end in (10, 5000, 5001, 60000, len(contents)):
+            with open(growing_file, 'wb') as fout:
+                fout.write(contents[:end])
+            values, offset = ingest.read_appended(growing_file, offset,
+                                                  columns=['x', 'y', 'channel'])
+            parts.append(values)
+        np.testing.assert_array_equal(np.concatenate(parts), self.values[:, [2, 3, 7]])
+        self.assertEqual(offset, len(contents))
+
+    def test_parse_filter(self):
+        """
+        Filters are read from text, and bad filters are reported.
+        """
+        print("Start TestReadTable test_parse_filter", flush=True)
+        self.assertEqual(ingest.parse_filter('uncertainty_xy [nm] <= 20'),
+                         ('uncertainty_xy [nm]', '<=', 20.))
+        self.assertEqual(ingest.parse_filter('-1==1'), ('-1', '==', 1.))
+        with self.assertRaises(ValueError):
+            ingest.parse_filter('precision~20')
+
+    def test_read_data_in(self):
+        """
+        relative_positions.read_data_in reads the X, Y and channel columns,
+        and counts the columns in the file.
+        """
+        print("Start TestReadTable test_read_data_in", flush=True)
+        info = {'in_file_and_path': self.filename, 'dims': 2,
+                'colours_analysed': 2, 'start_channel': 0,
+                'xyz_columns': ['x', 'y'], 'row_filters': [('precision', '<', 30.)]}
+        values = relative_positions.read_data_in(info)
+        keep = self.values[:, 6] < 30
+        np.testing.assert_array_equal(values, self.values[keep][:, [2, 3, 7]])
+        self.assertEqual(info['columns'], 8)
+        self.assertEqual(info['values'], np.count_nonzero(keep))
+        np.testing.assert_array_equal(info['unique_colour_values'], [0., 1.])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+test_instrumentation.py
+
+Tests that the stages of a run are recorded with their times, memory use,
+counts and throughput, and saved as JSON.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+import instrumentation
+import modelling_general as models
+
+
+class TestStageRecorder(unittest.TestCase):
+    """
+    Test the StageRecorder class from the instrumentation library
+    """
+
+    def test_stages_recorded_and_saved(self):
+        """
+        Each stage has its times, counts and throughput, the peak memory
+        allocated with trace_memory, and the stages are saved as JSON.
+        """
+        print("Start TestStageRecorder test_stages_recorded_and_saved", flush=True)
+        recorder = instrumentation.StageRecorder(trace_memory=True)
+        with recorder.stage('allocate') as stage:
+            values = np.ones(2 ** 20)
+            stage['counts']['values'] = len(values)
+        with recorder.stage('nothing'):
+            pass
+
+        self.assertEqual([record['stage'] for record in recorder.stages],
+                         ['allocate', 'nothing'])
+        allocate = recorder.stages[0]
+        self.assertGreater(allocate['wall_seconds'], 0.)
+        self.assertGreaterEqual(allocate['cpu_seconds'], 0.)
+        self.assertGreaterEqual(allocate['peak_traced_mb'], 7.9)
+        self.assertAlmostEqual(allocate['throughput']['values per second'],
+                               len(values) / allocate['wall_seconds'])
+        self.assertEqual(recorder.stages[1]['throughput'], {})
+        self.assertAlmostEqual(recorder.total_seconds(),
+                               allocate['wall_seconds']
+                               + recorder.stages[1]['wall_seconds'])
+
+        with tempfile.TemporaryDirectory() as results_dir:
+            info = {'prog': 'test', 'results_dir': results_dir,
+                    'stage_recorder': recorder}
+            file_name = instrumentation.save_stages(info)
+            self.assertEqual(os.path.basename(file_name),
+                             instrumentation.STAGES_FILE_NAME)
+            with open(file_name) as fin:
+                saved = json.load(fin)
+        self.assertEqual(saved['program'], 'test')
+        self.assertEqual(saved['stages'][0]['counts'], {'values': 2 ** 20})
+
+        # Without a recorder, stages are not recorded or saved.
+        with instrumentation.stage({}, 'unrecorded') as stage:
+            stage['counts']['values'] = 1
+        self.assertIsNone(instrumentation.save_stages({}))
+
+    def test_model_evaluations_counted(self):
+        """
+        The number of fits and model evaluations in fit_model_to_experiment
+        are added to the record of a stage.
+        """
+        print("Start TestStageRecorder test_model_evaluations_counted", flush=True)
+        def line(x_values, slope, offset):
+            return slope * x_values + offset
+        line = instrumentation.CountCalls(line)
+        expt = 0.5 * (np.arange(100.) + 0.5) + 2.
+
+        recorder = instrumentation.StageRecorder()
+        with recorder.stage('fit') as stage:
+            for _ in range(2):
+                models.fit_model_to_experiment(expt, line, [1., 1.],
+                                               ([-10., -10.], [10., 10.]),
+                                               fitlength=100, stage=stage)
+        counts = recorder.stages[0]['counts']
+        self.assertEqual(counts['fits'], 2)
+        self.assertEqual(counts['model evaluations'], line.calls)
+        self.assertGreater(line.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
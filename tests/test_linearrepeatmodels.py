@@ -130,6 +130,36 @@ class TestLinearFit(unittest.TestCase):
         self.assertEqual(result, offset_float)
 
 
+class TestJacobians(unittest.TestCase):
+    """
+    Test the Jacobians of models from the linearrepeatmodels library
+    """
+
+    def test_jacobians_finite_differences(self):
+        """
+        Test that the Jacobians agree with finite differences of the models
+        """
+        print("Start test_jacobians_finite_differences")
+        x_values = np.arange(200) + 0.5
+        step = 1e-5
+        for model, params in (
+                (lin.linrepplusreps5_bg_flat,
+                 [30., 4., 1., 2., 3., 4., 5., 6., 7., 8.]),
+                (lin.lin_repeat_after_offset_5,
+                 [30., 4., 12., 1., 2., 3., 4., 5., 6., 0.1, 2.])):
+            jacobian = model.jacobian(x_values, *params)
+            self.assertEqual(jacobian.shape, (len(x_values), len(params)))
+            for i in range(len(params)):
+                upper = list(params)
+                upper[i] = upper[i] + step
+                lower = list(params)
+                lower[i] = lower[i] - step
+                expected = (model(x_values, *upper)
+                            - model(x_values, *lower)) / (2 * step)
+                np.testing.assert_allclose(jacobian[:, i], expected,
+                                           rtol=1e-5,
+                                           atol=1e-6 * np.max(np.abs(expected)))
+
 
 if __name__ == '__main__':
     unittest.main()
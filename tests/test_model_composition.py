@@ -0,0 +1,183 @@
+"""
+test_model_composition.py
+
+Tests that models composed from components give the same values, Jacobians,
+parameter names and linear parameters as the models written out in
+linearrepeatmodels, that their Jacobians agree with finite differences, that
+the fitting settings are made from the defaults or the values given, and that
+variable projection fits a background with an onset.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import unittest
+import numpy as np
+import modelling_general as models
+import linearrepeatmodels as lin
+import model_composition as compose
+import zdisk_modelling
+
+
+class TestComposeModel(unittest.TestCase):
+    """
+    Test compose_model from the model_composition library
+    """
+
+    def setUp(self):
+        self.x_values = np.arange(300) + 0.5
+        after_offset = compose.repeat_peaks(
+            6, first_multiple=0, offset=True,
+            amp_names=('amp0', 'a', 'b', 'c', 'd', 'e'))
+        self.cases = [
+            (lin.linrepplusreps5_bg_flat,
+             [compose.repeat_peaks(5), compose.repeated_localisations(),
+              compose.background('flat')],
+             [20., 4., 3., 2., 1.5, 1., 0.5, 3., 2., 0.4]),
+            (lin.lin_repeat_after_offset_5,
+             [after_offset, compose.background('linear')],
+             [30., 4., 12., 1., 2., 3., 4., 5., 6., 0.01, 2.]),
+            (lin.linrepplusreps5fixedpeakratio,
+             [compose.fixed_ratio_peaks(1. - np.arange(5) / 5.),
+              compose.repeated_localisations(),
+              compose.background('linear')],
+             [20., 4., 3., 3., 2., -0.001, 0.4]),
+            (lin.linrepnoreps5_bg_non_negative,
+             [compose.repeat_peaks(5), compose.background('non_negative')],
+             [20., 4., 3., 2., 1.5, 1., 0.5, -0.01, 1.])]
+
+    def test_same_as_written_models(self):
+        """
+        The composed models are the same as those written out.
+        """
+        print("Start TestComposeModel test_same_as_written_models",
+              flush=True)
+        for written, components, params in self.cases:
+            model_with_fit_settings = compose.compose_model(
+                components, dims=1, name=written.__name__)
+            model = model_with_fit_settings.model_rpd
+            self.assertEqual(model.__name__, written.__name__)
+            self.assertEqual(models.model_parameter_names(model),
+                             models.model_parameter_names(written))
+            self.assertEqual(models.linear_parameter_indices(model),
+                             models.linear_parameter_indices(written))
+            np.testing.assert_allclose(model(self.x_values, *params),
+                                       written(self.x_values, *params),
+                                       rtol=1e-12, atol=1e-15)
+            np.testing.assert_allclose(
+                model_with_fit_settings.vector_input_model(
+                    [self.x_values] + params),
+                written(self.x_values, *params), rtol=1e-12, atol=1e-15)
+            np.testing.assert_allclose(
+                models.model_jacobian(model)(self.x_values, *params),
+                written.jacobian(self.x_values, *params),
+                rtol=1e-10, atol=1e-15)
+
+    def test_jacobian(self):
+        """
+        The Jacobian agrees with finite differences, for all the components
+        and backgrounds, in 1, 2 and 3 dimensions, and for a single distance.
+        """
+        print("Start TestComposeModel test_jacobian", flush=True)
+        components = [compose.repeat_peaks(3, offset=True),
+                      compose.fixed_ratio_peaks([1., 0.5]),
+                      compose.repeated_localisations(),
+                      compose.substructure(),
+                      compose.background('onset'),
+                      compose.background('exponential')]
+        params = [25., 4., 3., 2., 1.5, 1., 5., 3., 2., 7., 1.,
+                  0.01, 40., 3., 60.]
+        for dims in (1, 2, 3):
+            model_with_fit_settings = compose.compose_model(components,
+                                                            dims=dims)
+            model = model_with_fit_settings.model_rpd
+            self.assertEqual(
+                models.model_parameter_names(model),
+                ['rep', 'broadening', 'first_peak_offset', 'a', 'b', 'c',
+                 'amp', 'locprec', 'ampreplocs',
+                 'substructspread', 'substructamp',
+                 'bggrad', 'bgonset', 'bgamp', 'bgdecay'])
+            jacobian = models.model_jacobian(model)(self.x_values, *params)
+            finite_differences = models.jacobian_of_model(
+                self.x_values, params,
+                model_with_fit_settings.vector_input_model)
+            np.testing.assert_allclose(
+                jacobian, finite_differences,
+                atol=1e-6 * np.max(np.abs(finite_differences)))
+            np.testing.assert_allclose(
+                models.model_jacobian(model)(self.x_values[30], *params),
+                jacobian[30])
+            self.assertAlmostEqual(model(self.x_values[30], *params),
+                                   model(self.x_values, *params)[30])
+
+    def test_fit_settings(self):
+        """
+        The initial parameters and bounds are the defaults or those given,
+        and models are set up in zdisk_modelling from components.
+        """
+        print("Start TestComposeModel test_fit_settings", flush=True)
+        components = [compose.repeat_peaks(2), compose.background('linear')]
+        model_with_fit_settings = compose.compose_model(
+            components, initial_params={'rep': 30.},
+            upper_bounds={'rep': 50.})
+        self.assertEqual(model_with_fit_settings.initial_params,
+                         [30., 5., 1., 1., 0., 1.])
+        self.assertEqual(model_with_fit_settings.param_bounds,
+                         ([0., 0., 0., 0., -np.inf, -np.inf],
+                          [50., np.inf, np.inf, np.inf, np.inf, np.inf]))
+        self.assertRaises(ValueError, compose.compose_model, components,
+                          initial_params={'repeat': 30.})
+        self.assertRaises(ValueError, compose.compose_model, components,
+                          dims=4)
+        self.assertRaises(ValueError, compose.background, 'quadratic')
+        self.assertRaises(TypeError,
+                          model_with_fit_settings.model_rpd,
+                          self.x_values, 20., 4.)
+
+        setup = (zdisk_modelling
+                 .set_up_model_5_variable_peaks_with_replocs_bg_flat_with_fit_settings())
+        self.assertEqual(setup.model_rpd.__name__, 'linrepplusreps5_bg_flat')
+        self.assertEqual(setup.initial_params,
+                         [20, 5, 1, 1, 1, 1, 1, 3, 1, 20])
+        self.assertEqual(setup.param_bounds,
+                         ([0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                          [50, 20, 1000, 1000, 1000, 1000, 10000, 50, 1000,
+                           100]))
+
+    def test_variable_projection_with_onset(self):
+        """
+        Variable projection fits a background with an onset, which is only
+        linear in a non-negative gradient, and refuses bounds that allow a
+        negative gradient.
+        """
+        print("Start TestComposeModel test_variable_projection_with_onset",
+              flush=True)
+        model_with_fit_settings = compose.compose_model(
+            [compose.substructure(), compose.background('onset')], dims=2)
+        model = model_with_fit_settings.model_rpd
+        self.assertEqual(model_with_fit_settings.param_bounds[0][2], 0.)
+        params = [10., 5., 0.02, 100.]
+        expt = model(self.x_values[:200], *params)
+        param_guesses = [12., 1., 1., 90.]
+        params_optimised = models.fit_model_to_experiment(
+            expt, model, param_guesses,
+            model_with_fit_settings.param_bounds, fitlength=200,
+            variable_projection=True)[0]
+        np.testing.assert_allclose(params_optimised, params, rtol=1e-6)
+        self.assertRaises(ValueError, models.fit_model_to_experiment,
+                          expt, model, param_guesses,
+                          ([0., 0., -np.inf, 0.], np.inf), fitlength=200,
+                          variable_projection=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+"""
+test_modelling_general.py
+
+Tests that the confidence band on a model from stdev_of_model is found at all
+the distances at once, from the analytic Jacobian of the model or from finite
+differences, that fitting by variable projection gives the same
+parameters and covariance as curve_fit, and that the distances between the
+vertices of a polygon are found without a search.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import unittest
+import numpy as np
+from scipy.spatial.distance import pdist
+import modelling_general as models
+import linearrepeatmodels as lin
+
+
+class TestStdevOfModel(unittest.TestCase):
+    """
+    Test stdev_of_model and jacobian_of_model from the modelling_general
+    library
+    """
+
+    def test_linear_model(self):
+        """
+        For a straight line, the variance is known exactly at every distance.
+        """
+        print("Start TestStdevOfModel test_linear_model", flush=True)
+        x_values = np.arange(100) + 0.5
+        params = np.array([0.3, 2.])
+        params_covar = np.array([[0.01, -0.02], [-0.02, 0.5]])
+        expected = np.sqrt(x_values ** 2 * params_covar[0, 0]
+                           + 2 * x_values * params_covar[0, 1]
+                           + params_covar[1, 1])
+        for jacobian in (None, models.model_jacobian(lin.linear_fit)):
+            stdev = models.stdev_of_model(x_values, params, params_covar,
+                                          lin.linear_fit_vector_args,
+                                          jacobian=jacobian)
+            self.assertEqual(stdev.shape, x_values.shape)
+            np.testing.assert_allclose(stdev, expected, rtol=1e-8)
+
+    def test_finite_differences_and_jacobian(self):
+        """
+        The finite differences over all the distances agree with the analytic
+        Jacobian of a model, and so give the same confidence band.
+        """
+        print("Start TestStdevOfModel test_finite_differences_and_jacobian",
+              flush=True)
+        x_values = np.arange(200) + 0.5
+        params = np.array([30., 4., 12., 1., 2., 3., 4., 5., 6., 0.1, 2.])
+        random = np.random.default_rng(0)
+        factor = random.standard_normal((len(params), len(params)))
+        params_covar = np.dot(factor, factor.T) * 1e-3
+
+        jacobian = models.model_jacobian(lin.lin_repeat_after_offset_5)
+        finite_differences = models.jacobian_of_model(
+            x_values, params, lin.lin_repeat_after_offset_5_vectorargs)
+        self.assertEqual(finite_differences.shape,
+                         (len(x_values), len(params)))
+        np.testing.assert_allclose(
+            finite_differences, jacobian(x_values, *params),
+            atol=1e-8 * np.max(np.abs(finite_differences)))
+
+        stdev = models.stdev_of_model(x_values, params, params_covar,
+                                      lin.lin_repeat_after_offset_5_vectorargs)
+        np.testing.assert_allclose(
+            stdev,
+            models.stdev_of_model(x_values, params, params_covar,
+                                  lin.lin_repeat_after_offset_5_vectorargs,
+                                  jacobian=jacobian),
+            rtol=1e-7)
+
+
+class TestVariableProjection(unittest.TestCase):
+    """
+    Test fit_model_variable_projection from the modelling_general library
+    """
+
+    def setUp(self):
+        self.model = lin.lin_repeat_after_offset_5
+        self.params = np.array([30., 4., 12., 1., 2., 3., 4., 5., 6., 0.01,
+                                2.])
+        self.bounds = ([0., 0., 0., 0., 0., 0., 0., 0., 0., -1., -10.],
+                       [100., 20., 50., 50., 50., 50., 50., 50., 50., 1., 10.])
+        random = np.random.default_rng(1)
+        x_values = np.arange(200) + 0.5
+        self.expt = (self.model(x_values, *self.params)
+                     + random.normal(0., 0.02, len(x_values)))
+
+    def test_linear_parameters(self):
+        """
+        The linear parameters are found from the names the model declares.
+        """
+        print("Start TestVariableProjection test_linear_parameters",
+              flush=True)
+        self.assertEqual(models.linear_parameter_indices(self.model),
+                         [3, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(models.linear_parameter_indices(
+            lin.linrepnoreps4_bg_non_negative), [])
+        self.assertRaises(ValueError, models.fit_model_variable_projection,
+                          self.expt, lin.linrepnoreps4_bg_non_negative,
+                          None, None, fitlength=200)
+
+    def test_not_linear_between_bounds(self):
+        """
+        A parameter declared linear must be linear between its bounds: a
+        background that is zero before an onset distance is only linear in
+        a gradient of one sign.
+        """
+        print("Start TestVariableProjection test_not_linear_between_bounds",
+              flush=True)
+
+        def onset_background(x_values, bggrad, bgonset):
+            return np.maximum(bggrad * (x_values - bgonset), 0.)
+
+        onset_background.linear_params = ('bggrad',)
+        expt = onset_background(np.arange(200) + 0.5, 0.02, 100.)
+        params_optimised = models.fit_model_variable_projection(
+            expt, onset_background, [1., 90.], ([0., 0.], [np.inf, 200.]),
+            fitlength=200)[0]
+        np.testing.assert_allclose(params_optimised, [0.02, 100.], rtol=1e-6)
+        self.assertRaises(ValueError, models.fit_model_variable_projection,
+                          expt, onset_background, [1., 90.],
+                          ([-np.inf, 0.], [np.inf, 200.]), fitlength=200)
+
+    def test_same_fit_as_curve_fit(self):
+        """
+        The parameters and covariance agree with curve_fit, and do not
+        depend on the guesses for the linear parameters.
+        """
+        print("Start TestVariableProjection test_same_fit_as_curve_fit",
+              flush=True)
+        (params_curve_fit,
+         covar_curve_fit,
+         error_curve_fit) = models.fit_model_to_experiment(
+             self.expt, self.model, self.params * 1.05, self.bounds,
+             fitlength=200)
+        param_guesses = self.params * 1.05
+        for amplitude_scale in (1., 0.1, 10.):
+            param_guesses[3:9] = self.params[3:9] * amplitude_scale
+            (params_optimised,
+             params_covar,
+             params_1sd_error) = models.fit_model_to_experiment(
+                 self.expt, self.model, param_guesses, self.bounds,
+                 fitlength=200, variable_projection=True)
+            np.testing.assert_allclose(params_optimised, params_curve_fit,
+                                       rtol=1e-5, atol=1e-7)
+            np.testing.assert_allclose(params_covar, covar_curve_fit,
+                                       rtol=1e-3,
+                                       atol=1e-6 * np.max(covar_curve_fit))
+            np.testing.assert_allclose(params_1sd_error,
+                                       np.sqrt(np.diag(params_covar)))
+
+    def test_instrumentation(self):
+        """
+        The fit and the model and Jacobian evaluations are counted.
+        """
+        print("Start TestVariableProjection test_instrumentation", flush=True)
+        stage = {'counts': {}}
+        models.fit_model_variable_projection(self.expt, self.model,
+                                             self.params, self.bounds,
+                                             fitlength=200, stage=stage)
+        self.assertEqual(stage['counts']['fits'], 1)
+        self.assertGreater(stage['counts']['model evaluations'], 0)
+        self.assertGreater(stage['counts']['jacobian evaluations'], 0)
+
+
+
+class TestPolygonChords(unittest.TestCase):
+    """
+    Test polygon_chords from the modelling_general library
+    """
+
+    def test_distances_between_polygon_points(self):
+        """
+        The distances and multiplicities are those between all the pairs of
+        points from generate_polygon_points.
+        """
+        print("Start TestPolygonChords test_distances_between_polygon_points",
+              flush=True)
+        for n in (2, 3, 8, 9, 40):
+            for diameter in (1., 123.4):
+                chords, multiplicities = models.polygon_chords(n, diameter)
+                self.assertEqual(len(chords), n // 2)
+                self.assertEqual(np.sum(multiplicities), n * (n - 1) // 2)
+                np.testing.assert_allclose(
+                    np.sort(pdist(models.generate_polygon_points(n,
+                                                                 diameter))),
+                    np.repeat(chords, multiplicities),
+                    rtol=1e-12)
+        # The memoised values are not changed by scaling.
+        self.assertEqual(models.polygon_chords(8, 10.)[0][-1], 10.)
+        self.assertEqual(models.polygon_chords(8, 1.)[0][-1], 1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+"""
+test_neighbour_search.py
+
+Tests of the cell-list neighbour search against a brute-force search over
+every pair of localisations.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import unittest
+import numpy as np
+import neighbour_search as ns
+
+
+def brute_force_pairs(xyz_values, filterdist):
+    """All pairs (i < j) within filterdist in every dimension."""
+    pairs = set()
+    for i in range(len(xyz_values)):
+        for j in range(i + 1, len(xyz_values)):
+            if np.all(np.abs(xyz_values[j] - xyz_values[i]) < filterdist):
+                pairs.add((i, j))
+    return pairs
+
+
+def brute_force_pairs_between(xyz_values_start, xyz_values_end, filterdist):
+    """All pairs of a 'from' and a 'to' localisation within filterdist."""
+    pairs = set()
+    for i in range(len(xyz_values_start)):
+        for j in range(len(xyz_values_end)):
+            if np.all(np.abs(xyz_values_end[j] - xyz_values_start[i]) < filterdist):
+                pairs.add((i, j))
+    return pairs
+
+
+def collect_pairs(pair_blocks):
+    """Gather blocks of index pairs into a list of (i, j) tuples."""
+    pairs = []
+    for i_values, j_values in pair_blocks:
+        pairs.extend(zip(i_values.tolist(), j_values.tolist()))
+    return pairs
+
+
+class TestIterNeighbourPairs(unittest.TestCase):
+    """
+    Test the iter_neighbour_pairs function from the neighbour_search library
+    """
+
+    def test_2d_and_3d_random_match_brute_force(self):
+        """
+        Pairs found in random 2D and 3D data are the same as those found by
+        testing every pair, and each is found once with i < j.
+        """
+        print("Start TestIterNeighbourPairs test_2d_and_3d_random_match_brute_force",
+              flush=True)
+        rng = np.random.default_rng(1)
+        for dims in (2, 3):
+            xyz_values = rng.uniform(0., 500., (200, dims))
+            pairs = collect_pairs(ns.iter_neighbour_pairs(xyz_values, 60.))
+            self.assertEqual(len(pairs), len(set(pairs)))
+            self.assertTrue(all(i < j for i, j in pairs))
+            self.assertEqual(set(pairs), brute_force_pairs(xyz_values, 60.))
+
+    def test_small_blocks_and_dense_cells(self):
+        """
+        Splitting the search into very small blocks, with many localisations
+        per cell, gives the same pairs.
+        """
+        print("Start TestIterNeighbourPairs test_small_blocks_and_dense_cells",
+              flush=True)
+        rng = np.random.default_rng(2)
+        xyz_values = rng.normal(0., 10., (150, 3))
+        for block_size in (1, 7, 1000):
+            pairs = collect_pairs(ns.iter_neighbour_pairs(xyz_values, 15.,
+                                                          block_size=block_size))
+            self.assertEqual(len(pairs), len(set(pairs)))
+            self.assertEqual(set(pairs), brute_force_pairs(xyz_values, 15.))
+
+    def test_separations_on_cell_boundaries(self):
+        """
+        Localisations on a grid with the same spacing as the filter distance
+        are not within the filter distance of each other (strict inequality).
+        """
+        print("Start TestIterNeighbourPairs test_separations_on_cell_boundaries",
+              flush=True)
+        xyz_values = np.array([[0., 0.], [10., 0.], [0., 10.], [10., 10.],
+                               [5., 5.]])
+        pairs = collect_pairs(ns.iter_neighbour_pairs(xyz_values, 10.))
+        self.assertEqual(set(pairs), {(0, 4), (1, 4), (2, 4), (3, 4)})
+
+    def test_non_finite_localisations_ignored(self):
+        """
+        Localisations with NaN coordinates have no neighbours.
+        """
+        print("Start TestIterNeighbourPairs test_non_finite_localisations_ignored",
+              flush=True)
+        xyz_values = np.array([[np.nan, 1.], [1., 2.], [3., 4.]])
+        pairs = collect_pairs(ns.iter_neighbour_pairs(xyz_values, 5.))
+        self.assertEqual(pairs, [(1, 2)])
+
+
+class TestIterNeighbourPairsBetween(unittest.TestCase):
+    """
+    Test the iter_neighbour_pairs_between function from the neighbour_search
+    library
+    """
+
+    def test_random_match_brute_force(self):
+        """
+        Pairs found between two random sets of localisations are the same as
+        those found by testing every pair.
+        """
+        print("Start TestIterNeighbourPairsBetween test_random_match_brute_force",
+              flush=True)
+        rng = np.random.default_rng(3)
+        for dims in (2, 3):
+            xyz_values_start = rng.uniform(0., 400., (120, dims))
+            xyz_values_end = rng.uniform(100., 600., (80, dims))
+            pairs = collect_pairs(ns.iter_neighbour_pairs_between(
+                xyz_values_start, xyz_values_end, 50., block_size=50))
+            self.assertEqual(len(pairs), len(set(pairs)))
+            self.assertEqual(set(pairs),
+                             brute_force_pairs_between(xyz_values_start,
+                                                       xyz_values_end, 50.))
+
+
+class TestCanonicalOrientation(unittest.TestCase):
+    """
+    Test the canonical_orientation and lexicographic_order functions from the
+    neighbour_search library
+    """
+
+    def test_negative_vectors_reversed_without_negative_zeros(self):
+        """
+        Vectors with a negative first non-zero component are reversed, and
+        zero components stay positive zero.
+        """
+        print("Start TestCanonicalOrientation test_negative_vectors_reversed_"
+              "without_negative_zeros", flush=True)
+        separation_values = np.array([[-1., 2., 0.],
+                                      [0., -3., 1.],
+                                      [0., 0., -2.],
+                                      [4., -5., 6.]])
+        expected = np.array([[1., -2., 0.],
+                             [0., 3., -1.],
+                             [0., 0., 2.],
+                             [4., -5., 6.]])
+        result = ns.canonical_orientation(separation_values)
+        np.testing.assert_array_equal(expected, result)
+        self.assertFalse(np.any(np.signbit(result[result == 0])))
+
+    def test_lexicographic_order_with_ties(self):
+        """
+        Sorting by X, then Y, then Z gives the same order as numpy.lexsort.
+        """
+        print("Start TestCanonicalOrientation test_lexicographic_order_with_ties",
+              flush=True)
+        rng = np.random.default_rng(4)
+        separation_values = rng.integers(0, 4, (500, 3)).astype(float)
+        result = separation_values[ns.lexicographic_order(separation_values)]
+        expected = separation_values[np.lexsort(separation_values.T[::-1])]
+        np.testing.assert_array_equal(expected, result)
+
+
+if __name__ == '__main__':
+    unittest.main()
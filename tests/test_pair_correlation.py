@@ -0,0 +1,215 @@
+"""
+test_pair_correlation.py
+
+Tests that the pair-correlation kernels give the direct formulae of
+Churchman (2006) where they can be evaluated, are normalised, and are
+smooth and finite for large separations.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import unittest
+import numpy as np
+from scipy.special import i0
+import pair_correlation as pc
+import modelling_general as models
+
+
+def direct_1d(z, zmean, sigma):
+    """The 1D density as written by Churchman."""
+    return (np.sqrt(2 / np.pi) / sigma
+            * np.exp(-(zmean ** 2 + z ** 2) / (2 * sigma ** 2))
+            * np.cosh(zmean * z / sigma ** 2))
+
+
+def direct_2d(r, rmean, sigma):
+    """The 2D density as written by Churchman."""
+    return (r / sigma ** 2
+            * np.exp(-(rmean ** 2 + r ** 2) / (2 * sigma ** 2))
+            * i0(r * rmean / sigma ** 2))
+
+
+def direct_3d(r, rmean, sigma):
+    """The 3D density as written by Churchman."""
+    return (np.sqrt(2 / np.pi) * r / (sigma * rmean)
+            * np.exp(-(rmean ** 2 + r ** 2) / (2 * sigma ** 2))
+            * np.sinh(r * rmean / sigma ** 2))
+
+
+class TestPairCorrelation(unittest.TestCase):
+    """
+    Test the functions from the pair_correlation library
+    """
+
+    def test_direct_formulae(self):
+        """
+        Where the direct formulae do not overflow, the kernels give the same
+        values, for arrays and single values, and the modelling_general
+        functions give the kernels.
+        """
+        print("Start TestPairCorrelation test_direct_formulae", flush=True)
+        r_values = np.arange(400) + 0.5
+        for rmean, sigma in ((0.1, 5.), (30., 5.), (50., 30.), (200., 40.)):
+            for kernel, direct in ((pc.pair_correlation_1d, direct_1d),
+                                   (pc.pair_correlation_2d, direct_2d),
+                                   (pc.pair_correlation_3d, direct_3d)):
+                with np.errstate(over='ignore', invalid='ignore'):
+                    expected = direct(r_values, rmean, sigma)
+                # Far tails of the direct formulae lose precision as they
+                # underflow, so these are compared relative to the peak.
+                usable = r_values * rmean / sigma ** 2 < 700.
+                peak = np.max(expected[usable])
+                np.testing.assert_allclose(kernel(r_values, rmean, sigma)[usable],
+                                           expected[usable], rtol=1e-12,
+                                           atol=1e-12 * peak)
+                self.assertAlmostEqual(kernel(20.5, rmean, sigma) / expected[20], 1.,
+                                       places=12)
+
+            np.testing.assert_allclose(
+                pc.pair_correlation_2d_standardised(r_values, rmean, sigma),
+                pc.pair_correlation_2d(r_values, rmean, sigma) / r_values,
+                rtol=1e-12)
+            np.testing.assert_array_equal(models.pairwise_correlation_1d(r_values, rmean, sigma),
+                                          pc.pair_correlation_1d(r_values, rmean, sigma))
+            np.testing.assert_array_equal(models.pairwise_correlation_2d(r_values, rmean, sigma),
+                                          pc.pair_correlation_2d(r_values, rmean, sigma))
+            np.testing.assert_array_equal(models.pairwise_correlation_3d(r_values, rmean, sigma),
+                                          pc.pair_correlation_3d(r_values, rmean, sigma))
+
+        # 3D with rmean = 0.
+        np.testing.assert_allclose(
+            pc.pair_correlation_3d(r_values, 0., 5.),
+            np.sqrt(2 / np.pi) * r_values ** 2 / 5. ** 3
+            * np.exp(-r_values ** 2 / (2 * 5. ** 2)),
+            rtol=1e-12)
+
+    def test_normalised_and_smooth(self):
+        """
+        The densities integrate to 1 over the separations, including where
+        the direct formulae overflow, with no steps between neighbouring
+        separations, and parameters can be arrays.
+        """
+        print("Start TestPairCorrelation test_normalised_and_smooth", flush=True)
+        step = 0.01
+        r_values = np.arange(0., 2000., step) + step / 2
+        for rmean, sigma in ((0., 10.), (20., 5.), (500., 3.), (1500., 1.)):
+            for kernel in (pc.pair_correlation_1d, pc.pair_correlation_2d,
+                           pc.pair_correlation_3d):
+                p_values = kernel(r_values, rmean, sigma)
+                self.assertTrue(np.all(np.isfinite(p_values)))
+                self.assertAlmostEqual(np.sum(p_values) * step, 1., places=6)
+                # Changes between neighbouring values are small and smooth.
+                self.assertLess(np.max(np.abs(np.diff(p_values, 2))),
+                                1e-3 * np.max(p_values))
+
+        rmean_values = np.array([[10.], [100.], [1000.]])
+        sigma_values = np.array([[2.], [5.], [1.]])
+        p_values = pc.pair_correlation_2d(r_values, rmean_values, sigma_values)
+        self.assertEqual(p_values.shape, (3, len(r_values)))
+        np.testing.assert_array_equal(p_values[1],
+                                      pc.pair_correlation_2d(r_values, 100., 5.))
+
+    def test_sum_pair_correlations(self):
+        """
+        The sum over peaks is the sum of the densities for each peak, in any
+        size of chunks, for single and per-peak spreads and amplitudes.
+        """
+        print("Start TestPairCorrelation test_sum_pair_correlations", flush=True)
+        r_values = np.arange(300) + 0.5
+        peak_means = np.array([0., 20., 35.5, 100., 180.])
+        sigmas = np.array([3., 5., 5., 8., 12.])
+        amplitudes = np.array([1., 0.5, 2., 0., 3.])
+        for dims, kernel in ((1, pc.pair_correlation_1d),
+                             (2, pc.pair_correlation_2d),
+                             (3, pc.pair_correlation_3d)):
+            expected = np.zeros(len(r_values))
+            for mean, sigma, amplitude in zip(peak_means, sigmas, amplitudes):
+                expected = expected + amplitude * kernel(r_values, mean, sigma)
+            for max_elements in (pc.MAX_KERNEL_ELEMENTS, 600, 1):
+                np.testing.assert_allclose(
+                    pc.sum_pair_correlations(r_values, peak_means, sigmas,
+                                             amplitudes, dims=dims,
+                                             max_elements=max_elements),
+                    expected, rtol=1e-12)
+
+        np.testing.assert_allclose(
+            pc.sum_pair_correlations(r_values, peak_means, 5.),
+            np.sum([pc.pair_correlation_2d(r_values, mean, 5.)
+                    for mean in peak_means], axis=0),
+            rtol=1e-12)
+        single = pc.sum_pair_correlations(20.5, peak_means, sigmas, amplitudes)
+        self.assertEqual(np.shape(single), ())
+        self.assertAlmostEqual(single / pc.sum_pair_correlations(
+            r_values, peak_means, sigmas, amplitudes)[20], 1., places=12)
+        np.testing.assert_array_equal(
+            pc.sum_pair_correlations(r_values, [], 5.), np.zeros(len(r_values)))
+        self.assertRaises(ValueError, pc.sum_pair_correlations,
+                          r_values, peak_means, 5., dims=4)
+
+    def test_derivatives(self):
+        """
+        The derivatives with respect to the mean and spread of a peak agree
+        with finite differences, including for a mean of zero and where the
+        direct formulae overflow, and sum over peaks as the densities do.
+        """
+        print("Start TestPairCorrelation test_derivatives", flush=True)
+        r_values = np.arange(400) + 0.5
+        step = 1e-5
+        for rmean, sigma in ((0., 5.), (0.01, 5.), (30., 5.), (200., 2.)):
+            for dims, kernel in ((1, pc.pair_correlation_1d),
+                                 (2, pc.pair_correlation_2d),
+                                 (3, pc.pair_correlation_3d)):
+                p_values, d_rmean, d_sigma = pc.pair_correlation_derivatives(
+                    r_values, rmean, sigma, dims=dims)
+                np.testing.assert_allclose(p_values,
+                                           kernel(r_values, rmean, sigma),
+                                           rtol=1e-12,
+                                           atol=1e-12 * np.max(p_values))
+                expected_d_rmean = (kernel(r_values, rmean + step, sigma)
+                                    - kernel(r_values, rmean - step, sigma)
+                                    ) / (2 * step)
+                expected_d_sigma = (kernel(r_values, rmean, sigma + step)
+                                    - kernel(r_values, rmean, sigma - step)
+                                    ) / (2 * step)
+                np.testing.assert_allclose(
+                    d_rmean, expected_d_rmean,
+                    atol=1e-6 * np.max(np.abs(expected_d_sigma)))
+                np.testing.assert_allclose(
+                    d_sigma, expected_d_sigma,
+                    atol=1e-6 * np.max(np.abs(expected_d_sigma)))
+
+        peak_means = np.array([0., 20., 100.])
+        sigmas = np.array([3., 5., 8.])
+        amplitudes = np.array([1., 0.5, 2.])
+        (rpd, d_means,
+         d_sigmas, d_amplitudes) = pc.sum_pair_correlations_derivatives(
+             r_values, peak_means, sigmas, amplitudes)
+        self.assertEqual(d_means.shape, (len(r_values), 3))
+        np.testing.assert_allclose(
+            rpd, pc.sum_pair_correlations(r_values, peak_means, sigmas,
+                                          amplitudes), rtol=1e-12)
+        for i in range(3):
+            (p_values, d_rmean,
+             d_sigma) = pc.pair_correlation_derivatives(r_values,
+                                                        peak_means[i],
+                                                        sigmas[i])
+            np.testing.assert_allclose(d_amplitudes[:, i], p_values,
+                                       rtol=1e-12)
+            np.testing.assert_allclose(d_means[:, i],
+                                       amplitudes[i] * d_rmean, rtol=1e-12)
+            np.testing.assert_allclose(d_sigmas[:, i],
+                                       amplitudes[i] * d_sigma, rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
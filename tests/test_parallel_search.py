@@ -0,0 +1,108 @@
+"""
+test_parallel_search.py
+
+Tests that dividing the neighbour search into tiles finds every pair of
+localisations once.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import unittest
+import numpy as np
+import neighbour_search as ns
+import parallel_search as ps
+
+
+def tile_pairs(tile):
+    """Pairs found in a tile, as indices into the whole data set."""
+    pairs = []
+    for i_values, j_values in tile.neighbour_pairs(block_size=100):
+        pairs.extend(zip(tile.indices[i_values].tolist(),
+                         tile.indices[j_values].tolist()))
+    return pairs
+
+
+def tile_pairs_between(tile):
+    """Pairs found between two sets of localisations in a tile."""
+    pairs = []
+    for i_values, j_values in tile.neighbour_pairs_between(block_size=100):
+        pairs.extend(zip(tile.start_indices[i_values].tolist(),
+                         tile.end_indices[j_values].tolist()))
+    return pairs
+
+
+def all_pairs(pair_blocks):
+    """Gather blocks of index pairs into a list of (i, j) tuples."""
+    pairs = []
+    for i_values, j_values in pair_blocks:
+        pairs.extend(zip(i_values.tolist(), j_values.tolist()))
+    return pairs
+
+
+class TestMapTiles(unittest.TestCase):
+    """
+    Test the map_tiles function from the parallel_search library
+    """
+
+    def test_tiles_find_each_pair_once(self):
+        """
+        The pairs found in all the tiles, in this process or by worker
+        processes, are those found without tiles, each found once.
+        """
+        print("Start TestMapTiles test_tiles_find_each_pair_once", flush=True)
+        rng = np.random.default_rng(10)
+        for dims in (2, 3):
+            xyz_values = rng.uniform(0., 600., (800, dims))
+            expected = sorted(all_pairs(ns.iter_neighbour_pairs(xyz_values, 40.)))
+            for workers in (1, 2):
+                pairs = []
+                for result in ps.map_tiles(tile_pairs, xyz_values, 40.,
+                                           workers=workers):
+                    pairs.extend(result)
+                self.assertEqual(expected, sorted(pairs))
+
+    def test_tiles_find_each_pair_between_once(self):
+        """
+        The pairs found between two sets of localisations in all the tiles
+        are those found without tiles, each found once.
+        """
+        print("Start TestMapTiles test_tiles_find_each_pair_between_once",
+              flush=True)
+        rng = np.random.default_rng(11)
+        xyz_values_start = rng.uniform(0., 600., (500, 3))
+        xyz_values_end = rng.uniform(-100., 500., (400, 3))
+        expected = sorted(all_pairs(ns.iter_neighbour_pairs_between(
+            xyz_values_start, xyz_values_end, 40.)))
+        pairs = []
+        for result in ps.map_tiles(tile_pairs_between, xyz_values_start, 40.,
+                                   xyz_values_end=xyz_values_end, workers=2):
+            pairs.extend(result)
+        self.assertEqual(expected, sorted(pairs))
+
+    def test_tile_cell_ranges_cover_all_cells(self):
+        """
+        Tiles are contiguous, do not overlap and include every occupied cell.
+        """
+        print("Start TestMapTiles test_tile_cell_ranges_cover_all_cells",
+              flush=True)
+        cell_x = np.sort(np.random.default_rng(12).integers(0, 30, 1000))
+        ranges = ps.tile_cell_ranges(cell_x, 8)
+        self.assertLessEqual(len(ranges), 8)
+        self.assertEqual(ranges[0][0], cell_x[0])
+        self.assertEqual(ranges[-1][1], cell_x[-1] + 1)
+        for (_, last), (first, _) in zip(ranges[:-1], ranges[1:]):
+            self.assertEqual(last, first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,9 +19,11 @@ under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
 CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import tempfile
 import unittest
 from unittest import mock
 import numpy as np
+import matplotlib.pyplot as plt
 import plotting as plots
 
 
@@ -75,6 +77,49 @@ class TestDraw2dScatterPlot(unittest.TestCase):
 
 
 
+class TestPlotHistograms(unittest.TestCase):
+    """
+    Test the plot_histograms function from the plotting library
+    """
+
+    def test_figures_closed(self):
+        """
+        Tests that the histogram figures are closed once saved, so that the
+        histograms for many pairs of channels can be plotted in one run.
+        """
+        print("Start TestPlotHistograms test_figures_closed", flush=True)
+        rng = np.random.default_rng(0)
+        d_values = rng.uniform(-50., 50., (1000, 7))
+        open_figures = len(plt.get_fignums())
+        with tempfile.TemporaryDirectory() as results_dir:
+            info = {'results_dir': results_dir,
+                    'short_results_dir': results_dir,
+                    'short_names': False}
+            for _ in range(3):
+                plots.plot_histograms(d_values, 3, 60., info)
+        self.assertEqual(len(plt.get_fignums()), open_figures)
+
+    def test_curves_title(self):
+        """
+        Tests that the title of the fitted curves gives the orders of
+        symmetry that were fitted.
+        """
+        print("Start TestPlotHistograms test_curves_title", flush=True)
+        symmetries = [7, 8, 9]
+        x_values = np.arange(50) + 0.5
+        with tempfile.TemporaryDirectory() as results_dir:
+            info = {'results_dir': results_dir,
+                    'short_results_dir': results_dir,
+                    'short_names': False}
+            plots.plot_histogram_with_curves(np.arange(51.), np.ones(50),
+                                             symmetries, x_values,
+                                             [x_values] * len(symmetries),
+                                             info)
+        figure = plt.gcf()
+        self.assertEqual(figure.axes[0].get_title(), '7-fold to 9-fold fits')
+        plt.close(figure)
+
+
 if __name__ == '__main__':
     unittest.main()
     
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+test_polyhedramodelling.py
+
+Tests that the models of polyhedra find each different distance between the
+vertices once, with the number of pairs of vertices at that distance, and
+give the same relative position distributions as one peak for every pair of
+vertices, and that polyhedron_model makes models for any vertices.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import unittest
+import numpy as np
+import modelling_general as models
+import polyhedramodelling as poly
+
+
+class TestPolyhedra(unittest.TestCase):
+    """
+    Test the polyhedra models from the polyhedramodelling library
+    """
+
+    def setUp(self):
+        self.r = np.arange(300) + 0.5
+        self.params = [40., 55.,
+                       2., 6.,
+                       0.5, 7.,
+                       1.5, 9.,
+                       120., 0.8, 10.,
+                       0.01]
+
+    def test_vertex_distances(self):
+        """
+        The different distances and their multiplicities are those of all the
+        pairs of vertices, for any lengths.
+        """
+        print("Start TestPolyhedra test_vertex_distances", flush=True)
+        for vertices_function, lengths, n_distances in (
+                (poly.tri_prism_vertices, (30., 50.), 3),
+                (poly.tri_prism_1_length_vertices, (30.,), 2),
+                (poly.tri_pyramid_vertices, (30., 50.), 3),
+                (poly.cuboid_vertices, (30., 40., 50.), 7),
+                (poly.cube_vertices, (30.,), 3)):
+            for scale in (1., 1.7):
+                scaled_lengths = [length * scale for length in lengths]
+                dists, multiplicities = poly.vertex_distances(
+                    vertices_function, scaled_lengths)
+                self.assertEqual(len(dists), n_distances)
+                relpos = poly.get_1d_relpos_no_filter(
+                    vertices_function(*scaled_lengths))
+                np.testing.assert_allclose(
+                    np.repeat(dists, multiplicities.astype(int)),
+                    np.sort(np.sqrt(np.sum(relpos ** 2, axis=1))),
+                    rtol=1e-12)
+
+    def test_same_as_every_pair(self):
+        """
+        The models give the same values as one peak for every pair of
+        vertices.
+        """
+        print("Start TestPolyhedra test_same_as_every_pair", flush=True)
+        (a, b, locamp, locprec, structamp, spread,
+         substructamp, substructspread,
+         gridspace, gridamp, gridspread, bgslope) = self.params
+        relpos = poly.get_1d_relpos_no_filter(poly.tri_prism_vertices(a, b))
+        expected = bgslope * self.r
+        for dist in np.sqrt(np.sum(relpos ** 2, axis=1)):
+            expected = expected + structamp * models.pairwise_correlation_3d(
+                self.r, dist, spread)
+        expected = expected + locamp * models.pairwise_correlation_3d(
+            self.r, 0., np.sqrt(2) * locprec)
+        expected = expected + substructamp * models.pairwise_correlation_3d(
+            self.r, 0., np.sqrt(2) * substructspread)
+        for grid_distance in (gridspace, gridspace * np.sqrt(2)):
+            expected = expected + gridamp * models.pairwise_correlation_2d(
+                self.r, grid_distance, gridspread)
+
+        np.testing.assert_allclose(
+            poly.tri_prism_on_grid_2disobg_substructure_rpd(self.r,
+                                                            *self.params),
+            expected, rtol=1e-12, atol=1e-15)
+
+    def test_polyhedron_model(self):
+        """
+        A model made by polyhedron_model is the same as the model written
+        for that polyhedron, with the same Jacobian, and works with fixed
+        vertices too.
+        """
+        print("Start TestPolyhedra test_polyhedron_model", flush=True)
+        model_rpd, model_rpd_vectorargs = poly.polyhedron_model(
+            poly.tri_prism_vertices, substructure=True, grid=True,
+            background='2d')
+        written = poly.tri_prism_on_grid_2disobg_substructure_rpd
+        self.assertEqual(models.model_parameter_names(model_rpd),
+                         models.model_parameter_names(written))
+        self.assertEqual(models.linear_parameter_indices(model_rpd),
+                         models.linear_parameter_indices(written))
+        np.testing.assert_array_equal(model_rpd(self.r, *self.params),
+                                      written(self.r, *self.params))
+        np.testing.assert_array_equal(
+            model_rpd_vectorargs([self.r] + self.params),
+            written(self.r, *self.params))
+        jacobian = models.model_jacobian(model_rpd)
+        np.testing.assert_array_equal(jacobian(self.r, *self.params),
+                                      written.jacobian(self.r, *self.params))
+        finite_differences = models.jacobian_of_model(self.r, self.params,
+                                                      model_rpd_vectorargs)
+        np.testing.assert_allclose(
+            jacobian(self.r, *self.params), finite_differences,
+            atol=1e-6 * np.max(np.abs(finite_differences)))
+
+        # A fixed cube, with a 3D background.
+        fixed_rpd, _ = poly.polyhedron_model(
+            poly.fixed_vertices(poly.cube_vertices(35.)), background='3d')
+        self.assertIsNone(models.model_jacobian(fixed_rpd))
+        self.assertEqual(models.model_parameter_names(fixed_rpd),
+                         ['locamp', 'locprec', 'structamp', 'spread',
+                          'bgscale'])
+        np.testing.assert_allclose(
+            fixed_rpd(self.r, 2., 6., 0.5, 7., 1e-4),
+            poly.polyhedron_rpd(self.r, poly.cube_vertices, (35.,),
+                                2., 6., 0.5, 7., bgscale=1e-4),
+            rtol=1e-12)
+        self.assertRaises(TypeError, fixed_rpd, self.r, 2., 6.)
+        self.assertRaises(ValueError, poly.polyhedron_model,
+                          poly.cube_vertices, background='1d')
+
+
+if __name__ == '__main__':
+    unittest.main()
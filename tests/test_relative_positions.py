@@ -19,7 +19,10 @@ under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
 CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-#import tempfile
+import os
+import glob
+import argparse
+import tempfile
 import unittest
 import numpy as np
 import relative_positions as rp
@@ -208,6 +211,42 @@ class TestGetdistances(unittest.TestCase):
         self.assertTrue(res)
 
 
+    def test_orientation_and_coincident_options(self):
+        """
+        Tests the canonical and keep_coincident options of getdistances,
+        with 3 localisations in 2d space, 2 of them in the same place.
+        """
+        print("Start TestGetdistances test_orientation_and_coincident_options",
+              flush=True)
+        xyz_values = np.array([[100., 100.],
+                               [90., 105.],
+                               [90., 105.]])
+        filterdist = 150
+
+        np.testing.assert_array_equal(
+            rp.getdistances(xyz_values, filterdist),
+            np.array([[10., -5., 0.],
+                      [10., -5., 0.]]))
+        np.testing.assert_array_equal(
+            rp.getdistances(xyz_values, filterdist, canonical=False),
+            np.array([[-10., 5., 0.],
+                      [-10., 5., 0.]]))
+        np.testing.assert_array_equal(
+            rp.getdistances(xyz_values, filterdist, keep_coincident=True),
+            np.array([[0., 0., 0.],
+                      [10., -5., 0.],
+                      [10., -5., 0.]]))
+        np.testing.assert_array_equal(
+            rp.getdistances(xyz_values, filterdist, sort_and_halve=False,
+                            keep_coincident=True),
+            np.array([[-10., 5., 0.],
+                      [-10., 5., 0.],
+                      [10., -5., 0.],
+                      [0., 0., 0.],
+                      [10., -5., 0.],
+                      [0., 0., 0.]]))
+
+
     def test_getdistances_2d_array_of_10(self):
         """
         Test that the input of 10 lines of a numpy array of a 2D sample returns
@@ -446,5 +485,286 @@ class TestGetVectors(unittest.TestCase):
         self.assertTrue(res)
 
 
+class TestGethistograms(unittest.TestCase):
+    """
+    Test the gethistograms and gethistograms_two_colours functions from the
+    relative_positions library
+    """
+
+    def test_same_as_histograms_of_getdistances(self):
+        """
+        Tests that the histograms accumulated by gethistograms are the same as
+        histograms of the distances from getdistances and get_vectors, for
+        random localisations including repeated positions.
+        """
+        print("Start TestGethistograms test_same_as_histograms_of_getdistances",
+              flush=True)
+        rng = np.random.default_rng(8)
+        for dims in (2, 3):
+            xyz_values = np.round(rng.uniform(0., 300., (400, dims)), 1)
+            xyz_values[::10] = xyz_values[1::10]
+            histograms = rp.gethistograms(xyz_values, 40)
+            v_values = rp.get_vectors(rp.getdistances(xyz_values, 40), dims)
+            self.assertEqual(histograms.total, len(v_values))
+            columns = [0, 1, 3] if dims == 2 else range(7)
+            bins = np.arange(0., 41.)
+            for column, description in zip(columns, histograms.descriptions):
+                values = np.absolute(v_values[:, column])
+                np.testing.assert_array_equal(
+                    np.histogram(values[values < 40], bins)[0],
+                    histograms.counts_in_bins(description, bins, below=40))
+                self.assertEqual(values.max(), histograms.maxima[description])
+
+    def test_two_colours_same_as_getdistances_two_colours(self):
+        """
+        Tests that the histograms accumulated by gethistograms_two_colours are
+        the same as histograms of the distances from getdistances_two_colours,
+        including skipping 'from' localisations with only one neighbour.
+        """
+        print("Start TestGethistograms test_two_colours_same_as_getdistances_"
+              "two_colours", flush=True)
+        rng = np.random.default_rng(9)
+        xyz_values_start = rng.uniform(0., 500., (300, 3))
+        xyz_values_end = rng.uniform(0., 500., (200, 3))
+        histograms = rp.gethistograms_two_colours(xyz_values_start, 30,
+                                                  xyz_values_end)
+        v_values = rp.get_vectors(
+            rp.getdistances_two_colours(xyz_values_start, 30, xyz_values_end), 3)
+        self.assertEqual(histograms.total, len(v_values))
+        bins = np.arange(0., 61.)
+        for column, description in enumerate(histograms.descriptions):
+            values = np.absolute(v_values[:, column])
+            np.testing.assert_array_equal(np.histogram(values, bins)[0],
+                                          histograms.counts_in_bins(description, bins))
+            self.assertEqual(values.max(), histograms.maxima[description])
+
+
+
+class TestWorkers(unittest.TestCase):
+    """
+    Test that the relative_positions search functions give the same results
+    with several worker processes
+    """
+
+    def test_same_result_with_workers(self):
+        """
+        Tests that getdistances, getdistances_two_colours and gethistograms
+        give identical results with one and with two worker processes.
+        """
+        print("Start TestWorkers test_same_result_with_workers", flush=True)
+        rng = np.random.default_rng(13)
+        xyz_values = np.round(rng.uniform(0., 800., (1500, 3)), 1)
+        xyz_values_end = rng.uniform(0., 800., (700, 3))
+        for sort_and_halve in (True, False):
+            np.testing.assert_array_equal(
+                rp.getdistances(xyz_values, 50, sort_and_halve=sort_and_halve),
+                rp.getdistances(xyz_values, 50, sort_and_halve=sort_and_halve,
+                                workers=2))
+        np.testing.assert_array_equal(
+            rp.getdistances_two_colours(xyz_values, 50, xyz_values_end),
+            rp.getdistances_two_colours(xyz_values, 50, xyz_values_end, workers=2))
+        serial = rp.gethistograms(xyz_values, 50)
+        parallel = rp.gethistograms(xyz_values, 50, workers=2)
+        self.assertEqual(serial.total, parallel.total)
+        self.assertEqual(serial.maxima, parallel.maxima)
+        np.testing.assert_array_equal(serial.counts_in_bins('xyz', np.arange(0., 90.)),
+                                      parallel.counts_in_bins('xyz', np.arange(0., 90.)))
+
+
+
+class TestSaveRelativePositionsOutOfCore(unittest.TestCase):
+    """
+    Test the save_relative_positions_out_of_core function from the
+    relative_positions library
+    """
+
+    def test_same_file_as_in_memory(self):
+        """
+        Tests that relative positions saved in blocks, with a small memory
+        budget, give the same file as get_vectors and save_relative_positions.
+        """
+        print("Start TestSaveRelativePositionsOutOfCore test_same_file_as_in_memory",
+              flush=True)
+        rng = np.random.default_rng(16)
+        xyz_values = np.round(rng.uniform(0., 1000., (2000, 2)), 1)
+        xyz_values_end = rng.uniform(0., 1000., (800, 2))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for end_values in (None, xyz_values_end):
+                info = {'results_dir': temp_dir, 'short_names': False,
+                        'in_file_no_extension': 'in_memory'}
+                if end_values is None:
+                    d_values = rp.getdistances(xyz_values, 50)
+                else:
+                    d_values = rp.getdistances_two_colours(xyz_values, 50, end_values)
+                in_memory = rp.save_relative_positions(
+                    rp.get_vectors(d_values, 2), 50, 2, info)
+                info['in_file_no_extension'] = 'out_of_core'
+                writer = rp.save_relative_positions_out_of_core(
+                    xyz_values, 50, 2, info, xyz_values_end=end_values, max_memory=1)
+                with open(in_memory) as fin_1, open(writer.out_file_name) as fin_2:
+                    self.assertEqual(fin_1.read(), fin_2.read())
+
+
+class TestFilterDistanceSweep(unittest.TestCase):
+    """
+    Test the parse_filter_distances and sweep_filter_distances functions
+    from the relative_positions library
+    """
+
+    def test_parse_filter_distances(self):
+        """
+        Tests that filter distances are read from lists and ranges.
+        """
+        print("Start TestFilterDistanceSweep test_parse_filter_distances", flush=True)
+        self.assertEqual(rp.parse_filter_distances('150'), [150])
+        self.assertEqual(rp.parse_filter_distances('200,50,100'), [50, 100, 200])
+        self.assertEqual(rp.parse_filter_distances('50:200:50,75'), [50, 75, 100, 150, 200])
+        self.assertEqual(rp.parse_filter_distances('0.5:1.5:0.5'), [0.5, 1, 1.5])
+        for text in ('a', '50:100', '50:100:0', '0,50'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                rp.parse_filter_distances(text)
+
+    def test_same_as_separate_searches(self):
+        """
+        Tests that the relative positions saved for each filter distance in a
+        sweep are the same as those from searching with that filter distance,
+        for one and two colour channels.
+        """
+        print("Start TestFilterDistanceSweep test_same_as_separate_searches",
+              flush=True)
+        rng = np.random.default_rng(17)
+        xyzcolour_values = np.column_stack((rng.uniform(0., 1000., (1500, 2)),
+                                            rng.integers(0, 2, 1500)))
+        xyzcolour_values[10:20, 0:2] = xyzcolour_values[0, 0:2]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            in_file = os.path.join(temp_dir, 'locs.csv')
+            np.savetxt(in_file, xyzcolour_values, delimiter=',')
+            for colours, start in ((None, '1'), (2, '2')):
+                info = {'prog': 'relative_positions', 'prog_short_name': 'rp',
+                        'description': 'Sweep test.',
+                        'start': start, 'in_file_and_path': in_file, 'dims': 2,
+                        'bin_size': 1, 'zoom': 10, 'colours_analysed': colours,
+                        'start_channel': 0, 'end_channel': 1,
+                        'short_names': False, 'verbose': False, 'workers': 1,
+                        'cache_dir': None, 'filter_distances': [20, 45.5, 60],
+                        'host': 'host', 'ip_address': 'ip',
+                        'operating_system': 'os', 'values': 1500, 'columns': 3,
+                        'unique_colour_values': np.array([0., 1.])}
+                xyz_values_start = xyzcolour_values[:, 0:2]
+                xyz_values_end = None
+                if colours == 2:
+                    xyz_values_start = xyzcolour_values[xyzcolour_values[:, 2] == 0, 0:2]
+                    xyz_values_end = xyzcolour_values[xyzcolour_values[:, 2] == 1, 0:2]
+                out_files = rp.sweep_filter_distances(
+                    xyzcolour_values, xyz_values_start, info, xyz_values_end=xyz_values_end)
+                self.assertEqual(len(out_files), 3)
+                for out_file, filterdist in zip(out_files, [60, 45.5, 20]):
+                    if colours is None:
+                        d_values = rp.getdistances(xyz_values_start, filterdist)
+                    else:
+                        d_values = rp.getdistances_two_colours(
+                            xyz_values_start, filterdist, xyz_values_end)
+                    np.testing.assert_array_equal(
+                        np.loadtxt(out_file, delimiter=',', skiprows=1),
+                        rp.get_vectors(d_values, 2))
+                    results_dir = os.path.dirname(out_file)
+                    self.assertIn('filter_' + str(filterdist) + '_', results_dir)
+                    self.assertEqual(len(glob.glob(
+                        os.path.join(results_dir, 'scatter_plot*.png'))), 2)
+
+    def test_smallest_distance_without_pairs(self):
+        """
+        Tests that a filter distance within which there are no relative
+        positions is skipped, without a results directory, and the larger
+        filter distances are still saved.
+        """
+        print("Start TestFilterDistanceSweep test_smallest_distance_without_pairs",
+              flush=True)
+        # Localisations on a grid, 10 nm apart.
+        grid = np.arange(0., 200., 10.)
+        xyz_values = np.column_stack([values.ravel() for values
+                                      in np.meshgrid(grid, grid)])
+        xyzcolour_values = np.column_stack((xyz_values, np.zeros(len(xyz_values))))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            in_file = os.path.join(temp_dir, 'locs.csv')
+            np.savetxt(in_file, xyzcolour_values, delimiter=',')
+            info = {'prog': 'relative_positions', 'prog_short_name': 'rp',
+                    'description': 'Sweep test.',
+                    'start': '3', 'in_file_and_path': in_file, 'dims': 2,
+                    'bin_size': 1, 'zoom': 10, 'colours_analysed': None,
+                    'start_channel': 0, 'end_channel': 1,
+                    'short_names': False, 'verbose': False, 'workers': 1,
+                    'cache_dir': None, 'filter_distances': [5, 15, 25],
+                    'host': 'host', 'ip_address': 'ip',
+                    'operating_system': 'os', 'values': len(xyz_values),
+                    'columns': 3, 'unique_colour_values': np.array([0.])}
+            out_files = rp.sweep_filter_distances(xyzcolour_values, xyz_values, info)
+            self.assertEqual(len(out_files), 2)
+            for out_file, filterdist in zip(out_files, [25, 15]):
+                np.testing.assert_array_equal(
+                    np.loadtxt(out_file, delimiter=',', skiprows=1),
+                    rp.get_vectors(rp.getdistances(xyz_values, filterdist), 2))
+                self.assertIn('filter_' + str(filterdist) + '_',
+                              os.path.dirname(out_file))
+            for filterdist, n_dirs in ((25, 1), (15, 1), (5, 0)):
+                self.assertEqual(len(glob.glob(
+                    os.path.join(temp_dir, '**', '*filter_' + str(filterdist) + '_*'),
+                    recursive=True)), n_dirs)
+
+            # With no relative positions at the largest filter distance, there
+            # is nothing to save.
+            info['filter_distances'] = [2, 5]
+            with self.assertRaises(SystemExit):
+                rp.sweep_filter_distances(xyzcolour_values, xyz_values, info)
+
+
+class TestChannelPairs(unittest.TestCase):
+    """
+    Test the getdistances_channel_pairs and gethistograms_channel_pairs
+    functions from the relative_positions library
+    """
+
+    def test_same_as_each_pair_of_channels(self):
+        """
+        Tests that one search of three channels gives the same relative
+        positions and histograms as searching each channel and each pair of
+        channels, on one or two processes.
+        """
+        print("Start TestChannelPairs test_same_as_each_pair_of_channels", flush=True)
+        rng = np.random.default_rng(18)
+        for dims in (2, 3):
+            xyz_values = np.round(rng.uniform(0., 800., (2000, dims)))
+            xyz_values[5:15] = xyz_values[0]
+            channel_values = rng.integers(1, 4, 2000).astype(float)
+            xyzcolour_values = np.column_stack((xyz_values, channel_values))
+            for workers in (1, 2):
+                d_values = rp.getdistances_channel_pairs(
+                    xyzcolour_values, [1, 2, 3], 40, dims, workers=workers)
+                histograms = rp.gethistograms_channel_pairs(
+                    xyzcolour_values, [1, 2, 3], 40, dims, workers=workers)
+                self.assertEqual(len(d_values), 9)
+                for start_channel, end_channel in d_values:
+                    xyz_values_start = xyz_values[channel_values == start_channel]
+                    xyz_values_end = xyz_values[channel_values == end_channel]
+                    if start_channel == end_channel:
+                        expected = rp.getdistances(xyz_values_start, 40)
+                        expected_histograms = rp.gethistograms(xyz_values_start, 40)
+                    else:
+                        expected = rp.getdistances_two_colours(
+                            xyz_values_start, 40, xyz_values_end)
+                        expected_histograms = rp.gethistograms_two_colours(
+                            xyz_values_start, 40, xyz_values_end)
+                    np.testing.assert_array_equal(
+                        rp.get_vectors(d_values[(start_channel, end_channel)], dims),
+                        rp.get_vectors(expected, dims))
+                    result = histograms[(start_channel, end_channel)]
+                    for description in expected_histograms.descriptions:
+                        np.testing.assert_array_equal(
+                            result.counts[description],
+                            expected_histograms.counts[description])
+                        self.assertEqual(result.maxima[description],
+                                         expected_histograms.maxima[description])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,141 @@
+"""
+test_relpos_cache.py
+
+Tests that relative positions taken from the cache, including for smaller
+filter distances than were searched, are the same as those found by
+searching, and that the cache is kept to its maximum size.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import time
+import tempfile
+import unittest
+import numpy as np
+import neighbour_search
+import relpos_cache
+import relative_positions as rp
+
+
+def searched(xyz_values_start, filterdist, dims, xyz_values_end=None):
+    """Relative positions found without the cache."""
+    if xyz_values_end is None:
+        return rp.get_vectors(rp.getdistances(xyz_values_start, filterdist), dims)
+    return rp.get_vectors(rp.getdistances_two_colours(xyz_values_start, filterdist,
+                                                      xyz_values_end), dims)
+
+
+class TestRelativePositionCache(unittest.TestCase):
+    """
+    Test the RelativePositionCache class from the relpos_cache library
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_smaller_filter_distances(self):
+        """
+        Results for smaller filter distances, taken from a stored result,
+        are the same as searching again, for one and two sets of
+        localisations, including localisations at the same positions.
+        """
+        print("Start TestRelativePositionCache test_smaller_filter_distances",
+              flush=True)
+        rng = np.random.default_rng(8)
+        cache = relpos_cache.RelativePositionCache(self.cache_dir)
+        for dims in (2, 3):
+            xyz_values_start = rng.uniform(0., 1500., (1500, dims))
+            xyz_values_start[100:110] = xyz_values_start[0]
+            xyz_values_end = rng.uniform(0., 1500., (1000, dims))
+            xyz_values_end[0:30] = xyz_values_start[0:30]
+            for xyz_end in (None, xyz_values_end):
+                key = relpos_cache.localisations_key(xyz_values_start, xyz_end)
+                self.assertEqual(cache.lookup(key, 60., xyz_values_start, xyz_end),
+                                 (None, None, None, None))
+                v_values, start_indices, end_indices = rp.get_vectors_and_pairs(
+                    xyz_values_start, 60., dims, xyz_values_end=xyz_end)
+                np.testing.assert_array_equal(
+                    v_values, searched(xyz_values_start, 60., dims, xyz_end))
+                cache.store(key, 60., dims, v_values, start_indices, end_indices)
+                for filterdist in (60., 45.5, 20., 3.):
+                    cached, _, _, cached_filterdist = cache.lookup(
+                        key, filterdist, xyz_values_start, xyz_end)
+                    self.assertEqual(cached_filterdist, 60.)
+                    np.testing.assert_array_equal(
+                        cached, searched(xyz_values_start, filterdist, dims, xyz_end))
+                self.assertEqual(cache.lookup(key, 61., xyz_values_start, xyz_end),
+                                 (None, None, None, None))
+
+    def test_key(self):
+        """
+        The key depends on the localisations and which set they are in.
+        """
+        print("Start TestRelativePositionCache test_key", flush=True)
+        xyz_values = np.arange(12.).reshape(6, 2)
+        key = relpos_cache.localisations_key(xyz_values)
+        self.assertEqual(key, relpos_cache.localisations_key(xyz_values.copy()))
+        self.assertNotEqual(key, relpos_cache.localisations_key(xyz_values[:-1]))
+        self.assertNotEqual(key, relpos_cache.localisations_key(xyz_values[:3],
+                                                                xyz_values[3:]))
+        self.assertNotEqual(key, relpos_cache.localisations_key(
+            xyz_values.astype(np.float32)))
+
+    def test_least_recently_used_removed(self):
+        """
+        Results for larger filter distances replace those for smaller ones,
+        and the least recently used results are removed to keep the cache to
+        its maximum size.
+        """
+        print("Start TestRelativePositionCache test_least_recently_used_removed",
+              flush=True)
+        rng = np.random.default_rng(9)
+        cache = relpos_cache.RelativePositionCache(self.cache_dir, max_size=10.)
+        keys = []
+        for index in range(3):
+            xyz_values = rng.uniform(0., 1000., (1000, 2))
+            keys.append(relpos_cache.localisations_key(xyz_values))
+            for filterdist in (20., 40.):
+                v_values, start_indices, end_indices = rp.get_vectors_and_pairs(
+                    xyz_values, filterdist, 2)
+                cache.store(keys[-1], filterdist, 2, v_values, start_indices,
+                            end_indices)
+            self.assertEqual([entry[0] for entry in cache.entries(keys[-1])], [40.])
+            # Distinct access times.
+            time.sleep(0.05)
+
+        # Use the first, so that the second is the least recently used.
+        self.assertIsNotNone(cache.lookup(keys[0], 40., xyz_values)[0])
+        sizes = [relpos_cache._directory_size(cache.entries(key)[0][1]) for key in keys]
+        cache.max_size = (sum(sizes) - 1) / 2. ** 20
+        cache.evict()
+        self.assertEqual([len(cache.entries(key)) for key in keys], [1, 0, 1])
+
+    def test_coincident_counts(self):
+        """
+        Localisations at the same position in two sets are counted.
+        """
+        print("Start TestRelativePositionCache test_coincident_counts", flush=True)
+        xyz_values_start = np.array([[0., 0.], [1., 2.], [3., 3.]])
+        xyz_values_end = np.array([[1., 2.], [0., 1.], [1., 2.], [3., 3.]])
+        np.testing.assert_array_equal(
+            neighbour_search.coincident_counts(xyz_values_start, xyz_values_end),
+            [0, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
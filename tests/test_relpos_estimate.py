@@ -0,0 +1,105 @@
+"""
+test_relpos_estimate.py
+
+Tests that the estimates made before a search count the candidate pairs
+exactly, and give the number of relative positions found by the search,
+exactly when all the cells are sampled and closely from a sample.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import unittest
+import numpy as np
+import neighbour_search
+import relpos_estimate
+import relative_positions as rp
+
+
+class TestEstimateSearch(unittest.TestCase):
+    """
+    Test the estimate_search function from the relpos_estimate library
+    """
+
+    def test_candidate_pair_counts(self):
+        """
+        The candidate pairs counted from each cell are those generated by
+        iter_candidate_pairs, for one and two sets of localisations.
+        """
+        print("Start TestEstimateSearch test_candidate_pair_counts", flush=True)
+        rng = np.random.default_rng(21)
+        for dims in (2, 3):
+            xyz_values_start = rng.uniform(0., 400., (800, dims))
+            xyz_values_end = rng.uniform(0., 400., (500, dims))
+            cells = neighbour_search.CellList(xyz_values_start, 30.)
+            cells_between = neighbour_search.cell_lists_between(
+                xyz_values_start, xyz_values_end, 30.)
+            for cells_a, cells_b in ((cells, None), cells_between):
+                counts = neighbour_search.candidate_pair_counts(cells_a, cells_b)
+                self.assertEqual(
+                    np.sum(counts),
+                    sum(len(i_values) for i_values, _ in
+                        neighbour_search.iter_candidate_pairs(cells_a, cells_b,
+                                                              block_size=1000)))
+
+            # Between two sets, the count from each 'from' cell.
+            cells_start, cells_end = cells_between
+            for cell_index in range(0, len(cells_start.cell_ids), 7):
+                cell_mask = np.zeros(len(cells_start.cell_ids), dtype=bool)
+                cell_mask[cell_index] = True
+                self.assertEqual(
+                    neighbour_search.candidate_pair_counts(*cells_between)[cell_index],
+                    sum(len(i_values) for i_values, _ in
+                        neighbour_search.iter_candidate_pairs(
+                            cells_start, cells_end, cell_mask=cell_mask)))
+
+    def test_pairs_as_found_by_search(self):
+        """
+        The estimated number of relative positions is that found by
+        getdistances and getdistances_two_colours when every cell is sampled,
+        and close to it from a small sample of cells.
+        """
+        print("Start TestEstimateSearch test_pairs_as_found_by_search", flush=True)
+        rng = np.random.default_rng(22)
+        xyz_values_start = np.round(rng.uniform(0., 2000., (12000, 3)), 1)
+        xyz_values_start[100:110] = xyz_values_start[0]
+        xyz_values_end = rng.uniform(0., 2000., (5000, 3))
+        for xyz_values_end_or_none in (None, xyz_values_end):
+            if xyz_values_end_or_none is None:
+                found = len(rp.getdistances(xyz_values_start, 70.))
+            else:
+                found = len(rp.getdistances_two_colours(xyz_values_start, 70.,
+                                                        xyz_values_end))
+            estimate = relpos_estimate.estimate_search(
+                xyz_values_start, 70., xyz_values_end_or_none)
+            self.assertEqual(estimate['sampled_fraction'], 1.)
+            self.assertEqual(estimate['pairs'], found)
+            self.assertGreater(estimate['output_bytes'], 0)
+            self.assertGreater(estimate['peak_memory_bytes'],
+                               found * 7 * 8)
+
+            sampled = relpos_estimate.estimate_search(
+                xyz_values_start, 70., xyz_values_end_or_none,
+                sample_candidates=20000)
+            self.assertLess(sampled['sampled_fraction'], 0.5)
+            self.assertEqual(sampled['candidate_pairs'], estimate['candidate_pairs'])
+            self.assertAlmostEqual(sampled['pairs'] / found, 1., delta=0.05)
+
+        histograms_only = relpos_estimate.estimate_search(
+            xyz_values_start, 70., histogram_only=True)
+        self.assertEqual(histograms_only['output_bytes'], 0)
+        self.assertLess(histograms_only['peak_memory_bytes'],
+                        estimate['peak_memory_bytes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
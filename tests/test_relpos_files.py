@@ -0,0 +1,149 @@
+"""
+test_relpos_files.py
+
+Tests of the binary relative positions format: that the table read back is
+the same as that saved, that the sidecar is checked, and that the readers
+of relative positions accept it.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+import relpos_files
+import relpos_writer
+import utils
+
+
+def relpos_table(n_rows, dims, seed):
+    """A sorted table of relative positions, as from get_vectors."""
+    rng = np.random.default_rng(seed)
+    d_values = np.zeros((n_rows, 3))
+    d_values[:, 0:dims] = rng.uniform(-50., 50., (n_rows, dims))
+    return relpos_writer.sort_by_distance(relpos_writer.vector_columns(d_values, dims))
+
+
+class TestBinaryRelativePositions(unittest.TestCase):
+    """
+    Test saving and reading relative positions with the relpos_files library
+    """
+
+    def test_save_and_read(self):
+        """
+        The table read back, memory-mapped, is the table saved, and the
+        sidecar describes it.
+        """
+        print("Start TestBinaryRelativePositions test_save_and_read", flush=True)
+        info = {'colours_analysed': 2, 'start_channel': 1, 'end_channel': 0}
+        for dims in (2, 3):
+            v_values = relpos_table(200, dims, dims)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                filename = os.path.join(temp_dir, 'relpos.npy')
+                relpos_files.save_relpos_npy(v_values, filename, dims, 50., info)
+                values, metadata = relpos_files.read_relpos_npy(filename)
+                self.assertIsInstance(values, np.memmap)
+                # Columns are contiguous on disk.
+                self.assertTrue(values.flags['F_CONTIGUOUS'])
+                np.testing.assert_array_equal(values, v_values)
+                self.assertEqual(metadata['dims'], dims)
+                self.assertEqual(metadata['filter_dist'], 50.)
+                self.assertEqual(metadata['end_channel'], 0)
+                self.assertEqual(','.join(metadata['columns']),
+                                 relpos_files.RELPOS_HEADERS[dims])
+
+                xy_values = relpos_files.read_relative_positions(
+                    filename, columns=['xx_separation', 'xy_separation'])
+                np.testing.assert_array_equal(xy_values, v_values[:, [0, 3]])
+                del values
+
+    def test_csv_columns(self):
+        """
+        Columns chosen by name from a .csv file are those from the binary file.
+        """
+        print("Start TestBinaryRelativePositions test_csv_columns", flush=True)
+        v_values = relpos_table(50, 3, 7)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'relpos.csv')
+            np.savetxt(filename, v_values, delimiter=',',
+                       header=relpos_files.RELPOS_HEADERS[3], comments='')
+            values = relpos_files.read_relative_positions(filename,
+                                                          columns=['yz_separation'])
+        np.testing.assert_array_equal(values, v_values[:, [5]])
+
+    def test_wrong_sidecar(self):
+        """
+        A .npy file without a sidecar describing relative positions is not
+        read as relative positions.
+        """
+        print("Start TestBinaryRelativePositions test_wrong_sidecar", flush=True)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'relpos.npy')
+            np.save(filename, relpos_table(10, 2, 3))
+            self.assertIsNone(relpos_files.read_relpos_metadata(filename))
+            with open(relpos_files.sidecar_file_name(filename), 'w') as fout:
+                json.dump({'format': relpos_files.RELPOS_FORMAT, 'dims': 2,
+                           'columns': ['x', 'y', 'z', 'xy']}, fout)
+            self.assertIsNone(relpos_files.read_relpos_metadata(filename))
+            with self.assertRaises(ValueError):
+                relpos_files.read_relpos_npy(filename)
+            with self.assertRaises(SystemExit):
+                utils.secondary_read_data_in({'in_file_and_path': filename})
+
+    def test_secondary_read_data_in(self):
+        """
+        Binary relative positions are read by the reader for models.
+        """
+        print("Start TestBinaryRelativePositions test_secondary_read_data_in",
+              flush=True)
+        v_values = relpos_table(100, 3, 11)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'relpos.npy')
+            relpos_files.save_relpos_npy(v_values, filename, 3, 50.)
+            info = {'in_file_and_path': filename}
+            values = utils.secondary_read_data_in(info)
+            np.testing.assert_array_equal(values, v_values)
+            self.assertEqual(info['values'], 100)
+            self.assertEqual(info['columns'], 7)
+            del values
+
+    def test_writer_npy(self):
+        """
+        The out-of-core writer gives the same table in a binary file as in a
+        .csv file.
+        """
+        print("Start TestBinaryRelativePositions test_writer_npy", flush=True)
+        rng = np.random.default_rng(21)
+        d_values = np.zeros((2000, 3))
+        d_values[:, 0:2] = rng.integers(-6, 7, (2000, 2))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'relpos.npy')
+            writer = relpos_writer.RelativePositionWriter(filename, 2, 50.,
+                                                          max_memory=0.01)
+            for block in np.array_split(d_values, 9):
+                writer.add(block)
+            writer.close()
+            values = relpos_files.read_relative_positions(filename)
+            np.testing.assert_array_equal(
+                values, relpos_writer.sort_by_distance(
+                    relpos_writer.vector_columns(d_values, 2)))
+            self.assertEqual(writer.total, 2000)
+            self.assertEqual(sorted(os.listdir(temp_dir)),
+                             ['relpos.json', 'relpos.npy'])
+            del values
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+test_relpos_incremental.py
+
+Tests that histograms updated as localisations are added are the same as
+those found from all the localisations at once.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import neighbour_search
+import relative_positions
+import relpos_incremental
+
+
+class TestIncrementalHistograms(unittest.TestCase):
+    """
+    Test the IncrementalHistograms class from the relpos_incremental library
+    """
+
+    def test_same_as_all_at_once(self):
+        """
+        Localisations added in batches, some outside the cells of the earlier
+        ones, and with the state saved and loaded between batches, give the
+        same histograms as gethistograms for all of them.
+        """
+        print("Start TestIncrementalHistograms test_same_as_all_at_once", flush=True)
+        rng = np.random.default_rng(19)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            state_file = os.path.join(temp_dir, 'state.npz')
+            for dims in (2, 3):
+                xyz_values = np.round(rng.uniform(0., 600., (3000, dims)), 1)
+                xyz_values[2000:] = xyz_values[2000:] + 400.
+                xyz_values[10:20] = xyz_values[0]
+                xyz_values[2500] = np.nan
+                incremental = relpos_incremental.IncrementalHistograms(dims, 30.)
+                for batch in np.split(np.arange(3000), [300, 301, 1000, 2000, 2900]):
+                    incremental.add(xyz_values[batch])
+                    incremental.save(state_file)
+                    incremental = relpos_incremental.load_incremental_histograms(
+                        state_file)
+                expected = relative_positions.gethistograms(xyz_values, 30.)
+                self.assertEqual(incremental.histograms.total, expected.total)
+                for description in expected.descriptions:
+                    n_bins = len(expected.counts[description])
+                    np.testing.assert_array_equal(
+                        incremental.histograms.counts[description][:n_bins],
+                        expected.counts[description])
+                    np.testing.assert_array_equal(
+                        incremental.histograms.exact_counts[description][:n_bins],
+                        expected.exact_counts[description])
+                    self.assertEqual(incremental.histograms.maxima[description],
+                                     expected.maxima[description])
+
+    def test_appended_cell_list(self):
+        """
+        Merging localisations into a cell list gives the same cells as
+        making the cell list of all of them.
+        """
+        print("Start TestIncrementalHistograms test_appended_cell_list", flush=True)
+        rng = np.random.default_rng(20)
+        xyz_values = rng.uniform(0., 100., (500, 2))
+        xyz_values_new = rng.uniform(10., 90., (300, 2))
+        xyz_values_new[3] = np.nan
+        origin, grid_shape = neighbour_search.common_grid(7., xyz_values)
+        cells = neighbour_search.CellList(xyz_values, 7., origin, grid_shape)
+        appended = cells.appended(xyz_values_new)
+        expected = neighbour_search.CellList(
+            np.concatenate((xyz_values, xyz_values_new)), 7., origin, grid_shape)
+        for key in ('cell_ids_per_loc', 'order', 'cell_ids', 'cell_starts', 'cell_counts'):
+            np.testing.assert_array_equal(getattr(appended, key), getattr(expected, key))
+        self.assertFalse(cells.contains(xyz_values + 200.))
+        with self.assertRaises(ValueError):
+            cells.appended(xyz_values + 200.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+test_relpos_table.py
+
+Tests that the compact RelativePositions container gives the same table of
+relative positions, in the same order, as the full table from get_vectors
+did, and that its distance columns are calculated once and kept.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import relpos_table
+import relpos_writer
+import relative_positions as rp
+
+
+def full_table(d_values, dims):
+    """The sorted full table, made as get_vectors made it before."""
+    return relpos_writer.sort_by_distance(
+        relpos_writer.vector_columns(d_values.copy(), dims))
+
+
+class TestRelativePositions(unittest.TestCase):
+    """
+    Test the RelativePositions class from the relpos_table library
+    """
+
+    def test_same_as_full_table(self):
+        """
+        The table and its order are the same as the full table sorted by
+        relpos_writer.sort_by_distance, including for equal distances.
+        """
+        print("Start TestRelativePositions test_same_as_full_table", flush=True)
+        rng = np.random.default_rng(11)
+        for dims in (2, 3):
+            # Whole numbers, so that many relative positions are equally far.
+            d_values = rng.integers(-6, 7, (4000, 3)).astype(np.float64)
+            if dims == 2:
+                d_values[:, 2] = 0.
+            expected = full_table(d_values, dims)
+            np.testing.assert_array_equal(rp.get_vectors(d_values.copy(), dims),
+                                          expected)
+
+            relative_positions = rp.get_relative_positions(d_values, dims)
+            self.assertEqual(relative_positions.shape, expected.shape)
+            np.testing.assert_array_equal(np.asarray(relative_positions), expected)
+            np.testing.assert_array_equal(
+                np.concatenate(list(relative_positions.iter_tables(block_rows=999))),
+                expected)
+            for column in range(expected.shape[1]):
+                np.testing.assert_array_equal(relative_positions[:, column],
+                                              expected[:, column])
+
+    def test_float32_and_lazy_distances(self):
+        """
+        Components can be stored as float32, and distance columns are only
+        calculated when used, then kept, including through sorting.
+        """
+        print("Start TestRelativePositions test_float32_and_lazy_distances",
+              flush=True)
+        rng = np.random.default_rng(12)
+        d_values = rng.uniform(-100., 100., (2000, 3))
+        relative_positions = relpos_table.RelativePositions(d_values, 3,
+                                                            dtype=np.float32)
+        self.assertEqual(relative_positions.components.dtype, np.float32)
+        self.assertEqual(relative_positions.components.nbytes, 2000 * 3 * 4)
+        self.assertEqual(relative_positions._distances, {})
+
+        xz_distances = relative_positions.distance('xz')
+        self.assertIs(relative_positions.distance('xz'), xz_distances)
+        self.assertEqual(list(relative_positions._distances), ['xz'])
+
+        relative_positions.sort()
+        self.assertEqual(sorted(relative_positions._distances), ['xyz', 'xz'])
+        expected = full_table(d_values.astype(np.float32).astype(np.float64), 3)
+        np.testing.assert_allclose(np.asarray(relative_positions), expected,
+                                   rtol=1e-6)
+        np.testing.assert_array_equal(relative_positions[:, 0], expected[:, 0])
+
+        with self.assertRaises(TypeError):
+            relative_positions[0]
+
+    def test_save_relative_positions(self):
+        """
+        The CSV file saved a block at a time is the same as saving the full
+        table.
+        """
+        print("Start TestRelativePositions test_save_relative_positions",
+              flush=True)
+        rng = np.random.default_rng(13)
+        d_values = rng.uniform(-50., 50., (3000, 3))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            full_dir = os.path.join(temp_dir, 'full')
+            compact_dir = os.path.join(temp_dir, 'compact')
+            os.makedirs(full_dir)
+            os.makedirs(compact_dir)
+            info = {'results_dir': full_dir, 'in_file_no_extension': 'locs',
+                    'short_names': False}
+            rp.save_relative_positions(full_table(d_values, 3), 50., 3, info)
+            info['results_dir'] = compact_dir
+            relative_positions = rp.get_relative_positions(d_values, 3)
+            rp.save_relative_positions(relative_positions, 50., 3, info)
+            file_name = os.listdir(full_dir)[0]
+            with open(os.path.join(full_dir, file_name)) as full_file, \
+                    open(os.path.join(compact_dir, file_name)) as compact_file:
+                self.assertEqual(full_file.read(), compact_file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
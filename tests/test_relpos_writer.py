@@ -0,0 +1,92 @@
+"""
+test_relpos_writer.py
+
+Tests that relative positions written in sorted blocks and merged give the
+same file as sorting them all in memory.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+import relpos_writer as rw
+
+
+def sorted_in_memory(d_values, dims):
+    """The table of relative positions sorted all at once."""
+    return rw.sort_by_distance(rw.vector_columns(d_values, dims))
+
+
+class TestRelativePositionWriter(unittest.TestCase):
+    """
+    Test the RelativePositionWriter class from the relpos_writer library
+    """
+
+    def write_and_read(self, blocks, dims, max_memory, starts=None,
+                       excluded_starts=None):
+        """Write blocks of vectors with a writer and read the file back."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            out_file_name = os.path.join(temp_dir, 'relpos.csv')
+            writer = rw.RelativePositionWriter(out_file_name, dims, 50.,
+                                               max_memory=max_memory)
+            for index, block in enumerate(blocks):
+                writer.add(block, None if starts is None else starts[index])
+            writer.close(excluded_starts=excluded_starts)
+            with open(out_file_name) as fin:
+                header = fin.readline().strip()
+            values = np.loadtxt(out_file_name, delimiter=',', skiprows=1, ndmin=2)
+            # Only the output file is left.
+            self.assertEqual(os.listdir(temp_dir), ['relpos.csv'])
+        self.assertEqual(header, rw.RELPOS_HEADERS[dims])
+        return writer, values
+
+    def test_merged_runs_match_sorting_in_memory(self):
+        """
+        Many small sorted runs, with many tied distances, merge into the same
+        table as sorting everything at once.
+        """
+        print("Start TestRelativePositionWriter test_merged_runs_match_"
+              "sorting_in_memory", flush=True)
+        rng = np.random.default_rng(14)
+        for dims in (2, 3):
+            d_values = np.zeros((3000, 3))
+            d_values[:, 0:dims] = rng.integers(-6, 7, (3000, dims))
+            blocks = np.array_split(d_values, 13)
+            writer, values = self.write_and_read(blocks, dims, max_memory=0.01)
+            np.testing.assert_array_equal(sorted_in_memory(d_values, dims), values)
+            self.assertEqual(writer.total, len(d_values))
+            self.assertEqual(writer.histograms.total, len(d_values))
+
+    def test_excluded_start_localisations(self):
+        """
+        Vectors from excluded 'from' localisations are left out of the file.
+        """
+        print("Start TestRelativePositionWriter test_excluded_start_localisations",
+              flush=True)
+        rng = np.random.default_rng(15)
+        d_values = rng.uniform(-50., 50., (500, 3))
+        starts = rng.integers(0, 40, 500)
+        excluded_starts = np.zeros(40, dtype=bool)
+        excluded_starts[::3] = True
+        writer, values = self.write_and_read(
+            np.array_split(d_values, 4), 3, max_memory=0.005,
+            starts=np.array_split(starts, 4), excluded_starts=excluded_starts)
+        expected = sorted_in_memory(d_values[~excluded_starts[starts]], 3)
+        np.testing.assert_array_equal(expected, values)
+        self.assertEqual(writer.total, len(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
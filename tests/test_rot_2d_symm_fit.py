@@ -0,0 +1,123 @@
+"""
+test_rot_2d_symm_fit.py
+
+Tests that the rotational symmetry models are given the order of symmetry
+with each call, that the fits for a range of orders of symmetry are the same
+on one or several processes, and that the orders of symmetry are read from the
+command line.
+
+---
+Copyright 2026 Peckham Lab
+
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+this file except in compliance with the License. You may obtain a copy of the
+License at
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import argparse
+import unittest
+import numpy as np
+import modelling_general as models
+import rot_2d_symm_fit as rot
+
+
+class TestSymmetryOrder(unittest.TestCase):
+    """
+    Test bind_symmetry_order and fit_symmetries from rot_2d_symm_fit
+    """
+
+    def setUp(self):
+        self.model_with_info = (
+            rot.set_up_model_replocs_substruct_iso_bg_with_onset_with_fit_settings())
+        self.x_values = np.arange(200) + 0.5
+        self.params = [110., 8., 1., 5., 2., 10., 1., 0.01, 50.]
+        random = np.random.default_rng(0)
+        model = rot.bind_symmetry_order(self.model_with_info.model_rpd, 8)
+        self.xy_histogram = (model(self.x_values, *self.params)
+                             + random.normal(0., 0.05, len(self.x_values)))
+
+    def test_bound_models(self):
+        """
+        A model bound to an order of symmetry gives the same values as with
+        that order given, and a model must be given an order of symmetry.
+        """
+        print("Start TestSymmetryOrder test_bound_models", flush=True)
+        model = self.model_with_info.model_rpd
+        bound = {order: rot.bind_symmetry_order(model, order)
+                 for order in (6, 9)}
+        self.assertEqual(models.model_parameter_names(bound[6]),
+                         models.model_parameter_names(model))
+        self.assertEqual(models.linear_parameter_indices(bound[6]),
+                         models.linear_parameter_indices(model))
+        self.assertEqual(bound[6].__name__, model.__name__)
+
+        for order in (6, 9):
+            np.testing.assert_array_equal(
+                bound[order](self.x_values, *self.params),
+                model(self.x_values, *self.params, symmetry_order=order))
+            np.testing.assert_array_equal(
+                models.model_jacobian(bound[order])(self.x_values,
+                                                    *self.params),
+                models.model_jacobian(model)(self.x_values, *self.params,
+                                             symmetry_order=order))
+        self.assertFalse(np.array_equal(bound[6](self.x_values, *self.params),
+                                        bound[9](self.x_values, *self.params)))
+
+        with self.assertRaises(TypeError):
+            model(self.x_values, *self.params)
+
+    def test_fit_symmetries(self):
+        """
+        The fits are those for each order of symmetry in turn, for any
+        number of processes.
+        """
+        print("Start TestSymmetryOrder test_fit_symmetries", flush=True)
+        symmetries = [7, 8, 9]
+        stage = {'counts': {}}
+        fits = rot.fit_symmetries(self.xy_histogram, symmetries,
+                                  self.model_with_info, 200, stage=stage)
+        self.assertEqual(len(fits), len(symmetries))
+        self.assertEqual(stage['counts']['fits'], len(symmetries))
+        for order, fit in zip(symmetries, fits):
+            params_optimised = models.fit_model_to_experiment(
+                self.xy_histogram,
+                rot.bind_symmetry_order(self.model_with_info.model_rpd, order),
+                self.model_with_info.initial_params,
+                self.model_with_info.param_bounds,
+                fitlength=200)[0]
+            np.testing.assert_array_equal(fit[0], params_optimised)
+
+        for fit, parallel_fit in zip(fits, rot.fit_symmetries(
+                self.xy_histogram, symmetries, self.model_with_info, 200,
+                workers=2)):
+            for value, parallel_value in zip(fit, parallel_fit):
+                np.testing.assert_array_equal(value, parallel_value)
+
+        # Starting from the neighbouring optimum finds equally good fits
+        # here (the two components at zero separation may swap).
+        warm_fits = rot.fit_symmetries(self.xy_histogram, symmetries,
+                                       self.model_with_info, 200,
+                                       warm_start=True)
+        np.testing.assert_array_equal(warm_fits[0][0], fits[0][0])
+        np.testing.assert_allclose([fit[3] for fit in warm_fits],
+                                   [fit[3] for fit in fits], rtol=1e-5)
+
+    def test_parse_symmetries(self):
+        """
+        Orders of symmetry are read as ranges and lists.
+        """
+        print("Start TestSymmetryOrder test_parse_symmetries", flush=True)
+        self.assertEqual(rot.parse_symmetries('3-40'), list(range(3, 41)))
+        self.assertEqual(rot.parse_symmetries('9,5-7,5'), [5, 6, 7, 9])
+        for text in ('a', '5-', '1-4'):
+            self.assertRaises(argparse.ArgumentTypeError,
+                              rot.parse_symmetries, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -40,19 +40,24 @@ import numpy as np
 import matplotlib.pyplot as plt
 from background_models import exponential_decay_1d_pair_corr as expo_bg
 from modelling_general import pairwise_correlation_1d
+from modelling_general import model_jacobian
 from modelling_general import stdev_of_model
 from utils import find_hostname_and_ip
+import relpos_files
+import instrumentation
+import pair_correlation
 
 
 def get_input(info):
     """Load relative positions.
 
     Returns:
-        Relative position data (2D or 3D) loaded from .csv file.
+        Relative position data (2D or 3D) loaded from .csv or .npy file.
     """
     Tk().withdraw()
     print('Please select input file containing relative positions to assess '
-          'for two-layer structure (.csv or .txt with comma delimiters).')
+          'for two-layer structure (.csv or .txt with comma delimiters, '
+          'or .npy).')
     print('The file should contain an array '
           'with one relative position per row.\n')
     infile = askopenfilename()
@@ -70,8 +75,13 @@ def get_input(info):
 
     if infile[-4:] == '.npy':
         try:
-            xyz_values = np.load(infile)
-        except (EOFError, IOError, OSError) as exception:
+            if relpos_files.read_relpos_metadata(infile) is not None:
+                # Saved by relative_positions.py --format npy: memory-mapped,
+                # so only the column analysed is read from disk.
+                xyz_values = relpos_files.read_relpos_npy(infile)[0]
+            else:
+                xyz_values = np.load(infile)
+        except (EOFError, IOError, OSError, ValueError) as exception:
             print("\n\nCould not read file: ", infile)
             print("\n\n", type(exception))
             sys.exit("Could not read the input file "+infile+".\n")
@@ -169,6 +179,29 @@ def log_file_header(log_file, info):
     return
 
 
+def _two_layer_peaks_columns(distance_values_1d,
+                             layer_separation,
+                             amplitude_within_layer,
+                             amplitude_between_layers,
+                             broadening):
+    """Derivatives of the within-layer and between-layer peaks of the
+    two-layer models with respect to layer_separation,
+    amplitude_within_layer, amplitude_between_layers and broadening,
+    for the Jacobians of the models."""
+    (_, d_means,
+     d_broadenings,
+     d_amplitudes) = pair_correlation.sum_pair_correlations_derivatives(
+         distance_values_1d,
+         [0., layer_separation],
+         broadening,
+         [amplitude_within_layer, amplitude_between_layers],
+         dims=1)
+    return [d_means[..., 1],
+            d_amplitudes[..., 0],
+            d_amplitudes[..., 1],
+            d_broadenings.sum(axis=-1)]
+
+
 def two_layer_model_constant_bg(distance_values_1d,
                                 layer_separation,
                                 amplitude_within_layer,
@@ -214,6 +247,28 @@ def two_layer_model_constant_bg(distance_values_1d,
     return model_rpd
 
 
+def two_layer_model_constant_bg_jacobian(distance_values_1d,
+                                         layer_separation,
+                                         amplitude_within_layer,
+                                         amplitude_between_layers,
+                                         broadening,
+                                         background_offset):
+    """Jacobian of two_layer_model_constant_bg
+    (see modelling_general.model_jacobian)."""
+    columns = _two_layer_peaks_columns(distance_values_1d,
+                                       layer_separation,
+                                       amplitude_within_layer,
+                                       amplitude_between_layers,
+                                       broadening)
+    columns.append(np.ones(np.shape(distance_values_1d)))
+    return np.stack(columns, axis=-1)
+
+
+two_layer_model_constant_bg.jacobian = two_layer_model_constant_bg_jacobian
+two_layer_model_constant_bg.linear_params = (
+    'amplitude_within_layer', 'amplitude_between_layers', 'background_offset')
+
+
 def two_layer_model_exp_decay_bg(distance_values_1d,
                                  layer_separation,
                                  amplitude_within_layer,
@@ -265,11 +320,36 @@ def two_layer_model_exp_decay_bg(distance_values_1d,
     return model_rpd
 
 
+def two_layer_model_exp_decay_bg_jacobian(distance_values_1d,
+                                          layer_separation,
+                                          amplitude_within_layer,
+                                          amplitude_between_layers,
+                                          broadening,
+                                          bg_amplitude,
+                                          bg_scale_param):
+    """Jacobian of two_layer_model_exp_decay_bg
+    (see modelling_general.model_jacobian)."""
+    columns = _two_layer_peaks_columns(distance_values_1d,
+                                       layer_separation,
+                                       amplitude_within_layer,
+                                       amplitude_between_layers,
+                                       broadening)
+    decay = expo_bg(distance_values_1d, 1., bg_scale_param)
+    columns += [decay,
+                bg_amplitude * decay * distance_values_1d / bg_scale_param ** 2]
+    return np.stack(columns, axis=-1)
+
+
+two_layer_model_exp_decay_bg.jacobian = two_layer_model_exp_decay_bg_jacobian
+two_layer_model_exp_decay_bg.linear_params = (
+    'amplitude_within_layer', 'amplitude_between_layers', 'bg_amplitude')
+
+
 def two_layer_model_exp_decay_bg_vectorargs(input_vector):
     """Function to calculate the values given by two_layer_model_exp_decay_bg,
-    but using a vector input for the parameters, so that the numdifftools
-    package can be used to calculate partial derivatives for correct error
-    propagation in the model.
+    but using a vector input for the parameters, so that
+    modelling_general.stdev_of_model can calculate partial derivatives for
+    correct error propagation in the model.
 
     Args:
         input_vector (list or numpy array):
@@ -308,7 +388,8 @@ def two_layer_model_exp_decay_bg_vectorargs(input_vector):
 
 def fit_two_layer_model(experimental_data,
                         model=two_layer_model_constant_bg,
-                        fitlength=200.):
+                        fitlength=200.,
+                        stage=None):
     """Use scipy.optimize.curve_fit to do non-linear least-squares fitting
     of a model two-layer relative position distribution to an experimental
     distribution, e.g. histogram or kernel density estimation.
@@ -322,6 +403,9 @@ def fit_two_layer_model(experimental_data,
             Defaults to two_layer_model().
         fitlength:
             Maximum distance included in the fit.
+        stage:
+            Optional record of a stage of the run (see instrumentation.py),
+            to which the number of fits and model evaluations are added.
 
     Returns:
         params_optimised:
@@ -335,9 +419,17 @@ def fit_two_layer_model(experimental_data,
     # histogram or density has been obtained and the model generated.
     distance_values = np.arange(fitlength) + 0.5
 
+    # Use the analytic Jacobian of the model, if it has one.
+    jacobian = model_jacobian(model)
+    if stage is not None:
+        model = instrumentation.CountCalls(model)
+        if jacobian is not None:
+            jacobian = instrumentation.CountCalls(jacobian)
+
     # Find estimates and covariances of model parameters
     params_optimised, params_covar = curve_fit(
         model, distance_values, experimental_data,
+        jac=jacobian,
         p0=[60.,  # layer_separation
             10.,  # amplitude_within_layer
             10.,  # amplitude_between_layers
@@ -357,6 +449,13 @@ def fit_two_layer_model(experimental_data,
                  ])
         )
 
+    if stage is not None:
+        instrumentation.add_count(stage, 'fits', 1)
+        instrumentation.add_count(stage, 'model evaluations', model.calls)
+        if jacobian is not None:
+            instrumentation.add_count(stage, 'jacobian evaluations',
+                                      jacobian.calls)
+
     # Calculate uncertainty (1 SD)
     params_1sd_err = np.sqrt(np.diag(params_covar))
     # print('Fitted parameters:')
@@ -408,19 +507,24 @@ def main():
 
     log_file_header(log_file, info)
 
+    recorder = instrumentation.StageRecorder()
+    info['stage_recorder'] = recorder
+
     # Get distances and distance histogram, and plot.
     dimension_to_analyse = (
         int(input('Which column of the relative positions data '
                   '(which dimension) would you like to fit '
                   'to a two-layer model (start counting at 0)? '))
     )
-    distances = xyz_values[:, dimension_to_analyse]
-    distance_histogram_values, bin_values = np.histogram(
-            distances,
-            weights=np.repeat(float(fitlength) / len(distances),
-                              len(distances)),
-            bins=np.arange(fitlength + 1)
-            )
+    with recorder.stage('histogram') as stage:
+        distances = xyz_values[:, dimension_to_analyse]
+        distance_histogram_values, bin_values = np.histogram(
+                distances,
+                weights=np.repeat(float(fitlength) / len(distances),
+                                  len(distances)),
+                bins=np.arange(fitlength + 1)
+                )
+        stage['counts']['relative positions'] = len(distances)
 
     fig_histogram = plt.figure(num=None, figsize=(10, 8), dpi=100,
                                facecolor='w', edgecolor='k')
@@ -434,11 +538,13 @@ def main():
     model = two_layer_model_exp_decay_bg
     info['model_name'] = model.__name__
 
-    params_optimised, params_covar, params_1sd_error = (
-            fit_two_layer_model(distance_histogram_values,
-                                model=model,
-                                fitlength=fitlength)
-    )
+    with recorder.stage('fit') as stage:
+        params_optimised, params_covar, params_1sd_error = (
+                fit_two_layer_model(distance_histogram_values,
+                                    model=model,
+                                    fitlength=fitlength,
+                                    stage=stage)
+        )
 
     x_values = center
     fitted_curve = model(x_values, *params_optimised)
@@ -463,10 +569,12 @@ def main():
             color='xkcd:red', lw=0.75
             )
     vector_input_model = two_layer_model_exp_decay_bg_vectorargs
-    stdev = stdev_of_model(x_values,
-                           params_optimised,
-                           params_covar,
-                           vector_input_model)
+    with recorder.stage('confidence band'):
+        stdev = stdev_of_model(x_values,
+                               params_optimised,
+                               params_covar,
+                               vector_input_model,
+                               jacobian=model_jacobian(model))
     axes.fill_between(x_values,
                       model(x_values, *params_optimised) - stdev * 1.96,
                       model(x_values, *params_optimised) + stdev * 1.96,
@@ -481,6 +589,9 @@ def main():
     params_table = np.column_stack((params_optimised, params_1sd_error))
     print(params_table)
 
+    # Time taken and memory used in each stage.
+    instrumentation.save_stages(info)
+
     return params_table
 
 
@@ -25,6 +25,9 @@ import sys
 import socket
 from sys import platform as _platform
 import numpy as np
+import distance_histograms
+import relpos_files
+import ingest
 
 
 def find_hostname_and_ip():
@@ -253,7 +256,7 @@ def secondary_filename_and_path_setup(info):
     info['short_filename_without_extension'] = short_filename_without_extension
 
 
-def secondary_read_data_in(info):
+def secondary_read_data_in(info, columns=None):
     """Reads data from the input file thats filename is provided as an argument
        to this program or from the command line while this program executes.
        This reader is for a model and so only reads data that is ouput from
@@ -272,8 +275,12 @@ def secondary_read_data_in(info):
     Args:
         info (dict): A python dictionary containing a collection of useful parameters
             such as the filenames and paths.
+        columns (list): Optional, the columns to read, by index or name (e.g.
+            'xy_separation'). Other columns are not read. Defaults to all.
     Returns:
                xyz_values (numpy array): A numpy array of the x, y (and z) localisations.
+                   For a binary (.npy) relative positions file, this is
+                   memory-mapped, so columns are read from disk as they are used.
     """
 
     in_file = info['in_file_and_path']
@@ -292,10 +299,9 @@ def secondary_read_data_in(info):
                 line.__contains__("xx_separation,yy_separation,zz_separation,"
                                   "xy_separation,xz_separation,yz_separation,"
                                   "xyz_separation")):
-            skip = 1
             try:
-                xyz_values = np.loadtxt(in_file, delimiter=',', skiprows=skip)
-            except (EOFError, IOError, OSError) as exception:
+                xyz_values = ingest.read_table(in_file, columns=columns)
+            except (EOFError, IOError, OSError, ValueError) as exception:
                 print("\n\nCould not read file: ", in_file)
                 print("\n\n", type(exception))
                 sys.exit("Could not read the input file "+in_file+".\n")
@@ -305,6 +311,21 @@ def secondary_read_data_in(info):
                   'relative_positions.py\n')
             sys.exit("The input file "+in_file+" has the wrong format. It needs "
                      "a file output form relative_positions\n")
+    elif in_file[-4:] == '.npy':
+        # Binary relative positions: the JSON sidecar plays the part of the
+        # .csv header.
+        if relpos_files.read_relpos_metadata(in_file) is None:
+            print('Sorry, wrong format! This program needs a file output from '
+                  'relative_positions.py\n')
+            sys.exit("The input file "+in_file+" has the wrong format. It needs "
+                     "a file output form relative_positions, with its .json "
+                     "sidecar\n")
+        try:
+            xyz_values = relpos_files.read_relpos_npy(in_file, columns)[0]
+        except (EOFError, IOError, OSError, ValueError) as exception:
+            print("\n\nCould not read file: ", in_file)
+            print("\n\n", type(exception))
+            sys.exit("Could not read the input file "+in_file+".\n")
     else:
         xyz_values = 'Ouch'
         print('Sorry, wrong format! This program needs a file output from '
@@ -314,9 +335,48 @@ def secondary_read_data_in(info):
 
 
     info['values'] = xyz_values.shape[0]
-    info['columns'] = xyz_values.shape[1]
+    info['columns'] = ingest.read_header(in_file)[1]
     info['total_values'] = xyz_values.shape[0]
-    info['total_columns'] = xyz_values.shape[1]
+    info['total_columns'] = info['columns']
 
 
     return xyz_values
+
+
+def secondary_read_histograms_in(info):
+    """Reads distance histograms from the input file, as saved by
+       relative_positions.py with the --histogram-only option, for models that
+       are fitted to histograms.
+
+    Args:
+        info (dict): A python dictionary containing a collection of useful parameters
+            such as the filenames and paths.
+    Returns:
+        histograms (distance_histograms.DistanceHistograms):
+            Counts of distances between localisations in 1-nm bins.
+    """
+
+    in_file = info['in_file_and_path']
+
+    if not os.path.exists(in_file):
+        sys.exit("ERROR; The input file does not exist.")
+
+    try:
+        histograms = distance_histograms.load_histograms(in_file)
+    except (KeyError, ValueError) as exception:
+        print('Sorry, wrong format! This program needs a file output from '
+              'relative_positions.py\n')
+        print("\n\n", type(exception))
+        sys.exit("The input file "+in_file+" has the wrong format. It needs "
+                 "a file output form relative_positions\n")
+    except (EOFError, IOError, OSError) as exception:
+        print("\n\nCould not read file: ", in_file)
+        print("\n\n", type(exception))
+        sys.exit("Could not read the input file "+in_file+".\n")
+
+    info['values'] = histograms.total
+    info['columns'] = len(histograms.descriptions)
+    info['total_values'] = histograms.total
+    info['total_columns'] = len(histograms.descriptions)
+
+    return histograms
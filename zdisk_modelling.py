@@ -35,7 +35,9 @@ import pandas as pd
 from scipy.optimize import curve_fit
 import linearrepeatmodels as linmods
 import models_2d_distances_normalised as mods2d
+import model_composition as compose
 from modelling_general import ModelWithFitSettings
+from modelling_general import model_jacobian
 
 
 def read_relpos_from_pickles(input_files):
@@ -194,7 +196,8 @@ def fitmodel_to_hist(x,
     popt, pcov = curve_fit(
             model, x, experimentaldist,
             p0=initial_params,
-            bounds=param_bounds
+            bounds=param_bounds,
+            jac=model_jacobian(model)
             )
     # plt.plot(x, model(x, *popt))
     perr = np.sqrt(np.diag(pcov))
@@ -279,11 +282,60 @@ def create_default_fitting_params_dicts():
     return lower_bound_dict, upper_bound_dict, initial_params_dict
 
 
+def set_up_composed_model_with_fit_settings(components, name, param_keys):
+    """Set up a model RPD made from components (see
+    model_composition.compose_model), with the default fitting settings
+    from create_default_fitting_params_dicts.
+
+    Args:
+        components (list of model_composition.ModelComponents):
+            The parts of the model, e.g. peaks on a linear repeat and a
+            background.
+        name (str): The name of the model.
+        param_keys (list of strings):
+            The key in the dictionaries of fitting settings for each
+            parameter of the model, in order.
+
+    Returns:
+        A ModelWithFitSettings object containing:
+            model_rpd (function name):
+                Relative position density as a function of separation
+                between localisations.
+            initial_params (list):
+                Starting guesses for the parameter values by
+                scipy.optimize.curve_fit
+            lower_bounds (list), upper_bounds (list):
+                The bounds on allowable parameter values as
+                scipy.optimize.curve_fit runs.
+            vector_input_model (function):
+                The vector-input version of the model, for error
+                propagation.
+    """
+    model_with_fit_settings = compose.compose_model(components, dims=1,
+                                                    name=name)
+    n_params = len(model_with_fit_settings.initial_params)
+    if len(param_keys) != n_params:
+        raise ValueError('%d keys are needed for the parameters of %s, not %d'
+                         % (n_params, name, len(param_keys)))
+
+    (lower_bound_dict,
+     upper_bound_dict,
+     initial_params_dict) = create_default_fitting_params_dicts()
+
+    model_with_fit_settings.initial_params = [
+        initial_params_dict[key] for key in param_keys]
+    model_with_fit_settings.param_bounds = (
+        [lower_bound_dict[key] for key in param_keys],
+        [upper_bound_dict[key] for key in param_keys])
+
+    return model_with_fit_settings
+
+
 def set_up_model_3_peaks_fixed_ratio_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -358,7 +410,7 @@ def set_up_model_4_peaks_fixed_ratio_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -433,7 +485,7 @@ def set_up_model_5_peaks_fixed_ratio_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -513,7 +565,7 @@ def set_up_model_5_peaks_fixed_ratio_no_replocs_with_fit_settings():
     
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -582,7 +634,7 @@ def set_up_model_5_variable_peaks_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -668,7 +720,7 @@ def set_up_model_5_variable_peaks_bg_flat_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -751,7 +803,7 @@ def set_up_model_5_variable_peaks_with_replocs_bg_flat_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -768,65 +820,18 @@ def set_up_model_5_variable_peaks_with_replocs_bg_flat_with_fit_settings():
                 The bounds on allowable parameter values as
                 scipy.optimize.curve_fit runs.
     """
-    # Generate ModelWithFitSettings object, conatining a model_rpd
-    model_with_fit_settings = (
-        ModelWithFitSettings(model_rpd=linmods.linrepplusreps5_bg_flat)
-        )
-
-    # Add fitting parameters to ModelWithFitSettings object
-    (lower_bound_dict,
-     upper_bound_dict,
-     initial_params_dict) = create_default_fitting_params_dicts()
-
-    # Can optionally modify these dictionaries here:
-
-    initial_params = [initial_params_dict['repeat_distance'],
-                      initial_params_dict['repeat_broadening'],
-                      initial_params_dict['amp_peak_1'],
-                      initial_params_dict['amp_peak_2'],
-                      initial_params_dict['amp_peak_3'],
-                      initial_params_dict['amp_peak_4'],
-                      initial_params_dict['amp_peak_5'],
-                      initial_params_dict['loc_prec_sd'],
-                      initial_params_dict['loc_prec_amp'],
-                      initial_params_dict['bg_offset']
-                      ]
-
-    lower_bounds = [lower_bound_dict['repeat_distance'],
-                    lower_bound_dict['repeat_broadening'],
-                    lower_bound_dict['amp_peak_1'],
-                    lower_bound_dict['amp_peak_2'],
-                    lower_bound_dict['amp_peak_3'],
-                    lower_bound_dict['amp_peak_4'],
-                    lower_bound_dict['amp_peak_5'],
-                    lower_bound_dict['loc_prec_sd'],
-                    lower_bound_dict['loc_prec_amp'],
-                    lower_bound_dict['bg_offset']
-                    ]
-
-    upper_bounds = [upper_bound_dict['repeat_distance'],
-                    upper_bound_dict['repeat_broadening'],
-                    upper_bound_dict['amp_peak_1'],
-                    upper_bound_dict['amp_peak_2'],
-                    upper_bound_dict['amp_peak_3'],
-                    upper_bound_dict['amp_peak_4'],
-                    upper_bound_dict['amp_peak_5'],
-                    50,# upper_bound_dict['loc_prec_sd'],
-                    upper_bound_dict['loc_prec_amp'],
-                    upper_bound_dict['bg_offset']
-                    ]
-
-    bounds = (lower_bounds, upper_bounds)
-
-    model_with_fit_settings.initial_params = (
-        initial_params
-        )
-    model_with_fit_settings.param_bounds = (
-        bounds
-        )
-    model_with_fit_settings.vector_input_model = (
-        linmods.linrepplusreps5_bg_flat_vectorinput
-        )
+    model_with_fit_settings = set_up_composed_model_with_fit_settings(
+        [compose.repeat_peaks(5),
+         compose.repeated_localisations(),
+         compose.background('flat')],
+        'linrepplusreps5_bg_flat',
+        ['repeat_distance', 'repeat_broadening',
+         'amp_peak_1', 'amp_peak_2', 'amp_peak_3', 'amp_peak_4', 'amp_peak_5',
+         'loc_prec_sd', 'loc_prec_amp',
+         'bg_offset'])
+
+    # Upper bound on loc_prec_sd.
+    model_with_fit_settings.param_bounds[1][7] = 50
 
     return model_with_fit_settings
 
@@ -835,7 +840,7 @@ def set_up_model_5_variable_peaks_after_offset_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -926,7 +931,7 @@ def set_up_model_5_variable_peaks_after_offset_flat_bg_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1016,7 +1021,7 @@ def set_up_model_4_variable_peaks_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1096,7 +1101,7 @@ def set_up_model_4_variable_peaks_after_offset_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1177,7 +1182,7 @@ def set_up_model_linear_fit_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1237,7 +1242,7 @@ def set_up_model_linear_fit_plusreplocs_with_fit_settings():
     """Set up the RPD model with fitting settings.
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1307,7 +1312,7 @@ def set_up_model_onepeak_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1380,7 +1385,7 @@ def set_up_model_onepeak_plus_replocs_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1459,7 +1464,7 @@ def set_up_model_onepeak_plus_replocs_flat_bg_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1535,7 +1540,7 @@ def set_up_model_2d_onepeak_plus_replocs_flat_bg_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1611,7 +1616,7 @@ def set_up_model_onepeak_plus_replocs_no_bg_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -1684,7 +1689,7 @@ def set_up_model_2d_twopeaks_flat_bg_with_fit_settings():
 
     The fitting settings are to pass to scipy's
     curve_fit, and the vector-input version of the model is for
-    differentiation and error propagation with numdifftools.
+    differentiation and error propagation.
 
     Args:
         None
@@ -31,6 +31,7 @@ import zdisk_modelling
 from modelling_general import kde_1nm
 from modelling_general import pairwise_correlation_1d
 from modelling_general import stdev_of_model
+from modelling_general import model_jacobian
 from plotting import estimate_rpd_churchman_1d
 from zdisk_modelling import read_relpos_from_pickles
 from zdisk_modelling import getaxialseparations_no_smoothing
@@ -150,7 +151,9 @@ def plot_distance_hist_and_fit(
         stdev = stdev_of_model(bin_centres,
                                params_optimised,
                                params_covar,
-                               model_with_info.vector_input_model
+                               model_with_info.vector_input_model,
+                               jacobian=model_jacobian(
+                                   model_with_info.model_rpd)
                                )
 
         axes.fill_between(bin_centres,
@@ -226,7 +229,9 @@ def plot_fitted_model(
             stdev = stdev_of_model(estimate_points,
                                    params_optimised,
                                    params_covar,
-                                   model_with_info.vector_input_model
+                                   model_with_info.vector_input_model,
+                                   jacobian=model_jacobian(
+                                       model_with_info.model_rpd)
                                    )
 
         # Plot confidence intervals (95%)
@@ -498,7 +503,8 @@ def actn_mEos_x_plot():
     stdev = stdev_of_model(ax_plot_points,
                            params_optimised,
                            params_covar,
-                           model_with_info.vector_input_model
+                           model_with_info.vector_input_model,
+                           jacobian=model_jacobian(model_with_info.model_rpd)
                            )
 
     # Plot 95% confidence interval on model